@@ -0,0 +1,80 @@
+#gunicorn -c gunicorn.conf.py - several workers per pod sharing one preloaded heap
+#
+#With preload the master imports and warms the app once (Flask, OpenTelemetry,
+#validators, JWT) and the workers get those pages copy-on-write. gc.disable()
+#in the master, gc.freeze() right before each fork and gc.enable() in the
+#worker keep the collector from writing to, and so copying, the shared objects.
+#process_memory_bytes{kind="uss"} on /metrics is what each extra worker costs.
+#
+#Each worker writes its metrics to METRICS_MULTIPROC_DIR and a scrape, answered by
+#any of them, sums the pod (see MetricsRegistry). The concurrency limits are per
+#worker, bounded by its GUNICORN_THREADS; the rate limit buckets and the revoked
+#tokens are shared by the workers and the pods through RATE_LIMIT_REDIS_URL only.
+import os, sys
+from product_metrics import mark_worker_dead, registry, reset_multiprocess_dir
+from product_preload import disable_gc, enable_gc, freeze, memory_usage
+
+wsgi_app = "product_app:create_app()"
+bind = f"{os.environ.get('FLASK_HOST', '0.0.0.0')}:{os.environ.get('FLASK_RUN_PORT', '3002')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+gc_freeze = preload_app and os.environ.get("GUNICORN_GC_FREEZE", "true").lower() == "true"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30")) #above SHUTDOWN_READINESS_DELAY + SHUTDOWN_DRAIN_TIMEOUT + SHUTDOWN_FLUSH_TIMEOUT
+accesslog = None #requests are already in the RED metrics and traces
+metrics_dir = os.environ.get("METRICS_MULTIPROC_DIR", "/tmp/metrics") if workers > 1 else None #a single worker answers from memory
+metrics_interval = float(os.environ.get("METRICS_MULTIPROC_INTERVAL", "1"))
+
+if gc_freeze:
+    disable_gc()
+
+
+def on_starting(server):
+    if metrics_dir:
+        reset_multiprocess_dir(metrics_dir)
+
+
+def when_ready(server):
+    #Master, app loaded, no worker forked yet
+    if preload_app:
+        sys.modules["product_app"].warm_up_app(server.app.wsgi())
+
+
+def pre_fork(server, worker):
+    if gc_freeze:
+        freeze()
+
+
+def post_fork(server, worker):
+    enable_gc()
+
+
+def post_worker_init(worker):
+    #Threads of the master do not survive the fork: database checks, health monitor, import worker.
+    #Import jobs live in the worker that accepted them, which holds their lock file. The flock goes away
+    #with a dead worker and the next worker to start (its respawn included) resumes the job.
+    app_module = sys.modules["product_app"]
+    app_module.startup.start(app_module.startup_steps(), on_failure=app_module.startup_failed)
+    #SIGTERM: readiness fails, the worker keeps accepting for SHUTDOWN_READINESS_DELAY, then drains and flushes.
+    #An import still running when the pod goes is lost: IMPORT_SPOOL_DIR is on the pod's emptyDir (/tmp),
+    #deleted with it, so only a worker restarted inside the same pod resumes from the checkpoint.
+    app_module.shutdown.handle_sigterm(stop=lambda: setattr(worker, "alive", False))
+    if metrics_dir:
+        #Registered last so it runs first, right after the drain: the final snapshot has every request
+        registry.start_multiprocess(metrics_dir, metrics_interval)
+        app_module.shutdown.on_shutdown("metrics", registry.stop_multiprocess)
+    worker.log.info(f"Worker {worker.pid} ready to start, memory: {memory_usage()}")
+
+
+def worker_exit(server, worker):
+    #Also called in the master for workers that are already gone
+    if os.getpid() == worker.pid:
+        sys.modules["product_app"].shutdown.finish() #at once after a SIGTERM, max_requests and other exits drain here
+
+
+def child_exit(server, worker):
+    #Master: the counters of the exited worker stay in the totals, its gauges go
+    if metrics_dir:
+        mark_worker_dead(metrics_dir, worker.pid)
@@ -1,47 +1,68 @@
-import jwt,datetime,os,pymysql,logging, time;
+import jwt,datetime,os,pymysql,logging, time, tempfile;
 from datetime import datetime, timezone
 from functools import wraps
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, current_app, g, request, jsonify
 from werkzeug.security import check_password_hash, generate_password_hash
 from pymysql import Error
-from dotenv import dotenv_values
-from pathlib import Path
+from product_env_files import load_env_files
+load_env_files() #first: the modules below and the constants of this one read the environment at import
 from product_validator import ProductValidator
+from product_content_negotiation import NegotiatingJSONProvider, NegotiatingRequest
+from product_compression import setup_compression
+from product_metrics import registry, setup_metrics, record_db_connect, PROMETHEUS_CONTENT_TYPE
+from product_db_instrumentation import InstrumentedCursor, RequestDBStatsFilter, setup_db_instrumentation
+from product_tracing import setup_request_tracing, traced
+from product_health import HealthMonitor
+from product_startup import StartupGate, retry_with_backoff
+from product_circuit_breaker import CircuitOpenError, db_breaker
+from product_concurrency_limit import ConcurrencyLimits, setup_concurrency_limits
+from product_rate_limit import RateLimiter, limit_user, setup_rate_limits
+from product_deadline import deadline_timeout, raise_if_exhausted, setup_deadlines
+from product_shutdown import GracefulShutdown, flush_spans, setup_shutdown
+from product_preload import warm_up
+from product_structured_logging import setup_structured_logging, stop_listener, HOT_PATH_LOG_SAMPLE
+from product_import import ImportJobManager, ImportTooLarge, IMPORT_FORMATS, detect_import_format
 from opentelemetry import trace
-from opentelemetry.exporter.jaeger.thrift import JaegerExporter
-from opentelemetry.sdk.resources import SERVICE_NAME, Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.instrumentation.flask import FlaskInstrumentor
-from opentelemetry.instrumentation.requests import RequestsInstrumentor
-from opentelemetry.instrumentation.pymysql import PyMySQLInstrumentor
-from opentelemetry.instrumentation.logging import LoggingInstrumentor
 from opentelemetry.trace import Status, StatusCode
 
-def setup_tracing():
+#OpenTelemetry instrumentors create_app can enable (OTEL_INSTRUMENTATIONS)
+INSTRUMENTATIONS = ("flask", "requests", "pymysql", "logging")
+
+
+def setup_tracing(app, instrumentations=INSTRUMENTATIONS):
+    #SDK, exporters and instrumentors are imported here and not at module level -
+    #together they are most of the import time of a worker (pkg_resources, requests)
+    from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from product_sampling import sampler_from_env, span_processor_from_env
+    from product_span_export import batch_processor_from_env
+
     resource = Resource.create({
         SERVICE_NAME: "product-service",
         "deployment.environment": os.environ.get('FLASK_ENV', 'development'),
         "service.version": "1.0.0"
-        })
+                                })
     
-    provider = TracerProvider(resource=resource)
-
-    jaeger_exporter = JaegerExporter(
-        agent_host_name=os.environ.get('JAEGER_AGENT_HOST', 'jaeger.monitoring.svc.cluster.local'),
-        agent_port=int(os.environ.get('JAEGER_AGENT_PORT', '6831')),
-    )
-    span_processor = BatchSpanProcessor(jaeger_exporter)
+    provider = TracerProvider(resource=resource, sampler=sampler_from_env()) #per route head sampling, TRACE_SAMPLE_*
+    
+    #OTLP/HTTP or Jaeger exporter (OTEL_TRACES_EXPORTER) behind a bounded batch queue (OTEL_BSP_*)
+    span_processor = span_processor_from_env(batch_processor_from_env()) #tail sampling of slow/failed traces, TRACE_TAIL_*
     provider.add_span_processor(span_processor)
 
     trace.set_tracer_provider(provider)
-
-    FlaskInstrumentor().instrument_app(app)
-    RequestsInstrumentor().instrument()
-    PyMySQLInstrumentor().instrument()
-    LoggingInstrumentor().instrument()
     
-    return trace.get_tracer(__name__)
+    if "flask" in instrumentations:
+        from opentelemetry.instrumentation.flask import FlaskInstrumentor
+        FlaskInstrumentor().instrument_app(app)
+    if "requests" in instrumentations:
+        from opentelemetry.instrumentation.requests import RequestsInstrumentor
+        RequestsInstrumentor().instrument()
+    if "pymysql" in instrumentations:
+        from opentelemetry.instrumentation.pymysql import PyMySQLInstrumentor
+        PyMySQLInstrumentor().instrument()
+    if "logging" in instrumentations:
+        from opentelemetry.instrumentation.logging import LoggingInstrumentor
+        LoggingInstrumentor().instrument()
 
 def get_port():
     port = os.environ.get('FLASK_RUN_PORT','3002')
@@ -52,55 +73,99 @@ def get_debug_mode():
     return env in ['development', 'staging']
 
 
-def load_env_files():
-    current_dir = Path(__file__).parent
-
-    env_test_path = current_dir.parent / '.env.test'
-    if env_test_path.exists():
-        env_vars= dotenv_values(str(env_test_path))
-        for key, values in env_vars.items():
-            os.environ[key] = values
-        return
-    
-    root_env_path = current_dir.parent / '.env'
-    if root_env_path.exists():
-        env_vars = dotenv_values(str(root_env_path))
-        for key, values in env_vars.items():
-            os.environ[key] = values
-        
-
-load_env_files()
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
-tracer = setup_tracing()
-app.config["MYSQL_HOST"] = os.environ.get("MYSQL_HOST") or os.environ.get("PRODUCT_MYSQL_HOST") 
-app.config["MYSQL_USER"] = os.environ.get("MYSQL_USER") or os.environ.get("PRODUCT_MYSQL_USER")
-app.config["MYSQL_PASSWORD"] = os.environ.get("MYSQL_PASSWORD") or os.environ.get("PRODUCT_MYSQL_PASSWORD")
-app.config["MYSQL_DB"] = os.environ.get("MYSQL_DATABASE") or os.environ.get("PRODUCT_MYSQL_DB")
-app.config["MYSQL_PORT"] = os.environ.get("MYSQL_PORT") or os.environ.get("PRODUCT_MYSQL_PORT")
-
-def setup_structured_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='{"timestamp": "%(asctime)s", "level": "%(levelname)s", "service": "product-service", "message": "%(message)s"}',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-setup_structured_logging()
-
-
-def get_db_connection():
+def load_config():
+    """Settings of create_app from the environment, .env.test or .env were loaded at import"""
+
+    return {
+        "SECRET_KEY": os.environ.get('SECRET_KEY'),
+        "MYSQL_HOST": os.environ.get("MYSQL_HOST") or os.environ.get("PRODUCT_MYSQL_HOST"),
+        "MYSQL_USER": os.environ.get("MYSQL_USER") or os.environ.get("PRODUCT_MYSQL_USER"),
+        "MYSQL_PASSWORD": os.environ.get("MYSQL_PASSWORD") or os.environ.get("PRODUCT_MYSQL_PASSWORD"),
+        "MYSQL_DB": os.environ.get("MYSQL_DATABASE") or os.environ.get("PRODUCT_MYSQL_DB"),
+        "MYSQL_PORT": os.environ.get("MYSQL_PORT") or os.environ.get("PRODUCT_MYSQL_PORT"),
+        #No SDK, exporter or instrumentor is even imported when tracing is off
+        "TRACING_ENABLED": os.environ.get("OTEL_SDK_DISABLED", "false").lower() != "true",
+        "INSTRUMENTATIONS": tuple(name.strip() for name in os.environ.get("OTEL_INSTRUMENTATIONS", ",".join(INSTRUMENTATIONS)).split(",") if name.strip()),
+        "STRUCTURED_LOGGING": True,
+    }
+
+
+#Route classes of the concurrency limiters: probes and scrapes bypass them, bulk imports get
+#their own tight limit so uploads cannot take every thread of a worker (GUNICORN_THREADS)
+ROUTE_CLASSES = {"/health": None, "/health/detailed": None, "/metrics": None, "POST /products/import": "bulk"}
+CONCURRENCY_LIMITS = {"service": 4, "default": 4, "bulk": 1}
+CONCURRENCY_LATENCY_TARGETS = {"service": 1.0, "default": 1.0, "bulk": 5.0}
+#Token buckets, (burst, window seconds): per client IP, per user and per IP on the bulk routes
+RATE_LIMITS = {"ip": (300, 10.0), "user": (100, 10.0), "bulk": (10, 60.0)}
+#Time budget per route class in seconds, X-Request-Timeout-Ms only shortens it - imports spool the whole upload
+REQUEST_BUDGETS = {"default": 10.0, "bulk": 60.0}
+
+
+def create_app(config=None):
+    """Builds the product service - importing this module only loads .env, everything else happens here.
+
+    `config` overrides the settings load_config reads from the environment.
+    """
+
+    app = Flask(__name__)
+    app.config.update(load_config())
+    app.config.update(config or {})
+
+    app.request_class = NegotiatingRequest #request bodies in JSON, MessagePack or CBOR
+    app.json = NegotiatingJSONProvider(app) #orjson backed JSON, or MessagePack/CBOR when the Accept header asks for it
+    setup_compression(app) #gzip/br/zstd negotiated from Accept-Encoding, above COMPRESSION_MIN_SIZE
+    setup_metrics(app) #RED metrics per route, exported on /metrics
+    setup_shutdown(app, shutdown) #requests in flight, drained on SIGTERM
+    setup_rate_limits(app, RateLimiter.from_env(ROUTE_CLASSES, RATE_LIMITS)) #429 + RateLimit headers, before a concurrency permit is taken
+    setup_deadlines(app, ROUTE_CLASSES, REQUEST_BUDGETS) #per request deadline, bounds connects and statements, 504 once exhausted - before a permit is taken
+    setup_concurrency_limits(app, ConcurrencyLimits.from_env(ROUTE_CLASSES, CONCURRENCY_LIMITS, CONCURRENCY_LATENCY_TARGETS)) #AIMD limits on in-flight requests, 503 when shed
+    setup_db_instrumentation(app) #per request query count and DB time on the request span
+    setup_request_tracing(app) #user, result and error attributes on the FlaskInstrumentor request span
+    if app.config["STRUCTURED_LOGGING"]:
+        listener = setup_structured_logging("product-service", filters=[RequestDBStatsFilter()]) #JSON lines with extras and trace ids, written by a background thread
+        shutdown.on_shutdown("logs", lambda timeout: stop_listener(listener, timeout))
+    if app.config["TRACING_ENABLED"]:
+        setup_tracing(app, app.config["INSTRUMENTATIONS"])
+        shutdown.on_shutdown("spans", flush_spans)
+    app.register_blueprint(bp)
+
+    #The health monitor, startup and import threads open connections outside of requests
+    health_monitor.context = startup.context = import_manager.context = app.app_context
+    shutdown.on_shutdown("health_monitor", lambda timeout: health_monitor.stop())
+    return app
+
+
+bp = Blueprint("product", __name__)
+tracer = trace.get_tracer(__name__) #proxy until setup_tracing installs the provider
+
+
+#Short timeouts: with MySQL down a request fails after DB_CONNECT_TIMEOUT, and at once when the breaker is open
+DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", "2"))
+DB_READ_TIMEOUT = int(os.environ.get("DB_READ_TIMEOUT", "10"))
+
+def get_db_connection(check_breaker=True, **options):
+    if check_breaker:
+        db_breaker.check() #CircuitOpenError, answered with 503 and Retry-After by database_unavailable
+    options.setdefault("connect_timeout", deadline_timeout(DB_CONNECT_TIMEOUT)) #DeadlineExceeded, answered with 504, when the request is out of time
+    options.setdefault("read_timeout", deadline_timeout(DB_READ_TIMEOUT))
+    started = time.perf_counter()
     try:
         connection = pymysql.connect(
-            host=app.config["MYSQL_HOST"],
-            user=app.config["MYSQL_USER"],
-            password=app.config["MYSQL_PASSWORD"],
-            db=app.config["MYSQL_DB"],
-            port=int(app.config["MYSQL_PORT"]),
-            cursorclass=pymysql.cursors.DictCursor
+            host=current_app.config["MYSQL_HOST"],
+            user=current_app.config["MYSQL_USER"],
+            password=current_app.config["MYSQL_PASSWORD"],
+            db=current_app.config["MYSQL_DB"],
+            port=int(current_app.config["MYSQL_PORT"]),
+            cursorclass=InstrumentedCursor, #DictCursor timing every statement
+            **options
         )
+        record_db_connect(started, True)
+        db_breaker.record_success()
         return connection
     except Error as e:
+        record_db_connect(started, False)
+        raise_if_exhausted()
+        db_breaker.record_failure()
         logging.error(f"Error connecting to products database: {e}")
         return None
 
@@ -116,7 +181,7 @@ def token_required(f):
             if token.startswith("Bearer "):
                 token = token[7:]
 
-                data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+                data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
                 current_user_id = data['user_id']
         except jwt.ExpiredSignatureError:
             return jsonify({"error": "Token has expired!"}), 401
@@ -124,24 +189,23 @@ def token_required(f):
             return jsonify({"error": "Invalid token!"}), 401
         
 
+        g.current_user_id = current_user_id #picked up by the request span
+        limited = limit_user(current_user_id)
+        if limited:
+            return limited
         return f(current_user_id, *args, **kwargs)
     return decorated
 
 
-@app.route("/products", methods=["POST"])
+@bp.route("/products", methods=["POST"])
+@traced(response_fields={"product.id": "id", "product.name": "product_name", "product.price": "price", "product.quantity": "quantity"})
 @token_required
 def create_product(current_user_id):
-    with tracer.start_as_current_span("create_product") as span:
-        data = request.get_json()
-        span.set_attribute("http.method", "POST")
-        span.set_attribute("http.route", "/products")
-        span.set_attribute("user_id", current_user_id)
-        logging.info("product creation request received", extra={"product_name" : data.get("name"),"price":data.get("price") if data else "No data"})
+    data = request.get_json()
+    logging.info("product creation request received", extra={"product_name" : data.get("name"),"price":data.get("price") if data else "No data"})
     
     is_valid, validation_response = ProductValidator.validate_registration_object(data)
     if not is_valid:
-        span.set_attribute("error", True)
-        span.set_attribute("error.message", validation_response.get("error", "Invalid data"))
         logging.warning(f"Product registration failed:{validation_response}")
         return jsonify(validation_response), 400
     
@@ -150,445 +214,424 @@ def create_product(current_user_id):
     quantity = validation_response.get("quantity",0)
     description = validation_response.get("description","")
 
-    span.set_attribute("product.name", name)
-    span.set_attribute("product.price", price)
-    span.set_attribute("product.quantity", quantity)
-    span.set_attribute("product.description", description)
-
     connection = get_db_connection()
     if not connection:
         logging.error("Database connection failed during product creation")
-        span.set_attribute("error", True)
-        span.set_attribute("error.message", "Database connection failed")
-        span.set_status(Status(StatusCode.ERROR, "Database connection failed"))
         return jsonify({"error": "Database connection failed"}), 500    
 
     try:
         with connection.cursor() as cursor:
-            with tracer.start_as_current_span("insert_product") as insert_span:
-                cursor.execute("INSERT INTO items (name, price,quantity, description, created_by) VALUES (%s, %s, %s, %s, %s)",
-                            (name, price, quantity, description, current_user_id))
-                
-                product_id = cursor.lastrowid
-                connection.commit()
-                insert_span.set_attribute("product.id", product_id)
-                logging.info("Product created", extra ={"product_id": product_id, "product_name": name})
-                return jsonify({"message": "Product created successfully", 
-                                "id": product_id,
-                                "product_name":name,
-                                "description": description,
-                                "quantity": quantity,
-                                "price": price
-                                }), 201
+            cursor.execute("INSERT INTO items (name, price,quantity, description, created_by) VALUES (%s, %s, %s, %s, %s)",
+                        (name, price, quantity, description, current_user_id))
+            
+            product_id = cursor.lastrowid
+            connection.commit()
+            logging.info("Product created", extra ={"product_id": product_id, "product_name": name})
+            return jsonify({"message": "Product created successfully", 
+                            "id": product_id,
+                            "product_name":name,
+                            "description": description,
+                            "quantity": quantity,
+                            "price": price
+                            }), 201
         
     except Error as e:
         logging.error("Product creation error:", extra={"error": str(e)})
-        span.set_attribute("error", True)
-        span.set_attribute("error.message", str(e))
-        span.set_status(Status(StatusCode.ERROR, str(e)))
         return jsonify({"error": "Failed to create product"}), 500
     
     finally:
         connection.close()
 
 
-@app.route("/products", methods=["GET"])
+@bp.route("/products", methods=["GET"])
+@traced(response_fields={"product.count": lambda body: len(body.get("products", []))})
 @token_required
 def get_products(current_user_id):
-    with tracer.start_as_current_span("get_product") as span:
-        span.set_attribute("http.method", "GET")
-        span.set_attribute("http.route", "/prdoducts")
-        span.set_attribute("user_id", current_user_id)
-        token = request.headers.get('Authorization')
-        if token and token.startswith("Bearer "):
-            token = token[7:]
-        data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-        user_email = data['email']
-        span.set_attribute("user_email", user_email)
-        logging.info("product list request received", extra={"user_id": current_user_id, "user_email":user_email})
-
-        connection = get_db_connection()
-        if not connection:
-            logging.error("Database connection failed")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "Database connection failed")
-            span.set_status(Status(StatusCode.ERROR, "Database connection failed"))
-            return jsonify({"error": "Database connection failed"}), 500
-    
-        try:
-            with connection.cursor() as cursor:
-                with tracer.start_as_current_span("query_product") as query_span:
-                    cursor.execute("SELECT id, name, price, quantity, description, created_at, created_by FROM items WHERE created_by = %s",(current_user_id,))
-                    products = cursor.fetchall()
-                    query_span.set_attribute("product.count", len(products))
-
-                    #Json doesn't accept Decimal types, convert to float
-                    for product in products:
-                        if 'price' in product and product['price'] is not None:
-                            product['price'] = float(product['price'])
-
-                    if not products:
-                        logging.info("No products_found", extra={"user_id": current_user_id})
-                        query_span.set_attribute("empty_query", True)
-                        span.set_attribute("product_found", False)
-                        return jsonify({"message": "No products found", "products": []}), 200
-                    
-                logging.info(f"Products retrieved:{len(products)}", extra={"user_id": current_user_id, "product_count": len(products)})
-                span.set_attribute("product_found", True)
-                return jsonify({"products": products}), 200
-            
-        except Error as e:
-            logging.error("Error retrieving products", extra={"error": str(e)})
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", str(e))
-            span.set_status(Status(StatusCode.ERROR, str(e)))
-            return jsonify({"error": "Failed to retrieve products"}), 500
+    token = request.headers.get('Authorization')
+    if token and token.startswith("Bearer "):
+        token = token[7:]
+    data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
+    user_email = data['email']
+    logging.info("product list request received", extra={"user_id": current_user_id, "user_email":user_email, "log_sample": HOT_PATH_LOG_SAMPLE})
+
+    connection = get_db_connection()
+    if not connection:
+        logging.error("Database connection failed")
+        return jsonify({"error": "Database connection failed"}), 500
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id, name, price, quantity, description, created_at, created_by FROM items WHERE created_by = %s",(current_user_id,))
+            products = cursor.fetchall()
+
+            if not products:
+                logging.info("No products_found", extra={"user_id": current_user_id})
+                return jsonify({"message": "No products found", "products": []}), 200
+                
+            logging.info(f"Products retrieved:{len(products)}", extra={"user_id": current_user_id, "product_count": len(products), "log_sample": HOT_PATH_LOG_SAMPLE})
+            return jsonify({"products": products}), 200
         
-        finally:
-            connection.close()
+    except Error as e:
+        logging.error("Error retrieving products", extra={"error": str(e)})
+        return jsonify({"error": "Failed to retrieve products"}), 500
+    
+    finally:
+        connection.close()
 
 
-@app.route("/products", methods=["PUT"])
+@bp.route("/products", methods=["PUT"])
+@traced(request_fields={"product.id": "id"})
 @token_required
 def update_product(current_user_id):
-    with tracer.start_as_current_span("update_product") as span:
-        data = request.json
-        span.set_attribute("http.method", "PUT")
-        span.set_attribute("http.route", "/products")
-        span.set_attribute("user_id", current_user_id)
-        logging.info("Product update request received", extra={"product_id": data.get("id"),"product_name": data.get("name") if data else "No data"})
-
-        if not data or not data.get("id"):
-            logging.warning("Product update failed - missing item ID")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "mmissing product ID")
-            return jsonify({"error": "Product ID of the item to be changed is required",
-                            "example request":{"id":"1",
-                                            "name":"New Product Name",
-                                            "price": "19.99",
-                                            "description": "Updated description",
-                                            "quantity":"5"
-                                            }
-                        }), 400
+    data = request.json
+    logging.info("Product update request received", extra={"product_id": data.get("id"),"product_name": data.get("name") if data else "No data"})
+
+    if not data or not data.get("id"):
+        logging.warning("Product update failed - missing item ID")
+        return jsonify({"error": "Product ID of the item to be changed is required",
+                        "example request":{"id":"1",
+                                        "name":"New Product Name",
+                                        "price": "19.99",
+                                        "description": "Updated description",
+                                        "quantity":"5"
+                                        }
+                    }), 400
+
+    target_id = data["id"]
+    new_product_name = data.get("name")
+    new_price = data.get("price")
+    new_quantity = data.get("quantity")
+    new_description = data.get("description")
+
+    if new_product_name:
+        is_valid_name, name_result = ProductValidator.validate_product(new_product_name)
+        if not is_valid_name:
+            logging.warning("Product name update failed - invalid product name", extra={"user_id": current_user_id, "product name": new_product_name})
+            return jsonify({"error":f"Invalid product name: {name_result}"}), 400
+        new_product_name = ProductValidator.sanitize_input(new_product_name).lower()
     
-        target_id = data["id"]
-        new_product_name = data.get("name")
-        new_price = data.get("price")
-        new_quantity = data.get("quantity")
-        new_description = data.get("description")
-
-        span.set_attribute("update_name", new_product_name)
-        span.set_attribute("update_price", new_price)
-        span.set_attribute("update_quantity", new_quantity)
-        span.set_attribute("update_description", new_description)
-
-        if new_product_name:
-            is_valid_name, name_result = ProductValidator.validate_product(new_product_name)
-            if not is_valid_name:
-                span.set_attribute("error", True)
-                span.set_attribute("error.message", f"Invalid product name: {name_result}")
-                logging.warning("Product name update failed - invalid product name", extra={"user_id": current_user_id, "product name": new_product_name})
-                return jsonify({"error":f"Invalid product name: {name_result}"}), 400
-            new_product_name = ProductValidator.sanitize_input(new_product_name).lower()
-        
-        if new_price:
-            is_valid_price, price_result = ProductValidator.validate_product_price(new_price)
-            if not is_valid_price:
-                span.set_attribute("error", True)
-                span.set_attribute("error.message", f"Invalid product price: {price_result}")
-                logging.warning("Product price update failed - invalid price", extra={"user_id": current_user_id, "product price": new_price})
-                return jsonify({"error":f"Invalid price: {price_result}"}), 400
+    if new_price:
+        is_valid_price, price_result = ProductValidator.validate_product_price(new_price)
+        if not is_valid_price:
+            logging.warning("Product price update failed - invalid price", extra={"user_id": current_user_id, "product price": new_price})
+            return jsonify({"error":f"Invalid price: {price_result}"}), 400
+    
+    if new_quantity:
+        is_valid_quantity, quantity_result = ProductValidator.validate_product_quantity(new_quantity)
+        if not is_valid_quantity:
+            logging.warning("Product quantity update failed - invalid quantity", extra={"user_id": current_user_id, "product quantity": new_quantity})
+            return jsonify({"error":f"Invalid quantity: {quantity_result}"}), 400
         
-        if new_quantity:
-            is_valid_quantity, quantity_result = ProductValidator.validate_product_quantity(new_quantity)
-            if not is_valid_quantity:
-                span.set_attribute("error", True)
-                span.set_attribute("error.message", f"Invalid product quantity: {quantity_result}")
-                logging.warning("Product quantity update failed - invalid quantity", extra={"user_id": current_user_id, "product quantity": new_quantity})
-                return jsonify({"error":f"Invalid quantity: {quantity_result}"}), 400
+    if new_description:
+        is_valid_description, description_result = ProductValidator.validate_product_description(new_description)
+        if not is_valid_description:
+            logging.warning("Product description update failed - invalid description", extra={"user_id": current_user_id, "product description": new_description})
+            return jsonify({"error":f"Invalid description: {description_result}"}), 400
+        new_description = ProductValidator.sanitize_input(description_result)
+
+    connection = get_db_connection()
+
+    if not connection:
+        logging.error("Database connection failed during producto update")
+        return jsonify({"Error": "Database connection failed"}), 500
+
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id, name FROM items WHERE id = %s AND created_by = %s",(target_id,current_user_id))
+            selected_product = cursor.fetchone()
+            if not selected_product:
+                return jsonify({"error":"product not found or access denied"}),404
+                
+            if new_product_name is not None:# Allow empty name
+                cursor.execute("UPDATE items SET name = %s WHERE id = %s AND created_by = %s",(new_product_name, target_id, current_user_id))
+
+            if new_price is not None:# Allow zero price check above
+                cursor.execute("UPDATE items SET price = %s WHERE id = %s AND created_by = %s",(new_price, target_id, current_user_id))
+                
+            if new_description is not None:# Allow empty description
+                cursor.execute("UPDATE items SET description = %s WHERE id = %s AND created_by = %s",(new_description, target_id, current_user_id))
+
+            if new_quantity is not None:# Allow zero quantity
+                cursor.execute("UPDATE items SET quantity = %s WHERE id = %s AND created_by = %s",(new_quantity, target_id, current_user_id))
             
-        if new_description:
-            is_valid_description, description_result = ProductValidator.validate_product_description(new_description)
-            if not is_valid_description:
-                span.set_attribute("error", True)
-                span.set_attribute("error.message", f"Invalid product description: {description_result}")
-                logging.warning("Product description update failed - invalid description", extra={"user_id": current_user_id, "product description": new_description})
-                return jsonify({"error":f"Invalid description: {description_result}"}), 400
-            new_description = ProductValidator.sanitize_input(description_result)
-
-
-        connection = get_db_connection()
-
-        if not connection:
-            logging.error("Database connection failed during producto update")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "Database connection failed")
-            span.set_status(Status(StatusCode.ERROR, "Database connection failed"))
-            return jsonify({"Error": "Database connection failed"}), 500
+            connection.commit()
+
+            logging.info("Product updated succesfully", extra={"product_id":target_id})
+            return jsonify({"message":"Product updated successfully"}), 200
     
+    except Error as e:
+        logging.error("Error updating product", extra={"error": str(e), "product_id": target_id})
+        return jsonify({"error": "Failed to update product"}), 500
     
-        try:
-            with connection.cursor() as cursor:
-                with tracer.start_as_current_span("verify_product_query") as verify_span:
-                    cursor.execute("SELECT id, name FROM items WHERE id = %s AND created_by = %s",(target_id,current_user_id))
-                    selected_product = cursor.fetchone()
-                    if not selected_product:
-                        verify_span.set_attribute("product_exists", False)
-                        return jsonify({"error":"product not found or access denied"}),404
-                    verify_span.set_attribute("product.found", True)
-                    if selected_product and "name" in selected_product:
-                        verify_span.set_attribute("product.name", selected_product["name"])
-                    else:
-                        verify_span.set_attribute("product.name", "unknown")
-                    
-                with tracer.start_as_current_span("update_product_query") as update_span:    
-                    if new_product_name is not None:# Allow empty name
-                        cursor.execute("UPDATE items SET name = %s WHERE id = %s AND created_by = %s",(new_product_name, target_id, current_user_id))
-
-                    if new_price is not None:# Allow zero price check above
-                        cursor.execute("UPDATE items SET price = %s WHERE id = %s AND created_by = %s",(new_price, target_id, current_user_id))
-                        
-                    if new_description is not None:# Allow empty description
-                        cursor.execute("UPDATE items SET description = %s WHERE id = %s AND created_by = %s",(new_description, target_id, current_user_id))
-
-                    if new_quantity is not None:# Allow zero quantity
-                        cursor.execute("UPDATE items SET quantity = %s WHERE id = %s AND created_by = %s",(new_quantity, target_id, current_user_id))
-                    
-                    connection.commit()
-                    update_span.set_attribute("product.id", target_id)
-                    update_span.set_attribute("rows_affected", cursor.rowcount)
-
-                logging.info("Product updated succesfully", extra={"product_id":target_id})
-                return jsonify({"message":"Product updated successfully"}), 200
-        
-        except Error as e:
-            logging.error("Error updating product", extra={"error": str(e), "product_id": target_id})
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", str(e))
-            span.set_status(Status(StatusCode.ERROR, str(e)))
-            return jsonify({"error": "Failed to update product"}), 500
-        
-        finally:
-            connection.close()
+    finally:
+        connection.close()
 
 
-@app.route("/products", methods=["DELETE"])
+@bp.route("/products", methods=["DELETE"])
+@traced(response_fields={"product.id": "deleted_product_id"})
 @token_required
 def delete_product(current_user_id):
-    with tracer.start_as_current_span("delete_product") as span:
-        data = request.get_json()
-        span.set_attribute("http.method", "DELETE")
-        span.set_attribute("http.route", "/products")
-        span.set_attribute("user_id", current_user_id)
-        logging.info("Product deletion request received", extra={"product_id": data.get("id") if data else "No data"})
-
-        if not data or not data.get("id"):
-            logging.warning("Product deletion failed - missing item ID")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "missing item ID")
-            return jsonify({"error": "Product ID of the item to be deleted required",
-                            "example request":{"id":"1"}
-                            })
+    data = request.get_json()
+    logging.info("Product deletion request received", extra={"product_id": data.get("id") if data else "No data"})
+
+    if not data or not data.get("id"):
+        logging.warning("Product deletion failed - missing item ID")
+        return jsonify({"error": "Product ID of the item to be deleted required",
+                        "example request":{"id":"1"}
+                        })
+
+    target_id = data["id"]
+    connection = get_db_connection()
+
+    if not connection:
+        logging.error("Database connection failed during product deletion")
+        return jsonify({"error": "Database connection failed"}), 500
+
+    try:
+        with connection.cursor() as cursor: 
+            cursor.execute("SELECT * FROM items WHERE id = %s AND created_by =%s",(target_id, current_user_id))
+            product = cursor.fetchone()
+            if not product:
+                logging.warning("Product deletion failed - product not found", extra={"product_id": target_id})
+                return jsonify({"error": "Product not found"}), 404
+            
+            cursor.execute("DELETE FROM items WHERE id = %s AND created_by = %s",(target_id, current_user_id))
+            connection.commit()
+        #verification to see how many lines were deleted
+            if cursor.rowcount > 0:
+                logging.info("Product deleted successfully", extra={"product_id":target_id,"product_name":product["name"]})
+                return jsonify({"message": "Product deleted successfully",
+                                "deleted_product_id":target_id
+                                }), 200
+            else:
+                logging.warning("No product was deleted", extra={"product_id":target_id, "user_id":current_user_id})
+                return jsonify({"error":"No product was deleted"}),404
     
-        target_id = data["id"]
-        connection = get_db_connection()
-
-        if not connection:
-            logging.error("Database connection failed during product deletion")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "Database connection failed")
-            span.set_status(Status(StatusCode.ERROR, "Database connection failed"))
-            return jsonify({"error": "Database connection failed"}), 500
+    except Error as e:
+        logging.error("Error deleting product", extra={"error":str(e), "product_id":target_id, "user_id":current_user_id})
+        connection.rollback()
+        return jsonify({"error": "Failed to delete product"}),500
     
-        try:
-            with connection.cursor() as cursor: 
-                with tracer.start_as_current_span("verify_product_query") as verify_span:
-                    cursor.execute("SELECT * FROM items WHERE id = %s AND created_by =%s",(target_id, current_user_id))
-                    product = cursor.fetchone()
-                    if not product:
-                        verify_span.set_attribute("product_exists", False)
-                        logging.warning("Product deletion failed - product not found", extra={"product_id": target_id})
-                        return jsonify({"error": "Product not found"}), 404
-                    verify_span.set_attribute("product_found", True)
-                    verify_span.set_attribute("product.name", product["name"])
-                
-                with tracer.start_as_current_span("delete_product_query") as delete_span:
-                    cursor.execute("DELETE FROM items WHERE id = %s AND created_by = %s",(target_id, current_user_id))
-                    connection.commit()
-                    delete_span.set_attribute("product.id", target_id)
-                    delete_span.set_attribute("rows_deleted", cursor.rowcount)            
-            #verification to see how many lines were deleted
-                if cursor.rowcount > 0:
-                    logging.info("Product deleted successfully", extra={"product_id":target_id,"product_name":product["name"]})
-                    return jsonify({"message": "Product deleted successfully",
-                                    "deleted_product_id":target_id
-                                    }), 200
-                else:
-                    logging.warning("No product was deleted", extra={"product_id":target_id, "user_id":current_user_id})
-                    return jsonify({"error":"No product was deleted"}),404
-        
-        except Error as e:
-            logging.error("Error deleting product", extra={"error":str(e), "product_id":target_id, "user_id":current_user_id})
-            connection.rollback()
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", str(e))
-            span.set_status(Status(StatusCode.ERROR, str(e)))
-            return jsonify({"error": "Failed to delete product"}),500
-        
-        finally:
-            connection.close()
+    finally:
+        connection.close()
 
 
-@app.route("/health", methods=["GET"])
-def health_check():
-    with tracer.start_as_current_span("health_check") as span:
-        try:
-            connection = get_db_connection()
-            healthy = connection is not None
-            if connection:
-                connection.close()
-            span.set_attribute("healthy", healthy)
-            return jsonify({"status": "healthy" if healthy else "unhealthy"})
-        except:
-            span.set_attribute("healthy", False)
-            span.set_attribute("error", True)
-            span.set_status(Status(StatusCode.ERROR, "Health check failed"))
-            return jsonify({"status": "unhealthy"}), 503
-    
+import_manager = ImportJobManager(
+    spool_dir=os.environ.get("IMPORT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "product-imports")),
+    connection_factory=lambda: get_db_connection(),
+    chunk_size=int(os.environ.get("IMPORT_CHUNK_SIZE", "500")),
+    max_bytes=int(os.environ.get("IMPORT_MAX_BYTES", str(100 * 1024 * 1024)))
+)
+registry.function_gauge("product_import_queue_depth", "Import jobs waiting for the worker thread", lambda: import_manager._queue.qsize())
 
-@app.route("/health/detailed",methods=["GET"])
-def health_detailed():
-    with tracer.start_as_current_span("detailed_health_check") as span:
-        checks = {
-            "database_connection": False,
-            "database_query":False,
-            "service_responsive":True
-        }
 
-        try:
-            connection = get_db_connection()
-            if connection:
-                checks["database_connection"] = True
-                span.set_attribute("database_connection", True)
-                
-                with connection.cursor() as cursor:
-                    cursor.execute("SELECT 1")
-                    cursor.fetchone()
-                    checks["database_query"] = True
-                    span.set_attribute("database_query", True)
-                connection.close()
-    
-        except Exception as e:
-            logging.error(f"Health check error: {str(e)}")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", str(e))
-            span.set_status(Status(StatusCode.ERROR, f"Health check detailed failed: {str(e)}"))
+@bp.route("/products/import", methods=["POST"])
+@traced(response_fields={"import.job_id": "job_id"})
+@token_required
+def import_products(current_user_id):
+    #Accepts a multipart upload (field "file") or the raw CSV/NDJSON body
+    request.max_content_length = import_manager.max_bytes #413 from werkzeug before a larger body is parsed or spooled
+    upload = request.files.get("file")
+    if upload:
+        stream = upload.stream
+        file_format = detect_import_format(upload.mimetype, upload.filename)
+    else:
+        stream = request.stream
+        file_format = detect_import_format(request.content_type)
 
-        all_healthy = all(checks.values())
-        status = "healthy" if all_healthy else "unhealthy"
-        span.set_attribute("health.status", status)
+    if not file_format:
+        logging.warning("Product import failed - unsupported format", extra={"user_id": current_user_id, "content_type": request.content_type})
+        return jsonify({"error": "Unsupported import format",
+                        "supported_formats": sorted(IMPORT_FORMATS.keys())
+                        }), 415
 
-        logging.info(f"Health check executed - Status: {status}", extra={"checks": checks})
+    try:
+        job = import_manager.submit(current_user_id, stream, file_format)
+    except ImportTooLarge as e:
+        logging.warning("Product import failed - file too large", extra={"user_id": current_user_id, "max_bytes": import_manager.max_bytes})
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        logging.warning("Product import failed - empty file", extra={"user_id": current_user_id})
+        return jsonify({"error": str(e)}), 400
+
+    status_url = f"/products/import/{job.job_id}"
+    return jsonify({"message": "Import job accepted",
+                    "job_id": job.job_id,
+                    "status": job.status,
+                    "status_url": status_url
+                    }), 202, {"Location": status_url}
+
+
+@bp.route("/products/import/<job_id>", methods=["GET"])
+@traced(view_args=("job_id",), response_fields={"import.status": "status"})
+@token_required
+def get_import_job(current_user_id, job_id):
+    job = import_manager.get(job_id)
+    if not job or job.user_id != current_user_id: #jobs from other users are reported as not found
+        return jsonify({"error": "Import job not found"}), 404
 
-        return jsonify({"status": status,
-                        "service": "product-service", 
-                        "timestamp": datetime.now(timezone.utc).isoformat(),
-                        "checks": checks
-                            
-                        }), 200 if all_healthy else 503
+    return jsonify(job.to_dict()), 200
+
+
+#Dependencies are checked on a background thread, probes answer from the last result
+HEALTH_CHECK_TIMEOUT = int(os.environ.get("HEALTH_CHECK_TIMEOUT", "2"))
 
+def check_database():
+    #Bypasses the breaker and reports to it: when MySQL is back this closes it without waiting for a request to try
+    connection = get_db_connection(check_breaker=False, connect_timeout=HEALTH_CHECK_TIMEOUT, read_timeout=HEALTH_CHECK_TIMEOUT)
+    if not connection:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        return True
+    finally:
+        connection.close()
+
+health_monitor = HealthMonitor({"database": check_database}, interval=float(os.environ.get("HEALTH_CHECK_INTERVAL", "5")))
+startup = StartupGate() #verify_db_setup runs on it in the background, see __main__
+shutdown = GracefulShutdown.from_env() #SIGTERM handler installed by gunicorn.conf.py
 
-@app.route("/metrics",methods=["GET"])
+@bp.route("/health", methods=["GET"])
+def health_check():
+    if not startup.ready.is_set():
+        return jsonify({"status": startup.status()}) #alive while the database checks retry, the process exits if they run out of time
+    snapshot = health_monitor.snapshot()
+    return jsonify({"status": "healthy" if snapshot.healthy() else "unhealthy"})
+
+@bp.route("/health/detailed",methods=["GET"])
+@traced(response_fields={"health.status": "status"})
+def health_detailed():
+    if not startup.ready.is_set():
+        #Readiness - no traffic until the database checks of the startup passed
+        return jsonify({"status": startup.status(),
+                        "service": "product-service",
+                        "timestamp": datetime.now(timezone.utc).isoformat(),
+                        "startup_phases": dict(startup.phases)
+                        }), 503
+    if shutdown.draining.is_set():
+        #SIGTERM - out of the endpoints before the server stops accepting, liveness stays up while it drains
+        return jsonify({"status": "draining",
+                        "service": "product-service",
+                        "timestamp": datetime.now(timezone.utc).isoformat(),
+                        "draining_seconds": round(shutdown.draining_for(), 3)
+                        }), 503
+    snapshot = health_monitor.snapshot()
+    database = snapshot.checks["database"]
+    checks = {
+        #get_db_connection returns None when it cannot connect, an error means the connection worked and the query failed
+        "database_connection": database["ok"] or database["error"] is not None,
+        "database_query": database["ok"],
+        "service_responsive": True
+    }
+    status = "healthy" if snapshot.healthy() else "unhealthy"
+
+    return jsonify({"status": status,
+                    "service": "product-service", 
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "checks": checks,
+                    "checked_at": snapshot.timestamp,
+                    "check_age_seconds": round(snapshot.age(), 3),
+                    "check_duration_ms": database["duration_ms"],
+                    "circuit_breaker": db_breaker.status()
+                    }), 200 if snapshot.healthy() else 503
+
+
+@bp.app_errorhandler(CircuitOpenError)
+def database_unavailable(error):
+    #Breaker open - fail at once instead of every request holding a thread for the connect timeout
+    return jsonify({"error": "Database temporarily unavailable",
+                    "retry_after": error.retry_after
+                    }), 503, {"Retry-After": str(error.retry_after)}
+
+@bp.route("/metrics",methods=["GET"])
 def metrics():
-        return jsonify({
-            "service": "product-service",
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "active_endpoints": ["/product", "/health","health/detailed", "/metrics"]
-        })
+        #Prometheus text format - request counts, errors and latency per route, DB connections and compression
+        return registry.render(), 200, {"Content-Type": PROMETHEUS_CONTENT_TYPE}
 
 
-def verify_db_setup():
+#Startup: the server listens right away, readiness stays "starting" until the database checks pass
+DB_SETUP_DEADLINE = float(os.environ.get("DB_SETUP_DEADLINE", "70")) #the old 14 attempts x 5s
+DB_SETUP_BACKOFF_INITIAL = float(os.environ.get("DB_SETUP_BACKOFF_INITIAL", "0.1"))
+DB_SETUP_BACKOFF_MAX = float(os.environ.get("DB_SETUP_BACKOFF_MAX", "5"))
+
+def verify_db_attempt(attempt):
+    with tracer.start_as_current_span(f"db_setup_attempt_{attempt}") as attempt_span:
+        attempt_span.set_attribute("attempt_number", attempt)
+        #A stalled handshake must not eat the whole deadline
+        connection = get_db_connection(check_breaker=False, connect_timeout=HEALTH_CHECK_TIMEOUT, read_timeout=HEALTH_CHECK_TIMEOUT)
+        try:
+            if not connection:
+                attempt_span.set_attribute("db.connection_error", True)
+                raise Exception("Connection returned None")
+
+            attempt_span.set_attribute("db.connected", True)
+            with tracer.start_as_current_span("verify_items_table") as table_span:
+                #Metadata only - table_rows is the InnoDB estimate, a COUNT(*) would scan the whole table
+                with connection.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT table_rows AS table_rows
+                        FROM information_schema.tables
+                        WHERE table_schema = DATABASE()
+                        AND table_name = 'items'
+                        """)
+                    result = cursor.fetchone()
+                table_span.set_attribute("items_table_exists", result is not None)
+                if result is None:
+                    #The init scripts of the database create it, it shows up once MySQL is done with them
+                    raise Exception("table 'items' does not exist yet")
+                table_span.set_attribute("db.items_estimated_rows", result["table_rows"] or 0)
+                logging.info(f"table 'items' exists with about {result['table_rows'] or 0} records")
+        except Exception as e:
+            attempt_span.set_attribute("error", True)
+            attempt_span.set_status(Status(StatusCode.ERROR, f"Database setup verification failed: {str(e)}"))
+            raise
+        finally:
+            if connection:
+                try:
+                    connection.close()
+                except Exception as close_err:
+                    logging.warning(f"Failed to close connection: {close_err}")
+
+def verify_db_setup(deadline=None):
+    deadline = DB_SETUP_DEADLINE if deadline is None else deadline
     with tracer.start_as_current_span("verify_db_setup") as span:
-        max_retries = 15
-        retry_delay = 5  # seconds
-        span.set_attribute("db_setup.max_retries", max_retries)
-
-        for attempt in range(1, max_retries):
-            with tracer.start_as_current_span(f"db_setup_attempt_{attempt}") as attempt_span:
-                attempt_span.set_attribute("attempt_number", attempt)
-                connection = None
-
-                try: #Verify basic connectivity
-                    connection = get_db_connection()
-                    if not connection:
-                        print(f"Database connection returned none, attempt: {attempt}")
-                        attempt_span.set_attribute("db.connection_error", True)
-                        attempt_span.set_status(Status(StatusCode.ERROR, "Database connection failed"))
-                        raise Exception("Connection returned None")
-                    
-                    with connection.cursor() as cursor:
-                        cursor.execute("SELECT 1")
-                        result = cursor.fetchone()
-                        if not result:
-                            raise Exception("Simple query SELECT 1 failed")
-                        
-                    print (f"Basic connectivity successful, attempt: {attempt}") # Posso remover esses prints?
-                    attempt_span.set_attribute("db.connected", True)
-
-                    with tracer.start_as_current_span("verify_items_table") as table_span: # Não preciso do try para ver se existe a tabela?
-                        try:# Verify 'items' existence
-                            with connection.cursor() as cursor:
-                                cursor.execute("""
-                                    SELECT COUNT(*) as table_exists
-                                    FROM information_schema.tables
-                                    WHERE table_schema = DATABASE()
-                                    AND table_name = 'items'
-                                    """)
-                                result = cursor.fetchone()
-                                exists = result['table_exists'] > 0 
-                                table_span.set_attribute("items_table_exists", exists)
-
-                                if exists:
-                                    cursor.execute("SELECT COUNT(*) AS count FROM items")
-                                    product_result = cursor.fetchone()
-                                    product_count = product_result['count']
-                                    table_span.set_attribute("db.items_count", product_count)
-                                    print(f"tabel 'items' exists with {product_count} records")
-                                else:
-                                    print("table 'items' still not exists")
-                                                                
-                        except Exception as e:
-                                table_span.set_attribute("error", True)
-                                table_span.set_status(Status(StatusCode.ERROR, f"Table verification failed: {str(e)}"))
-                                print(f"Table verification failed: {e}")              
-
-                    span.set_attribute("db_setup.table_verification", True)
-                    span.set_attribute("db_setup.attempts", attempt)
-                    return True
-
-                except Exception as e:
-                    attempt_span.set_attribute("error", True)
-                    attempt_span.set_status(Status(StatusCode.ERROR, f"Database setup verification failed: {str(e)}"))
-                    print(f"Database setup verification attempt: {attempt} failed with error: {e}")
-
-                    if attempt < max_retries:
-                        print(f"attempt: {attempt} failed, retrying in {retry_delay} seconds...")
-                        time.sleep(retry_delay)
-                    else:
-                        span.set_attribute("db_setup.max_retries_reached", True)
-                        span.set_status(Status(StatusCode.ERROR, "Max retries reached for database setup verification"))
-                        print("Max retries reached. Database setup verification failed")
-                        return False
-                    
-                finally:
-                    if connection:
-                        try:
-                            connection.close()
-                        except Exception as close_err:
-                            print(f"Failed to close connection: {close_err}")
-    return False        
+        span.set_attribute("db_setup.deadline_seconds", deadline)
+        attempts = retry_with_backoff(verify_db_attempt, deadline, DB_SETUP_BACKOFF_INITIAL, DB_SETUP_BACKOFF_MAX, phase="database")
+        if not attempts:
+            span.set_attribute("db_setup.deadline_reached", True)
+            span.set_status(Status(StatusCode.ERROR, "Deadline reached for database setup verification"))
+            return False
+        span.set_attribute("db_setup.table_verification", True)
+        span.set_attribute("db_setup.attempts", attempts)
+        return True
+
+def startup_failed(phase):
+    print("Failed to start Product Service due to database setup issues.")
+    os._exit(1) #let the orchestrator restart the pod
+
+def startup_steps():
+    #Run in every process that serves requests: __main__, or each gunicorn worker after the fork.
+    #Every one resumes the interrupted imports no live process holds the lock file of.
+    return [
+        ("database", verify_db_setup),
+        ("health_monitor", health_monitor.start),
+        ("resume_imports", import_manager.resume_pending),
+    ]
+
+def warm_up_app(app):
+    """Preload mode (gunicorn.conf.py) - runs once in the master before the workers fork"""
+
+    def validate():
+        ProductValidator.validate_batch(["Warm up"], [1.0]) #batch validation of imports, loads numpy in the master
+        is_valid, result = ProductValidator.validate_registration_object({"name": "Warm up", "price": 1.0, "quantity": 1, "description": "warm up"})
+        assert is_valid, f"warm-up product rejected, nothing past the first check was warmed: {result}"
+    warm_up(app, validate=validate)
 
 if __name__ == "__main__":
+    app = create_app()
     port = get_port()
     debug_mode = get_debug_mode()
     environment = os.environ.get('FLASK_ENV','development')
@@ -604,14 +647,13 @@ if __name__ == "__main__":
     print("  GET   /products     - Get products list (JWT required)") 
     print("  PUT   /products     - Update products (JWT required)")
     print(" DELETE /products     - Delete product (JWT required)")
+    print("  POST  /products/import - Bulk import CSV/NDJSON in background (JWT required)")
+    print("  GET   /products/import/<job_id> - Import job progress (JWT required)")
     print("  GET   /health       - Health check")
     print("  GET   /health/detailed - Detailed health check")
     print("  GET   /metrics      - Service metrics")
     print("=" * 50)
 
-    if verify_db_setup():
-        host = os.getenv('FLASK_HOST', '0.0.0.0')
-        app.run(host=host, port=port, debug=debug_mode)  # nosec 
-    else:
-        print("Failed to start Product Service due to database setup issues.")
-    
\ No newline at end of file
+    startup.start(startup_steps(), on_failure=startup_failed)
+    host = os.getenv('FLASK_HOST', '0.0.0.0')
+    app.run(host=host, port=port, debug=debug_mode)  # nosec 
@@ -0,0 +1,718 @@
+#ASGI variant of the product routes, for a service that spends its time waiting on MySQL
+#
+#  uvicorn product_asgi:create_asgi_app --factory --host 0.0.0.0 --port 3002
+#
+#The Flask app holds a thread for the whole request while pymysql waits on the database.
+#Here the handlers await aiomysql instead: one event loop keeps thousands of connections
+#open and a bounded pool (ASGI_DB_POOL_SIZE) caps what reaches MySQL. Validation
+#(ProductValidator), JSON encoding, RED metrics, span enrichment (ROUTE_SPECS), logs and
+#the startup/health gating are the ones of product_app. Bulk imports stay on the WSGI
+#app, ImportJobManager is thread based.
+import asyncio, contextlib, contextvars, json, logging, os, signal, time
+from datetime import datetime, timezone
+import jwt
+from pymysql import Error, OperationalError
+from opentelemetry import trace
+from opentelemetry.trace import SpanKind
+from product_app import (load_config, setup_tracing, startup_failed, DB_SETUP_DEADLINE, DB_SETUP_BACKOFF_INITIAL,
+                         DB_SETUP_BACKOFF_MAX, HEALTH_CHECK_TIMEOUT, ROUTE_CLASSES, CONCURRENCY_LIMITS, CONCURRENCY_LATENCY_TARGETS,
+                         RATE_LIMITS, REQUEST_BUDGETS)
+from product_validator import ProductValidator
+from product_json_provider import encode_default
+from product_metrics import (registry, http_requests_in_flight, http_requests_total, http_request_duration_seconds,
+                             http_request_errors_total, http_request_queue_wait_seconds, parse_request_start, saturation,
+                             PROMETHEUS_CONTENT_TYPE)
+from product_db_instrumentation import fingerprint, db_queries_total, db_query_duration_seconds, db_slow_queries_total, SLOW_QUERY_MS
+from product_tracing import ROUTE_SPECS, enrich_span
+from product_health import HealthMonitor
+from product_circuit_breaker import CircuitOpenError, db_breaker, is_outage
+from product_concurrency_limit import ConcurrencyLimits, SHED_RETRY_AFTER, overload_signal
+from product_rate_limit import RateLimiter, most_limiting
+from product_deadline import (DeadlineExceeded, DEADLINE_HEADERS, STATEMENT_GRACE, current_deadline, deadline_exceeded_total,
+                              is_deadline_error, request_deadline, set_deadline, with_execution_time_hint)
+from product_concurrency_limit import parse_limits, route_class
+from product_startup import StartupGate, retry_with_backoff
+from product_shutdown import GracefulShutdown, flush_spans
+from product_structured_logging import setup_structured_logging, stop_listener, HOT_PATH_LOG_SAMPLE
+
+try: #ASGI mode only, the WSGI app runs without them
+    import aiomysql
+    from starlette.applications import Starlette
+    from starlette.middleware import Middleware
+    from starlette.responses import Response
+    from starlette.routing import Route
+except ImportError:
+    aiomysql = Starlette = Middleware = Response = Route = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DB_POOL_SIZE = int(os.environ.get("ASGI_DB_POOL_SIZE", "20")) #per worker, what MySQL sees at most
+
+db_pool_acquire_seconds = registry.histogram("db_pool_acquire_seconds", "Wait for a free connection of the ASGI pool")
+
+_databases = []
+registry.function_gauge("db_pool_connections", "Connections of the ASGI pool, by state",
+                        lambda: {(state,): sum(count for db in _databases for name, count in db.usage().items() if name == state)
+                                 for state in ("in_use", "idle", "max")}, ("state",))
+
+#(query count, DB seconds) of the request running in the current task
+_request_db_stats = contextvars.ContextVar("request_db_stats", default=None)
+
+tracer = trace.get_tracer(__name__)
+
+
+class InvalidBody(ValueError):
+    pass
+
+
+class AsyncDatabase:
+    """aiomysql pool with the query metrics and spans InstrumentedCursor and PyMySQLInstrumentor give the WSGI app"""
+
+    def __init__(self, config, size=DB_POOL_SIZE):
+        self.config = config
+        self.size = size
+        self.pool = None
+        self.loop = None
+        self._slots = None
+        _databases.append(self)
+
+    async def open(self):
+        #minsize=0: nothing connects before the startup gate checks the database
+        self.loop = asyncio.get_running_loop()
+        #FIFO in front of the pool - aiomysql hands a freed connection to whoever asks first,
+        #so new requests would overtake the ones already waiting and the tail latency explodes
+        self._slots = asyncio.Semaphore(self.size)
+        self.pool = await aiomysql.create_pool(
+            minsize=0, maxsize=self.size,
+            host=self.config["MYSQL_HOST"],
+            user=self.config["MYSQL_USER"],
+            password=self.config["MYSQL_PASSWORD"],
+            db=self.config["MYSQL_DB"],
+            port=int(self.config["MYSQL_PORT"]),
+            connect_timeout=HEALTH_CHECK_TIMEOUT,
+            cursorclass=aiomysql.DictCursor,
+            autocommit=True #the write handlers open their transaction with begin()
+        )
+
+    async def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+
+    def usage(self):
+        if self.pool is None:
+            return {}
+        return {"in_use": self.pool.size - self.pool.freesize, "idle": self.pool.freesize, "max": self.pool.maxsize}
+
+    def call(self, coroutine, timeout=None):
+        """Runs a coroutine on the pool's event loop from another thread (startup gate, health monitor)"""
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    async def acquire(self, check_breaker=True):
+        #None when no connection can be opened, like get_db_connection - CircuitOpenError while the breaker is open
+        if check_breaker:
+            db_breaker.check()
+        started = time.perf_counter()
+        deadline = current_deadline()
+        try:
+            #Waiting for a free connection is bounded by what the request has left, like the connect timeout of the WSGI app
+            await (self._slots.acquire() if deadline is None else asyncio.wait_for(self._slots.acquire(), deadline.check("database")))
+        except asyncio.TimeoutError:
+            deadline.exceed("database")
+        try:
+            connection = await self.pool.acquire()
+            db_breaker.record_success()
+        except (Error, OSError, asyncio.TimeoutError) as e:
+            self._slots.release()
+            db_breaker.record_failure()
+            logging.error(f"Error connecting to products database: {e}")
+            return None
+        except BaseException: #cancelled while connecting
+            self._slots.release()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            db_pool_acquire_seconds.observe(elapsed)
+            saturation.db_wait.observe(elapsed)
+        return connection
+
+    async def release(self, connection):
+        if not connection.closed and connection.get_transaction_status(): #the pool closes connections left in a transaction
+            await connection.rollback()
+        self.pool.release(connection)
+        self._slots.release()
+
+    async def execute(self, cursor, statement, args=None):
+        with tracer.start_as_current_span(statement.split(None, 1)[0].upper(), kind=SpanKind.CLIENT,
+                                          attributes={"db.system": "mysql", "db.name": self.config["MYSQL_DB"] or "",
+                                                      "db.statement": statement}):
+            deadline = current_deadline()
+            started = time.perf_counter()
+            try:
+                if deadline is None:
+                    return await cursor.execute(statement, args)
+                remaining = deadline.check("database")
+                return await asyncio.wait_for(cursor.execute(with_execution_time_hint(statement, remaining), args), remaining + STATEMENT_GRACE)
+            except asyncio.TimeoutError:
+                cursor.connection.close() #the reply of the abandoned statement would be read by the next one
+                deadline.exceed("database")
+            except OperationalError as e:
+                if deadline is not None and (is_deadline_error(e) or deadline.remaining() <= 0):
+                    deadline.exceed("database") #our budget ran out, not the database
+                if is_outage(e):
+                    db_breaker.record_failure()
+                raise
+            finally:
+                self._record(statement, time.perf_counter() - started)
+
+    def _record(self, query, elapsed):
+        statement = fingerprint(query)
+        db_queries_total.inc(labels=(statement,))
+        db_query_duration_seconds.observe(elapsed, labels=(statement,))
+        stats = _request_db_stats.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            db_slow_queries_total.inc(labels=(statement,))
+            logging.warning(f"Slow query ({elapsed * 1000:.1f} ms): {statement}",
+                            extra={"statement": statement, "duration_ms": round(elapsed * 1000, 2)})
+
+    async def verify_items_table(self):
+        #Same metadata only check as verify_db_attempt
+        connection = await self.acquire(check_breaker=False)
+        if not connection:
+            raise Exception("Connection returned None")
+        try:
+            async with connection.cursor() as cursor:
+                await self.execute(cursor, """
+                    SELECT table_rows AS table_rows
+                    FROM information_schema.tables
+                    WHERE table_schema = DATABASE()
+                    AND table_name = 'items'
+                    """)
+                result = await cursor.fetchone()
+            if result is None:
+                raise Exception("table 'items' does not exist yet")
+            logging.info(f"table 'items' exists with about {result['table_rows'] or 0} records")
+        finally:
+            await self.release(connection)
+
+    async def ping(self):
+        connection = await asyncio.wait_for(self.acquire(check_breaker=False), HEALTH_CHECK_TIMEOUT)
+        if not connection:
+            return False
+        try:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SELECT 1") #bounded by connect_timeout and the monitor's call() timeout
+                await cursor.fetchone()
+            return True
+        finally:
+            await self.release(connection)
+
+
+def dumps(payload):
+    #Same wire format as FastJSONProvider: sorted keys, Decimal as number, dates as HTTP dates
+    if orjson is not None:
+        return orjson.dumps(payload, default=encode_default,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS)
+    return json.dumps(payload, default=encode_default, ensure_ascii=False, sort_keys=True).encode()
+
+
+async def read_json(request):
+    """request.get_json() - None for an empty body, InvalidBody when it is not JSON. Kept for the request span."""
+
+    if not hasattr(request.state, "body"):
+        raw = await request.body()
+        try:
+            request.state.body = json.loads(raw) if raw else None
+        except ValueError:
+            raise InvalidBody("Invalid JSON body")
+    return request.state.body
+
+
+def authenticate(request):
+    """token_required - (claims, None) or (None, (error payload, 401))"""
+
+    token = request.headers.get("Authorization")
+    if not token:
+        return None, ({"error": "Token is missing!"}, 401)
+    if not token.startswith("Bearer "):
+        return None, ({"error": "Invalid token!"}, 401)
+    try:
+        return jwt.decode(token[7:], request.app.state.config["SECRET_KEY"], algorithms=["HS256"]), None
+    except jwt.ExpiredSignatureError:
+        return None, ({"error": "Token has expired!"}, 401)
+    except jwt.InvalidTokenError:
+        return None, ({"error": "Invalid token!"}, 401)
+
+
+def endpoint(handler, route, auth=True, limits=None, rate_limiter=None, budget=None):
+    """Wraps a handler with what the Flask hooks do: rate and concurrency limits, the deadline (`budget` seconds),
+    auth, RED metrics, span enrichment and JSON encoding.
+
+    Handlers return (payload, status[, headers]) like the Flask views, or a Response.
+    """
+
+    async def run(request):
+        started = time.perf_counter()
+        http_requests_in_flight.inc(labels=(route,))
+        queue_wait = parse_request_start(request.headers.get("X-Request-Start"))
+        if queue_wait is not None:
+            http_request_queue_wait_seconds.observe(queue_wait)
+            saturation.queue_wait.observe(queue_wait)
+        db_stats = [0, 0.0]
+        _request_db_stats.set(db_stats)
+        rate_limits = rate_limiter.check_client(request.method, route, request.headers.get("X-Forwarded-For"),
+                                                request.client and request.client.host) if rate_limiter else []
+        refused = most_limiting(rate_limits)
+        refused = refused if refused is not None and not refused.allowed else None
+        deadline = None
+        if budget is not None:
+            header = next((request.headers[header] for header in DEADLINE_HEADERS if header in request.headers), None)
+            deadline = request_deadline(budget, header, queue_wait)
+            set_deadline(deadline) #read by AsyncDatabase in this task
+        out_of_time = deadline is not None and deadline.budget <= 0 #the caller gave up while it waited in the queue, no permit for it
+        permits = limits.acquire(limits.classify(request.method, route)) if limits and refused is None and not out_of_time else []
+
+        status, claims, error = 500, None, None
+        try:
+            if auth and refused is None and permits is not None:
+                claims, error = authenticate(request)
+                request.state.claims = claims
+                decision = rate_limiter.check("user", claims["user_id"]) if claims and rate_limiter else None
+                if decision is not None:
+                    rate_limits.append(decision)
+                    refused = None if decision.allowed else decision
+            if refused is not None:
+                result = {"error": "Rate limit exceeded", "retry_after": refused.retry_after}, 429
+            elif permits is None: #no thread to free here, the limit is what keeps the event loop and pool from queueing
+                result = {"error": "Service overloaded, retry later", "retry_after": SHED_RETRY_AFTER}, 503, {"Retry-After": str(SHED_RETRY_AFTER)}
+            elif out_of_time:
+                deadline.exceeded = "queue"
+            elif error:
+                result = error
+            else:
+                try:
+                    result = await (handler(request, claims["user_id"]) if auth else handler(request))
+                except InvalidBody as e:
+                    result = {"error": str(e)}, 400
+                except CircuitOpenError as e:
+                    result = {"error": "Database temporarily unavailable", "retry_after": e.retry_after}, 503, {"Retry-After": str(e.retry_after)}
+                except DeadlineExceeded:
+                    pass #answered below
+                except Exception as e:
+                    logging.exception(f"Unhandled error in {handler.__name__}: {e}")
+                    result = {"error": "Internal server error"}, 500
+            if deadline is not None and deadline.exceeded: #also when the handler caught DeadlineExceeded and answered on its own
+                deadline_exceeded_total.inc(labels=(route, deadline.exceeded))
+                result = {"error": "Request deadline exceeded"}, 504
+
+            if isinstance(result, Response):
+                response, payload = result, None
+            else:
+                payload, status, *headers = result
+                response = Response(dumps(payload), status_code=status, headers=headers[0] if headers else None, media_type="application/json")
+            status = response.status_code
+            decision = most_limiting(rate_limits)
+            if decision is not None:
+                response.headers.update(decision.headers())
+
+            span = trace.get_current_span()
+            if span.is_recording():
+                span.set_attribute("db.query_count", db_stats[0])
+                span.set_attribute("db.time_ms", round(db_stats[1] * 1000, 2))
+                enrich_span(span, status, payload, claims and claims.get("user_id"), ROUTE_SPECS.get(handler.__name__),
+                            getattr(request.state, "body", None), request.path_params)
+            return response
+        finally:
+            if deadline is not None:
+                set_deadline(None)
+            if permits:
+                overloaded = overload_signal(status, caller_bound=deadline is not None and deadline.caller_bound)
+                if overloaded is None:
+                    limits.cancel(permits)
+                else:
+                    limits.release(permits, time.perf_counter() - started + (queue_wait or 0.0), overloaded)
+            http_requests_in_flight.dec(labels=(route,))
+            http_requests_total.inc(labels=(request.method, route, str(status)))
+            http_request_duration_seconds.observe(time.perf_counter() - started, labels=(request.method, route))
+            if status >= 500:
+                http_request_errors_total.inc(labels=(request.method, route))
+
+    run.__name__ = handler.__name__
+    return run
+
+
+async def create_product(request, current_user_id):
+    data = await read_json(request)
+    logging.info("product creation request received", extra={"product_name" : data.get("name") if data else None, "price": data.get("price") if data else "No data"})
+
+    is_valid, validation_response = ProductValidator.validate_registration_object(data)
+    if not is_valid:
+        logging.warning(f"Product registration failed:{validation_response}")
+        return validation_response, 400
+
+    name = validation_response["product_name"]
+    price = validation_response["price"]
+    quantity = validation_response.get("quantity",0)
+    description = validation_response.get("description","")
+
+    db = request.app.state.db
+    connection = await db.acquire()
+    if not connection:
+        logging.error("Database connection failed during product creation")
+        return {"error": "Database connection failed"}, 500
+
+    try:
+        await connection.begin()
+        async with connection.cursor() as cursor:
+            await db.execute(cursor, "INSERT INTO items (name, price,quantity, description, created_by) VALUES (%s, %s, %s, %s, %s)",
+                             (name, price, quantity, description, current_user_id))
+            product_id = cursor.lastrowid
+        await connection.commit()
+        logging.info("Product created", extra ={"product_id": product_id, "product_name": name})
+        return {"message": "Product created successfully",
+                "id": product_id,
+                "product_name":name,
+                "description": description,
+                "quantity": quantity,
+                "price": price
+                }, 201
+
+    except Error as e:
+        logging.error("Product creation error:", extra={"error": str(e)})
+        return {"error": "Failed to create product"}, 500
+
+    finally:
+        await db.release(connection)
+
+
+async def get_products(request, current_user_id):
+    logging.info("product list request received", extra={"user_id": current_user_id, "user_email": request.state.claims.get("email"), "log_sample": HOT_PATH_LOG_SAMPLE})
+
+    db = request.app.state.db
+    connection = await db.acquire()
+    if not connection:
+        logging.error("Database connection failed")
+        return {"error": "Database connection failed"}, 500
+
+    try:
+        async with connection.cursor() as cursor:
+            await db.execute(cursor, "SELECT id, name, price, quantity, description, created_at, created_by FROM items WHERE created_by = %s",(current_user_id,))
+            products = await cursor.fetchall()
+
+        if not products:
+            logging.info("No products_found", extra={"user_id": current_user_id})
+            return {"message": "No products found", "products": []}, 200
+
+        logging.info(f"Products retrieved:{len(products)}", extra={"user_id": current_user_id, "product_count": len(products), "log_sample": HOT_PATH_LOG_SAMPLE})
+        return {"products": list(products)}, 200
+
+    except Error as e:
+        logging.error("Error retrieving products", extra={"error": str(e)})
+        return {"error": "Failed to retrieve products"}, 500
+
+    finally:
+        await db.release(connection)
+
+
+async def update_product(request, current_user_id):
+    data = await read_json(request)
+    logging.info("Product update request received", extra={"product_id": data.get("id") if data else None, "product_name": data.get("name") if data else "No data"})
+
+    if not data or not data.get("id"):
+        logging.warning("Product update failed - missing item ID")
+        return {"error": "Product ID of the item to be changed is required",
+                "example request":{"id":"1",
+                                "name":"New Product Name",
+                                "price": "19.99",
+                                "description": "Updated description",
+                                "quantity":"5"
+                                }
+                }, 400
+
+    target_id = data["id"]
+    new_product_name = data.get("name")
+    new_price = data.get("price")
+    new_quantity = data.get("quantity")
+    new_description = data.get("description")
+
+    if new_product_name:
+        is_valid_name, name_result = ProductValidator.validate_product(new_product_name)
+        if not is_valid_name:
+            logging.warning("Product name update failed - invalid product name", extra={"user_id": current_user_id, "product name": new_product_name})
+            return {"error":f"Invalid product name: {name_result}"}, 400
+        new_product_name = ProductValidator.sanitize_input(new_product_name).lower()
+
+    if new_price:
+        is_valid_price, price_result = ProductValidator.validate_product_price(new_price)
+        if not is_valid_price:
+            logging.warning("Product price update failed - invalid price", extra={"user_id": current_user_id, "product price": new_price})
+            return {"error":f"Invalid price: {price_result}"}, 400
+
+    if new_quantity:
+        is_valid_quantity, quantity_result = ProductValidator.validate_product_quantity(new_quantity)
+        if not is_valid_quantity:
+            logging.warning("Product quantity update failed - invalid quantity", extra={"user_id": current_user_id, "product quantity": new_quantity})
+            return {"error":f"Invalid quantity: {quantity_result}"}, 400
+
+    if new_description:
+        is_valid_description, description_result = ProductValidator.validate_product_description(new_description)
+        if not is_valid_description:
+            logging.warning("Product description update failed - invalid description", extra={"user_id": current_user_id, "product description": new_description})
+            return {"error":f"Invalid description: {description_result}"}, 400
+        new_description = ProductValidator.sanitize_input(description_result)
+
+    db = request.app.state.db
+    connection = await db.acquire()
+    if not connection:
+        logging.error("Database connection failed during producto update")
+        return {"Error": "Database connection failed"}, 500
+
+    try:
+        await connection.begin()
+        async with connection.cursor() as cursor:
+            await db.execute(cursor, "SELECT id, name FROM items WHERE id = %s AND created_by = %s",(target_id,current_user_id))
+            selected_product = await cursor.fetchone()
+            if not selected_product:
+                return {"error":"product not found or access denied"}, 404
+
+            if new_product_name is not None:
+                await db.execute(cursor, "UPDATE items SET name = %s WHERE id = %s AND created_by = %s",(new_product_name, target_id, current_user_id))
+            if new_price is not None:
+                await db.execute(cursor, "UPDATE items SET price = %s WHERE id = %s AND created_by = %s",(new_price, target_id, current_user_id))
+            if new_description is not None:
+                await db.execute(cursor, "UPDATE items SET description = %s WHERE id = %s AND created_by = %s",(new_description, target_id, current_user_id))
+            if new_quantity is not None:
+                await db.execute(cursor, "UPDATE items SET quantity = %s WHERE id = %s AND created_by = %s",(new_quantity, target_id, current_user_id))
+
+        await connection.commit()
+        logging.info("Product updated succesfully", extra={"product_id":target_id})
+        return {"message":"Product updated successfully"}, 200
+
+    except Error as e:
+        logging.error("Error updating product", extra={"error": str(e), "product_id": target_id})
+        return {"error": "Failed to update product"}, 500
+
+    finally:
+        await db.release(connection) #rolls back whatever was not committed
+
+
+async def delete_product(request, current_user_id):
+    data = await read_json(request)
+    logging.info("Product deletion request received", extra={"product_id": data.get("id") if data else "No data"})
+
+    if not data or not data.get("id"):
+        logging.warning("Product deletion failed - missing item ID")
+        return {"error": "Product ID of the item to be deleted required",
+                "example request":{"id":"1"}
+                }, 200
+
+    target_id = data["id"]
+    db = request.app.state.db
+    connection = await db.acquire()
+    if not connection:
+        logging.error("Database connection failed during product deletion")
+        return {"error": "Database connection failed"}, 500
+
+    try:
+        await connection.begin()
+        async with connection.cursor() as cursor:
+            await db.execute(cursor, "SELECT * FROM items WHERE id = %s AND created_by =%s",(target_id, current_user_id))
+            product = await cursor.fetchone()
+            if not product:
+                logging.warning("Product deletion failed - product not found", extra={"product_id": target_id})
+                return {"error": "Product not found"}, 404
+
+            await db.execute(cursor, "DELETE FROM items WHERE id = %s AND created_by = %s",(target_id, current_user_id))
+            deleted = cursor.rowcount
+        await connection.commit()
+        if deleted > 0:
+            logging.info("Product deleted successfully", extra={"product_id":target_id,"product_name":product["name"]})
+            return {"message": "Product deleted successfully",
+                    "deleted_product_id":target_id
+                    }, 200
+        logging.warning("No product was deleted", extra={"product_id":target_id, "user_id":current_user_id})
+        return {"error":"No product was deleted"}, 404
+
+    except Error as e:
+        logging.error("Error deleting product", extra={"error":str(e), "product_id":target_id, "user_id":current_user_id})
+        return {"error": "Failed to delete product"}, 500
+
+    finally:
+        await db.release(connection)
+
+
+async def _health_snapshot(health_monitor):
+    #snapshot() runs the first round inline, and its check waits on this event loop
+    return health_monitor.last or await asyncio.to_thread(health_monitor.snapshot)
+
+
+async def health_check(request):
+    startup, health_monitor = request.app.state.startup, request.app.state.health_monitor
+    if not startup.ready.is_set():
+        return {"status": startup.status()}, 200
+    snapshot = await _health_snapshot(health_monitor)
+    return {"status": "healthy" if snapshot.healthy() else "unhealthy"}, 200
+
+
+async def health_detailed(request):
+    startup, health_monitor, shutdown = request.app.state.startup, request.app.state.health_monitor, request.app.state.shutdown
+    if not startup.ready.is_set():
+        return {"status": startup.status(),
+                "service": "product-service",
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "startup_phases": dict(startup.phases)
+                }, 503
+    if shutdown.draining.is_set():
+        return {"status": "draining",
+                "service": "product-service",
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "draining_seconds": round(shutdown.draining_for(), 3)
+                }, 503
+    snapshot = await _health_snapshot(health_monitor)
+    database = snapshot.checks["database"]
+    checks = {
+        "database_connection": database["ok"] or database["error"] is not None,
+        "database_query": database["ok"],
+        "service_responsive": True
+    }
+    return {"status": "healthy" if snapshot.healthy() else "unhealthy",
+            "service": "product-service",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "checks": checks,
+            "checked_at": snapshot.timestamp,
+            "check_age_seconds": round(snapshot.age(), 3),
+            "check_duration_ms": database["duration_ms"],
+            "circuit_breaker": db_breaker.status()
+            }, 200 if snapshot.healthy() else 503
+
+
+async def metrics(request):
+    return Response(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+ROUTES = (
+    ("/products", "POST", create_product, True),
+    ("/products", "GET", get_products, True),
+    ("/products", "PUT", update_product, True),
+    ("/products", "DELETE", delete_product, True),
+    ("/health", "GET", health_check, False),
+    ("/health/detailed", "GET", health_detailed, False),
+    ("/metrics", "GET", metrics, False),
+)
+
+
+class InFlightMiddleware:
+    """Counts the HTTP requests the graceful shutdown drains"""
+
+    def __init__(self, app, shutdown):
+        self.app = app
+        self.shutdown = shutdown
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        self.shutdown.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.shutdown.request_finished()
+
+
+def startup_steps(db, health_monitor):
+    #The gate runs on its own thread, the checks on the event loop of the pool
+    def verify_db_setup():
+        return retry_with_backoff(lambda attempt: db.call(db.verify_items_table(), HEALTH_CHECK_TIMEOUT * 2), DB_SETUP_DEADLINE,
+                                  DB_SETUP_BACKOFF_INITIAL, DB_SETUP_BACKOFF_MAX, phase="database") > 0
+    return [
+        ("database", verify_db_setup),
+        ("health_monitor", health_monitor.start),
+    ]
+
+
+def _span_details(scope):
+    #Server spans named by route like FlaskInstrumentor, so TRACE_SAMPLE_ROUTES applies to both apps
+    route = scope.get("path") if scope.get("path") in {path for path, *_ in ROUTES} else "unmatched"
+    return route, {"http.route": route}
+
+
+def create_asgi_app(config=None):
+    """Builds the ASGI product service - `config` overrides what load_config reads from the environment"""
+
+    if Starlette is None:
+        raise RuntimeError("The ASGI app needs starlette, uvicorn and aiomysql (product-service/requirements.txt)")
+
+    settings = load_config()
+    settings.update(config or {})
+    shutdown = GracefulShutdown.from_env()
+    if settings["STRUCTURED_LOGGING"]:
+        listener = setup_structured_logging("product-service")
+        shutdown.on_shutdown("logs", lambda timeout: stop_listener(listener, timeout))
+    if settings["TRACING_ENABLED"]:
+        #No flask or pymysql instrumentor here: the ASGI middleware opens the server spans, AsyncDatabase the DB ones
+        setup_tracing(None, [name for name in settings["INSTRUMENTATIONS"] if name not in ("flask", "pymysql")])
+        shutdown.on_shutdown("spans", flush_spans)
+
+    db = AsyncDatabase(settings)
+    health_monitor = HealthMonitor({"database": lambda: db.call(db.ping(), HEALTH_CHECK_TIMEOUT * 2)},
+                                   interval=float(os.environ.get("HEALTH_CHECK_INTERVAL", "5")))
+    startup = StartupGate()
+    shutdown.on_shutdown("health_monitor", lambda timeout: health_monitor.stop())
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        await db.open()
+        startup.start(startup_steps(db, health_monitor), on_failure=startup_failed)
+        #uvicorn installed its handler before the lifespan starts: it runs after the readiness delay,
+        #uvicorn then stops accepting and waits for the open connections (timeout_graceful_shutdown)
+        uvicorn_exit = signal.getsignal(signal.SIGTERM)
+        if callable(uvicorn_exit):
+            shutdown.handle_sigterm(stop=lambda: uvicorn_exit(signal.SIGTERM, None))
+        try:
+            yield
+        finally:
+            await asyncio.to_thread(shutdown.finish) #health monitor, spans, logs - at once after a SIGTERM, the timer thread did it
+            await db.close() #the connections are returned once the requests are drained
+
+    limits = ConcurrencyLimits.from_env(ROUTE_CLASSES, CONCURRENCY_LIMITS, CONCURRENCY_LATENCY_TARGETS)
+    rate_limiter = RateLimiter.from_env(ROUTE_CLASSES, RATE_LIMITS)
+    budgets = dict(REQUEST_BUDGETS, **parse_limits(os.environ.get("REQUEST_BUDGETS")))
+
+    def route_budget(path, method):
+        name = route_class(ROUTE_CLASSES, method, path)
+        return None if name is None else budgets.get(name, budgets["default"])
+
+    app = Starlette(routes=[Route(path, endpoint(handler, path, auth, limits, rate_limiter, route_budget(path, method)), methods=[method])
+                            for path, method, handler, auth in ROUTES],
+                    middleware=[Middleware(InFlightMiddleware, shutdown=shutdown)],
+                    lifespan=lifespan)
+    app.state.config = settings
+    app.state.db = db
+    app.state.health_monitor = health_monitor
+    app.state.startup = startup
+    app.state.shutdown = shutdown
+    app.state.concurrency_limits = limits
+    app.state.rate_limiter = rate_limiter
+
+    if settings["TRACING_ENABLED"]:
+        from opentelemetry.instrumentation.asgi import OpenTelemetryMiddleware
+        return OpenTelemetryMiddleware(app, default_span_details=_span_details)
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.environ.get('FLASK_RUN_PORT','3002'))
+    print("=" * 50)
+    print(f"Starting Product Service (ASGI) - Environment: {os.environ.get('FLASK_ENV','development')}")
+    print(f"Port: {port}, DB pool: {DB_POOL_SIZE} connections per worker")
+    print("=" * 50)
+    uvicorn.run("product_asgi:create_asgi_app", factory=True, host=os.getenv('FLASK_HOST', '0.0.0.0'), port=port, # nosec
+                workers=int(os.environ.get("WEB_CONCURRENCY", "1")), access_log=False,
+                timeout_graceful_shutdown=int(float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT", "20"))))
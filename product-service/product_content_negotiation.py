@@ -0,0 +1,120 @@
+import os
+from datetime import timezone
+from flask import Request, g, has_request_context, request
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from product_json_provider import FastJSONProvider, encode_default
+
+#Binary formats are optional, a missing library simply removes that format from negotiation
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+CBOR_MIMETYPE = "application/cbor"
+#Binary bodies are decoded in one go, the size is checked before (Content-Length) and while they are read
+BINARY_BODY_MAX_BYTES = int(os.environ.get("BINARY_BODY_MAX_BYTES", str(1024 * 1024)))
+
+
+def msgpack_dumps(obj):
+    return msgpack.packb(obj, default=encode_default, use_bin_type=True)
+
+
+def msgpack_loads(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+def cbor_dumps(obj):
+    #CBOR has native tags for decimals and timestamps, naive DB datetimes are treated as UTC
+    return cbor2.dumps(obj, timezone=timezone.utc)
+
+
+def _reject_tag(decoder, tag):
+    #Called for the semantic tags cbor2 has no decoder of its own for - a client has no reason to send them
+    raise ValueError(f"CBOR tag {tag.tag} is not accepted")
+
+
+def cbor_loads(data):
+    return cbor2.loads(data, tag_hook=_reject_tag)
+
+
+def available_encoders():
+    encoders = {}
+    if msgpack is not None:
+        for mimetype in MSGPACK_MIMETYPES:
+            encoders[mimetype] = msgpack_dumps
+    if cbor2 is not None:
+        encoders[CBOR_MIMETYPE] = cbor_dumps
+    return encoders
+
+
+def available_decoders():
+    decoders = {}
+    if msgpack is not None:
+        for mimetype in MSGPACK_MIMETYPES:
+            decoders[mimetype] = msgpack_loads
+    if cbor2 is not None:
+        decoders[CBOR_MIMETYPE] = cbor_loads
+    return decoders
+
+
+ENCODERS = available_encoders()
+DECODERS = available_decoders()
+OFFERED_MIMETYPES = [JSON_MIMETYPE] + list(ENCODERS.keys()) #JSON first so */* and missing Accept keep JSON
+
+
+def negotiate_mimetype():
+    """Picks the response format from the Accept header, JSON unless a binary format is preferred"""
+
+    if not has_request_context() or not request.accept_mimetypes:
+        return JSON_MIMETYPE
+    return request.accept_mimetypes.best_match(OFFERED_MIMETYPES, default=JSON_MIMETYPE)
+
+
+class NegotiatingRequest(Request):
+    """get_json() also understands MessagePack and CBOR bodies, so routes read every format the same way"""
+
+    def get_json(self, force=False, silent=False, cache=True):
+        decoder = DECODERS.get(self.mimetype)
+        if decoder is None:
+            return super().get_json(force=force, silent=silent, cache=cache)
+
+        if self.max_content_length is None or self.max_content_length > BINARY_BODY_MAX_BYTES:
+            self.max_content_length = BINARY_BODY_MAX_BYTES #413 from werkzeug, chunked bodies included
+        data = self.get_data(cache=cache)
+        if len(data) > BINARY_BODY_MAX_BYTES: #the stream was read before the limit was set
+            raise RequestEntityTooLarge()
+        try:
+            return decoder(data)
+        except Exception as e:
+            if silent:
+                return None
+            raise BadRequest(f"Failed to decode {self.mimetype} body: {e}")
+
+    @property
+    def is_json(self):
+        return self.mimetype in DECODERS or super().is_json
+
+
+class NegotiatingJSONProvider(FastJSONProvider):
+    """jsonify() answers in JSON, MessagePack or CBOR depending on the Accept header"""
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if has_request_context():
+            g.response_payload = obj #kept for the request span, so it never has to parse the body back
+
+        mimetype = negotiate_mimetype()
+        if mimetype == JSON_MIMETYPE:
+            response = super().response(obj)
+        else:
+            response = self._app.response_class(ENCODERS[mimetype](obj), mimetype=mimetype)
+
+        response.vary.add("Accept")
+        return response
@@ -0,0 +1,139 @@
+import functools, logging, os, re, threading, time
+from collections import OrderedDict
+import pymysql
+from flask import g, has_request_context
+from opentelemetry import trace
+from product_metrics import registry
+from product_circuit_breaker import db_breaker, is_outage
+from product_deadline import STATEMENT_GRACE, current_deadline, is_deadline_error, raise_if_exhausted, with_execution_time_hint
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "200"))
+EXPLAIN_INTERVAL = 60 #seconds between two EXPLAINs of the same statement
+EXPLAIN_HISTORY = 512 #statements whose last EXPLAIN is remembered, as many as fingerprint caches
+
+EXPLAINABLE = ("select", "update", "delete", "insert", "replace")
+
+db_queries_total = registry.counter("db_queries_total", "SQL statements executed", ("statement",))
+db_query_duration_seconds = registry.histogram("db_query_duration_seconds", "SQL statement latency in seconds", ("statement",),
+                                               buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+db_slow_queries_total = registry.counter("db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS", ("statement",))
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_REPEATED_LISTS = re.compile(r"\(\?\+\)(?:\s*,\s*\(\?\+\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+_last_explain = OrderedDict() #fingerprint -> time of its last EXPLAIN, least recently explained first
+_last_explain_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=512)
+def fingerprint(statement):
+    """Statement shape without values - "SELECT * FROM items WHERE id = %s" and "... id = 7" share one fingerprint"""
+
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _VALUE_LIST.sub("(?+)", statement) #IN lists and multi-row VALUES of any length
+    return _REPEATED_LISTS.sub("(?+)", statement)
+
+
+def request_db_stats():
+    """(query count, DB milliseconds) for the current request"""
+
+    if not has_request_context():
+        return 0, 0.0
+    return g.get("db_query_count", 0), round(g.get("db_time", 0.0) * 1000, 2)
+
+
+class InstrumentedCursor(pymysql.cursors.DictCursor):
+    """DictCursor that times every statement, per request and per statement fingerprint"""
+
+    def execute(self, query, args=None):
+        deadline = current_deadline()
+        if deadline is None:
+            statement, read_timeout = query, None
+        else:
+            #What the request has left bounds the statement: in MySQL for SELECTs, on the socket for the rest
+            remaining = deadline.check("database")
+            statement, read_timeout = with_execution_time_hint(query, remaining), self.connection._read_timeout
+            self.connection._read_timeout = min(read_timeout or remaining + STATEMENT_GRACE, remaining + STATEMENT_GRACE)
+        started = time.perf_counter()
+        succeeded = False
+        try:
+            result = super().execute(statement, args)
+            succeeded = True
+            return result
+        except pymysql.err.OperationalError as e:
+            if deadline is not None and is_deadline_error(e):
+                deadline.exceed("database")
+            raise_if_exhausted() #our budget ran out, not the database
+            if is_outage(e): #read timeout or lost connection, the breaker counts it like a failed connect
+                db_breaker.record_failure()
+            raise
+        finally:
+            if deadline is not None:
+                self.connection._read_timeout = read_timeout
+            self._record(query, time.perf_counter() - started, succeeded)
+
+    def _record(self, query, elapsed, succeeded=True):
+        statement = fingerprint(query if isinstance(query, str) else query.decode("utf-8", "replace"))
+        db_queries_total.inc(labels=(statement,))
+        db_query_duration_seconds.observe(elapsed, labels=(statement,))
+
+        if has_request_context():
+            g.db_query_count = g.get("db_query_count", 0) + 1
+            g.db_time = g.get("db_time", 0.0) + elapsed
+
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            db_slow_queries_total.inc(labels=(statement,))
+            logging.warning(f"Slow query ({elapsed * 1000:.1f} ms): {statement}",
+                            extra={"statement": statement, "duration_ms": round(elapsed * 1000, 2),
+                                   "explain": self._explain(statement) if succeeded else None}) #a failed statement left no plan to explain
+
+    def _explain(self, statement):
+        if not statement.lower().startswith(EXPLAINABLE):
+            return None
+        now = time.monotonic()
+        with _last_explain_lock:
+            if now - _last_explain.get(statement, -EXPLAIN_INTERVAL) < EXPLAIN_INTERVAL: #the same slow statement is explained once a minute
+                return None
+            _last_explain[statement] = now
+            _last_explain.move_to_end(statement)
+            if len(_last_explain) > EXPLAIN_HISTORY:
+                _last_explain.popitem(last=False)
+
+        executed = getattr(self, "_executed", None)
+        if not executed:
+            return None
+        try:
+            #Plain cursor, so the EXPLAIN itself is not timed and cannot recurse
+            with self.connection.cursor(pymysql.cursors.DictCursor) as cursor:
+                cursor.execute("EXPLAIN " + executed)
+                return cursor.fetchall()
+        except pymysql.Error as e:
+            return [{"error": str(e)}]
+
+
+def _after_request(response):
+    query_count, db_time_ms = request_db_stats()
+    span = trace.get_current_span()
+    if span.is_recording():
+        span.set_attribute("db.query_count", query_count)
+        span.set_attribute("db.time_ms", db_time_ms)
+    return response
+
+
+class RequestDBStatsFilter(logging.Filter):
+    """Adds db_query_count and db_time_ms of the current request to every log record"""
+
+    def filter(self, record):
+        record.db_query_count, record.db_time_ms = request_db_stats()
+        return True
+
+
+def setup_db_instrumentation(app):
+    app.after_request(_after_request)
@@ -0,0 +1,161 @@
+import contextvars, os, re, time
+from flask import g, jsonify, request
+from product_metrics import registry, parse_request_start
+from product_concurrency_limit import parse_limits, route_class
+
+deadline_exceeded_total = registry.counter("deadline_exceeded_total", "Requests answered 504 because their time budget ran out, by route and where it ran out",
+                                           ("route", "stage"))
+
+#Budget the caller has left, in milliseconds - ours, or the one Envoy sets for its route timeout
+DEADLINE_HEADERS = ("X-Request-Timeout-Ms", "X-Envoy-Expected-Rq-Timeout-Ms")
+STATEMENT_GRACE = 0.25 #seconds the socket waits past MAX_EXECUTION_TIME, so MySQL's own error comes first
+
+#ER_QUERY_TIMEOUT (MySQL MAX_EXECUTION_TIME) and ER_STATEMENT_TIMEOUT (MariaDB max_statement_time)
+_DEADLINE_ERRORS = (3024, 1969)
+_SELECT = re.compile(r"^(\s*SELECT\b)(?!\s*/\*\+)", re.IGNORECASE)
+
+
+class DeadlineExceeded(Exception):
+    """Raised where a request runs out of time - answered with 504"""
+
+    def __init__(self, stage):
+        super().__init__(f"request deadline exceeded ({stage})")
+        self.stage = stage
+
+
+class Deadline:
+    """When the current request has to be answered by, on the monotonic clock.
+
+    `exceeded` keeps the stage that ran out of time even when a view catches the
+    exception and answers 500 itself - the response is turned into a 504 anyway.
+    `caller_bound` is set when the caller's header shortened the budget: running out
+    of it then says nothing about how loaded the service is.
+    """
+
+    __slots__ = ("budget", "expires_at", "exceeded", "caller_bound", "clock")
+
+    def __init__(self, budget, caller_bound=False, clock=time.monotonic):
+        self.budget = budget
+        self.caller_bound = caller_bound
+        self.clock = clock
+        self.expires_at = clock() + budget
+        self.exceeded = None
+
+    def remaining(self):
+        return self.expires_at - self.clock()
+
+    def exceed(self, stage):
+        self.exceeded = self.exceeded or stage
+        raise DeadlineExceeded(stage)
+
+    def check(self, stage):
+        remaining = self.remaining()
+        if remaining <= 0:
+            self.exceed(stage)
+        return remaining
+
+
+_current = contextvars.ContextVar("request_deadline", default=None)
+
+
+def current_deadline():
+    return _current.get()
+
+
+def set_deadline(deadline):
+    _current.set(deadline)
+
+
+def request_budget(route_budget, header_value=None, queue_wait=None):
+    """Seconds left for a request: the budget of its route, shortened (never extended) by the
+    caller's, minus the time it already waited in front of the app"""
+
+    budget = route_budget
+    if header_value:
+        try:
+            budget = min(budget, float(header_value) / 1000)
+        except ValueError:
+            pass
+    return budget - (queue_wait or 0.0)
+
+
+def request_deadline(route_budget, header_value=None, queue_wait=None):
+    """The Deadline of a request, `caller_bound` when the header asked for less than the route budget"""
+
+    return Deadline(request_budget(route_budget, header_value, queue_wait),
+                    caller_bound=request_budget(route_budget, header_value) < route_budget)
+
+
+def deadline_timeout(default, stage="database"):
+    """`default` capped by the time the request has left, for connect and read timeouts - raises once it is out of time"""
+
+    deadline = _current.get()
+    if deadline is None:
+        return default
+    return min(default, deadline.check(stage))
+
+
+def raise_if_exhausted(stage="database"):
+    """DeadlineExceeded when the request is out of time - a timeout it caused says nothing about the database"""
+
+    deadline = _current.get()
+    if deadline is not None and deadline.remaining() <= 0:
+        deadline.exceed(stage)
+
+
+def with_execution_time_hint(query, remaining):
+    """SELECT ... -> SELECT /*+ MAX_EXECUTION_TIME(ms) */ ... - MySQL stops the statement itself
+    when the request is out of time. Only SELECTs take the hint, writes are bounded by the socket timeout."""
+
+    if not isinstance(query, str):
+        return query
+    return _SELECT.sub(lambda match: f"{match.group(1)} /*+ MAX_EXECUTION_TIME({max(1, int(remaining * 1000))}) */", query, count=1)
+
+
+def is_deadline_error(error):
+    return bool(error.args) and error.args[0] in _DEADLINE_ERRORS
+
+
+def deadline_response():
+    return jsonify({"error": "Request deadline exceeded"}), 504
+
+
+def setup_deadlines(app, route_classes, budgets):
+    """A Deadline per request from REQUEST_BUDGETS and the caller's header, 504 once it is exhausted.
+
+    Probes and scrapes (route class None) get no deadline. Set up before the concurrency
+    limits: a request that is out of time before it starts never takes a permit.
+    """
+
+    budgets = dict(budgets, **parse_limits(os.environ.get("REQUEST_BUDGETS")))
+
+    def start():
+        if request.url_rule is None:
+            return None
+        name = route_class(route_classes, request.method, request.url_rule.rule)
+        if name is None:
+            return None
+        header = next((request.headers[header] for header in DEADLINE_HEADERS if header in request.headers), None)
+        g.deadline = deadline = request_deadline(budgets.get(name, budgets["default"]), header, parse_request_start(request.headers.get("X-Request-Start")))
+        set_deadline(deadline)
+        if deadline.budget <= 0: #the caller gave up while it waited in the queue, nothing is worth starting
+            deadline.exceeded = "queue"
+            return deadline_response()
+        return None
+
+    def finish(response):
+        deadline = g.get("deadline")
+        if deadline is None or deadline.exceeded is None:
+            return response
+        deadline_exceeded_total.inc(labels=(request.url_rule.rule, deadline.exceeded))
+        if response.status_code != 504: #a view caught DeadlineExceeded and answered on its own
+            response = app.make_response(deadline_response())
+        return response
+
+    def clear(error=None):
+        set_deadline(None) #worker threads serve the next request in the same context
+
+    app.before_request(start)
+    app.after_request(finish)
+    app.teardown_request(clear)
+    app.register_error_handler(DeadlineExceeded, lambda error: deadline_response())
@@ -0,0 +1,97 @@
+import contextlib, logging, threading, time
+from datetime import datetime, timezone
+from product_metrics import registry
+
+health_check_duration_seconds = registry.histogram("health_check_duration_seconds", "Latency of one dependency check of the health monitor", ("check",),
+                                                   buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+_monitors = []
+registry.function_gauge("health_check_up", "1 when the last check of a dependency passed",
+                        lambda: {(name,): int(result["ok"]) for monitor in _monitors if monitor.last
+                                 for name, result in monitor.last.checks.items()}, ("check",))
+registry.function_gauge("health_check_age_seconds", "Seconds since the health monitor last finished its checks",
+                        lambda: max((monitor.last.age() for monitor in _monitors if monitor.last), default=0))
+
+
+class HealthSnapshot:
+    """Result of one round of checks - probes read it, only the monitor thread replaces it"""
+
+    def __init__(self, checks, finished, max_age):
+        self.checks = checks
+        self.finished = finished #time.monotonic()
+        self.timestamp = datetime.now(timezone.utc).isoformat()
+        self.max_age = max_age
+
+    def age(self):
+        return time.monotonic() - self.finished
+
+    def stale(self):
+        #A monitor stuck on a hanging dependency must not keep reporting its last good state
+        return self.age() > self.max_age
+
+    def healthy(self):
+        return not self.stale() and all(result["ok"] for result in self.checks.values())
+
+
+class HealthMonitor:
+    """Runs the dependency checks on its own thread every `interval` seconds.
+
+    Probe endpoints read snapshot() and never touch the dependencies themselves.
+    Checks return a truthy value or raise, and should bound their own time
+    (connect/read timeouts), the monitor cannot interrupt them. They run inside
+    context(), create_app sets it to the Flask app context.
+    """
+
+    def __init__(self, checks, interval=10.0, max_age=None):
+        self.checks = checks
+        self.interval = interval
+        self.max_age = max_age if max_age is not None else 3 * interval
+        self.last = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock() #one round at a time when snapshot() has to run the first one
+        self.context = contextlib.nullcontext
+        _monitors.append(self)
+
+    def run_checks(self):
+        with self._lock, self.context():
+            results = {}
+            for name, check in self.checks.items():
+                started = time.perf_counter()
+                try:
+                    ok, error = bool(check()), None
+                except Exception as e:
+                    ok, error = False, str(e)
+                elapsed = time.perf_counter() - started
+                health_check_duration_seconds.observe(elapsed, labels=(name,))
+                results[name] = {"ok": ok, "duration_ms": round(elapsed * 1000, 2), "error": error}
+
+            previous = self.last
+            self.last = HealthSnapshot(results, time.monotonic(), self.max_age)
+            if previous is None or previous.healthy() != self.last.healthy():
+                failed = [name for name, result in results.items() if not result["ok"]]
+                logging.log(logging.INFO if not failed else logging.WARNING,
+                            f"Health changed - {'healthy' if not failed else 'unhealthy'}", extra={"checks": results})
+            return self.last
+
+    def snapshot(self):
+        """Last known state, or a first round run inline when the monitor has not produced one yet"""
+
+        return self.last or self.run_checks()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_checks()
+            except Exception as e:
+                logging.error(f"Health monitor round failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="HealthMonitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,486 @@
+import contextlib, csv, fcntl, io, json, os, queue, re, threading, time, uuid, logging
+from datetime import datetime, timezone
+from pymysql import Error
+from product_validator import ProductValidator
+from product_content_negotiation import msgpack, cbor2, MSGPACK_MIMETYPES, CBOR_MIMETYPE
+
+#Formats accepted by POST /products/import
+IMPORT_FORMATS = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+if msgpack is not None:
+    IMPORT_FORMATS.update({mimetype: "msgpack" for mimetype in MSGPACK_MIMETYPES})
+if cbor2 is not None:
+    IMPORT_FORMATS[CBOR_MIMETYPE] = "cbor"
+
+BINARY_EXTENSIONS = {".msgpack": "msgpack", ".cbor": "cbor"}
+JOB_ID = re.compile(r"[0-9a-f]{32}") #uuid4().hex, anything else never names a checkpoint file
+
+INSERT_PRODUCT_SQL = "INSERT INTO items (name, price, quantity, description, created_by) VALUES (%s, %s, %s, %s, %s)"
+#Committed with the rows of each chunk: after a crash between the commit and the checkpoint file the
+#resume starts from here instead of inserting the chunk again
+SAVE_OFFSET_SQL = ("INSERT INTO import_offsets (job_id, rows_processed, rows_inserted, rows_failed) VALUES (%s, %s, %s, %s) "
+                   "ON DUPLICATE KEY UPDATE rows_processed=VALUES(rows_processed), rows_inserted=VALUES(rows_inserted), rows_failed=VALUES(rows_failed)")
+
+
+def detect_import_format(content_type, filename=None):
+    """Resolve the upload format from the Content-Type or the file extension"""
+
+    mimetype = (content_type or "").split(";")[0].strip().lower()
+    if mimetype in IMPORT_FORMATS:
+        return IMPORT_FORMATS[mimetype]
+
+    if filename:
+        extension = os.path.splitext(filename)[1].lower()
+        if extension == ".csv":
+            return "csv"
+        if extension in (".ndjson", ".jsonl"):
+            return "ndjson"
+        if BINARY_EXTENSIONS.get(extension) in IMPORT_FORMATS.values():
+            return BINARY_EXTENSIONS[extension]
+    return None
+
+
+class ImportTooLarge(ValueError):
+    pass
+
+
+class ImportJob:
+
+    def __init__(self, job_id, user_id, file_format, spool_path):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.file_format = file_format
+        self.spool_path = spool_path
+        self.status = "queued"
+        self.rows_processed = 0 #checkpoint - rows already validated and committed
+        self.rows_inserted = 0
+        self.rows_failed = 0
+        self.bytes_total = os.path.getsize(spool_path) if os.path.exists(spool_path) else 0
+        self.bytes_processed = 0
+        self.errors = []
+        self.error_message = None
+        self.created_at = datetime.now(timezone.utc).isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self._started_monotonic = None
+        self._finished_monotonic = None
+        self.checkpoint_throughput = 0.0 #last rate a checkpoint recorded, for jobs read back from disk
+
+    def throughput(self):
+        if not self._started_monotonic:
+            return self.checkpoint_throughput
+        elapsed = (self._finished_monotonic or time.monotonic()) - self._started_monotonic
+        if elapsed <= 0:
+            return 0.0
+        return round(self.rows_processed / elapsed, 2)
+
+    def progress(self):
+        if self.status == "completed":
+            return 100.0
+        if not self.bytes_total:
+            return 0.0
+        return round(min(self.bytes_processed / self.bytes_total, 1.0) * 100, 2)
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "format": self.file_format,
+            "progress_percent": self.progress(),
+            "rows_processed": self.rows_processed,
+            "rows_inserted": self.rows_inserted,
+            "rows_failed": self.rows_failed,
+            "throughput_rows_per_second": self.throughput(),
+            "errors": self.errors,
+            "error_message": self.error_message,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def checkpoint_state(self):
+        state = self.to_dict()
+        state.update({"user_id": self.user_id, "spool_path": self.spool_path, "bytes_processed": self.bytes_processed})
+        return state
+
+    @staticmethod
+    def from_checkpoint(state):
+        job = ImportJob(state["job_id"], state["user_id"], state["format"], state["spool_path"])
+        job.status = state.get("status", "queued")
+        job.rows_processed = state.get("rows_processed", 0)
+        job.rows_inserted = state.get("rows_inserted", 0)
+        job.rows_failed = state.get("rows_failed", 0)
+        job.bytes_processed = state.get("bytes_processed", 0)
+        job.errors = state.get("errors", [])
+        job.error_message = state.get("error_message")
+        job.created_at = state.get("created_at", job.created_at)
+        job.started_at = state.get("started_at")
+        job.finished_at = state.get("finished_at")
+        job.checkpoint_throughput = state.get("throughput_rows_per_second", 0.0)
+        return job
+
+
+class ImportJobManager:
+    """Spools bulk uploads to disk and imports them in a background worker thread"""
+
+    def __init__(self, spool_dir, connection_factory, chunk_size=500, max_errors=1000, max_bytes=100 * 1024 * 1024,
+                 checkpoint_ttl=24 * 3600):
+        self.spool_dir = spool_dir
+        self.connection_factory = connection_factory
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.max_bytes = max_bytes #uploads are spooled to the pod's emptyDir, bounded by its sizeLimit
+        self.checkpoint_ttl = checkpoint_ttl #seconds the status of a finished job stays readable
+        self.jobs = {}
+        self._claims = {} #job_id -> fd holding the flock of the job's lock file while this process owns it
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self.context = contextlib.nullcontext #the worker imports inside it, create_app sets the Flask app context
+
+    def _checkpoint_path(self, job_id):
+        return os.path.join(self.spool_dir, f"{job_id}.json")
+
+    def _claim(self, job_id):
+        """Takes the job's lock file, False while another live process holds it.
+
+        The kernel drops a flock when its process dies, so the jobs of a dead worker
+        are free for whichever process resumes them next - sibling or respawned worker.
+        """
+
+        fd = os.open(os.path.join(self.spool_dir, f"{job_id}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        with self._lock:
+            self._claims[job_id] = fd
+        return True
+
+    def _release(self, job_id):
+        #The lock file goes first: a process claiming it afterwards creates a new one and reads the final checkpoint
+        with self._lock:
+            fd = self._claims.pop(job_id, None)
+        if fd is None:
+            return
+        try:
+            os.remove(os.path.join(self.spool_dir, f"{job_id}.lock"))
+        except OSError:
+            pass
+        os.close(fd)
+
+    def submit(self, user_id, stream, file_format):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        spool_path = os.path.join(self.spool_dir, f"{job_id}.{file_format}")
+
+        #Copying the upload to disk in blocks so the request never holds the whole file in memory
+        try:
+            with open(spool_path, "wb") as spool_file:
+                while True:
+                    block = stream.read(64 * 1024)
+                    if not block:
+                        break
+                    if spool_file.tell() + len(block) > self.max_bytes:
+                        raise ImportTooLarge(f"Import file is larger than {self.max_bytes} bytes")
+                    spool_file.write(block)
+        except BaseException:
+            os.remove(spool_path) #also when the request stream hits its own limit
+            raise
+
+        job = ImportJob(job_id, user_id, file_format, spool_path)
+        if job.bytes_total == 0:
+            os.remove(spool_path)
+            raise ValueError("Import file is empty")
+
+        self._claim(job_id) #a fresh id, nobody else can hold it
+        with self._lock:
+            self.jobs[job_id] = job
+        self._save_checkpoint(job)
+        self._enqueue(job)
+        logging.info("Import job queued", extra={"job_id": job_id, "user_id": user_id, "format": file_format, "bytes": job.bytes_total})
+        return job
+
+    def get(self, job_id):
+        """The job, or a snapshot of its checkpoint when another worker process runs it"""
+
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is not None or not JOB_ID.fullmatch(job_id):
+            return job
+        try:
+            with open(self._checkpoint_path(job_id)) as checkpoint_file:
+                return ImportJob.from_checkpoint(json.load(checkpoint_file))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def resume_pending(self):
+        """Re-enqueue jobs no live process owns, continuing from their last checkpoint.
+
+        Safe to run in every worker: a job is only taken together with its lock file.
+        """
+
+        if not os.path.isdir(self.spool_dir):
+            return 0
+
+        resumed = 0
+        for filename in os.listdir(self.spool_dir):
+            job_id = filename[:-len(".json")]
+            if not filename.endswith(".json") or job_id in self._claims or not self._claim(job_id):
+                continue
+            try:
+                with open(os.path.join(self.spool_dir, filename)) as checkpoint_file:
+                    state = json.load(checkpoint_file)
+            except (OSError, ValueError) as e:
+                logging.warning("Unreadable import checkpoint", extra={"file": filename, "error": str(e)})
+                self._release(job_id)
+                continue
+
+            #Read after the claim: an owner that finished in the meantime wrote its final status first
+            if state.get("status") in ("completed", "failed") or not os.path.exists(state.get("spool_path", "")):
+                self._sweep(state)
+                self._release(job_id)
+                continue
+
+            job = ImportJob.from_checkpoint(state)
+            job.status = "queued"
+            with self._lock:
+                self.jobs[job.job_id] = job
+            self._enqueue(job)
+            resumed += 1
+
+        if resumed:
+            logging.info(f"Resumed {resumed} import jobs from checkpoint")
+        return resumed
+
+    def _sweep(self, state):
+        #Finished jobs: a spool file left by a crash goes at once, the checkpoint once its status is old enough
+        self._remove(state.get("spool_path"))
+        try:
+            finished = datetime.fromisoformat(state["finished_at"])
+        except (KeyError, TypeError, ValueError):
+            return
+        if (datetime.now(timezone.utc) - finished).total_seconds() > self.checkpoint_ttl:
+            self._remove(self._checkpoint_path(state["job_id"]))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except (OSError, TypeError):
+            pass
+
+    def _enqueue(self, job):
+        self._queue.put(job)
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_worker, name="product-import-worker", daemon=True)
+                self._worker.start()
+
+    def _run_worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                with self.context():
+                    self.process(job)
+            except Exception as e:
+                job.status = "failed"
+                job.error_message = str(e)
+                job.finished_at = datetime.now(timezone.utc).isoformat()
+                self._save_checkpoint(job)
+                logging.error("Import job failed", extra={"job_id": job.job_id, "error": str(e)})
+                #Not resumed either, the upload and its offset row would only fill the pod's disk and the table
+                self._forget_offset(job)
+                self._remove(job.spool_path)
+                self._release(job.job_id)
+            finally:
+                self._queue.task_done()
+
+    def _save_checkpoint(self, job):
+        checkpoint_path = self._checkpoint_path(job.job_id)
+        tmp_path = checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as checkpoint_file:
+            json.dump(job.checkpoint_state(), checkpoint_file)
+        os.replace(tmp_path, checkpoint_path) #atomic swap, a crash never leaves a half written checkpoint
+
+    def _iter_rows(self, job, spool_file):
+        """Yields (row_number, row_dict or None, parse_error) from the spooled upload"""
+
+        if job.file_format == "csv":
+            text = io.TextIOWrapper(spool_file, encoding="utf-8", newline="")
+            reader = csv.DictReader(text)
+            for row_number, row in enumerate(reader, start=1):
+                yield row_number, row, None
+            return
+
+        if job.file_format in ("msgpack", "cbor"):
+            yield from self._iter_binary_rows(job, spool_file)
+            return
+
+        for row_number, line in enumerate(spool_file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f"invalid JSON: {e}"
+                continue
+            yield row_number, row, None
+
+    def _iter_binary_rows(self, job, spool_file):
+        """MessagePack/CBOR uploads - either one array of products or a sequence of product objects"""
+
+        if job.file_format == "msgpack":
+            objects = msgpack.Unpacker(spool_file, raw=False)
+        else:
+            objects = self._iter_cbor_sequence(spool_file)
+
+        row_number = 0
+        try:
+            for obj in objects:
+                for row in (obj if isinstance(obj, list) else [obj]):
+                    row_number += 1
+                    yield row_number, row, None
+        except Exception as e: #a corrupt tail is reported once, rows decoded before it are kept
+            yield row_number + 1, None, f"invalid {job.file_format}: {e}"
+
+    @staticmethod
+    def _iter_cbor_sequence(spool_file):
+        decoder = cbor2.CBORDecoder(spool_file)
+        while spool_file.peek(1):
+            yield decoder.decode()
+
+    def process(self, job):
+        job.status = "running"
+        job.started_at = job.started_at or datetime.now(timezone.utc).isoformat()
+        job._started_monotonic = time.monotonic()
+        self._restore_offset(job)
+        resume_from = job.rows_processed
+        chunk = []
+
+        with open(job.spool_path, "rb") as spool_file:
+            for row_number, row, parse_error in self._iter_rows(job, spool_file):
+                if row_number <= resume_from:
+                    continue
+                chunk.append((row_number, row, parse_error))
+                if len(chunk) >= self.chunk_size:
+                    self._import_chunk(job, chunk, spool_file)
+                    chunk = []
+            if chunk:
+                self._import_chunk(job, chunk, spool_file)
+
+        job.status = "completed"
+        job.bytes_processed = job.bytes_total
+        job._finished_monotonic = time.monotonic()
+        job.finished_at = datetime.now(timezone.utc).isoformat()
+        self._save_checkpoint(job)
+        self._forget_offset(job) #only once the checkpoint says completed, the job is never resumed again
+        self._release(job.job_id)
+        self._remove(job.spool_path)
+        logging.info("Import job completed", extra={"job_id": job.job_id, "rows_inserted": job.rows_inserted, "rows_failed": job.rows_failed})
+
+    def _record_error(self, job, row_number, message):
+        job.rows_failed += 1
+        if len(job.errors) < self.max_errors:
+            job.errors.append({"row": row_number, "error": message})
+
+    def _import_chunk(self, job, chunk, spool_file):
+        rows = []
+        chunk_errors = []
+        for row_number, row, parse_error in chunk:
+            if parse_error:
+                chunk_errors.append((row_number, parse_error))
+            elif not isinstance(row, dict):
+                chunk_errors.append((row_number, "input must be a dictionary"))
+            else:
+                rows.append((row_number, row))
+
+        rows_to_insert = []
+        if rows:
+            #Whole chunk validated column by column instead of one dict at a time
+            error_mask, errors, columns = ProductValidator.validate_batch(
+                [row.get("name") for _, row in rows],
+                [row.get("price") for _, row in rows],
+                [row.get("quantity", 0) for _, row in rows],
+                [row.get("description", "") for _, row in rows])
+
+            for index, (row_number, _) in enumerate(rows):
+                if error_mask[index]:
+                    chunk_errors.append((row_number, errors[index]))
+                    continue
+                rows_to_insert.append((columns["product_name"][index],
+                                       columns["price"][index],
+                                       columns["quantity"][index],
+                                       columns["description"][index],
+                                       job.user_id))
+
+        for row_number, message in sorted(chunk_errors):
+            self._record_error(job, row_number, message)
+
+        if rows_to_insert:
+            self._insert_rows(job, rows_to_insert, chunk[-1][0])
+
+        job.rows_processed = chunk[-1][0]
+        try:
+            job.bytes_processed = spool_file.tell()
+        except (OSError, ValueError):
+            pass
+        self._save_checkpoint(job)
+
+    def _insert_rows(self, job, rows_to_insert, rows_processed):
+        connection = self.connection_factory()
+        if not connection:
+            raise Error("Database connection failed during import")
+        try:
+            with connection.cursor() as cursor:
+                #executemany rewrites the INSERT into one multi-row statement for the whole chunk
+                cursor.executemany(INSERT_PRODUCT_SQL, rows_to_insert)
+                cursor.execute(SAVE_OFFSET_SQL, (job.job_id, rows_processed, job.rows_inserted + len(rows_to_insert), job.rows_failed))
+            connection.commit()
+            job.rows_inserted += len(rows_to_insert)
+        except Error:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def _restore_offset(self, job):
+        """Moves the job past rows MySQL committed after its last checkpoint file"""
+
+        connection = self.connection_factory()
+        if not connection:
+            raise Error("Database connection failed during import")
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT rows_processed, rows_inserted, rows_failed FROM import_offsets WHERE job_id=%s", (job.job_id,))
+                offset = cursor.fetchone()
+        finally:
+            connection.close()
+        if offset and offset["rows_processed"] > job.rows_processed:
+            logging.info("Import job resumes past its checkpoint file", extra={"job_id": job.job_id, "checkpoint_rows": job.rows_processed,
+                                                                             "committed_rows": offset["rows_processed"]})
+            job.rows_processed = offset["rows_processed"]
+            job.rows_inserted = offset["rows_inserted"]
+            job.rows_failed = offset["rows_failed"]
+
+    def _forget_offset(self, job):
+        #Best effort: a row left behind is never read, its job is completed
+        try:
+            connection = self.connection_factory()
+            if not connection:
+                return
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("DELETE FROM import_offsets WHERE job_id=%s", (job.job_id,))
+                connection.commit()
+            finally:
+                connection.close()
+        except Exception as e:
+            logging.warning("Import offset not deleted", extra={"job_id": job.job_id, "error": str(e)})
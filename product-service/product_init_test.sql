@@ -26,6 +26,14 @@ CREATE TABLE IF NOT EXISTS items(
 );
 
 
+CREATE TABLE IF NOT EXISTS import_offsets(
+    job_id CHAR(32) NOT NULL PRIMARY KEY,
+    rows_processed INT NOT NULL,
+    rows_inserted INT NOT NULL,
+    rows_failed INT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
 INSERT IGNORE INTO items (name, quantity, price, description, created_by) VALUES 
 ('Test Product 1', 10, 29.99, 'Description for test product 1', 1),
 ('Test Product 2', 5, 49.99, 'Description for test product 2', 1);
\ No newline at end of file
@@ -0,0 +1,58 @@
+import json, decimal
+from datetime import date
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try: #orjson is optional, without it the provider falls back to the stdlib json module
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_default(obj):
+    """Types pymysql returns that JSON does not know - same wire format the routes already produced"""
+
+    if isinstance(obj, decimal.Decimal): #DECIMAL columns (price) are sent as numbers, not strings
+        return float(obj)
+    if isinstance(obj, date): #datetime is a subclass of date, both keep Flask's HTTP date format
+        return http_date(obj)
+    return DefaultJSONProvider.default(obj)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson that encodes Decimal and datetime rows natively"""
+
+    ensure_ascii = False
+
+    def _orjson_options(self, indent=False):
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            kwargs.setdefault("default", encode_default)
+            kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+            kwargs.setdefault("sort_keys", self.sort_keys)
+            return json.dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=encode_default, option=self._orjson_options()).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+
+        if orjson is None:
+            dump_args = {"indent": 2} if indent else {"separators": (",", ":")}
+            body = f"{self.dumps(obj, **dump_args)}\n"
+        else: #bytes straight from orjson, no intermediate str
+            body = orjson.dumps(obj, default=encode_default, option=self._orjson_options(indent)) + b"\n"
+
+        return self._app.response_class(body, mimetype=self.mimetype)
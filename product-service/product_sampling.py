@@ -0,0 +1,149 @@
+import os, threading, time
+from collections import OrderedDict
+from opentelemetry.sdk.trace import SpanProcessor
+from opentelemetry.sdk.trace.sampling import Decision, ParentBased, Sampler, SamplingResult, TraceIdRatioBased
+from opentelemetry.trace import StatusCode
+from product_metrics import registry
+
+traces_tail_sampled_total = registry.counter("traces_tail_sampled_total", "Traces the tail sampler kept or dropped, by reason", ("decision",))
+traces_tail_buffered = registry.gauge("traces_tail_buffered", "Traces waiting for their root span in the tail sampler")
+
+_DROP = SamplingResult(Decision.DROP)
+
+
+def parse_route_ratios(value):
+    """"/health=0,/metrics=0,/login=0.5" -> {"/health": 0.0, "/metrics": 0.0, "/login": 0.5}"""
+
+    ratios = {}
+    for item in (value or "").split(","):
+        if "=" not in item:
+            continue
+        route, ratio = item.rsplit("=", 1)
+        ratios[route.strip()] = min(max(float(ratio), 0.0), 1.0)
+    return ratios
+
+
+class RouteSampler(Sampler):
+    """Head sampling per route - the Flask route of server spans, the span name of everything else"""
+
+    def __init__(self, default_ratio=1.0, route_ratios=None):
+        self.default = TraceIdRatioBased(default_ratio)
+        self.routes = {route: TraceIdRatioBased(ratio) for route, ratio in (route_ratios or {}).items()}
+
+    def should_sample(self, parent_context, trace_id, name, kind=None, attributes=None, links=None, trace_state=None):
+        route = (attributes or {}).get("http.route", name)
+        sampler = self.routes.get(route, self.default)
+        if sampler.rate <= 0: #dropped routes skip the id math
+            return _DROP
+        return sampler.should_sample(parent_context, trace_id, name, kind, attributes, links, trace_state)
+
+    def get_description(self):
+        routes = ",".join(f"{route}={sampler.rate}" for route, sampler in self.routes.items())
+        return f"RouteSampler{{default={self.default.rate},{routes}}}"
+
+
+class _Trace:
+    __slots__ = ("spans", "started", "error")
+
+    def __init__(self):
+        self.spans = []
+        self.started = time.monotonic()
+        self.error = False
+
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """Buffers the spans of each trace until its local root ends, then forwards the whole trace or nothing.
+
+    Errored and slow traces are always kept, the rest with probability `ratio`
+    (decided on the trace id, so every service keeps the same traces).
+    """
+
+    def __init__(self, delegate, ratio=0.1, latency_threshold=0.5, max_traces=2048, trace_timeout=30.0):
+        self.delegate = delegate
+        self.bound = round(min(max(ratio, 0.0), 1.0) * (1 << 64))
+        self.latency_threshold_ns = int(latency_threshold * 1e9)
+        self.max_traces = max_traces
+        self.trace_timeout = trace_timeout
+        self._traces = OrderedDict()
+        self._decided = OrderedDict() #trace id -> keep, for spans that end after their root
+        self._lock = threading.Lock()
+
+    def on_start(self, span, parent_context=None):
+        self.delegate.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span):
+        trace_id = span.context.trace_id
+        is_root = span.parent is None or span.parent.is_remote
+        errored = span.status.status_code == StatusCode.ERROR
+
+        with self._lock:
+            if trace_id in self._decided:
+                keep, forward = self._decided[trace_id], [span]
+            else:
+                buffered = self._traces.get(trace_id)
+                if buffered is None:
+                    buffered = self._traces[trace_id] = _Trace()
+                    traces_tail_buffered.inc()
+                buffered.spans.append(span)
+                buffered.error = buffered.error or errored
+                if not is_root:
+                    self._evict()
+                    return
+                del self._traces[trace_id]
+                traces_tail_buffered.dec()
+                keep = self._decide(trace_id, span, buffered.error)
+                forward = buffered.spans
+                self._decided[trace_id] = keep
+                if len(self._decided) > self.max_traces:
+                    self._decided.popitem(last=False)
+
+        if keep:
+            for finished in forward:
+                self.delegate.on_end(finished)
+
+    def _decide(self, trace_id, root, error):
+        if error:
+            traces_tail_sampled_total.inc(labels=("error",))
+            return True
+        if root.end_time - root.start_time >= self.latency_threshold_ns:
+            traces_tail_sampled_total.inc(labels=("slow",))
+            return True
+        if trace_id & 0xFFFFFFFFFFFFFFFF < self.bound: #same rule as TraceIdRatioBased
+            traces_tail_sampled_total.inc(labels=("ratio",))
+            return True
+        traces_tail_sampled_total.inc(labels=("dropped",))
+        return False
+
+    def _evict(self):
+        #Called with the lock held - bounds memory when roots never end or the buffer is full
+        now = time.monotonic()
+        while self._traces:
+            trace_id, oldest = next(iter(self._traces.items()))
+            if len(self._traces) <= self.max_traces and now - oldest.started < self.trace_timeout:
+                break
+            del self._traces[trace_id]
+            traces_tail_buffered.dec()
+            traces_tail_sampled_total.inc(labels=("evicted",))
+
+    def shutdown(self):
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis=30000):
+        return self.delegate.force_flush(timeout_millis)
+
+
+def sampler_from_env():
+    return ParentBased(RouteSampler(float(os.environ.get("TRACE_SAMPLE_RATIO", "1.0")),
+                                    parse_route_ratios(os.environ.get("TRACE_SAMPLE_ROUTES", "/health=0,/health/detailed=0,/metrics=0"))))
+
+
+def span_processor_from_env(processor):
+    """Wraps the exporting processor in the tail sampler when TRACE_TAIL_SAMPLING is on"""
+
+    if os.environ.get("TRACE_TAIL_SAMPLING", "false").lower() != "true":
+        return processor
+    return TailSamplingSpanProcessor(processor,
+                                     ratio=float(os.environ.get("TRACE_TAIL_RATIO", "0.1")),
+                                     latency_threshold=float(os.environ.get("TRACE_TAIL_LATENCY_MS", "500")) / 1000,
+                                     max_traces=int(os.environ.get("TRACE_TAIL_MAX_TRACES", "2048")),
+                                     trace_timeout=float(os.environ.get("TRACE_TAIL_TIMEOUT", "30")))
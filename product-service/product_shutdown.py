@@ -0,0 +1,161 @@
+import logging, os, signal, threading, time
+from flask import g
+from product_metrics import registry
+
+_shutdowns = []
+registry.function_gauge("shutdown_draining_seconds", "Seconds since SIGTERM while the process drains, 0 while it serves",
+                        lambda: max((shutdown.draining_for() for shutdown in _shutdowns), default=0.0))
+
+
+class GracefulShutdown:
+    """What a worker does between SIGTERM and its exit.
+
+    1. readiness fails at once, the process keeps serving for `readiness_delay`
+       while kube-proxy and the ingress stop routing to the pod - the pod leaves the
+       endpoints when it is deleted, not when the probe fails (a probe every 10s
+       with failureThreshold 3 would take 30s), so the delay only has to cover the
+       propagation of that removal
+    2. `stop` runs - the server stops accepting connections
+    3. requests in flight get up to `drain_timeout` to finish
+    4. the shutdown hooks run, last registered first, each bounded by `flush_timeout`
+       where it takes one: health monitor, spans, log queue
+
+    The drain is reported in the log, the process is gone before the next scrape.
+    """
+
+    def __init__(self, readiness_delay=5.0, drain_timeout=20.0, flush_timeout=3.0, clock=time.monotonic):
+        self.readiness_delay = readiness_delay
+        self.drain_timeout = drain_timeout
+        self.flush_timeout = flush_timeout
+        self.clock = clock
+        self.draining = threading.Event()
+        self.started = None
+        self.in_flight = 0
+        self.served_while_draining = 0
+        self.drain_seconds = None
+        self._hooks = {}
+        self._idle = threading.Condition()
+        self._finish_lock = threading.Lock()
+        _shutdowns.append(self)
+
+    @staticmethod
+    def from_env():
+        #The three together have to stay under GUNICORN_GRACEFUL_TIMEOUT, the master kills the workers after it
+        return GracefulShutdown(float(os.environ.get("SHUTDOWN_READINESS_DELAY", "5")),
+                                float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT", "20")),
+                                float(os.environ.get("SHUTDOWN_FLUSH_TIMEOUT", "3")))
+
+    def on_shutdown(self, name, hook):
+        """hook(timeout) runs once the requests are drained - registering a name again replaces its hook"""
+
+        self._hooks[name] = hook
+
+    def draining_for(self):
+        return self.clock() - self.started if self.draining.is_set() else 0.0
+
+    def request_started(self):
+        with self._idle:
+            self.in_flight += 1
+            if self.draining.is_set():
+                self.served_while_draining += 1
+
+    def request_finished(self):
+        with self._idle:
+            self.in_flight -= 1
+            if self.in_flight <= 0:
+                self._idle.notify_all()
+
+    def begin(self):
+        """Readiness fails from now on - False when the shutdown had already begun"""
+
+        with self._idle:
+            if self.draining.is_set():
+                return False
+            self.started = self.clock()
+            self.draining.set()
+        logging.info("Shutdown requested, readiness fails from now on", extra={"in_flight": self.in_flight, "readiness_delay": self.readiness_delay})
+        return True
+
+    def drain(self, timeout):
+        """Waits for the requests in flight, True when none is left"""
+
+        with self._idle:
+            return self._idle.wait_for(lambda: self.in_flight <= 0, max(0.0, timeout))
+
+    def finish(self):
+        """Drains what is left of the drain timeout, runs the hooks and reports - once, later calls return at once"""
+
+        with self._finish_lock:
+            if self.drain_seconds is not None:
+                return self.drain_seconds
+            self.begin()
+            drained = self.drain(self.started + self.readiness_delay + self.drain_timeout - self.clock())
+            self.drain_seconds = self.clock() - self.started
+            report = {"drain_seconds": round(self.drain_seconds, 3), "abandoned": self.in_flight,
+                      "served_while_draining": self.served_while_draining}
+            if drained:
+                logging.info(f"Shutdown drained in {self.drain_seconds:.2f}s", extra=report)
+            else:
+                logging.warning(f"Shutdown drain timed out after {self.drain_seconds:.2f}s, {self.in_flight} requests abandoned", extra=report)
+            for name, hook in reversed(list(self._hooks.items())):
+                started = time.perf_counter()
+                try:
+                    hook(self.flush_timeout)
+                except Exception as e:
+                    logging.error(f"Shutdown hook {name} failed: {e}")
+                    continue
+                logging.debug(f"Shutdown hook {name} done in {time.perf_counter() - started:.3f}s")
+            return self.drain_seconds
+
+    def handle_sigterm(self, stop):
+        """Installs the SIGTERM handler - main thread only, False anywhere else.
+
+        The first SIGTERM fails readiness and calls `stop` after the readiness delay,
+        then finishes the shutdown on the same timer thread, so the spans and logs are
+        flushed even when a request outlives the drain. Another SIGTERM stops at once.
+        """
+
+        if threading.current_thread() is not threading.main_thread():
+            return False
+
+        def stop_and_finish():
+            stop()
+            self.finish()
+
+        def handler(signum, frame):
+            if not self.begin():
+                stop()
+                return
+            timer = threading.Timer(self.readiness_delay, stop_and_finish)
+            timer.name = "GracefulShutdown"
+            timer.daemon = True
+            timer.start()
+
+        signal.signal(signal.SIGTERM, handler)
+        return True
+
+
+def flush_spans(timeout):
+    """Shutdown hook: exports the spans the batch processor still holds"""
+
+    from opentelemetry import trace
+    force_flush = getattr(trace.get_tracer_provider(), "force_flush", None) #the proxy provider when tracing is off
+    if force_flush is not None:
+        force_flush(int(timeout * 1000))
+
+
+def setup_shutdown(app, shutdown):
+    """Counts the requests in flight that the shutdown drains"""
+
+    app.extensions["shutdown"] = shutdown
+
+    def started():
+        shutdown.request_started()
+        g.shutdown_counted = True
+
+    def finished(error=None):
+        if g.pop("shutdown_counted", False):
+            shutdown.request_finished()
+
+    app.before_request(started)
+    app.teardown_request(finished)
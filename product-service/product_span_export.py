@@ -0,0 +1,192 @@
+import gzip, logging, os, time
+import requests
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+from product_metrics import registry
+
+#orjson is already used by the JSON provider, json is the fallback
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    import json
+    _dumps = lambda value: json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+spans_exported_total = registry.counter("spans_exported_total", "Spans handed to the exporter, by result", ("exporter", "result"))
+spans_dropped_total = registry.counter("spans_dropped_total", "Spans lost before reaching the collector", ("reason",))
+span_export_duration_seconds = registry.histogram("span_export_duration_seconds", "Latency of one span batch export", ("exporter",),
+                                                  buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+
+_processors = []
+registry.function_gauge("span_export_queue_depth", "Spans waiting in the batch processor queue",
+                        lambda: sum(len(processor.queue) for processor in _processors))
+
+
+def _value(value):
+    #bool before int, bool is an int subclass
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes):
+    return [{"key": key, "value": _value(value)} for key, value in (attributes or {}).items()]
+
+
+def _span(span):
+    encoded = {
+        "traceId": format(span.context.trace_id, "032x"),
+        "spanId": format(span.context.span_id, "016x"),
+        "name": span.name,
+        "kind": span.kind.value + 1, #OTLP counts from SPAN_KIND_UNSPECIFIED = 0
+        "startTimeUnixNano": str(span.start_time),
+        "endTimeUnixNano": str(span.end_time),
+        "attributes": _attributes(span.attributes),
+        "status": {"code": span.status.status_code.value},
+    }
+    if span.parent is not None:
+        encoded["parentSpanId"] = format(span.parent.span_id, "016x")
+    if span.status.description:
+        encoded["status"]["message"] = span.status.description
+    if span.events:
+        encoded["events"] = [{"timeUnixNano": str(event.timestamp), "name": event.name, "attributes": _attributes(event.attributes)}
+                             for event in span.events]
+    return encoded
+
+
+def encode_spans(spans):
+    """OTLP/JSON ExportTraceServiceRequest, spans grouped by resource and instrumentation scope"""
+
+    resources = {}
+    for span in spans:
+        scopes = resources.setdefault(span.resource, {})
+        scope = span.instrumentation_scope
+        key = (scope.name, scope.version) if scope else ("", None)
+        scopes.setdefault(key, []).append(_span(span))
+
+    return {"resourceSpans": [
+        {"resource": {"attributes": _attributes(resource.attributes)},
+         "scopeSpans": [{"scope": {"name": name, "version": version or ""}, "spans": encoded}
+                        for (name, version), encoded in scopes.items()]}
+        for resource, scopes in resources.items()]}
+
+
+class OTLPJSONSpanExporter(SpanExporter):
+    """OTLP over HTTP with the JSON encoding, gzip compressed.
+
+    The protobuf OTLP exporters of this SDK version need protobuf < 5, which the
+    pinned protobuf excludes - the JSON encoding needs nothing but requests.
+    """
+
+    def __init__(self, endpoint, compression="gzip", timeout=10.0, headers=None):
+        self.endpoint = endpoint
+        self.compression = compression
+        self.timeout = timeout
+        self._session = requests.Session() #keep-alive between batches
+        self._session.headers.update({"Content-Type": "application/json"})
+        if compression == "gzip":
+            self._session.headers["Content-Encoding"] = "gzip"
+        self._session.headers.update(headers or {})
+        self._failing = False
+
+    def export(self, spans):
+        body = _dumps(encode_spans(spans))
+        if self.compression == "gzip":
+            body = gzip.compress(body, compresslevel=6)
+        try:
+            response = self._session.post(self.endpoint, data=body, timeout=self.timeout)
+            success = 200 <= response.status_code < 300
+            reason = f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            success, reason = False, str(e)
+
+        #One warning per outage, not one per batch
+        if not success and not self._failing:
+            logging.warning(f"Span export to {self.endpoint} failed: {reason}")
+        elif success and self._failing:
+            logging.info(f"Span export to {self.endpoint} recovered")
+        self._failing = not success
+        return SpanExportResult.SUCCESS if success else SpanExportResult.FAILURE
+
+    def shutdown(self):
+        self._session.close()
+
+
+class MeasuredSpanExporter(SpanExporter):
+    """Times every batch and counts exported and failed spans"""
+
+    def __init__(self, exporter, name):
+        self.exporter = exporter
+        self.name = name
+
+    def export(self, spans):
+        started = time.perf_counter()
+        try:
+            result = self.exporter.export(spans)
+        except Exception as e:
+            logging.warning(f"Span exporter {self.name} raised: {e}")
+            result = SpanExportResult.FAILURE
+
+        span_export_duration_seconds.observe(time.perf_counter() - started, labels=(self.name,))
+        ok = result == SpanExportResult.SUCCESS
+        spans_exported_total.inc(len(spans), labels=(self.name, "success" if ok else "failure"))
+        if not ok:
+            spans_dropped_total.inc(len(spans), labels=("export_failed",))
+        return result
+
+    def shutdown(self):
+        self.exporter.shutdown()
+
+    def force_flush(self, timeout_millis=30000):
+        return self.exporter.force_flush(timeout_millis)
+
+
+class MeasuredBatchSpanProcessor(BatchSpanProcessor):
+    """BatchSpanProcessor that counts the spans it drops when the queue is full.
+
+    Queue size, batch size, flush interval and export timeout come from the
+    standard OTEL_BSP_* variables when not given.
+    """
+
+    def __init__(self, span_exporter, **options):
+        super().__init__(span_exporter, **options)
+        _processors.append(self)
+
+    def on_end(self, span):
+        #The deque drops its oldest span silently once full
+        if not self.done and span.context.trace_flags.sampled and len(self.queue) >= self.max_queue_size:
+            spans_dropped_total.inc(labels=("queue_full",))
+        super().on_end(span)
+
+    def shutdown(self):
+        super().shutdown()
+        if self in _processors:
+            _processors.remove(self)
+
+
+def span_exporter_from_env():
+    """OTEL_TRACES_EXPORTER=otlp (OTLP/HTTP JSON) or jaeger (Thrift over UDP, the default)"""
+
+    exporter = os.environ.get("OTEL_TRACES_EXPORTER", "jaeger").lower()
+    if exporter == "otlp":
+        endpoint = os.environ.get("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT") or \
+            os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "http://jaeger.monitoring.svc.cluster.local:4318").rstrip("/") + "/v1/traces"
+        return "otlp", OTLPJSONSpanExporter(endpoint,
+                                            compression=os.environ.get("OTEL_EXPORTER_OTLP_COMPRESSION", "gzip").lower(),
+                                            timeout=float(os.environ.get("OTEL_EXPORTER_OTLP_TIMEOUT", "10000")) / 1000)
+
+    from opentelemetry.exporter.jaeger.thrift import JaegerExporter
+    return "jaeger", JaegerExporter(
+        agent_host_name=os.environ.get('JAEGER_AGENT_HOST', 'jaeger.monitoring.svc.cluster.local'),
+        agent_port=int(os.environ.get('JAEGER_AGENT_PORT', '6831')),
+    )
+
+
+def batch_processor_from_env():
+    name, exporter = span_exporter_from_env()
+    return MeasuredBatchSpanProcessor(MeasuredSpanExporter(exporter, name))
@@ -0,0 +1,103 @@
+import contextlib, logging, random, threading, time
+from product_metrics import registry
+
+startup_attempts_total = registry.counter("startup_attempts_total", "Attempts of startup phases that retry, by result", ("phase", "result"))
+
+_gates = []
+registry.function_gauge("startup_phase_duration_seconds", "Wall time of each startup phase, total is process import to ready",
+                        lambda: {(name,): seconds for gate in _gates for name, seconds in gate.phases.items()}, ("phase",))
+registry.function_gauge("service_ready", "1 once every startup phase passed - readiness is held false until then",
+                        lambda: max((int(gate.ready.is_set()) for gate in _gates), default=0))
+
+
+def backoff_delays(initial, maximum, multiplier=2.0):
+    """Exponential backoff with full jitter: uniform(0, min(maximum, initial * multiplier ** n)).
+
+    The jitter keeps pods restarted together from retrying the database in lockstep.
+    """
+
+    ceiling = initial
+    while True:
+        yield random.uniform(0, ceiling) # nosec - jitter, not security
+        ceiling = min(maximum, ceiling * multiplier)
+
+
+def retry_with_backoff(attempt_fn, deadline, initial=0.1, maximum=5.0, phase="startup", sleep=time.sleep):
+    """Calls attempt_fn(attempt) until it returns without raising or `deadline` seconds have passed.
+
+    Returns the number of attempts it took, 0 when the deadline ran out.
+    """
+
+    give_up_at = time.monotonic() + deadline
+    attempt = 0
+    for delay in backoff_delays(initial, maximum):
+        attempt += 1
+        try:
+            attempt_fn(attempt)
+            startup_attempts_total.inc(labels=(phase, "success"))
+            return attempt
+        except Exception as e:
+            startup_attempts_total.inc(labels=(phase, "failure"))
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                logging.error(f"{phase}: attempt {attempt} failed, deadline of {deadline:g}s reached: {e}")
+                return 0
+            delay = min(delay, remaining)
+            logging.warning(f"{phase}: attempt {attempt} failed, retrying in {delay:.2f}s: {e}")
+            sleep(delay)
+
+
+class StartupGate:
+    """Runs the startup phases on a background thread while the HTTP server is already listening.
+
+    Readiness answers "starting" until every phase has passed. A phase is a
+    (name, fn) pair, fn returning False fails the startup and calls on_failure.
+    Phases run inside context(), create_app sets it to the Flask app context.
+    """
+
+    def __init__(self):
+        self.created = time.monotonic()
+        self.phases = {}
+        self.ready = threading.Event()
+        self.failed_phase = None
+        self._thread = None
+        self.context = contextlib.nullcontext
+        _gates.append(self)
+
+    def status(self):
+        if self.ready.is_set():
+            return "ready"
+        return "failed" if self.failed_phase else "starting"
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - started, 6)
+
+    def run(self, steps, on_failure=None):
+        with self.context():
+            return self._run(steps, on_failure)
+
+    def _run(self, steps, on_failure):
+        for name, step in steps:
+            with self.phase(name):
+                result = step()
+            if result is False:
+                self.failed_phase = name
+                logging.error(f"Startup failed in phase {name} after {time.monotonic() - self.created:.2f}s")
+                if on_failure:
+                    on_failure(name)
+                return False
+        self.phases["total"] = round(time.monotonic() - self.created, 6)
+        self.ready.set()
+        logging.info(f"Service ready after {self.phases['total']:.2f}s", extra={"phases": dict(self.phases)})
+        return True
+
+    def start(self, steps, on_failure=None):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, args=(steps, on_failure), name="StartupGate", daemon=True)
+            self._thread.start()
+        return self
@@ -1,8 +1,29 @@
 import re
 
+#NumPy is imported by the first batch validation, it is a fifth of the import time of a worker otherwise
+_NOT_LOADED = object()
+np = _NOT_LOADED
+
+def load_numpy():
+    """NumPy, or None when it is not installed - optional, batch validation falls back to plain lists without it"""
+
+    global np
+    if np is _NOT_LOADED:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
+
 class ProductValidator:
     #REGEX for simpler product name validation
     PRODUCT_REGEX = r'^[a-zA-Z0-9\s\-\'\.\,\(\)]+$'
+    PRODUCT_PATTERN = re.compile(PRODUCT_REGEX) #compiled once at import
+
+    #Translation table that deletes every dangerous character in a single pass
+    SANITIZE_TABLE = str.maketrans('', '', '<>"\';/\\=')
+    DANGEROUS_BYTES = b'<>"\';/\\='
 
     #quantity configuration
     MIN_QUANTITY = 0
@@ -29,7 +50,7 @@ class ProductValidator:
             return False, "Product name too long (max 254 characters)"
 
         #validating product name format with REGEX
-        if not re.match(ProductValidator.PRODUCT_REGEX, product_to_validate):
+        if not ProductValidator.PRODUCT_PATTERN.match(product_to_validate):
             return False, "Invalid product name format.Only letters, numbers, spaces, and - ' . , ( ) are allowed"
         
         return True, product_to_validate.lower()
@@ -103,11 +124,9 @@ class ProductValidator:
         if not isinstance(text, str):
             return text
         
-        dangerous_characters = ['<', '>', '"', "'", ';', '/', '\\','='] 
-        for char in dangerous_characters:
-            text = text.replace(char, '')
-        
-        return text.strip()
+        if text.isascii(): #bytes.translate deletes in C without a per character dict lookup
+            return text.encode('ascii').translate(None, ProductValidator.DANGEROUS_BYTES).decode('ascii').strip()
+        return text.translate(ProductValidator.SANITIZE_TABLE).strip()
     
 
     @staticmethod
@@ -160,4 +179,146 @@ class ProductValidator:
             "price": price_result,  
             "quantity": quantity_result,  
             "description": sanitized_description
-        }
\ No newline at end of file
+        }
+
+
+    @staticmethod
+    def _coerce_price_column(prices):
+        """Converts a price column to floats, None marks values that are not numbers"""
+
+        if np is not None and isinstance(prices, np.ndarray) and prices.dtype.kind in "iuf":
+            return prices.astype(float), None #numeric arrays skip per item coercion
+
+        coerced = []
+        for price in prices:
+            try:
+                coerced.append(float(price.strip()) if isinstance(price, str) else float(price))
+            except (ValueError, TypeError):
+                coerced.append(None)
+        return coerced, [value is None for value in coerced]
+
+    @staticmethod
+    def _coerce_quantity_column(quantities):
+        """Converts a quantity column to ints, None marks values that are not integers"""
+
+        if np is not None and isinstance(quantities, np.ndarray) and quantities.dtype.kind in "iu":
+            return quantities.astype(np.int64), None
+
+        coerced = []
+        for quantity in quantities:
+            try:
+                if quantity is None or quantity == "":
+                    coerced.append(0)
+                elif isinstance(quantity, float): #same rule as validate_product_quantity
+                    coerced.append(None)
+                elif isinstance(quantity, str):
+                    coerced.append(int(quantity.strip()))
+                else:
+                    coerced.append(int(quantity))
+            except (ValueError, TypeError):
+                coerced.append(None)
+        return coerced, [value is None for value in coerced]
+
+    @staticmethod
+    def _out_of_range(values, invalid, minimum, maximum):
+        """Range check over a whole column, vectorized when NumPy is available"""
+
+        if np is not None:
+            if invalid is None:
+                array = values
+                invalid_array = np.zeros(len(values), dtype=bool)
+            else:
+                invalid_array = np.asarray(invalid, dtype=bool)
+                array = np.asarray([minimum if value is None else value for value in values], dtype=float)
+            return ((array < minimum) | (array > maximum)) & ~invalid_array
+
+        return [value is not None and (value < minimum or value > maximum) for value in values]
+
+    @staticmethod
+    def validate_batch(names, prices, quantities=None, descriptions=None):
+        """Column oriented validation of many products at once.
+
+        Takes lists or NumPy arrays with one entry per row and returns
+        (error_mask, errors, columns): error_mask[i] is True when row i is invalid,
+        errors[i] holds the same message validate_registration_object would return
+        and columns holds the sanitized product_name/price/quantity/description lists.
+        """
+
+        load_numpy()
+        size = len(names)
+        if quantities is None:
+            quantities = [0] * size
+        if descriptions is None:
+            descriptions = [""] * size
+        if not (len(prices) == len(quantities) == len(descriptions) == size):
+            raise ValueError("all columns must have the same length")
+
+        errors = [None] * size
+        product_match = ProductValidator.PRODUCT_PATTERN.match
+
+        #Name column - regex and length must run per item, the errors follow validate_product
+        clean_names = [None] * size
+        for index, name in enumerate(names):
+            if name is None:
+                errors[index] = "missing required field: name"
+                continue
+            if prices[index] is None:
+                errors[index] = "missing required field: price"
+                continue
+            if not isinstance(name, str):
+                errors[index] = "missing required field: Product name must be a valid string"
+                continue
+            stripped = name.strip()
+            if len(stripped) == 0:
+                errors[index] = "missing required field: Product name cannot be empty"
+            elif len(stripped) > 254:
+                errors[index] = "missing required field: Product name too long (max 254 characters)"
+            elif not product_match(stripped):
+                errors[index] = "missing required field: Invalid product name format.Only letters, numbers, spaces, and - ' . , ( ) are allowed"
+            else:
+                clean_names[index] = ProductValidator.sanitize_input(name).strip().lower()
+
+        #Price column
+        price_values, price_invalid = ProductValidator._coerce_price_column(prices)
+        price_range = ProductValidator._out_of_range(price_values, price_invalid, ProductValidator.MIN_PRICE, ProductValidator.MAX_PRICE)
+        for index in range(size):
+            if errors[index] is not None:
+                continue
+            if (price_invalid is not None and price_invalid[index]) or price_range[index]:
+                errors[index] = "price does not meet requirements"
+
+        #Quantity column
+        quantity_values, quantity_invalid = ProductValidator._coerce_quantity_column(quantities)
+        quantity_range = ProductValidator._out_of_range(quantity_values, quantity_invalid, ProductValidator.MIN_QUANTITY, ProductValidator.MAX_QUANTITY)
+        for index in range(size):
+            if errors[index] is not None:
+                continue
+            if quantity_invalid is not None and quantity_invalid[index]:
+                errors[index] = "Invalid quantity: Quantity must be a valid integer"
+            elif quantity_range[index]:
+                if quantity_values[index] < ProductValidator.MIN_QUANTITY:
+                    errors[index] = f"Invalid quantity: Quantity must be at least {ProductValidator.MIN_QUANTITY}"
+                else:
+                    errors[index] = f"Invalid quantity: Quantity must be lower than {ProductValidator.MAX_QUANTITY}"
+
+        #Description column
+        clean_descriptions = [None] * size
+        for index, description in enumerate(descriptions):
+            if errors[index] is not None:
+                continue
+            if description and not isinstance(description, str):
+                errors[index] = "Description must be a string"
+            else:
+                clean_descriptions[index] = ProductValidator.sanitize_input(description or "").strip().lower()
+
+        error_mask = [error is not None for error in errors]
+        columns = {
+            "product_name": clean_names,
+            "price": [None if error_mask[i] else round(float(price_values[i]), 2) for i in range(size)],
+            "quantity": [None if error_mask[i] else int(quantity_values[i]) for i in range(size)],
+            "description": clean_descriptions,
+        }
+        if np is not None:
+            error_mask = np.asarray(error_mask, dtype=bool)
+
+        return error_mask, errors, columns
@@ -0,0 +1,71 @@
+#Benchmark: cold start of a worker - import, create_app and first request in a fresh interpreter, with and without tracing instrumentation
+import os, statistics, subprocess, sys
+
+SERVICE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service'))
+RUNS = int(os.environ.get("BENCH_COLD_RUNS", "5"))
+TOP = int(os.environ.get("BENCH_IMPORTTIME_TOP", "10"))
+
+#Prints import, create_app and first request times in ms
+WORKER = """
+import time
+started = time.perf_counter()
+import product_app
+imported = time.perf_counter()
+app = product_app.create_app({config})
+created = time.perf_counter()
+app.test_client().get("/metrics")
+served = time.perf_counter()
+print((imported - started) * 1000, (created - imported) * 1000, (served - created) * 1000, (served - started) * 1000)
+"""
+
+SCENARIOS = (
+    #What every import paid before create_app: SDK, exporter and all four instrumentors
+    ("tracing, 4 instrumentors", {}, {}),
+    ("tracing, flask only", {}, {"INSTRUMENTATIONS": ("flask",)}),
+    ("tracing off", {"OTEL_SDK_DISABLED": "true"}, {}),
+)
+
+
+def run_worker(env, config, importtime=False):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", WORKER.format(config=repr(config))]
+    result = subprocess.run(command, cwd=SERVICE_DIR, env=dict(os.environ, **env), capture_output=True, text=True, check=True)
+    return result.stdout.split("\n")[-2], result.stderr
+
+
+def cold_start(env, config):
+    timings = [[float(value) for value in run_worker(env, config)[0].split()] for _ in range(RUNS)]
+    return [statistics.median(column) for column in zip(*timings)]
+
+
+def importtime_breakdown(env, config):
+    #-X importtime lines: "import time: self | cumulative | module", top level modules are not indented
+    entries = []
+    for line in run_worker(env, config, importtime=True)[1].splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        if module.startswith("   ") or not module.strip(): #keep direct imports of the worker
+            continue
+        entries.append((int(cumulative) / 1000, module.strip()))
+    return sorted(entries, reverse=True)[:TOP]
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print(f"App factory cold start - median of {RUNS} fresh interpreters")
+    print("=" * 50)
+    print(f"{'scenario':26s} {'import':>8s} {'create':>8s} {'1st req':>8s} {'total':>8s} ms")
+
+    totals = {}
+    for label, env, config in SCENARIOS:
+        imported, created, served, total = cold_start(env, config)
+        totals[label] = total
+        print(f"{label:26s} {imported:8.1f} {created:8.1f} {served:8.1f} {total:8.1f}")
+
+    print("=" * 50)
+    print("Slowest imports with tracing and all instrumentors (ms, cumulative)")
+    for cumulative, module in importtime_breakdown({}, {}):
+        print(f"  {cumulative:8.1f}  {module}")
+    print("=" * 50)
+    print(f"speedup x{totals[SCENARIOS[0][0]] / totals['tracing off']:.2f} to first request without instrumentation, "
+          f"x{totals[SCENARIOS[0][0]] / totals['tracing, flask only']:.2f} with the flask instrumentor only")
@@ -0,0 +1,57 @@
+#Benchmark: payload size and encode/decode time of a large product listing in JSON vs MessagePack vs CBOR
+import os, sys, time
+from decimal import Decimal
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+
+from flask import Flask
+from product_json_provider import FastJSONProvider
+from product_content_negotiation import ENCODERS, DECODERS, CBOR_MIMETYPE
+
+ROWS = int(os.environ.get("BENCH_ROWS", "10000"))
+REPEAT = int(os.environ.get("BENCH_REPEAT", "5"))
+
+
+def build_listing(size):
+    return {"products": [{"id": index,
+                          "name": f"product {index}",
+                          "price": Decimal("19.90") + index,
+                          "quantity": index % 100,
+                          "description": "imported from legacy catalog",
+                          "created_at": datetime(2025, 1, 1, 12, 0, 0),
+                          "created_by": 333} for index in range(size)]}
+
+
+def best_of(function):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    listing = build_listing(ROWS)
+    json_provider = FastJSONProvider(Flask("bench"))
+
+    formats = {"application/json": (lambda obj: json_provider.dumps(obj).encode("utf-8"), json_provider.loads)}
+    for mimetype in ("application/msgpack", CBOR_MIMETYPE):
+        if mimetype in ENCODERS:
+            formats[mimetype] = (ENCODERS[mimetype], DECODERS[mimetype])
+        else:
+            print(f"{mimetype} library not installed - skipped")
+
+    print("=" * 50)
+    print(f"Response format benchmark - {ROWS} products, best of {REPEAT}")
+    print("=" * 50)
+
+    json_size = None
+    for mimetype, (encode, decode) in formats.items():
+        payload = encode(listing)
+        encode_time = best_of(lambda: encode(listing))
+        decode_time = best_of(lambda: decode(payload))
+        json_size = json_size or len(payload)
+        print(f"{mimetype:22s} size {len(payload) / 1024:8.1f} KiB ({len(payload) / json_size * 100:5.1f}% of JSON)"
+              f"  encode {encode_time * 1000:7.1f} ms  decode {decode_time * 1000:7.1f} ms")
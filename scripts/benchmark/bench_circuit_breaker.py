@@ -0,0 +1,59 @@
+#Benchmark: GET /products while MySQL is down - every request waiting out the connect timeout vs the circuit breaker failing fast
+import logging, os, sys, time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("RATE_LIMITS", "ip=1000000/1,user=1000000/1,auth=1000000/1") #one client sending everything, not what is measured
+
+from unittest.mock import patch
+import jwt, pymysql
+import product_app
+from product_circuit_breaker import db_breaker
+
+CONNECT_TIMEOUT = float(os.environ.get("BENCH_CONNECT_TIMEOUT_MS", "200")) / 1000 #stands in for DB_CONNECT_TIMEOUT, shortened so the run stays short
+REQUESTS = int(os.environ.get("BENCH_REQUESTS", "200"))
+THREADS = int(os.environ.get("BENCH_THREADS", "4")) #GUNICORN_THREADS
+
+app = product_app.create_app({"STRUCTURED_LOGGING": False, "SECRET_KEY": "bench-secret-key-of-at-least-32-bytes", "MYSQL_PORT": "3306"})
+token = jwt.encode({"user_id": 1, "email": "bench@example.com"}, app.config["SECRET_KEY"], algorithm="HS256")
+logging.disable(logging.CRITICAL) #one error line per failed connect otherwise
+
+
+def unreachable(**options):
+    #What a connect to a host that does not answer does: nothing until the timeout
+    time.sleep(CONNECT_TIMEOUT)
+    raise pymysql.err.OperationalError(2003, "Can't connect to MySQL server (timed out)")
+
+
+def run(label, failure_threshold):
+    db_breaker.failure_threshold = failure_threshold
+    db_breaker.record_success()
+    client = app.test_client()
+
+    def request(_):
+        started = time.perf_counter()
+        response = client.get("/products", headers={"Authorization": f"Bearer {token}"})
+        return time.perf_counter() - started, response.status_code
+
+    with patch.object(product_app.pymysql, "connect", unreachable), ThreadPoolExecutor(THREADS) as pool:
+        started = time.perf_counter()
+        results = list(pool.map(request, range(REQUESTS)))
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    fast = sum(1 for _, status in results if status == 503)
+    print(f"{label:18s} {REQUESTS / elapsed:8.0f} req/s  p50 {latencies[len(latencies) // 2] * 1000:7.1f} ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.1f} ms  {fast} answered 503 by the breaker")
+    return elapsed
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print(f"MySQL down - {REQUESTS} requests on {THREADS} threads, connect timeout {CONNECT_TIMEOUT * 1000:.0f} ms")
+    print("=" * 50)
+    without = run("no breaker", 10 ** 9)
+    with_breaker = run("circuit breaker", 5)
+    db_breaker.failure_threshold = 5
+    print(f"speedup x{without / with_breaker:.1f} to get through the same requests, threads freed for /health and other routes")
@@ -0,0 +1,68 @@
+#Benchmark: GET /profile latency during a login flood on one worker's threads - no limits vs the auth route class limit
+import logging, os, sys, time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../user-service')))
+
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("RATE_LIMITS", "ip=1000000/1,user=1000000/1,auth=1000000/1") #one client sending everything, not what is measured
+
+from unittest.mock import MagicMock, patch
+import jwt
+import app as user_app
+
+HASH_TIME = float(os.environ.get("BENCH_HASH_MS", "100")) / 1000 #one password verify, slept so the CPU count of the machine does not matter
+LOGINS = int(os.environ.get("BENCH_LOGINS", "200"))
+PROFILES = int(os.environ.get("BENCH_PROFILES", "200"))
+THREADS = int(os.environ.get("BENCH_THREADS", "4")) #GUNICORN_THREADS, requests past them wait in gunicorn's queue
+
+app = user_app.create_app({"STRUCTURED_LOGGING": False, "SECRET_KEY": "bench-secret-key-of-at-least-32-bytes", "MYSQL_PORT": "3306"})
+token = jwt.encode({"user_id": 1, "email": "bench@example.com"}, app.config["SECRET_KEY"], algorithm="HS256")
+logging.disable(logging.CRITICAL)
+
+
+def slow_verify(stored, password):
+    time.sleep(HASH_TIME)
+    return True
+
+
+def connection():
+    connection = MagicMock()
+    connection.cursor.return_value.__enter__.return_value.fetchone.return_value = {"id": 1, "email": "bench@example.com", "password": "hash"}
+    return connection
+
+
+def run(label, auth_limit):
+    limits = app.extensions["concurrency_limits"]
+    auth = limits.classes["auth"]
+    auth.maximum = auth.limit = auth_limit
+    client = app.test_client()
+
+    def request(kind, submitted):
+        if kind == "login":
+            response = client.post("/login", json={"email": "bench@example.com", "password": "Bench@1234"})
+        else:
+            response = client.get("/profile", headers={"Authorization": f"Bearer {token}"})
+        return kind, time.perf_counter() - submitted, response.status_code #queue wait in the pool included, like behind gunicorn
+
+    #a burst of logins with profile reads arriving in the middle of it
+    kinds = ["login"] * (LOGINS // 2) + ["profile", "login"] * min(PROFILES, LOGINS // 2) + ["profile"] * max(PROFILES - LOGINS // 2, 0)
+    with patch.object(user_app, "verify_password", slow_verify), patch.object(user_app, "get_db_connection", connection), ThreadPoolExecutor(THREADS) as pool:
+        started = time.perf_counter()
+        results = [future.result() for future in [pool.submit(request, kind, time.perf_counter()) for kind in kinds]]
+        elapsed = time.perf_counter() - started
+
+    profiles = sorted(latency for kind, latency, _ in results if kind == "profile")
+    shed = sum(1 for kind, _, status in results if kind == "login" and status == 503)
+    print(f"{label:22s} profile p50 {profiles[len(profiles) // 2] * 1000:7.1f} ms  p99 {profiles[int(len(profiles) * 0.99)] * 1000:7.1f} ms  "
+          f"{shed} logins shed, done in {elapsed:.1f}s")
+    return profiles[int(len(profiles) * 0.99)]
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print(f"Login flood - {LOGINS} logins ({HASH_TIME * 1000:.0f} ms verify) and {PROFILES} profile reads on {THREADS} threads")
+    print("=" * 50)
+    unlimited = run("no auth limit", THREADS * 1000)
+    limited = run("auth limit 2", 2)
+    print(f"speedup x{unlimited / limited:.1f} on profile p99, shed logins answered 503 with Retry-After at once")
@@ -0,0 +1,57 @@
+#Benchmark: GET /products on a slow database with callers that give up after 300 ms - threads held to the end of the SELECT vs abandoned at the deadline
+import asyncio, logging, os, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../loadtest')))
+
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("RATE_LIMITS", "ip=1000000/1,user=1000000/1") #one client sending everything, not what is measured
+
+import jwt
+import product_app
+from fake_mysql import FakeMySQL
+
+STATEMENT_TIME = float(os.environ.get("BENCH_STATEMENT_MS", "1000")) / 1000 #every statement of the fake MySQL, a database in trouble
+CALLER_TIMEOUT_MS = int(os.environ.get("BENCH_CALLER_TIMEOUT_MS", "300"))
+REQUESTS = int(os.environ.get("BENCH_REQUESTS", "40"))
+THREADS = int(os.environ.get("BENCH_THREADS", "4")) #GUNICORN_THREADS
+PORT = int(os.environ.get("BENCH_MYSQL_PORT", "3397"))
+
+SECRET_KEY = "bench-secret-key-of-at-least-32-bytes"
+app = product_app.create_app({"STRUCTURED_LOGGING": False, "SECRET_KEY": SECRET_KEY, "MYSQL_HOST": "127.0.0.1", "MYSQL_PORT": str(PORT),
+                              "MYSQL_USER": "bench", "MYSQL_PASSWORD": "bench", "MYSQL_DB": "products"})
+token = jwt.encode({"user_id": 1, "email": "bench@example.com"}, SECRET_KEY, algorithm="HS256")
+logging.disable(logging.CRITICAL) #one slow query warning per statement otherwise
+
+
+def run(label, headers):
+    client = app.test_client()
+
+    def request(_):
+        started = time.perf_counter()
+        response = client.get("/products", headers={"Authorization": f"Bearer {token}", **headers})
+        return time.perf_counter() - started, response.status_code
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        started = time.perf_counter()
+        results = list(pool.map(request, range(REQUESTS)))
+        elapsed = time.perf_counter() - started
+
+    held = sum(latency for latency, _ in results) / len(results)
+    timed_out = sum(1 for _, status in results if status == 504)
+    print(f"{label:22s} thread held {held * 1000:7.1f} ms per request  {REQUESTS / elapsed:6.1f} req/s  {timed_out} answered 504")
+    return held
+
+
+if __name__ == "__main__":
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(FakeMySQL(STATEMENT_TIME).serve("127.0.0.1", PORT), loop).result()
+
+    print("=" * 50)
+    print(f"Slow MySQL ({STATEMENT_TIME * 1000:.0f} ms per statement) - {REQUESTS} requests on {THREADS} threads, callers wait {CALLER_TIMEOUT_MS} ms")
+    print("=" * 50)
+    without = run("no deadline header", {})
+    with_deadline = run("X-Request-Timeout-Ms", {"X-Request-Timeout-Ms": str(CALLER_TIMEOUT_MS)})
+    print(f"speedup x{without / with_deadline:.1f} in thread time per request, work nobody waits for is abandoned")
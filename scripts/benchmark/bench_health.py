@@ -0,0 +1,48 @@
+#Benchmark: /health/detailed latency when every probe connects to MySQL vs answering from the health monitor snapshot
+import os, sys, time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from unittest.mock import MagicMock, patch
+import product_app
+
+app = product_app.create_app()
+product_app.startup.ready.set() #what the startup thread does once the database checks passed
+
+PROBES = int(os.environ.get("BENCH_PROBES", "200"))
+CONNECT_LATENCY = float(os.environ.get("BENCH_CONNECT_MS", "20")) / 1000 #TCP + auth handshake with a busy MySQL
+
+
+def slow_connection(**options):
+    time.sleep(CONNECT_LATENCY)
+    return MagicMock()
+
+
+def probe_per_request(client):
+    #What /health/detailed did before the monitor: a connection and a query per probe
+    product_app.health_monitor.run_checks()
+    return client.get("/health/detailed")
+
+
+def run(label, probe):
+    client = app.test_client()
+    start = time.perf_counter()
+    for _ in range(PROBES):
+        assert probe(client).status_code == 200
+    elapsed = time.perf_counter() - start
+    print(f"{label:22s} {elapsed / PROBES * 1e6:9.1f} us/probe")
+    return elapsed
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print(f"Health probe benchmark - {PROBES} probes, {CONNECT_LATENCY * 1000:.0f} ms to connect")
+    print("=" * 50)
+
+    with patch.object(product_app, "get_db_connection", slow_connection):
+        direct_time = run("connect per probe", probe_per_request)
+        product_app.health_monitor.run_checks()
+        cached_time = run("monitor snapshot", lambda client: client.get("/health/detailed"))
+    print(f"speedup x{direct_time / cached_time:.0f}")
@@ -0,0 +1,70 @@
+#Benchmark: large GET /products listing - Flask default jsonify (+ Decimal conversion loop) vs FastJSONProvider
+import os, sys, time, tracemalloc
+from decimal import Decimal
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from product_json_provider import FastJSONProvider, orjson
+
+ROWS = int(os.environ.get("BENCH_ROWS", "10000"))
+REPEAT = int(os.environ.get("BENCH_REPEAT", "5"))
+
+
+def build_products(size):
+    return [{"id": index,
+             "name": f"product {index}",
+             "price": Decimal("19.90") + index,
+             "quantity": index % 100,
+             "description": "imported from legacy catalog",
+             "created_at": datetime(2025, 1, 1, 12, 0, 0),
+             "created_by": 333} for index in range(size)]
+
+
+def legacy_listing(app, products):
+    #What get_products did before: convert every Decimal by hand, then the default provider
+    for product in products:
+        if 'price' in product and product['price'] is not None:
+            product['price'] = float(product['price'])
+    return app.json.response({"products": products}).get_data()
+
+
+def fast_listing(app, products):
+    return app.json.response({"products": products}).get_data()
+
+
+def measure(label, app, listing):
+    timings = []
+    with app.app_context():
+        for _ in range(REPEAT):
+            products = build_products(ROWS) #fresh rows each time, the legacy loop mutates them
+            start = time.perf_counter()
+            body = listing(app, products)
+            timings.append(time.perf_counter() - start)
+
+        products = build_products(ROWS)
+        tracemalloc.start()
+        listing(app, products)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    best = min(timings)
+    print(f"{label:34s} {best * 1000:8.1f} ms  {ROWS / best:12,.0f} rows/s  peak alloc {peak / 1024 / 1024:7.2f} MiB  body {len(body) / 1024:8.1f} KiB")
+    return best
+
+
+if __name__ == "__main__":
+    default_app = Flask("default")
+    default_app.json = DefaultJSONProvider(default_app)
+    fast_app = Flask("fast")
+    fast_app.json = FastJSONProvider(fast_app)
+
+    print("=" * 50)
+    print(f"JSON provider benchmark - {ROWS} products, best of {REPEAT}, orjson: {'yes' if orjson else 'no (stdlib fallback)'}")
+    print("=" * 50)
+
+    legacy_time = measure("default jsonify + Decimal loop", default_app, legacy_listing)
+    fast_time = measure("FastJSONProvider", fast_app, fast_listing)
+    print(f"speedup x{legacy_time / fast_time:.2f}")
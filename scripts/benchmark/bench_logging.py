@@ -0,0 +1,82 @@
+#Benchmark: time a request thread spends in one log call - synchronous template formatting vs the queued JSON handler
+import io, logging, os, sys, time
+from logging.handlers import QueueListener
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+
+from product_structured_logging import AsyncLogHandler, JSONFormatter, LogAggregationFilter, LogContextFilter, LogSamplingFilter
+
+CALLS = int(os.environ.get("BENCH_LOG_CALLS", "20000"))
+SINK_LATENCY = float(os.environ.get("BENCH_SINK_LATENCY_US", "50")) / 1e6
+
+TEMPLATE = '{"timestamp": "%(asctime)s", "level": "%(levelname)s", "service": "product-service", "message": "%(message)s"}'
+
+
+class SlowSink(io.StringIO):
+    #stderr of a container whose log pipe is read slower than it is written
+    def write(self, text):
+        time.sleep(SINK_LATENCY)
+        return super().write(text)
+
+
+def run(label, handler, extra):
+    logger = logging.getLogger(f"bench.{label}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+
+    start = time.perf_counter()
+    for index in range(CALLS):
+        logger.info("Products retrieved:%s", index, extra=extra)
+    elapsed = time.perf_counter() - start
+    print(f"{label:28s} {elapsed / CALLS * 1e6:7.2f} us/call on the request thread")
+    return elapsed
+
+
+def queued(stream, max_size=CALLS, rate_limits=None):
+    writer = logging.StreamHandler(stream)
+    writer.setFormatter(JSONFormatter("product-service"))
+    handler = AsyncLogHandler(max_size=max_size)
+    handler.addFilter(LogSamplingFilter())
+    handler.addFilter(LogAggregationFilter(handler, rate_limits or {}))
+    handler.addFilter(LogContextFilter())
+    listener = QueueListener(handler.queue, writer)
+    listener.start()
+    return handler, listener
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print(f"Logging benchmark - {CALLS} calls, slow sink {SINK_LATENCY * 1e6:.0f} us/write")
+    print("=" * 50)
+
+    for sink in ("memory", "slow sink"):
+        make_stream = io.StringIO if sink == "memory" else SlowSink
+
+        sync_handler = logging.StreamHandler(make_stream())
+        sync_handler.setFormatter(logging.Formatter(TEMPLATE))
+        sync_time = run(f"{sink}: sync template", sync_handler, {"user_id": 1})
+
+        handler, listener = queued(make_stream())
+        async_time = run(f"{sink}: queued JSON", handler, {"user_id": 1})
+        listener.stop()
+
+        handler, listener = queued(make_stream())
+        sampled_time = run(f"{sink}: queued JSON 10% kept", handler, {"user_id": 1, "log_sample": 0.1})
+        listener.stop()
+        print(f"{sink}: speedup x{sync_time / async_time:.2f} (x{sync_time / sampled_time:.2f} sampled)")
+
+    #Credential stuffing: every failed login logs a warning, sampling never drops warnings
+    for label, limits in (("auth flood", None), ("auth flood, auth=5/10", {"bench": (5, 10)})):
+        stream = SlowSink()
+        handler, listener = queued(stream, rate_limits=limits)
+        logger = logging.getLogger("bench.auth")
+        logger.handlers = []
+        logger.propagate = False
+        logger.addHandler(handler)
+        start = time.perf_counter()
+        for index in range(CALLS):
+            logger.warning("Login failed - invalid credentials", extra={"email": f"victim{index}@example.com"})
+        elapsed = time.perf_counter() - start
+        listener.stop()
+        print(f"{label:28s} {elapsed / CALLS * 1e6:7.2f} us/call  {stream.getvalue().count(chr(10)):6d} lines written")
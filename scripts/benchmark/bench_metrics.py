@@ -0,0 +1,58 @@
+#Benchmark: cost of one request worth of metric updates - per-thread shards vs a single shared lock
+import os, sys, threading, time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+
+from product_metrics import MetricsRegistry
+
+THREADS = int(os.environ.get("BENCH_THREADS", "8"))
+UPDATES = int(os.environ.get("BENCH_UPDATES", "100000"))
+
+
+class LockedCounter:
+    #What a naive registry does: one dict behind one lock shared by every request thread
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+def run(label, counter):
+    labels = ("GET", "/products", "200")
+
+    def work():
+        for _ in range(UPDATES):
+            counter.inc(labels=labels)
+
+    threads = [threading.Thread(target=work) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    total = THREADS * UPDATES
+    print(f"{label:24s} {elapsed * 1000:8.1f} ms  {elapsed / total * 1e9:7.1f} ns/update")
+    return elapsed
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print(f"Metrics update benchmark - {THREADS} threads x {UPDATES} updates")
+    print("=" * 50)
+
+    registry = MetricsRegistry()
+    sharded = registry.counter("bench_total", "bench", ("method", "route", "status"))
+    locked = LockedCounter()
+
+    locked_time = run("shared lock", locked)
+    sharded_time = run("per-thread shards", sharded)
+    assert sharded.value(("GET", "/products", "200")) == THREADS * UPDATES
+
+    start = time.perf_counter()
+    registry.render()
+    print(f"render                   {(time.perf_counter() - start) * 1000:8.2f} ms")
+    print(f"speedup x{locked_time / sharded_time:.2f}")
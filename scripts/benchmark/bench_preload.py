@@ -0,0 +1,93 @@
+#Benchmark: memory of a pod running N gunicorn workers - app loaded per worker vs preloaded in the master, with and without gc.freeze
+import json, os, subprocess, sys, time, urllib.request
+
+SERVICE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../user-service'))
+sys.path.insert(0, SERVICE_DIR)
+
+from preload import memory_usage
+
+WORKERS = int(os.environ.get("BENCH_WORKERS", "4"))
+REQUESTS = int(os.environ.get("BENCH_REQUESTS", "4000")) #spread over the workers, enough for the collector to run in each
+PORT = int(os.environ.get("BENCH_PORT", "3911"))
+LIMIT = 512 * 1024 * 1024 #memory limit of the deployment
+
+SCENARIOS = (
+    ("import per worker", {"GUNICORN_PRELOAD": "false"}),
+    ("preload", {"GUNICORN_PRELOAD": "true", "GUNICORN_GC_FREEZE": "false"}),
+    ("preload + gc.freeze", {"GUNICORN_PRELOAD": "true", "GUNICORN_GC_FREEZE": "true"}),
+)
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as handle:
+        return [int(child) for child in handle.read().split()]
+
+
+def wait_for_workers(master):
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{PORT}/health", timeout=1).read()
+            if len(children(master.pid)) == WORKERS:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("gunicorn did not start")
+
+
+def traffic():
+    login = json.dumps({"email": "not-an-email", "password": "x"}).encode()
+    for index in range(REQUESTS):
+        if index % 2:
+            urllib.request.urlopen(f"http://127.0.0.1:{PORT}/metrics").read()
+        else:
+            request = urllib.request.Request(f"http://127.0.0.1:{PORT}/login", data=login, headers={"Content-Type": "application/json"})
+            try:
+                urllib.request.urlopen(request)
+            except urllib.error.HTTPError: #400 from the validators, no database needed
+                pass
+
+
+def measure(env):
+    env = dict(os.environ, WEB_CONCURRENCY=str(WORKERS), FLASK_RUN_PORT=str(PORT), FLASK_HOST="127.0.0.1",
+               DB_SETUP_DEADLINE="3600", MYSQL_HOST="127.0.0.1", MYSQL_PORT="1", OTEL_SDK_DISABLED="false", **env)
+    master = subprocess.Popen(["gunicorn", "-c", "gunicorn.conf.py"], cwd=SERVICE_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_workers(master)
+        traffic()
+        time.sleep(0.5)
+        pids = children(master.pid)
+        return memory_usage(master.pid), [memory_usage(pid) for pid in pids]
+    finally:
+        #No collector listens here, workers would retry their last span export on the way out
+        for pid in children(master.pid):
+            os.kill(pid, 9)
+        master.kill()
+        master.wait()
+
+
+def mib(value):
+    return value / 1024 / 1024
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print(f"Preload benchmark - {WORKERS} gthread workers, {REQUESTS} requests, tracing on")
+    print("=" * 50)
+    print(f"{'scenario':22s} {'worker USS':>10s} {'worker PSS':>10s} {'pod PSS':>9s} {'workers/512Mi':>14s}  (MiB)")
+
+    results = {}
+    for label, env in SCENARIOS:
+        master, workers = measure(env)
+        uss = sum(worker["uss"] for worker in workers) / len(workers)
+        pss = sum(worker["pss"] for worker in workers) / len(workers)
+        total = master["pss"] + sum(worker["pss"] for worker in workers)
+        #Each extra worker adds its unique pages, the shared ones are paid once
+        shared = total - uss * len(workers)
+        fits = int((LIMIT - shared) // uss)
+        results[label] = uss
+        print(f"{label:22s} {mib(uss):10.1f} {mib(pss):10.1f} {mib(total):9.1f} {fits:14d}")
+
+    print(f"unique memory per worker x{results['import per worker'] / results['preload + gc.freeze']:.1f} lower with preload + gc.freeze")
@@ -0,0 +1,67 @@
+#Benchmark: ProductValidator.validate_batch (column oriented) vs validate_registration_object (one dict at a time)
+import os, sys, time, random
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+
+from product_validator import ProductValidator, load_numpy
+
+np = load_numpy()
+
+ROWS = int(os.environ.get("BENCH_ROWS", "100000"))
+REPEAT = int(os.environ.get("BENCH_REPEAT", "3"))
+
+
+def build_rows(size):
+    random.seed(42)
+    rows = []
+    for index in range(size):
+        rows.append({
+            "name": f"Product {index} - model ({index % 97})",
+            "price": round(random.uniform(-10, 10010), 2), #some rows out of range on purpose
+            "quantity": random.randint(-5, 10005),
+            "description": "imported from legacy catalog"
+        })
+    return rows
+
+
+def best_of(function):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def per_item(rows):
+    return [ProductValidator.validate_registration_object(row) for row in rows]
+
+
+def batch_lists(names, prices, quantities, descriptions):
+    return ProductValidator.validate_batch(names, prices, quantities, descriptions)
+
+
+if __name__ == "__main__":
+    rows = build_rows(ROWS)
+    names = [row["name"] for row in rows]
+    prices = [row["price"] for row in rows]
+    quantities = [row["quantity"] for row in rows]
+    descriptions = [row["description"] for row in rows]
+
+    print("=" * 50)
+    print(f"Batch validation benchmark - rows: {ROWS}, best of {REPEAT}")
+    print("=" * 50)
+
+    results = {"per_item (validate_registration_object)": best_of(lambda: per_item(rows)),
+               "batch (lists)": best_of(lambda: batch_lists(names, prices, quantities, descriptions))}
+
+    if np is not None:
+        price_array = np.asarray(prices, dtype=float)
+        quantity_array = np.asarray(quantities, dtype=np.int64)
+        results["batch (numpy arrays)"] = best_of(lambda: batch_lists(names, price_array, quantity_array, descriptions))
+    else:
+        print("numpy not installed - skipping array input")
+
+    baseline = results["per_item (validate_registration_object)"]
+    for label, elapsed in results.items():
+        print(f"{label:42s} {elapsed * 1000:9.1f} ms  {ROWS / elapsed:12,.0f} rows/s  x{baseline / elapsed:.2f}")
@@ -0,0 +1,59 @@
+#Benchmark: cost of the rate limit checks - per bucket, per request, memory per client and the eviction sweep
+import os, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../user-service')))
+
+from rate_limit import LocalBuckets, RateLimiter, SharedBuckets
+
+CHECKS = int(os.environ.get("BENCH_CHECKS", "200000"))
+CLIENTS = int(os.environ.get("BENCH_CLIENTS", "100000"))
+REDIS_URL = os.environ.get("BENCH_REDIS_URL") #e.g. redis://localhost:6379/0, the shared backend is measured only when set
+
+POLICIES = {"ip": (300, 10.0), "user": (100, 10.0), "auth": (30, 60.0)}
+ROUTE_CLASSES = {"/health": None, "POST /login": "auth"}
+
+
+def per_call(function, count):
+    started = time.perf_counter()
+    for number in range(count):
+        function(number)
+    return (time.perf_counter() - started) / count
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print(f"Rate limit checks - {CHECKS} checks, {CLIENTS} distinct clients")
+    print("=" * 50)
+
+    limiter = RateLimiter(POLICIES, ROUTE_CLASSES, LocalBuckets())
+    ips = [f"10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}" for number in range(CLIENTS)]
+    same = per_call(lambda number: limiter.check("user", 1), CHECKS)
+    spread = per_call(lambda number: limiter.check("ip", ips[number % CLIENTS]), CHECKS)
+    request = per_call(lambda number: limiter.check_client("POST", "/login", None, ips[number % CLIENTS]), CHECKS)
+    bypass = per_call(lambda number: limiter.check_client("GET", "/health", None, "10.0.0.1"), CHECKS)
+    print(f"one bucket            {same * 1e6:6.2f} us per check")
+    print(f"{'%d buckets' % CLIENTS:21s} {spread * 1e6:6.2f} us per check")
+    print(f"POST /login (ip+auth) {request * 1e6:6.2f} us per request")
+    print(f"GET /health (bypass)  {bypass * 1e6:6.2f} us per request")
+
+    tracemalloc.start()
+    buckets = LocalBuckets()
+    before = tracemalloc.get_traced_memory()[0]
+    for ip in ips:
+        buckets.take(f"ip:{ip}", 1 / 30, 10.0)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"memory                {size / CLIENTS:6.0f} bytes per tracked client, key string included")
+
+    tracked = len(buckets)
+    buckets._next_eviction = 0
+    started = time.perf_counter()
+    buckets.take("ip:sweep", 1 / 30, 10.0)
+    print(f"eviction sweep        {(time.perf_counter() - started) * 1000:6.1f} ms over {tracked} clients, {len(buckets)} kept, once per RATE_LIMIT_EVICT_INTERVAL")
+
+    if REDIS_URL:
+        import redis
+        shared = RateLimiter(POLICIES, ROUTE_CLASSES, SharedBuckets(redis.Redis.from_url(REDIS_URL), LocalBuckets()))
+        remote = per_call(lambda number: shared.check("ip", ips[number % CLIENTS]), min(CHECKS, 20000))
+        print(f"shared (Redis)        {remote * 1e6:6.2f} us per check, one round trip")
+    print(f"per request overhead of the local buckets: {request * 1e6:.1f} us on /login, {spread * 1e6:.1f} us on other routes")
@@ -0,0 +1,48 @@
+#Benchmark: span export throughput to the stand-in OTLP collector - gzip vs plain JSON, and a slow collector with a bounded queue
+import os, sys, time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../loadtest')))
+
+os.environ.pop("OTEL_SDK_DISABLED", None)
+
+from opentelemetry.sdk.trace import TracerProvider
+from otlp_collector import start_collector
+from product_span_export import MeasuredBatchSpanProcessor, MeasuredSpanExporter, OTLPJSONSpanExporter, spans_dropped_total
+
+SPANS = int(os.environ.get("BENCH_SPANS", "20000"))
+
+
+def run(label, compression, delay=0.0, max_queue_size=8192):
+    server, stats = start_collector(delay=delay)
+    exporter = OTLPJSONSpanExporter(f"http://127.0.0.1:{server.server_address[1]}/v1/traces", compression=compression)
+    processor = MeasuredBatchSpanProcessor(MeasuredSpanExporter(exporter, label), max_queue_size=max_queue_size,
+                                           max_export_batch_size=512, schedule_delay_millis=200)
+    provider = TracerProvider()
+    provider.add_span_processor(processor)
+    tracer = provider.get_tracer(__name__)
+    dropped_before = spans_dropped_total.value(("queue_full",))
+
+    start = time.perf_counter()
+    for index in range(SPANS):
+        with tracer.start_as_current_span("GET /products", attributes={"http.route": "/products", "http.status_code": 200}) as span:
+            span.set_attribute("product.count", index % 50)
+    produced = time.perf_counter() - start
+    provider.shutdown() #flushes what is still queued
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    batches, spans, wire, raw, _ = stats.snapshot()
+    dropped = spans_dropped_total.value(("queue_full",)) - dropped_before
+    print(f"{label:18s} {SPANS / produced:8.0f} spans/s produced  {spans / elapsed:8.0f} spans/s collected  "
+          f"{wire / spans if spans else 0:6.0f} B/span  {dropped:6.0f} dropped")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print(f"Span export benchmark - {SPANS} spans through the batch processor")
+    print("=" * 50)
+
+    run("otlp json", "none")
+    run("otlp json+gzip", "gzip")
+    run("slow collector", "gzip", delay=0.2, max_queue_size=1024) #queue overflows, drops are counted
@@ -0,0 +1,54 @@
+#Benchmark: time until readiness when MySQL accepts connections shortly after the pod starts - fixed 5s retries vs jittered exponential backoff
+import os, sys, time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from unittest.mock import MagicMock, patch
+import product_app
+
+DB_READY_AFTER = float(os.environ.get("BENCH_DB_READY_MS", "500")) / 1000
+FIXED_DELAY = float(os.environ.get("BENCH_FIXED_DELAY", "5")) #the old retry_delay
+RUNS = int(os.environ.get("BENCH_STARTUP_RUNS", "5"))
+
+
+def database_ready_after(delay):
+    up_at = time.monotonic() + delay
+    connection = MagicMock()
+    connection.cursor.return_value.__enter__.return_value.fetchone.return_value = {"table_rows": 1000000}
+
+    def connect(**options):
+        return connection if time.monotonic() >= up_at else None
+    return connect
+
+
+def fixed_retries():
+    #The loop verify_db_setup had: try, sleep retry_delay, try again
+    for attempt in range(1, 15):
+        try:
+            return product_app.verify_db_attempt(attempt)
+        except Exception:
+            time.sleep(FIXED_DELAY)
+
+
+def run(label, verify):
+    timings = []
+    for _ in range(RUNS if verify is not fixed_retries else 1):
+        with patch.object(product_app, "get_db_connection", database_ready_after(DB_READY_AFTER)):
+            start = time.perf_counter()
+            verify()
+            timings.append(time.perf_counter() - start)
+    average = sum(timings) / len(timings)
+    print(f"{label:22s} {average:6.2f} s to ready (worst {max(timings):.2f} s)")
+    return average
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print(f"Startup benchmark - MySQL accepts connections after {DB_READY_AFTER * 1000:.0f} ms")
+    print("=" * 50)
+
+    fixed_time = run(f"fixed {FIXED_DELAY:g}s retries", fixed_retries)
+    backoff_time = run("jittered backoff", product_app.verify_db_setup)
+    print(f"speedup x{fixed_time / backoff_time:.1f}")
@@ -0,0 +1,56 @@
+#Benchmark: cost of exporting every trace vs the tail sampler keeping failed, slow and 10% of the rest
+import os, sys, time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+
+os.environ.pop("OTEL_SDK_DISABLED", None)
+
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.trace import Status, StatusCode
+from product_sampling import TailSamplingSpanProcessor
+
+TRACES = int(os.environ.get("BENCH_TRACES", "5000"))
+ERROR_EVERY = 100 #1% of the requests fail
+
+
+class SerializingExporter(SpanExporter):
+    #Stands in for the Jaeger/OTLP exporter - the serialization is the CPU the service pays per span
+    def __init__(self):
+        self.spans = 0
+        self.bytes = 0
+
+    def export(self, spans):
+        for span in spans:
+            self.bytes += len(span.to_json(indent=None))
+        self.spans += len(spans)
+        return SpanExportResult.SUCCESS
+
+
+def run(label, tail):
+    exporter = SerializingExporter()
+    processor = SimpleSpanProcessor(exporter)
+    provider = TracerProvider()
+    provider.add_span_processor(TailSamplingSpanProcessor(processor, ratio=0.1) if tail else processor)
+    tracer = provider.get_tracer(__name__)
+
+    start = time.perf_counter()
+    for index in range(TRACES):
+        with tracer.start_as_current_span("GET /products", attributes={"http.route": "/products"}):
+            with tracer.start_as_current_span("SELECT") as query:
+                query.set_attribute("db.statement", "SELECT ... FROM items WHERE created_by = %s")
+                if index % ERROR_EVERY == 0:
+                    query.set_status(Status(StatusCode.ERROR, "lost connection"))
+    elapsed = time.perf_counter() - start
+    print(f"{label:16s} {elapsed / TRACES * 1e6:7.1f} us/trace  {exporter.spans:6d} spans  {exporter.bytes / 1024:8.0f} KiB exported")
+    return elapsed
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print(f"Trace sampling benchmark - {TRACES} traces, 1 in {ERROR_EVERY} failing")
+    print("=" * 50)
+
+    all_time = run("export all", tail=False)
+    tail_time = run("tail sampling", tail=True)
+    print(f"speedup x{all_time / tail_time:.2f}")
@@ -0,0 +1,82 @@
+#Benchmark: request throughput with per-route manual spans vs the after_request span enrichment
+import os, sys, time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+
+from flask import Flask, jsonify
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.instrumentation.flask import FlaskInstrumentor
+from product_content_negotiation import NegotiatingJSONProvider
+from product_tracing import setup_request_tracing, traced
+
+REQUESTS = int(os.environ.get("BENCH_REQUESTS", "3000"))
+
+PRODUCTS = [{"id": index, "product_name": f"product {index}", "price": 9.9, "quantity": 3} for index in range(20)]
+
+exporter = InMemorySpanExporter()
+provider = TracerProvider()
+provider.add_span_processor(SimpleSpanProcessor(exporter))
+tracer = provider.get_tracer(__name__)
+
+
+def manual_app():
+    #What the routes did before: one span per route plus one per DB step, each with its own attributes
+    app = Flask("manual")
+    app.json = NegotiatingJSONProvider(app)
+    FlaskInstrumentor().instrument_app(app, tracer_provider=provider)
+
+    @app.route("/products")
+    def get_products():
+        with tracer.start_as_current_span("get_products") as span:
+            span.set_attribute("user.id", 1)
+            with tracer.start_as_current_span("db_connection") as db_span:
+                db_span.set_attribute("db.system", "mysql")
+                with tracer.start_as_current_span("db_query_products") as query_span:
+                    query_span.set_attribute("db.statement", "SELECT ... FROM items WHERE created_by = %s")
+                    products = list(PRODUCTS)
+                    query_span.set_attribute("db.result_count", len(products))
+            span.set_attribute("product.count", len(products))
+            return jsonify({"products": products})
+    return app
+
+
+def middleware_app():
+    app = Flask("middleware")
+    app.json = NegotiatingJSONProvider(app)
+    FlaskInstrumentor().instrument_app(app, tracer_provider=provider)
+    setup_request_tracing(app)
+
+    @app.route("/products")
+    @traced(response_fields={"product.count": lambda body: len(body.get("products", []))})
+    def get_products():
+        return jsonify({"products": list(PRODUCTS)})
+    return app
+
+
+def run(label, app):
+    client = app.test_client()
+    for _ in range(100):
+        client.get("/products")
+    exporter.clear()
+
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        client.get("/products")
+    elapsed = time.perf_counter() - start
+    spans = len(exporter.get_finished_spans()) / REQUESTS
+    exporter.clear()
+    print(f"{label:20s} {REQUESTS / elapsed:9.0f} req/s  {elapsed / REQUESTS * 1e6:7.1f} us/request  {spans:.0f} spans/request")
+    return elapsed
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print(f"Request tracing benchmark - {REQUESTS} requests")
+    print("=" * 50)
+
+    manual_time = run("manual spans", manual_app())
+    middleware_time = run("span enrichment", middleware_app())
+    print(f"speedup x{manual_time / middleware_time:.2f}")
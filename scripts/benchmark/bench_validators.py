@@ -0,0 +1,114 @@
+#Microbenchmark: compiled single-pass validators vs the previous multi-pass implementation
+#The legacy_* functions are copies of the old code, kept here as the baseline and as the reference for error messages
+import os, sys, re, timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../user-service')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+
+from validators import Validators
+from product_validator import ProductValidator
+
+NUMBER = int(os.environ.get("BENCH_NUMBER", "100000"))
+
+
+def legacy_validate_email(email):
+    if not email or not isinstance(email, str):
+        return False, "Email must be a valid string"
+    email_to_validate = email.strip()
+    if not re.match(Validators.EMAIL_REGEX, email_to_validate):
+        return False, "Invalid email format"
+    if len(email_to_validate) > 254:
+        return False, "Email is too long"
+    return True, email_to_validate.lower()
+
+
+def legacy_validate_password(password):
+    if not password or not isinstance(password, str):
+        return False, ["Password must be a valid string"]
+    errors = []
+    special_characters = "@#/-_&!"
+    if len(password) < Validators.MIN_PASSWORD_LENGTH:
+        errors.append(f"password must be at least {Validators.MIN_PASSWORD_LENGTH} characters long")
+    if len(password) > Validators.MAX_PASSWORD_LENGTH:
+        errors.append(f"password must be at most {Validators.MAX_PASSWORD_LENGTH} characters long")
+    if not any(char.isupper() for char in password):
+        errors.append("password must contain at least one uppercase letter")
+    if not any(char.islower() for char in password):
+        errors.append("password must contain at least one lowercase letter")
+    if not any(char.isdigit() for char in password):
+        errors.append("password must contain at least one number")
+    if not any(char in special_characters for char in password):
+        errors.append(f"password must contain at least one special character: {special_characters}")
+    return len(errors) == 0, errors
+
+
+def legacy_sanitize_input(text):
+    if not isinstance(text, str):
+        return text
+    dangerous_characters = ['<', '>', '"', "'", ';', '/', '\\', '=']
+    for char in dangerous_characters:
+        text = text.replace(char, '')
+    return text.strip()
+
+
+def legacy_validate_product(name):
+    if not isinstance(name, str):
+        return False, "Product name must be a valid string"
+    product_to_validate = name.strip()
+    if len(product_to_validate) == 0:
+        return False, "Product name cannot be empty"
+    if len(product_to_validate) > 254:
+        return False, "Product name too long (max 254 characters)"
+    if not re.match(ProductValidator.PRODUCT_REGEX, product_to_validate):
+        return False, "Invalid product name format.Only letters, numbers, spaces, and - ' . , ( ) are allowed"
+    return True, product_to_validate.lower()
+
+
+EMAILS = ["seller@example.com", "  Upper.Case+tag@Example.COM ", "bad-email", "a@b", "", None]
+PASSWORDS = ["StrongPass123!", "Ab1@", "aaaaaaaaaaaaaaaaaaaaaaaaa", "NOLOWER123@", "noupper123@", "Ünïcödé1@a", "", None]
+CLEAN_TEXTS = ["normal text", "seller@example.com", "Coffee Maker - Deluxe", "  spaces  ", 123]
+HOSTILE_TEXTS = ["<script>alert('xss')</script>", "test' OR '1'='1", ";DROP TABLE users; --", "x" * 200 + "<"]
+PRODUCT_NAMES = ["Laptop Pro", "Coffee Maker - Deluxe", "Product<script>", "  ", "A" * 255, None]
+
+CASES = [
+    ("validate_email", legacy_validate_email, Validators.validate_email, EMAILS),
+    ("validate_password", legacy_validate_password, Validators.validate_password, PASSWORDS),
+    ("sanitize_input (user)", legacy_sanitize_input, Validators.sanitize_input, CLEAN_TEXTS),
+    ("sanitize_input (product)", legacy_sanitize_input, ProductValidator.sanitize_input, CLEAN_TEXTS),
+    ("sanitize_input (hostile)", legacy_sanitize_input, Validators.sanitize_input, HOSTILE_TEXTS),
+    ("validate_product", legacy_validate_product, ProductValidator.validate_product, PRODUCT_NAMES),
+]
+
+
+def check_same_results():
+    for label, legacy, current, inputs in CASES:
+        for value in inputs:
+            assert legacy(value) == current(value), f"{label} changed its result for {value!r}: {legacy(value)} != {current(value)}"
+
+
+def run_all(function, inputs):
+    for value in inputs:
+        function(value)
+
+
+if __name__ == "__main__":
+    check_same_results()
+
+    print("=" * 50)
+    print(f"Validator microbenchmark - {NUMBER} iterations per input set")
+    print("Results and error messages identical to the legacy implementation: OK")
+    print("=" * 50)
+
+    regressions = []
+    for label, legacy, current, inputs in CASES:
+        legacy_time = min(timeit.repeat(lambda: run_all(legacy, inputs), number=NUMBER // 10, repeat=3))
+        current_time = min(timeit.repeat(lambda: run_all(current, inputs), number=NUMBER // 10, repeat=3))
+        per_call_legacy = legacy_time / (NUMBER // 10) / len(inputs) * 1e9
+        per_call_current = current_time / (NUMBER // 10) / len(inputs) * 1e9
+        print(f"{label:26s} legacy {per_call_legacy:8.0f} ns/call   compiled {per_call_current:8.0f} ns/call   x{legacy_time / current_time:.2f}")
+        if current_time > legacy_time:
+            regressions.append(label)
+
+    if regressions:
+        print(f"Slower than legacy: {', '.join(regressions)}")
+        sys.exit(1)
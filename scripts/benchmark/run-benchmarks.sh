@@ -0,0 +1,19 @@
+#!/bin/bash
+#Run every benchmark script in this folder
+echo "Running benchmarks"
+
+BENCH_DIR="$(cd "$(dirname "$0")" && pwd)"
+STATUS=0
+
+for bench in "$BENCH_DIR"/bench_*.py; do
+    echo ""
+    echo ">>> $(basename "$bench")"
+    python3 "$bench" || STATUS=1
+done
+
+if [ $STATUS -eq 0 ]; then
+    echo "Benchmarks finished"
+else
+    echo "Some benchmarks failed"
+fi
+exit $STATUS
@@ -0,0 +1,221 @@
+#Load test: GET /products with 1000 concurrent keep-alive connections - threaded WSGI (gunicorn gthread) vs ASGI (uvicorn + aiomysql)
+#
+#  pip install -r product-service/requirements.txt
+#  python3 scripts/loadtest/asgi_vs_wsgi.py --connections 1000 --duration 20 --delay-ms 20
+#
+#Both servers run the product service against fake_mysql.py in this process, every statement
+#taking --delay-ms, so the service mostly waits on the database like in production.
+#Reported per server:
+#  concurrency  statements in progress at the database, mean and peak - requests actually being served
+#  latency      p50/p99/max seen by the clients, queueing in front of the threads included
+#  memory       RSS and USS summed over the server processes, peak during the run, and their threads
+#Client, fake database and servers share the machine: compare the two rows, not absolute numbers.
+import argparse, asyncio, os, signal, subprocess, sys, time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+SERVICE_DIR = sys.path[0]
+
+import jwt
+from fake_mysql import FakeMySQL
+from product_preload import memory_usage
+
+SECRET_KEY = "load-test-secret-key-of-32-bytes!"
+USER_ID = 1
+
+
+def scenarios(args):
+    return (
+        (f"WSGI gthread {args.wsgi_workers}x{args.wsgi_threads}",
+         ["gunicorn", "-c", "gunicorn.conf.py"],
+         {"WEB_CONCURRENCY": str(args.wsgi_workers), "GUNICORN_THREADS": str(args.wsgi_threads)}),
+        (f"ASGI uvicorn, pool {args.pool_size}",
+         [sys.executable, "-m", "uvicorn", "product_asgi:create_asgi_app", "--factory", "--host", "127.0.0.1",
+          "--port", str(args.port), "--no-access-log", "--log-level", "warning", "--backlog", "4096"],
+         {"ASGI_DB_POOL_SIZE": str(args.pool_size)}),
+    )
+
+
+def process_tree(pid):
+    pids = [pid]
+    for child in pids:
+        try:
+            with open(f"/proc/{child}/task/{child}/children") as handle:
+                pids += [int(value) for value in handle.read().split()]
+        except OSError:
+            pass
+    return pids
+
+
+def threads(pid):
+    try:
+        with open(f"/proc/{pid}/status") as handle:
+            return next(int(line.split()[1]) for line in handle if line.startswith("Threads:"))
+    except (OSError, StopIteration):
+        return 0
+
+
+def server_memory(pid):
+    rss = uss = thread_count = 0
+    for child in process_tree(pid):
+        usage = memory_usage(child)
+        rss += usage.get("rss", 0)
+        uss += usage.get("uss", 0)
+        thread_count += threads(child)
+    return rss, uss, thread_count
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {name.strip().lower(): value.strip() for name, _, value in (line.partition(":") for line in lines[1:] if line)}
+    await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers.get("connection", "").lower() == "close"
+
+
+class Load:
+
+    def __init__(self, port, token, timeout):
+        self.port = port
+        self.request = (f"GET /products HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+                        f"Authorization: Bearer {token}\r\n\r\n").encode()
+        self.timeout = timeout
+        self.latencies = []
+        self.errors = 0
+        self.recording = False
+        self.stopping = False
+
+    async def connection(self):
+        reader = writer = None
+        while not self.stopping:
+            started = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", self.port), self.timeout)
+                writer.write(self.request)
+                status, close = await asyncio.wait_for(read_response(reader), self.timeout)
+                failed = status >= 400
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                failed, close = True, True
+            if self.recording:
+                self.latencies.append(time.perf_counter() - started)
+                self.errors += failed
+            if close and writer is not None:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+
+async def wait_ready(port, process):
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /health/detailed HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+            status, _ = await read_response(reader)
+            writer.close()
+            if status == 200:
+                return
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+async def run_scenario(args, db, command, env, token):
+    env = dict(os.environ, FLASK_HOST="127.0.0.1", FLASK_RUN_PORT=str(args.port), SECRET_KEY=SECRET_KEY,
+               MYSQL_HOST="127.0.0.1", MYSQL_PORT=str(args.mysql_port), MYSQL_USER="load", MYSQL_PASSWORD="load",
+               MYSQL_DATABASE="products", OTEL_SDK_DISABLED="true", LOG_HOT_PATH_SAMPLE="0",
+               CONCURRENCY_LIMITS="service=1000000,default=1000000", RATE_LIMITS="ip=1000000/1,user=1000000/1", REQUEST_BUDGETS="default=3600",
+               **env) #servers compared on queueing, not shedding, rate limits or deadlines
+    process = subprocess.Popen(command, cwd=SERVICE_DIR, env=env, start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        await wait_ready(args.port, process)
+        load = Load(args.port, token, args.timeout)
+        clients = []
+        for _ in range(args.connections): #opened in batches, a burst of 1000 SYNs only measures the accept queue
+            clients.append(asyncio.ensure_future(load.connection()))
+            if len(clients) % 100 == 0:
+                await asyncio.sleep(0.05)
+        await asyncio.sleep(args.warmup)
+
+        load.recording = True
+        db.stats.reset()
+        started = time.monotonic()
+        peak_rss = peak_uss = peak_threads = 0
+        while time.monotonic() - started < args.duration:
+            rss, uss, thread_count = server_memory(process.pid)
+            peak_rss, peak_uss, peak_threads = max(peak_rss, rss), max(peak_uss, uss), max(peak_threads, thread_count)
+            await asyncio.sleep(0.5)
+        elapsed = time.monotonic() - started
+        load.recording = False
+        mean_in_flight = db.stats.mean_in_flight()
+
+        load.stopping = True
+        await asyncio.wait(clients, timeout=args.timeout + 1)
+        latencies = sorted(load.latencies)
+        return {
+            "requests/s": len(latencies) / elapsed,
+            "errors": load.errors,
+            "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+            "p99": latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+            "max": latencies[-1] if latencies else 0.0,
+            "concurrency": mean_in_flight,
+            "peak": db.stats.peak_in_flight,
+            "rss": peak_rss,
+            "uss": peak_uss,
+            "threads": peak_threads,
+        }
+    finally:
+        for pid in reversed(process_tree(process.pid)):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        process.wait()
+
+
+def mib(value):
+    return value / 1024 / 1024
+
+
+async def main(args):
+    db = FakeMySQL(args.delay_ms / 1000, args.rows)
+    server = await db.serve("127.0.0.1", args.mysql_port)
+    token = jwt.encode({"user_id": USER_ID, "email": "load@test.local", "exp": int(time.time()) + 3600}, SECRET_KEY, algorithm="HS256")
+
+    print("=" * 50)
+    print(f"ASGI vs WSGI - {args.connections} connections, GET /products, {args.delay_ms:g} ms per statement, {args.duration:g}s")
+    print("=" * 50)
+    print(f"{'server':26s} {'req/s':>7s} {'errors':>7s} {'p50':>7s} {'p99':>7s} {'max':>7s} {'in DB':>6s} {'peak':>5s} {'RSS':>6s} {'USS':>6s} {'threads':>7s}")
+    results = {}
+    for label, command, env in scenarios(args):
+        result = results[label] = await run_scenario(args, db, command, env, token)
+        print(f"{label:26s} {result['requests/s']:7.0f} {result['errors']:7d} {result['p50'] * 1000:6.0f}ms {result['p99'] * 1000:6.0f}ms "
+              f"{result['max'] * 1000:6.0f}ms {result['concurrency']:6.1f} {result['peak']:5d} {mib(result['rss']):5.0f}M {mib(result['uss']):5.0f}M {result['threads']:7d}", flush=True)
+    server.close()
+
+    wsgi, asgi = results.values()
+    print("=" * 50)
+    print(f"ASGI: x{asgi['requests/s'] / max(wsgi['requests/s'], 1e-9):.1f} throughput, x{asgi['concurrency'] / max(wsgi['concurrency'], 1e-9):.1f} requests "
+          f"served at once, p99 x{wsgi['p99'] / max(asgi['p99'], 1e-9):.1f} lower, {mib(asgi['uss']):.0f} vs {mib(wsgi['uss']):.0f} MiB USS")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GET /products under many concurrent connections, WSGI vs ASGI")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--delay-ms", type=float, default=20.0)
+    parser.add_argument("--rows", type=int, default=10)
+    parser.add_argument("--port", type=int, default=3912)
+    parser.add_argument("--mysql-port", type=int, default=3307)
+    parser.add_argument("--wsgi-workers", type=int, default=2) #the deployment: WEB_CONCURRENCY=2, GUNICORN_THREADS=4
+    parser.add_argument("--wsgi-threads", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,219 @@
+#Stand-in MySQL server: speaks enough of the wire protocol for pymysql and aiomysql to run the product routes
+#
+#  python3 scripts/loadtest/fake_mysql.py --port 3307 --delay-ms 20 --rows 10
+#  MYSQL_HOST=127.0.0.1 MYSQL_PORT=3307 python3 product-service/product_app.py
+#
+#Any user and password are accepted. Every statement answers after --delay-ms, like a database
+#that is busy but not saturated, so what is measured is how the service waits on it. SELECTs on
+#items return --rows rows, INSERT/UPDATE/DELETE one affected row, a SELECT whose MAX_EXECUTION_TIME
+#hint is shorter than --delay-ms the error MySQL answers. Connections and statements in
+#progress are printed every second; asyncio keeps thousands of client connections on one thread.
+import argparse, asyncio, itertools, re, struct, time
+
+CLIENT_FLAGS = (0x1 | 0x8 | 0x200 | 0x2000 | 0x8000 | 0x20000 | 0x80000) #long password, with db, 4.1, transactions, secure conn, multi results, plugin auth
+SERVER_STATUS_AUTOCOMMIT = 0x2
+UTF8MB4, BINARY = 45, 63
+LONG, LONGLONG, DATETIME, NEWDECIMAL, VAR_STRING = 3, 8, 12, 246, 253
+
+ITEM_COLUMNS = {
+    "id": LONGLONG, "name": VAR_STRING, "price": NEWDECIMAL, "quantity": LONG,
+    "description": VAR_STRING, "created_at": DATETIME, "created_by": LONGLONG,
+}
+_SELECT_ITEMS = re.compile(r"^\s*SELECT\s+(.+?)\s+FROM\s+items\b", re.IGNORECASE | re.DOTALL)
+_MAX_EXECUTION_TIME = re.compile(r"/\*\+\s*MAX_EXECUTION_TIME\((\d+)\)\s*\*/", re.IGNORECASE)
+ER_QUERY_TIMEOUT = 3024
+
+
+class ServerStats:
+
+    def __init__(self):
+        self.connections = 0
+        self.queries = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.in_flight_seconds = 0.0 #integral of in_flight over time
+        self._changed = self._since = time.monotonic()
+
+    def _account(self):
+        now = time.monotonic()
+        self.in_flight_seconds += self.in_flight * (now - self._changed)
+        self._changed = now
+
+    def query_started(self):
+        self._account()
+        self.queries += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def query_finished(self):
+        self._account()
+        self.in_flight -= 1
+
+    def reset(self):
+        self._account()
+        self.queries = 0
+        self.peak_in_flight = self.in_flight
+        self.in_flight_seconds = 0.0
+        self._since = time.monotonic()
+
+    def mean_in_flight(self):
+        self._account()
+        return self.in_flight_seconds / max(time.monotonic() - self._since, 1e-9)
+
+
+def lenenc_int(value):
+    if value < 251:
+        return bytes([value])
+    if value < 2 ** 16:
+        return b"\xfc" + struct.pack("<H", value)
+    if value < 2 ** 24:
+        return b"\xfd" + struct.pack("<I", value)[:3]
+    return b"\xfe" + struct.pack("<Q", value)
+
+
+def lenenc_str(value):
+    if value is None:
+        return b"\xfb"
+    value = value if isinstance(value, bytes) else str(value).encode()
+    return lenenc_int(len(value)) + value
+
+
+def ok_packet(affected=0, insert_id=0):
+    return b"\x00" + lenenc_int(affected) + lenenc_int(insert_id) + struct.pack("<HH", SERVER_STATUS_AUTOCOMMIT, 0)
+
+
+def err_packet(code, message):
+    return b"\xff" + struct.pack("<H", code) + b"#HY000" + message.encode()
+
+
+def eof_packet():
+    return b"\xfe" + struct.pack("<HH", 0, SERVER_STATUS_AUTOCOMMIT)
+
+
+def column_definition(name, type_code):
+    charset = UTF8MB4 if type_code == VAR_STRING else BINARY
+    return (b"".join(lenenc_str(part) for part in (b"def", b"products", b"items", b"items", name, name))
+            + b"\x0c" + struct.pack("<HIBHB", charset, 255, type_code, 0, 2 if type_code == NEWDECIMAL else 0) + b"\x00\x00")
+
+
+def handshake(connection_id):
+    salt = b"abcdefgh" + b"ijklmnopqrst" #fixed, every password is accepted anyway
+    return (b"\x0a" + b"8.0.36-fake\x00" + struct.pack("<I", connection_id) + salt[:8] + b"\x00"
+            + struct.pack("<H", CLIENT_FLAGS & 0xffff) + bytes([UTF8MB4]) + struct.pack("<H", SERVER_STATUS_AUTOCOMMIT)
+            + struct.pack("<H", CLIENT_FLAGS >> 16) + bytes([21]) + b"\x00" * 10 + salt[8:] + b"\x00"
+            + b"mysql_native_password\x00")
+
+
+class FakeMySQL:
+
+    def __init__(self, delay=0.02, rows=10, stats=None):
+        self.delay = delay
+        self.rows = rows
+        self.stats = stats or ServerStats()
+        self._ids = itertools.count(1)
+        self._insert_ids = itertools.count(1000)
+
+    def item_row(self, number, columns):
+        values = {"id": number, "name": f"product {number}", "price": "19.99", "quantity": number % 50,
+                  "description": "load test product", "created_at": "2024-01-01 12:00:00", "created_by": 1}
+        return [values[column] for column in columns]
+
+    def respond(self, query):
+        """Packets answering one COM_QUERY"""
+
+        query = re.sub(r"/\*.*?\*/", "", query) #optimizer hints
+        select = _SELECT_ITEMS.match(query)
+        if select:
+            selected = select.group(1).strip()
+            columns = list(ITEM_COLUMNS) if selected == "*" else [column.strip() for column in selected.split(",")]
+            count = 1 if re.search(r"\bWHERE\s+id\s*=", query, re.IGNORECASE) else self.rows
+            return self.result_set([(column, ITEM_COLUMNS.get(column, VAR_STRING)) for column in columns],
+                                   [self.item_row(number, columns) for number in range(1, count + 1)])
+        if "information_schema.tables" in query:
+            return self.result_set([("table_rows", LONGLONG)], [[self.rows]])
+        if re.match(r"^\s*SELECT\s+1\s*$", query, re.IGNORECASE):
+            return self.result_set([("1", LONGLONG)], [[1]])
+        if re.match(r"^\s*INSERT\b", query, re.IGNORECASE):
+            return [ok_packet(1, next(self._insert_ids))]
+        if re.match(r"^\s*(UPDATE|DELETE|REPLACE)\b", query, re.IGNORECASE):
+            return [ok_packet(1)]
+        return [ok_packet()] #SET, BEGIN, COMMIT, ROLLBACK and anything else
+
+    def result_set(self, columns, rows):
+        packets = [lenenc_int(len(columns))]
+        packets += [column_definition(name.encode(), type_code) for name, type_code in columns]
+        packets.append(eof_packet())
+        packets += [b"".join(lenenc_str(value) for value in row) for row in rows]
+        packets.append(eof_packet())
+        return packets
+
+    async def handle(self, reader, writer):
+        self.stats.connections += 1
+        try:
+            writer.write(_packet(0, handshake(next(self._ids))))
+            await _read_packet(reader) #handshake response, any credentials are fine
+            writer.write(_packet(2, ok_packet()))
+            while True:
+                sequence, payload = await _read_packet(reader)
+                command = payload[:1]
+                if command == b"\x01": #COM_QUIT
+                    break
+                if command == b"\x03": #COM_QUERY
+                    self.stats.query_started()
+                    try:
+                        query = payload[1:].decode("utf-8", "replace")
+                        limit = _MAX_EXECUTION_TIME.search(query)
+                        if limit and int(limit.group(1)) / 1000 < self.delay: #stopped like MySQL stops a SELECT past its hint
+                            await asyncio.sleep(int(limit.group(1)) / 1000)
+                            packets = [err_packet(ER_QUERY_TIMEOUT, "Query execution was interrupted, maximum statement execution time exceeded")]
+                        else:
+                            await asyncio.sleep(self.delay)
+                            packets = self.respond(query)
+                    finally:
+                        self.stats.query_finished()
+                else: #COM_PING, COM_INIT_DB, ...
+                    packets = [ok_packet()]
+                writer.write(b"".join(_packet(sequence + 1 + index, packet) for index, packet in enumerate(packets)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError): #client gone or server shutting down
+            pass
+        finally:
+            self.stats.connections -= 1
+            writer.close()
+
+    async def serve(self, host, port):
+        return await asyncio.start_server(self.handle, host, port, backlog=4096)
+
+
+def _packet(sequence, payload):
+    return struct.pack("<I", len(payload))[:3] + bytes([sequence & 0xff]) + payload
+
+
+async def _read_packet(reader):
+    header = await reader.readexactly(4)
+    length = int.from_bytes(header[:3], "little")
+    return header[3], await reader.readexactly(length)
+
+
+async def report(stats):
+    previous = 0
+    while True:
+        await asyncio.sleep(1)
+        print(f"connections={stats.connections} queries/s={stats.queries - previous} in_flight={stats.in_flight} peak={stats.peak_in_flight}", flush=True)
+        previous = stats.queries
+
+
+async def main(args):
+    server = FakeMySQL(args.delay_ms / 1000, args.rows)
+    await server.serve(args.host, args.port)
+    print(f"Fake MySQL on {args.host}:{args.port}, {args.delay_ms:g} ms per statement", flush=True)
+    await report(server.stats)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3307)
+    parser.add_argument("--delay-ms", type=float, default=20.0)
+    parser.add_argument("--rows", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
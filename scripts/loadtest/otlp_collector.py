@@ -0,0 +1,104 @@
+#Stand-in OTLP/HTTP collector: accepts span batches on /v1/traces and prints what it received every second
+#
+#  python3 scripts/loadtest/otlp_collector.py --port 4318 --delay-ms 50
+#  OTEL_TRACES_EXPORTER=otlp OTEL_EXPORTER_OTLP_ENDPOINT=http://localhost:4318 python3 product-service/product_app.py
+#
+#--delay-ms and --fail-ratio imitate a slow or overloaded collector, so queue size, batch size and flush
+#interval (OTEL_BSP_*) can be tuned against spans_dropped_total and span_export_queue_depth on /metrics.
+import argparse, gzip, json, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class CollectorStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.spans = 0
+        self.wire_bytes = 0
+        self.json_bytes = 0
+        self.rejected = 0
+
+    def record(self, spans, wire_bytes, json_bytes):
+        with self._lock:
+            self.batches += 1
+            self.spans += spans
+            self.wire_bytes += wire_bytes
+            self.json_bytes += json_bytes
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        with self._lock:
+            return self.batches, self.spans, self.wire_bytes, self.json_bytes, self.rejected
+
+
+def count_spans(body):
+    return sum(len(scope.get("spans", [])) for resource in body.get("resourceSpans", []) for scope in resource.get("scopeSpans", []))
+
+
+def make_handler(stats, delay=0.0, fail_ratio=0.0):
+
+    class OTLPHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" #keep-alive, like a real collector
+
+        def do_POST(self):
+            payload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path != "/v1/traces":
+                return self._reply(404)
+            if delay:
+                time.sleep(delay)
+            if fail_ratio and random.random() < fail_ratio: # nosec - load simulation, not security
+                stats.reject()
+                return self._reply(503)
+
+            raw = gzip.decompress(payload) if self.headers.get("Content-Encoding") == "gzip" else payload
+            stats.record(count_spans(json.loads(raw)), len(payload), len(raw))
+            self._reply(200)
+
+        def _reply(self, status):
+            body = b"{}"
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return OTLPHandler
+
+
+def start_collector(port=0, delay=0.0, fail_ratio=0.0):
+    """Runs the collector in a background thread, returns (server, stats) - port 0 picks a free port"""
+
+    stats = CollectorStats()
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(stats, delay, fail_ratio))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in OTLP/HTTP trace collector")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="latency added to every batch")
+    parser.add_argument("--fail-ratio", type=float, default=0.0, help="share of batches answered with 503")
+    args = parser.parse_args()
+
+    server, stats = start_collector(args.port, args.delay_ms / 1000, args.fail_ratio)
+    print(f"OTLP collector on http://127.0.0.1:{server.server_address[1]}/v1/traces")
+    previous = stats.snapshot()
+    try:
+        while True:
+            time.sleep(1)
+            current = stats.snapshot()
+            batches, spans, wire, raw, rejected = (now - before for now, before in zip(current, previous))
+            ratio = raw / wire if wire else 0
+            print(f"{spans:7d} spans/s  {batches:4d} batches/s  {wire / 1024:8.1f} KiB/s on the wire (x{ratio:.1f})  {rejected} rejected")
+            previous = current
+    except KeyboardInterrupt:
+        server.shutdown()
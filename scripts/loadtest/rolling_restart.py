@@ -0,0 +1,169 @@
+#Load test: one pod of a rolling update - requests that fail while the product service is terminated under load
+#
+#  pip install -r product-service/requirements.txt
+#  python3 scripts/loadtest/rolling_restart.py --clients 16 --probe-period 1 --delay-ms 50
+#
+#gunicorn runs the product service against fake_mysql.py. A model of the Service endpoints
+#sends every new connection to the pod until its readiness probe (/health/detailed, every
+#--probe-period) fails, then to the other replicas (not modelled, never fail). SIGTERM goes
+#to the master while the clients are busy, like the kubelet does once the pod is deleted,
+#right after a probe passed. The probe stands in for the endpoint removal of the deleted pod and
+#its propagation to kube-proxy, so --probe-period models that lag, not the readinessProbe period.
+#Reported per SHUTDOWN_READINESS_DELAY:
+#  failed       requests routed to the pod that got no answer (refused, reset) or a 5xx
+#  unready      seconds from SIGTERM to the first failing probe, the pod is out of the endpoints then
+#  exit         seconds from SIGTERM to the exit of the master
+#  drain        drain duration the worker logged, and the requests it abandoned
+import argparse, asyncio, json, os, signal, subprocess, sys, tempfile, time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
+SERVICE_DIR = sys.path[0]
+
+import jwt
+from fake_mysql import FakeMySQL
+from asgi_vs_wsgi import read_response, wait_ready
+
+SECRET_KEY = "load-test-secret-key-of-32-bytes!"
+
+
+class Endpoints:
+    """The pod is in the endpoints until a readiness probe fails"""
+
+    def __init__(self, port, period):
+        self.port = port
+        self.period = period
+        self.ready = True
+        self.removed_at = None
+        self.probed = asyncio.Event()
+
+    async def probe(self):
+        while self.ready:
+            await asyncio.sleep(self.period)
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+                writer.write(b"GET /health/detailed HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+                status, _ = await asyncio.wait_for(read_response(reader), 1.0)
+                writer.close()
+                failed = status != 200
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                failed = True
+            if failed:
+                self.ready = False
+                self.removed_at = time.monotonic()
+            else:
+                self.probed.set()
+
+
+class Clients:
+
+    def __init__(self, port, token, endpoints):
+        self.request = (f"GET /products HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+                        f"Authorization: Bearer {token}\r\nConnection: close\r\n\r\n").encode()
+        self.port = port
+        self.endpoints = endpoints
+        self.served = 0
+        self.failed = 0
+
+    async def client(self):
+        while self.endpoints.ready: #one connection per request, kube-proxy picks the pod per connection
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+                writer.write(self.request)
+                status, _ = await asyncio.wait_for(read_response(reader), 30)
+                writer.close()
+                failed = status >= 500
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                failed = True
+                await asyncio.sleep(0.01) #a refused connect returns at once
+            self.failed += failed
+            self.served += not failed
+
+
+def drain_report(log_path):
+    #JSON lines of the workers, the drain is the last thing each one logs
+    reports = []
+    with open(log_path) as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "drain_seconds" in record:
+                reports.append(record)
+    return reports
+
+
+async def run_scenario(args, readiness_delay, token):
+    env = dict(os.environ, FLASK_HOST="127.0.0.1", FLASK_RUN_PORT=str(args.port), SECRET_KEY=SECRET_KEY,
+               MYSQL_HOST="127.0.0.1", MYSQL_PORT=str(args.mysql_port), MYSQL_USER="load", MYSQL_PASSWORD="load",
+               MYSQL_DATABASE="products", OTEL_SDK_DISABLED="true", LOG_HOT_PATH_SAMPLE="0",
+               WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS=str(args.threads), HEALTH_CHECK_INTERVAL="0.5",
+               SHUTDOWN_READINESS_DELAY=str(readiness_delay), SHUTDOWN_DRAIN_TIMEOUT="10",
+               CONCURRENCY_LIMITS="service=1000000,default=1000000", RATE_LIMITS="ip=1000000/1,user=1000000/1", REQUEST_BUDGETS="default=3600")
+    with tempfile.NamedTemporaryFile("w+", suffix=".log") as log:
+        process = subprocess.Popen(["gunicorn", "-c", "gunicorn.conf.py"], cwd=SERVICE_DIR, env=env, start_new_session=True,
+                                   stdout=subprocess.DEVNULL, stderr=log)
+        try:
+            await wait_ready(args.port, process)
+            endpoints = Endpoints(args.port, args.probe_period)
+            clients = Clients(args.port, token, endpoints)
+            tasks = [asyncio.ensure_future(clients.client()) for _ in range(args.clients)]
+            tasks.append(asyncio.ensure_future(endpoints.probe()))
+            await asyncio.sleep(args.warmup)
+            endpoints.probed.clear()
+            await endpoints.probed.wait() #right after a probe passed, the next one comes a full period later
+
+            before = clients.served
+            terminated_at = time.monotonic()
+            process.send_signal(signal.SIGTERM)
+            await asyncio.wait(tasks, timeout=60)
+            while process.poll() is None and time.monotonic() - terminated_at < 60:
+                await asyncio.sleep(0.05)
+            exited = time.monotonic() - terminated_at
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+        return {
+            "served": clients.served - before,
+            "failed": clients.failed,
+            "unready": endpoints.removed_at - terminated_at if endpoints.removed_at else float("nan"),
+            "exit": exited,
+            "drains": drain_report(log.name),
+        }
+
+
+async def main(args):
+    db = FakeMySQL(args.delay_ms / 1000, 10)
+    server = await db.serve("127.0.0.1", args.mysql_port)
+    token = jwt.encode({"user_id": 1, "email": "load@test.local", "exp": int(time.time()) + 3600}, SECRET_KEY, algorithm="HS256")
+
+    print("=" * 50)
+    print(f"Rolling restart - {args.clients} clients, GET /products, {args.delay_ms:g} ms per statement, probe every {args.probe_period:g}s")
+    print("=" * 50)
+    results = {}
+    for delay in (0, args.readiness_delay):
+        result = results[delay] = await run_scenario(args, delay, token)
+        drains = ", ".join(f"{report['drain_seconds']:.2f}s/{report['abandoned']} abandoned" for report in result["drains"]) or "not logged"
+        print(f"SHUTDOWN_READINESS_DELAY={delay:<4g} served {result['served']:5d} after SIGTERM, failed {result['failed']:4d}  "
+              f"unready {result['unready']:5.2f}s  exit {result['exit']:5.2f}s  drain {drains}", flush=True)
+    server.close()
+
+    immediate, delayed = results[0], results[args.readiness_delay]
+    print("=" * 50)
+    print(f"{immediate['failed']} -> {delayed['failed']} failed requests per terminated pod, "
+          f"the pod left the endpoints before it stopped accepting")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Failed requests while one pod of a rolling update terminates")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--delay-ms", type=float, default=50.0)
+    parser.add_argument("--probe-period", type=float, default=1.0) #lag until kube-proxy stops routing to the pod
+    parser.add_argument("--readiness-delay", type=float, default=3.0) #above that lag
+    parser.add_argument("--port", type=int, default=3913)
+    parser.add_argument("--mysql-port", type=int, default=3308)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,145 @@
+#Load test: step load against a running service, comparing when a CPU based HPA and the saturation based HPA would scale out
+#
+#  microk8s kubectl port-forward -n projeto-final deploy/product-service 3002:5002
+#  python3 scripts/loadtest/saturation_scenario.py --url http://localhost:3002 --path /products --token <jwt>
+#
+#Point it at a pod rather than a local process so CPU is measured against the pod limits.
+#
+#Every second /metrics is scraped. For each sample the HPA formula desired = ceil(replicas * metric / target)
+#is applied to both signals: CPU utilization averaged over 30s like metrics-server, and service_saturation
+#with max over 1m like the prometheus-adapter rule in k8s/monitoring.
+import argparse, math, threading, time, urllib.request, urllib.error
+from collections import deque
+
+
+def parse_stages(text):
+    """Parses "4:30,32:60" into [(4 workers, 30 s), (32 workers, 60 s)]"""
+    stages = []
+    for stage in text.split(","):
+        workers, seconds = stage.split(":")
+        stages.append((int(workers), float(seconds)))
+    return stages
+
+
+def scrape(url):
+    values = {}
+    with urllib.request.urlopen(url + "/metrics", timeout=5) as response: # nosec - URL given on the command line
+        for line in response.read().decode().splitlines():
+            if line.startswith("#") or " " not in line:
+                continue
+            name, value = line.rsplit(" ", 1)
+            values[name] = float(value)
+    return values
+
+
+class LoadGenerator:
+
+    def __init__(self, url, path, token):
+        self.url = url + path
+        self.headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.workers = 0
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def set_workers(self, count):
+        self.workers = count
+        while len(self._threads) < count:
+            index = len(self._threads)
+            thread = threading.Thread(target=self._run, args=(index,), daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _run(self, index):
+        while not self._stop.is_set():
+            if index >= self.workers: #workers above the current stage idle
+                time.sleep(0.05)
+                continue
+            request = urllib.request.Request(self.url, headers=dict(self.headers, **{"X-Request-Start": f"t={time.time():.3f}"}))
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response: # nosec - URL given on the command line
+                    response.read()
+                failed = False
+            except (urllib.error.URLError, OSError):
+                failed = True
+            with self._lock:
+                self.latencies.append(time.perf_counter() - started)
+                self.errors += failed
+
+    def take(self):
+        with self._lock:
+            latencies, errors = self.latencies, self.errors
+            self.latencies, self.errors = [], 0
+        return latencies, errors
+
+    def stop(self):
+        self._stop.set()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Step load test comparing CPU and saturation based scale-out")
+    parser.add_argument("--url", default="http://localhost:3002")
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--token", default=None)
+    parser.add_argument("--stages", default="4:30,32:60,4:30")
+    parser.add_argument("--replicas", type=int, default=2, help="replicas the HPA starts from (minReplicas)")
+    parser.add_argument("--cpu-request", type=float, default=0.1, help="pod CPU request in cores (100m)")
+    parser.add_argument("--cpu-target", type=float, default=0.8, help="averageUtilization of the CPU policy")
+    parser.add_argument("--saturation-target", type=float, default=0.7, help="averageValue of the saturation policy")
+    args = parser.parse_args()
+
+    load = LoadGenerator(args.url, args.path, args.token)
+    cpu_window = deque(maxlen=30) #metrics-server reports CPU averaged over ~30s
+    saturation_window = deque(maxlen=60) #max_over_time(...[1m]) in the adapter rule
+    first_scale_out = {"cpu": None, "saturation": None}
+    previous = scrape(args.url)
+    previous_time = time.monotonic()
+    started = previous_time
+
+    print(f"{'t':>5} {'workers':>7} {'rps':>7} {'p95 ms':>8} {'err':>4} {'cpu %':>6} {'sat':>5} {'cpu->':>5} {'sat->':>5}")
+    try:
+        for workers, seconds in parse_stages(args.stages):
+            load.set_workers(workers)
+            stage_end = time.monotonic() + seconds
+            while time.monotonic() < stage_end:
+                time.sleep(1)
+                now = time.monotonic()
+                interval = now - previous_time
+                current = scrape(args.url)
+                cpu_seconds = current.get("process_cpu_seconds_total", 0) - previous.get("process_cpu_seconds_total", 0)
+                cpu_window.append(cpu_seconds / interval / args.cpu_request)
+                saturation_window.append(current.get("service_saturation", 0.0))
+                previous, previous_time = current, now
+
+                cpu_utilization = sum(cpu_window) / len(cpu_window)
+                saturation = max(saturation_window)
+                desired_cpu = math.ceil(args.replicas * cpu_utilization / args.cpu_target)
+                desired_saturation = math.ceil(args.replicas * saturation / args.saturation_target)
+                elapsed = now - started
+                for policy, desired in (("cpu", desired_cpu), ("saturation", desired_saturation)):
+                    if desired > args.replicas and first_scale_out[policy] is None:
+                        first_scale_out[policy] = elapsed
+
+                latencies, errors = load.take()
+                print(f"{elapsed:5.0f} {workers:7d} {len(latencies) / interval:7.0f} {percentile(latencies, 0.95) * 1000:8.1f} {errors:4d} "
+                      f"{cpu_utilization * 100:6.0f} {saturation:5.2f} {desired_cpu:5d} {desired_saturation:5d}")
+    finally:
+        load.stop()
+
+    print("")
+    for policy, elapsed in first_scale_out.items():
+        print(f"{policy:10s} first scale-out at " + (f"{elapsed:.0f}s" if elapsed is not None else "never"))
+
+
+if __name__ == "__main__":
+    main()
@@ -38,6 +38,13 @@ microk8s kubectl apply -f k8s/services/product-service/01-product-deployment.yml
 microk8s kubectl apply -f k8s/services/product-service/02-product-service.yml
 microk8s kubectl apply -f k8s/services/product-service/03-product-hpa.yml
 
+# Custom metrics for the HPAs - only when prometheus-adapter is installed in the monitoring namespace
+if microk8s kubectl get deployment prometheus-adapter -n monitoring >/dev/null 2>&1; then
+    echo "Configuring prometheus-adapter rules..."
+    microk8s kubectl apply -f k8s/monitoring/01-prometheus-adapter-rules.yml
+    microk8s kubectl rollout restart deployment prometheus-adapter -n monitoring
+fi
+
 # Networking
 echo "Deploying ingress..."
 microk8s kubectl apply -f k8s/networking/01-ingress.yml
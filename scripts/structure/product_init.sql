@@ -14,4 +14,12 @@ CREATE TABLE IF NOT EXISTS items(
     INDEX idx_created_by (created_by),
     INDEX idx_created_at (created_at),
     INDEX idx_name (name)
-);  
\ No newline at end of file
+);  
+
+CREATE TABLE IF NOT EXISTS import_offsets(
+    job_id CHAR(32) NOT NULL PRIMARY KEY,
+    rows_processed INT NOT NULL,
+    rows_inserted INT NOT NULL,
+    rows_failed INT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
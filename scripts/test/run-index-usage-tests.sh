@@ -0,0 +1,33 @@
+#!/bin/bash
+#Run the index usage regression suite - EXPLAIN of every service statement against a seeded MySQL
+#Uses INDEX_TEST_MYSQL_HOST when set, otherwise starts a throwaway mysql:8.0 container
+echo "Running index usage tests"
+
+cd "$(dirname "$0")/../.."
+
+CONTAINER=""
+if [ -z "$INDEX_TEST_MYSQL_HOST" ] && command -v docker >/dev/null 2>&1; then
+    CONTAINER=$(docker run -d --rm -e MYSQL_ALLOW_EMPTY_PASSWORD=yes -p 3307:3306 mysql:8.0)
+    export INDEX_TEST_MYSQL_HOST=127.0.0.1
+    export INDEX_TEST_MYSQL_PORT=3307
+
+    echo "Waiting for MySQL"
+    for attempt in $(seq 1 60); do
+        python3 -c "import pymysql; pymysql.connect(host='127.0.0.1', port=3307, user='root')" >/dev/null 2>&1 && break
+        sleep 2
+    done
+fi
+
+pytest tests/user/test_index_usage.py tests/product/test_product_index_usage.py -v -rs
+STATUS=$?
+
+if [ -n "$CONTAINER" ]; then
+    docker stop "$CONTAINER" >/dev/null
+fi
+
+if [ $STATUS -eq 0 ]; then
+    echo "Index usage tests passed successfully"
+else
+    echo "Index usage tests failed"
+fi
+exit $STATUS
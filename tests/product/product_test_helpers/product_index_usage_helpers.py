@@ -0,0 +1,131 @@
+import ast, os, re
+
+INSERT_COLUMNS = re.compile(r"INSERT\s+(?:IGNORE\s+)?INTO\s+\w+\s*\(([^)]*)\)\s*VALUES", re.IGNORECASE)
+PLACEHOLDER_COLUMN = re.compile(r"(\w+)\s*=\s*%s")
+
+
+class ProductIndexUsageHelpers:
+    """EXPLAIN based index checks for the statements product-service sends to MySQL"""
+
+    __test__ = False  # Prevent pytest from collecting this class as a test case
+
+    def __init__(self, connection, database, max_scan_rows):
+        self.connection = connection
+        self.database = database
+        self.max_scan_rows = max_scan_rows
+
+    @staticmethod
+    def extract_statements(source_path):
+        """Every SQL string passed to cursor.execute/executemany in a module, literal or module constant"""
+
+        with open(source_path, encoding="utf-8") as source_file:
+            tree = ast.parse(source_file.read())
+
+        constants = {}
+        for node in tree.body:
+            if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+                for target in node.targets:
+                    if isinstance(target, ast.Name):
+                        constants[target.id] = node.value.value
+
+        statements = []
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in ("execute", "executemany")):
+                continue
+            if not node.args:
+                continue
+            argument = node.args[0]
+            if isinstance(argument, ast.Constant) and isinstance(argument.value, str):
+                statement = argument.value
+            elif isinstance(argument, ast.Name) and argument.id in constants:
+                statement = constants[argument.id]
+            else:
+                continue
+            statement = " ".join(statement.split())
+            if statement not in statements:
+                statements.append(statement)
+        return statements
+
+    @staticmethod
+    def needs_index(statement):
+        """Statements that read a table - SELECT 1 and information_schema lookups have nothing to index"""
+
+        lowered = statement.lower()
+        if lowered.startswith(("update", "delete")):
+            return True
+        return " from " in lowered and "information_schema" not in lowered
+
+    @staticmethod
+    def sql_literal(value):
+        if isinstance(value, (int, float)):
+            return str(value)
+        return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+    @staticmethod
+    def bind_sample_values(statement, samples):
+        """Replaces every %s with a sample value of the column it is compared with or inserted into.
+
+        The value must have the column type, a number compared with a VARCHAR column
+        would hide the index and make the check fail for the wrong reason.
+        """
+
+        insert = INSERT_COLUMNS.match(statement)
+        if insert:
+            columns = [column.strip() for column in insert.group(1).split(",")]
+        else:
+            columns = PLACEHOLDER_COLUMN.findall(statement)
+        parts = statement.split("%s")
+        if len(columns) != len(parts) - 1:
+            raise ValueError(f"cannot match placeholders to columns: {statement}")
+
+        return parts[0] + "".join(ProductIndexUsageHelpers.sql_literal(samples[column]) + part for column, part in zip(columns, parts[1:]))
+
+    def plan_problems(self, plan):
+        problems = []
+        for row in plan:
+            rows = int(row.get("rows") or 0)
+            if rows <= self.max_scan_rows:
+                continue
+            if row.get("type") == "ALL":
+                problems.append(f"full table scan on {row.get('table')} ({rows} rows)")
+            if "filesort" in (row.get("Extra") or ""):
+                problems.append(f"filesort on {row.get('table')} ({rows} rows)")
+        return problems
+
+    def create_schema(self, schema_path):
+        """Creates a scratch database from a scripts/structure file, without its USE line and seed rows"""
+
+        with open(schema_path, encoding="utf-8") as schema_file:
+            schema = re.sub(r"(#|--\s).*", "", schema_file.read()) #comments would become empty statements
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS `{self.database}`")
+            cursor.execute(f"CREATE DATABASE `{self.database}`")
+            cursor.execute(f"USE `{self.database}`")
+            for statement in schema.split(";"):
+                statement = statement.strip()
+                if statement and not statement.upper().startswith("USE ") and not statement.upper().startswith("INSERT"):
+                    cursor.execute(statement)
+        self.connection.commit()
+
+    def seed(self, table, insert_sql, rows, chunk_size=5000):
+        with self.connection.cursor() as cursor:
+            for start in range(0, len(rows), chunk_size):
+                cursor.executemany(insert_sql, rows[start:start + chunk_size])
+            cursor.execute(f"ANALYZE TABLE `{table}`") #fresh statistics, as a long running database would have
+            cursor.fetchall()
+        self.connection.commit()
+
+    def explain(self, statement):
+        with self.connection.cursor() as cursor:
+            cursor.execute("EXPLAIN " + statement)
+            return cursor.fetchall()
+
+    def drop_schema(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS `{self.database}`")
+        self.connection.commit()
+
+
+def service_source(*parts):
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", *parts))
@@ -0,0 +1,92 @@
+import pytest, os
+from product_test_helpers.product_index_usage_helpers import ProductIndexUsageHelpers, service_source
+
+#Index usage regression suite - seeds a scratch database on a local MySQL and EXPLAINs every statement
+#product-service issues. Skipped when no MySQL is reachable (INDEX_TEST_MYSQL_* variables, root@127.0.0.1 by default).
+
+SEED_ROWS = int(os.environ.get("INDEX_TEST_ROWS", "50000"))
+MAX_SCAN_ROWS = int(os.environ.get("INDEX_TEST_MAX_SCAN_ROWS", "1000"))
+OWNERS = 500 #rows are spread over 500 users, like a catalogue shared by many sellers
+
+SOURCES = [service_source("product-service", "product_app.py"), service_source("product-service", "product_import.py")]
+SCHEMA = service_source("scripts", "structure", "product_init.sql")
+
+SAMPLES = {
+    "id": SEED_ROWS // 2,
+    "created_by": 42,
+    "name": "product 1234",
+    "price": 19.9,
+    "quantity": 3,
+    "description": "seeded product",
+    "job_id": "0" * 32,
+    "rows_processed": 500,
+    "rows_inserted": 480,
+    "rows_failed": 20,
+}
+
+SEED_SQL = "INSERT INTO items (name, price, quantity, description, created_by) VALUES (%s, %s, %s, %s, %s)"
+
+
+def service_statements():
+    statements = []
+    for source in SOURCES:
+        statements.extend(ProductIndexUsageHelpers.extract_statements(source))
+    return statements
+
+
+@pytest.fixture(scope="module")
+def index_helper():
+    pymysql = pytest.importorskip("pymysql")
+    try:
+        connection = pymysql.connect(host=os.environ.get("INDEX_TEST_MYSQL_HOST", "127.0.0.1"),
+                                     port=int(os.environ.get("INDEX_TEST_MYSQL_PORT", "3306")),
+                                     user=os.environ.get("INDEX_TEST_MYSQL_USER", "root"),
+                                     password=os.environ.get("INDEX_TEST_MYSQL_PASSWORD", ""),
+                                     cursorclass=pymysql.cursors.DictCursor,
+                                     connect_timeout=3)
+    except pymysql.Error as e:
+        pytest.skip(f"MySQL not reachable for the index usage suite: {e}")
+
+    helper = ProductIndexUsageHelpers(connection, "index_usage_products", MAX_SCAN_ROWS)
+    helper.create_schema(SCHEMA)
+    helper.seed("items", SEED_SQL, [(f"product {index}", 19.9, index % 100, "seeded product", index % OWNERS)
+                                    for index in range(SEED_ROWS)])
+    yield helper
+    helper.drop_schema()
+    connection.close()
+
+
+class TestProductStatementExtraction:
+    """Runs without MySQL - keeps the statement list in sync with the service code"""
+
+    def test_known_statements_are_found(self):
+        statements = service_statements()
+        assert "SELECT id, name, price, quantity, description, created_at, created_by FROM items WHERE created_by = %s" in statements
+        assert "DELETE FROM items WHERE id = %s AND created_by = %s" in statements
+        assert "INSERT INTO items (name, price, quantity, description, created_by) VALUES (%s, %s, %s, %s, %s)" in statements #import module constant
+        assert "SELECT rows_processed, rows_inserted, rows_failed FROM import_offsets WHERE job_id=%s" in statements
+        assert "DELETE FROM import_offsets WHERE job_id=%s" in statements
+        assert any(statement.startswith("INSERT INTO import_offsets (job_id, rows_processed, rows_inserted, rows_failed)") for statement in statements) #SAVE_OFFSET_SQL
+
+    def test_every_statement_can_be_bound(self):
+        for statement in service_statements():
+            bound = ProductIndexUsageHelpers.bind_sample_values(statement, SAMPLES)
+            assert "%s" not in bound
+
+    def test_string_columns_get_quoted_values(self):
+        bound = ProductIndexUsageHelpers.bind_sample_values("UPDATE items SET name = %s WHERE id = %s", SAMPLES)
+        assert bound == f"UPDATE items SET name = 'product 1234' WHERE id = {SAMPLES['id']}"
+
+    def test_plan_problems_above_threshold(self):
+        helper = ProductIndexUsageHelpers(None, "unused", max_scan_rows=1000)
+        assert helper.plan_problems([{"table": "items", "type": "ref", "rows": 100, "Extra": None}]) == []
+        assert helper.plan_problems([{"table": "items", "type": "ALL", "rows": 500, "Extra": None}]) == [] #small tables may scan
+        assert helper.plan_problems([{"table": "items", "type": "ALL", "rows": 50000, "Extra": "Using where; Using filesort"}]) == [
+            "full table scan on items (50000 rows)", "filesort on items (50000 rows)"]
+
+
+@pytest.mark.parametrize("statement", [statement for statement in service_statements() if ProductIndexUsageHelpers.needs_index(statement)])
+def test_statement_uses_an_index(index_helper, statement):
+    plan = index_helper.explain(ProductIndexUsageHelpers.bind_sample_values(statement, SAMPLES))
+    problems = index_helper.plan_problems(plan)
+    assert not problems, f"{statement}\n" + "\n".join(problems) + f"\nEXPLAIN: {plan}"
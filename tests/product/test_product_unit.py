@@ -1,13 +1,15 @@
-import pytest, sys, os
+import io, pytest, sys, os
 from unittest.mock import Mock, patch, MagicMock
 from unittest import mock
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../product-service')))
 
 
-from product_app import app, token_required, get_db_connection
+from product_app import create_app, token_required, get_db_connection, health_monitor
 from pymysql import Error
 
+app = create_app()
+
 
 class TestProductTokenRequiredDecorator:
     
@@ -93,6 +95,7 @@ class TestGetDbConnection:
             })
             
             import pymysql
+            from product_db_instrumentation import InstrumentedCursor
             conn = get_db_connection()
 
             assert conn == mock_conn
@@ -102,7 +105,9 @@ class TestGetDbConnection:
                 password="test_product_pass",
                 db="test_product_db",
                 port=3306,
-                cursorclass=pymysql.cursors.DictCursor
+                cursorclass=InstrumentedCursor,
+                connect_timeout=2, #DB_CONNECT_TIMEOUT and DB_READ_TIMEOUT defaults
+                read_timeout=10
             )
     
     @patch('product_app.pymysql.connect')
@@ -243,6 +248,30 @@ class TestProductAppRoutesWithMocks:
                             assert response.status_code == 200
                             assert response.get_json() == {"products": db_data}
 
+    @patch('product_app.get_db_connection')
+    @patch('product_app.jwt.decode')
+    def test_product_get_route_encodes_decimal_and_datetime(self, mock_jwt_decode, mock_db):
+        from decimal import Decimal
+        from datetime import datetime as dt
+        mock_jwt_decode.return_value = {'user_id': 333, 'email': 'test_product_unit@example.com'}
+
+        #Row exactly as pymysql returns it - DECIMAL price and DATETIME created_at
+        db_data = [{"id": 1, "name": "keyboard", "price": Decimal("29.90"), "quantity": 10,
+                    "description": "", "created_at": dt(2025, 1, 2, 3, 4, 5), "created_by": 333}]
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_db.return_value = mock_conn
+        mock_cursor.fetchall.return_value = db_data
+
+        with app.test_client() as client:
+            response = client.get('/products', headers={'Authorization': 'Bearer valid.jwt.token'})
+
+        assert response.status_code == 200
+        product = response.get_json()["products"][0]
+        assert product["price"] == 29.9
+        assert product["created_at"] == "Thu, 02 Jan 2025 03:04:05 GMT"
+
     @patch('product_app.get_db_connection')
     @patch('product_app.jwt.decode')
     def test_product_get_empty(self, mock_jwt_decode, mock_db):
@@ -361,10 +390,18 @@ class TestProductAppRoutesWithMocks:
 
 class TestProductHealthCheck:
 
+    @pytest.fixture(autouse=True)
+    def started(self):
+        from product_app import startup
+        startup.ready.set() #what the startup thread does once verify_db_setup passed
+        yield
+        startup.ready.clear()
+
     @patch('product_app.get_db_connection')
     def test_health_check(self, mock_db):
         mock_conn = MagicMock()
         mock_db.return_value = mock_conn
+        health_monitor.run_checks() #what the monitor thread does every HEALTH_CHECK_INTERVAL
         
         with app.test_client() as client:
             response = client.get('/health')
@@ -375,10 +412,1351 @@ class TestProductHealthCheck:
     def test_health_check_detailed(self, mock_db):
         mock_conn = MagicMock()
         mock_db.return_value = mock_conn
+        health_monitor.run_checks()
         
         with app.test_client() as client:
             response = client.get('/health/detailed')
             assert response.status_code == 200
             data = response.get_json()
             assert "checks" in data
-            assert data["checks"]["database_connection"] == True
\ No newline at end of file
+            assert data["checks"]["database_connection"] == True
+            assert data["check_age_seconds"] >= 0
+
+    def test_stale_snapshot_is_unhealthy(self):
+        from product_health import HealthMonitor
+
+        monitor = HealthMonitor({"database": lambda: True}, interval=5)
+        snapshot = monitor.snapshot()
+        assert snapshot.healthy()
+        assert monitor.snapshot() is snapshot #cached, the check is not run again
+
+        snapshot.finished -= 16 #monitor thread stuck for more than 3 intervals
+        assert snapshot.stale() and not snapshot.healthy()
+
+    def test_monitor_thread_refreshes_the_snapshot(self):
+        import threading
+        from product_health import HealthMonitor
+
+        calls = threading.Semaphore(0)
+        def check():
+            calls.release()
+            raise ConnectionError("MySQL unreachable")
+
+        monitor = HealthMonitor({"database": check}, interval=0.01).start()
+        try:
+            assert calls.acquire(timeout=2) and calls.acquire(timeout=2) #two rounds on its own schedule
+        finally:
+            monitor.stop()
+        result = monitor.last.checks["database"]
+        assert (result["ok"], result["error"]) == (False, "MySQL unreachable")
+
+class TestProductImport:
+
+    @patch('product_app.jwt.decode')
+    def test_import_route_accepts_csv(self, mock_jwt_decode):
+        mock_jwt_decode.return_value = {'user_id': 333, 'email': 'test_product_unit@example.com'}
+
+        from product_import import ImportJob
+        fake_job = MagicMock(spec=ImportJob)
+        fake_job.job_id = "abc123"
+        fake_job.status = "queued"
+        fake_job.bytes_total = 36
+
+        with patch('product_app.import_manager.submit', return_value=fake_job) as mock_submit:
+            with app.test_client() as client:
+                response = client.post('/products/import',
+                    data=b"name,price,quantity\nkeyboard,10.50,2\n",
+                    headers={'Authorization': 'Bearer valid.jwt.token'},
+                    content_type='text/csv')
+
+        assert response.status_code == 202
+        assert response.get_json()["job_id"] == "abc123"
+        assert response.headers["Location"] == "/products/import/abc123"
+        assert mock_submit.call_args[0][0] == 333
+        assert mock_submit.call_args[0][2] == "csv"
+
+    @patch('product_app.jwt.decode')
+    def test_import_route_unsupported_format(self, mock_jwt_decode):
+        mock_jwt_decode.return_value = {'user_id': 333, 'email': 'test_product_unit@example.com'}
+
+        with app.test_client() as client:
+            response = client.post('/products/import',
+                data=b"<xml></xml>",
+                headers={'Authorization': 'Bearer valid.jwt.token'},
+                content_type='application/xml')
+
+        assert response.status_code == 415
+        assert "Unsupported import format" in response.get_json()["error"]
+
+    @patch('product_app.jwt.decode')
+    def test_import_job_not_visible_to_other_users(self, mock_jwt_decode):
+        mock_jwt_decode.return_value = {'user_id': 999, 'email': 'other@example.com'}
+
+        from product_import import ImportJob
+        other_job = ImportJob("job-1", 333, "csv", "/nonexistent.csv")
+
+        with patch('product_app.import_manager.get', return_value=other_job):
+            with app.test_client() as client:
+                response = client.get('/products/import/job-1', headers={'Authorization': 'Bearer valid.jwt.token'})
+
+        assert response.status_code == 404
+
+    def test_import_job_processes_chunks_and_reports_row_errors(self, tmp_path):
+        from product_import import ImportJob, ImportJobManager
+
+        spool_path = tmp_path / "job-1.ndjson"
+        spool_path.write_text(
+            '{"name": "keyboard", "price": 10.5, "quantity": 2}\n'
+            '{"name": "mouse<script>", "price": 5}\n'
+            'not json\n'
+            '{"name": "monitor", "price": "199.90"}\n'
+        )
+
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_cursor.fetchone.return_value = None #no offset committed yet
+
+        manager = ImportJobManager(str(tmp_path), lambda: mock_conn, chunk_size=2)
+        job = ImportJob("job-1", 333, "ndjson", str(spool_path))
+        manager.process(job)
+
+        assert job.status == "completed"
+        assert job.rows_processed == 4
+        assert job.rows_inserted == 2
+        assert job.rows_failed == 2
+        assert [error["row"] for error in job.errors] == [2, 3]
+        assert mock_cursor.executemany.call_count == 2 #one multi-row insert per chunk
+        assert mock_cursor.executemany.call_args_list[0][0][1] == [("keyboard", 10.5, 2, "", 333)]
+        assert (tmp_path / "job-1.json").exists() #checkpoint persisted
+
+    def test_import_job_resumes_from_checkpoint(self, tmp_path):
+        from product_import import ImportJob, ImportJobManager
+
+        spool_path = tmp_path / "job-2.csv"
+        spool_path.write_text("name,price\nfirst,1\nsecond,2\nthird,3\n")
+
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_cursor.fetchone.return_value = None #no offset committed yet
+
+        manager = ImportJobManager(str(tmp_path), lambda: mock_conn, chunk_size=10)
+        job = ImportJob("job-2", 333, "csv", str(spool_path))
+        job.rows_processed = 2 #first two rows were committed before the restart
+        manager.process(job)
+
+        inserted = mock_cursor.executemany.call_args[0][1]
+        assert [row[0] for row in inserted] == ["third"]
+        assert job.rows_processed == 3
+
+    def test_import_job_of_another_worker_is_read_from_its_checkpoint(self, tmp_path):
+        from product_import import ImportJob, ImportJobManager
+
+        spool_path = tmp_path / f"{'a' * 32}.csv"
+        spool_path.write_text("name,price\nfirst,1\nsecond,2\n")
+        running = ImportJobManager(str(tmp_path), MagicMock())
+        job = ImportJob("a" * 32, 333, "csv", str(spool_path))
+        job.status, job.rows_processed, job.started_at = "running", 1, "2026-01-01T00:00:00+00:00"
+        running._save_checkpoint(job)
+
+        other_worker = ImportJobManager(str(tmp_path), MagicMock())
+        snapshot = other_worker.get("a" * 32).to_dict()
+
+        assert (snapshot["status"], snapshot["rows_processed"], snapshot["started_at"]) == ("running", 1, "2026-01-01T00:00:00+00:00")
+        assert other_worker.get("b" * 32) is None
+        assert other_worker.get("../" + "a" * 29) is None #only job ids name checkpoint files
+
+    def test_import_offset_commits_with_the_chunk_and_wins_over_a_stale_checkpoint(self, tmp_path):
+        from product_import import ImportJob, ImportJobManager, SAVE_OFFSET_SQL
+
+        spool_path = tmp_path / "job-5.csv"
+        spool_path.write_text("name,price\nfirst,1\nsecond,2\nthird,3\n")
+
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+        #the process died after committing the first two rows, before the checkpoint file said so
+        mock_cursor.fetchone.return_value = {"rows_processed": 2, "rows_inserted": 2, "rows_failed": 0}
+
+        manager = ImportJobManager(str(tmp_path), lambda: mock_conn, chunk_size=10)
+        job = ImportJob("job-5", 333, "csv", str(spool_path))
+        manager.process(job)
+
+        assert [row[0] for row in mock_cursor.executemany.call_args[0][1]] == ["third"] #not inserted twice
+        assert (SAVE_OFFSET_SQL, ("job-5", 3, 3, 0)) in [call[0] for call in mock_cursor.execute.call_args_list]
+        assert job.rows_inserted == 3
+        assert mock_cursor.execute.call_args[0] == ("DELETE FROM import_offsets WHERE job_id=%s", ("job-5",)) #completed, never resumed again
+
+    def test_import_upload_over_the_cap_is_refused(self, tmp_path):
+        from product_import import ImportJobManager, ImportTooLarge
+
+        manager = ImportJobManager(str(tmp_path), MagicMock(), max_bytes=100 * 1024)
+        with pytest.raises(ImportTooLarge):
+            manager.submit(333, io.BytesIO(b"name,price\n" + b"x,1\n" * 50000), "csv")
+        assert list(tmp_path.iterdir()) == [] #partial spool removed
+
+    @patch('product_app.jwt.decode', return_value={'user_id': 333})
+    def test_import_route_answers_413_over_the_cap(self, mock_jwt_decode):
+        with patch('product_app.import_manager.max_bytes', 1024), app.test_client() as client:
+            response = client.post('/products/import', data=b"name,price\n" + b"x,1\n" * 1000,
+                                   headers={'Authorization': 'Bearer valid.jwt.token', 'Content-Type': 'text/csv'})
+
+        assert response.status_code == 413
+
+    def test_failed_import_leaves_no_upload_behind(self, tmp_path):
+        from product_import import ImportJobManager
+
+        connections = [None, MagicMock()] #MySQL down for the job, back for the offset cleanup
+        manager = ImportJobManager(str(tmp_path), lambda: connections.pop(0))
+        job = manager.submit(333, io.BytesIO(b"name,price\nfirst,1\n"), "csv")
+        manager._queue.join()
+
+        assert job.status == "failed"
+        assert sorted(path.name for path in tmp_path.iterdir()) == [f"{job.job_id}.json"] #status stays readable, upload and lock gone
+        assert connections == [] #offset row deleted
+
+    def test_old_checkpoints_of_finished_jobs_are_swept(self, tmp_path):
+        import json
+        from datetime import datetime, timezone
+        from product_import import ImportJobManager
+
+        for job_id, finished_at in (("a" * 32, "2020-01-01T00:00:00+00:00"), ("b" * 32, datetime.now(timezone.utc).isoformat())):
+            (tmp_path / f"{job_id}.csv").write_text("name,price\n")
+            (tmp_path / f"{job_id}.json").write_text(json.dumps({"job_id": job_id, "status": "failed", "finished_at": finished_at,
+                                                                 "spool_path": str(tmp_path / f"{job_id}.csv")}))
+
+        assert ImportJobManager(str(tmp_path), MagicMock()).resume_pending() == 0
+        assert sorted(path.name for path in tmp_path.iterdir()) == [f"{'b' * 32}.json"]
+
+    def test_import_job_reads_msgpack_array(self, tmp_path):
+        msgpack = pytest.importorskip("msgpack")
+        from product_import import ImportJob, ImportJobManager
+
+        spool_path = tmp_path / "job-3.msgpack"
+        spool_path.write_bytes(msgpack.packb([{"name": "keyboard", "price": 10}, {"name": "", "price": 1}]))
+
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_cursor.fetchone.return_value = None #no offset committed yet
+
+        manager = ImportJobManager(str(tmp_path), lambda: mock_conn)
+        job = ImportJob("job-3", 333, "msgpack", str(spool_path))
+        manager.process(job)
+
+        assert job.rows_inserted == 1
+        assert job.errors[0]["row"] == 2
+
+
+class TestProductContentNegotiation:
+
+    def _mock_products_db(self, mock_db, rows):
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_db.return_value = mock_conn
+        mock_cursor.fetchall.return_value = rows
+        mock_cursor.lastrowid = 7
+        return mock_cursor
+
+    @patch('product_app.get_db_connection')
+    @patch('product_app.jwt.decode')
+    def test_get_products_as_msgpack(self, mock_jwt_decode, mock_db):
+        msgpack = pytest.importorskip("msgpack")
+        from decimal import Decimal
+        mock_jwt_decode.return_value = {'user_id': 333, 'email': 'test_product_unit@example.com'}
+        self._mock_products_db(mock_db, [{"id": 1, "name": "keyboard", "price": Decimal("29.90")}])
+
+        with app.test_client() as client:
+            response = client.get('/products', headers={'Authorization': 'Bearer valid.jwt.token',
+                                                        'Accept': 'application/msgpack'})
+
+        assert response.status_code == 200
+        assert response.mimetype == "application/msgpack"
+        assert "Accept" in response.headers["Vary"]
+        assert msgpack.unpackb(response.data) == {"products": [{"id": 1, "name": "keyboard", "price": 29.9}]}
+
+    @patch('product_app.get_db_connection')
+    @patch('product_app.jwt.decode')
+    def test_get_products_defaults_to_json(self, mock_jwt_decode, mock_db):
+        mock_jwt_decode.return_value = {'user_id': 333, 'email': 'test_product_unit@example.com'}
+        self._mock_products_db(mock_db, [{"id": 1}])
+
+        with app.test_client() as client:
+            response = client.get('/products', headers={'Authorization': 'Bearer valid.jwt.token', 'Accept': '*/*'})
+
+        assert response.mimetype == "application/json"
+
+    @patch('product_app.get_db_connection')
+    @patch('product_app.jwt.decode')
+    def test_create_product_with_cbor_body(self, mock_jwt_decode, mock_db):
+        cbor2 = pytest.importorskip("cbor2")
+        mock_jwt_decode.return_value = {'user_id': 333, 'email': 'test_product_unit@example.com'}
+        self._mock_products_db(mock_db, [])
+
+        with app.test_client() as client:
+            response = client.post('/products',
+                data=cbor2.dumps({"name": "keyboard", "price": 10.5, "quantity": 2}),
+                headers={'Authorization': 'Bearer valid.jwt.token', 'Accept': 'application/cbor'},
+                content_type='application/cbor')
+
+        assert response.status_code == 201
+        body = cbor2.loads(response.data)
+        assert body["id"] == 7
+        assert body["product_name"] == "keyboard"
+
+    @patch('product_app.jwt.decode')
+    def test_create_product_with_corrupt_msgpack_body(self, mock_jwt_decode):
+        pytest.importorskip("msgpack")
+        mock_jwt_decode.return_value = {'user_id': 333, 'email': 'test_product_unit@example.com'}
+
+        with app.test_client() as client:
+            response = client.post('/products', data=b"\xc1\xc1",
+                headers={'Authorization': 'Bearer valid.jwt.token'},
+                content_type='application/msgpack')
+
+        assert response.status_code == 400
+
+
+
+class TestProductCompression:
+
+    @patch('product_app.get_db_connection')
+    @patch('product_app.jwt.decode')
+    def test_large_listing_is_gzip_compressed(self, mock_jwt_decode, mock_db):
+        import gzip
+        mock_jwt_decode.return_value = {'user_id': 333, 'email': 'test_product_unit@example.com'}
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_db.return_value = mock_conn
+        mock_cursor.fetchall.return_value = [{"id": index, "name": f"product {index}", "price": 1.5} for index in range(200)]
+
+        with app.test_client() as client:
+            response = client.get('/products', headers={'Authorization': 'Bearer valid.jwt.token', 'Accept-Encoding': 'gzip'})
+
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert len(gzip.decompress(response.data)) > len(response.data)
+
+    @patch('product_app.get_db_connection')
+    def test_small_response_is_not_compressed(self, mock_db):
+        from product_app import startup
+        mock_db.return_value = MagicMock()
+
+        startup.ready.set()
+        try:
+            with app.test_client() as client:
+                response = client.get('/health', headers={'Accept-Encoding': 'gzip, br, zstd'})
+        finally:
+            startup.ready.clear()
+
+        assert "Content-Encoding" not in response.headers
+        assert response.get_json()["status"] == "healthy"
+
+    def test_streamed_response_is_compressed_incrementally(self):
+        import zlib
+        from flask import Flask
+        from product_compression import Compressor, setup_compression
+
+        stream_app = Flask("stream_test")
+        setup_compression(stream_app, Compressor(min_size=10**9)) #threshold does not apply to streams
+
+        @stream_app.route("/export")
+        def export():
+            return stream_app.response_class((f"row {index}\n" for index in range(100)), mimetype="text/csv")
+
+        with stream_app.test_client() as client:
+            response = client.get("/export", headers={"Accept-Encoding": "gzip"}, buffered=False)
+            chunks = list(response.response)
+
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert len(chunks) > 1 #one compressed block per produced chunk
+        assert zlib.decompress(b"".join(chunks), 31).decode().startswith("row 0\nrow 1\n")
+
+    def test_choose_encoding_prefers_client_weights(self):
+        from werkzeug.datastructures import Accept
+        from product_compression import Compressor
+
+        compressor = Compressor()
+        compressor.encodings = ["zstd", "br", "gzip"]
+        assert compressor.choose_encoding(Accept([("gzip", 1), ("br", 0.5)])) == "gzip"
+        assert compressor.choose_encoding(Accept([("gzip", 1), ("br", 1)])) == "br"
+        assert compressor.choose_encoding(Accept([("identity", 1)])) is None
+
+
+class TestProductMetrics:
+
+    @patch('product_app.get_db_connection')
+    def test_metrics_endpoint_exposes_prometheus_text(self, mock_db):
+        mock_db.return_value = MagicMock()
+
+        with app.test_client() as client:
+            client.get('/health')
+            response = client.get('/metrics')
+
+        assert response.status_code == 200
+        assert response.mimetype == "text/plain"
+        body = response.get_data(as_text=True)
+        assert 'http_requests_total{method="GET",route="/health",status="200"}' in body
+        assert 'http_requests_in_flight{route="/metrics"} 1' in body #the scrape itself is in flight
+        assert "# TYPE db_connect_duration_seconds histogram" in body
+        assert "# TYPE process_cpu_seconds_total counter" in body #rate() needs the counter type
+        assert "product_import_queue_depth 0" in body
+
+    @patch('product_app.get_db_connection')
+    @patch('product_app.jwt.decode')
+    def test_compressed_bytes_are_counted_per_encoding(self, mock_jwt_decode, mock_db):
+        from product_compression import compression_responses_total, compression_bytes_out_total
+        mock_jwt_decode.return_value = {'user_id': 333, 'email': 'test_product_unit@example.com'}
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_db.return_value = mock_conn
+        mock_cursor.fetchall.return_value = [{"id": index, "name": f"product {index}", "price": 1.5} for index in range(200)]
+        responses_before = compression_responses_total.value(("gzip",))
+        bytes_before = compression_bytes_out_total.value(("gzip",))
+
+        with app.test_client() as client:
+            response = client.get('/products', headers={'Authorization': 'Bearer valid.jwt.token', 'Accept-Encoding': 'gzip'})
+
+        assert compression_responses_total.value(("gzip",)) == responses_before + 1
+        assert compression_bytes_out_total.value(("gzip",)) == bytes_before + len(response.data)
+
+    def test_unmatched_routes_share_one_label(self):
+        from product_metrics import http_requests_total
+
+        before = http_requests_total.value(("GET", "unmatched", "404"))
+        with app.test_client() as client:
+            client.get('/does-not-exist/1')
+            client.get('/does-not-exist/2')
+
+        assert http_requests_total.value(("GET", "unmatched", "404")) == before + 2
+
+    def test_request_start_header_parsing(self):
+        from product_metrics import parse_request_start
+
+        now = 1700000000.5
+        assert parse_request_start("t=1700000000.250", now=now) == pytest.approx(0.25)
+        assert parse_request_start("t=1700000000250", now=now) == pytest.approx(0.25) #milliseconds
+        assert parse_request_start("t=1700000000250000", now=now) == pytest.approx(0.25) #microseconds
+        assert parse_request_start("t=1700000001", now=now) == 0.0 #clock skew never gives a negative wait
+        assert parse_request_start("garbage") is None
+        assert parse_request_start(None) is None
+
+    def test_saturation_is_the_highest_component(self):
+        from product_metrics import SaturationSignal
+
+        signal = SaturationSignal(capacity=10, queue_wait_target=0.1, db_wait_target=0.1)
+        for _ in range(50):
+            signal.db_wait.observe(0.2) #DB connects twice as slow as the target
+        components = signal.components()
+
+        assert components[("db_wait",)] == pytest.approx(2.0, rel=0.05)
+        assert components[("queue_wait",)] == 0.0
+        assert signal.value() == pytest.approx(components[("db_wait",)], rel=0.01)
+
+    def test_saturation_fades_when_traffic_stops(self):
+        from product_metrics import DecayingAverage
+
+        average = DecayingAverage(alpha=1.0, half_life=10.0)
+        average.observe(1.0)
+        average.updated -= 10 #one half life without observations
+        assert average.value() == pytest.approx(0.5, rel=0.01)
+
+
+class TestProductDBInstrumentation:
+
+    def test_fingerprint_drops_values(self):
+        from product_db_instrumentation import fingerprint
+
+        assert fingerprint("SELECT * FROM items WHERE id = %s AND created_by = %s") == "SELECT * FROM items WHERE id = ? AND created_by = ?"
+        assert fingerprint("SELECT *   FROM items\n WHERE name = 'tv' LIMIT 10") == "SELECT * FROM items WHERE name = ? LIMIT ?"
+        assert fingerprint("INSERT INTO items (name) VALUES (%s, %s),(%s, %s)") == fingerprint("INSERT INTO items (name) VALUES (%s, %s)")
+
+    @patch('pymysql.cursors.Cursor.execute', return_value=1)
+    def test_queries_are_counted_per_request(self, mock_execute):
+        from product_db_instrumentation import InstrumentedCursor, request_db_stats
+
+        with app.test_request_context('/products'):
+            cursor = InstrumentedCursor(MagicMock())
+            cursor.execute("SELECT * FROM items WHERE id = %s", (1,))
+            cursor.execute("SELECT * FROM items WHERE id = %s", (2,))
+            query_count, db_time_ms = request_db_stats()
+
+        assert query_count == 2
+        assert db_time_ms >= 0
+
+    @patch('pymysql.cursors.Cursor.execute', return_value=1)
+    def test_slow_query_is_logged_with_explain(self, mock_execute, caplog):
+        import product_db_instrumentation
+        from product_db_instrumentation import InstrumentedCursor
+
+        connection = MagicMock()
+        explain_cursor = connection.cursor.return_value.__enter__.return_value
+        explain_cursor.fetchall.return_value = [{"table": "items", "type": "ALL", "rows": 50000}]
+        cursor = InstrumentedCursor(connection)
+        cursor._executed = "SELECT * FROM items WHERE description = 'tv'"
+
+        with patch.object(product_db_instrumentation, "SLOW_QUERY_MS", 0), caplog.at_level("WARNING"):
+            product_db_instrumentation._last_explain.clear()
+            cursor.execute("SELECT * FROM items WHERE description = %s", ("tv",))
+
+        explain_cursor.execute.assert_called_once_with("EXPLAIN SELECT * FROM items WHERE description = 'tv'")
+        record = next(record for record in caplog.records if record.message.startswith("Slow query"))
+        assert record.explain == [{"table": "items", "type": "ALL", "rows": 50000}]
+        assert record.statement == "SELECT * FROM items WHERE description = ?"
+
+    def test_failed_statement_is_not_explained(self, caplog):
+        import pymysql
+        import product_db_instrumentation
+        from product_db_instrumentation import InstrumentedCursor
+
+        connection = MagicMock()
+        cursor = InstrumentedCursor(connection)
+        cursor._executed = "SELECT * FROM items WHERE id = 1"
+        with patch.object(product_db_instrumentation, "SLOW_QUERY_MS", 0), caplog.at_level("WARNING"), \
+             patch('pymysql.cursors.Cursor.execute', side_effect=pymysql.err.ProgrammingError(1064, "syntax error")):
+            product_db_instrumentation._last_explain.clear()
+            with pytest.raises(pymysql.err.ProgrammingError):
+                cursor.execute("SELECT * FROM items WHERE id = %s", (1,))
+
+        connection.cursor.assert_not_called()
+        record = next(record for record in caplog.records if record.message.startswith("Slow query"))
+        assert record.explain is None
+
+    @patch('pymysql.cursors.Cursor.execute', return_value=1)
+    def test_explain_history_is_bounded(self, mock_execute):
+        import product_db_instrumentation
+        from product_db_instrumentation import InstrumentedCursor
+
+        cursor = InstrumentedCursor(MagicMock())
+        cursor._executed = "SELECT 1 FROM items"
+        with patch.object(product_db_instrumentation, "EXPLAIN_HISTORY", 3):
+            product_db_instrumentation._last_explain.clear()
+            for index in range(5):
+                cursor._explain(f"SELECT * FROM t{index}")
+            assert list(product_db_instrumentation._last_explain) == ["SELECT * FROM t2", "SELECT * FROM t3", "SELECT * FROM t4"]
+
+
+@pytest.fixture
+def span_exporter(monkeypatch):
+    monkeypatch.delenv("OTEL_SDK_DISABLED", raising=False) #conftest disables the SDK for the app import
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    exporter.tracer = provider.get_tracer(__name__)
+    return exporter
+
+
+class TestProductRequestTracing:
+
+    def _finish(self, span_exporter, path, method, body, payload, status, user_id=None):
+        from flask import jsonify, g
+        from opentelemetry import trace
+        from product_tracing import _enrich_request_span
+
+        with app.test_request_context(path, method=method, json=body):
+            with span_exporter.tracer.start_as_current_span("request") as span, trace.use_span(span):
+                if user_id is not None:
+                    g.current_user_id = user_id
+                response = jsonify(payload) #the JSON provider keeps the payload for the hook
+                response.status_code = status
+                _enrich_request_span(response)
+        return span_exporter.get_finished_spans()[-1]
+
+    def test_success_copies_declared_response_fields(self, span_exporter):
+        span = self._finish(span_exporter, '/products', 'GET', None, {"products": [{"id": 1}, {"id": 2}]}, 200, user_id=3)
+
+        assert span.attributes["product.count"] == 2
+        assert span.attributes["enduser.id"] == "3"
+        assert span.attributes["app.result"] == "success"
+        assert "error" not in span.attributes
+
+    def test_request_fields_are_read_from_the_body(self, span_exporter):
+        span = self._finish(span_exporter, '/products', 'PUT', {"id": 7, "price": 10}, {"error": "Product not found"}, 404)
+
+        assert span.attributes["product.id"] == 7
+        assert span.attributes["app.result"] == "client_error"
+        assert span.attributes["error.message"] == "Product not found"
+        assert span.status.is_ok #4xx are the client's fault, the span stays unset
+
+    def test_server_error_sets_span_status(self, span_exporter):
+        from opentelemetry.trace import StatusCode
+
+        span = self._finish(span_exporter, '/products', 'DELETE', {"id": 7}, {"error": "Database connection error"}, 503)
+
+        assert span.attributes["app.result"] == "server_error"
+        assert span.status.status_code == StatusCode.ERROR
+        assert span.status.description == "Database connection error"
+
+    def test_unrecorded_span_is_left_alone(self):
+        from product_tracing import _enrich_request_span
+
+        with app.test_request_context('/products'):
+            response = app.response_class(status=500)
+            assert _enrich_request_span(response) is response #no active span, nothing to enrich
+
+
+class TestProductTraceSampling:
+
+    def _provider(self, monkeypatch, sampler=None, **tail_options):
+        monkeypatch.delenv("OTEL_SDK_DISABLED", raising=False)
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+        from product_sampling import TailSamplingSpanProcessor
+
+        exporter = InMemorySpanExporter()
+        provider = TracerProvider(sampler=sampler) if sampler else TracerProvider()
+        processor = TailSamplingSpanProcessor(SimpleSpanProcessor(exporter), **tail_options)
+        provider.add_span_processor(processor)
+        return provider.get_tracer(__name__), exporter, processor
+
+    def test_route_ratios_are_parsed(self):
+        from product_sampling import parse_route_ratios
+
+        assert parse_route_ratios("/health=0, /products=0.25,bogus,/x=7") == {"/health": 0.0, "/products": 0.25, "/x": 1.0}
+
+    def test_dropped_route_is_not_recorded_nor_its_children(self, monkeypatch):
+        from opentelemetry.sdk.trace.sampling import ParentBased
+        from product_sampling import RouteSampler
+
+        tracer, exporter, processor = self._provider(monkeypatch, ParentBased(RouteSampler(1.0, {"/health": 0.0})), ratio=1.0)
+        with tracer.start_as_current_span("GET /health", attributes={"http.route": "/health"}) as span:
+            with tracer.start_as_current_span("SELECT") as child:
+                assert not child.is_recording()
+            assert not span.is_recording()
+        with tracer.start_as_current_span("GET /products", attributes={"http.route": "/products"}):
+            pass
+
+        assert [span.name for span in exporter.get_finished_spans()] == ["GET /products"]
+
+    def test_tail_keeps_whole_errored_trace(self, monkeypatch):
+        from opentelemetry.trace import Status, StatusCode
+
+        tracer, exporter, processor = self._provider(monkeypatch, ratio=0.0)
+        with tracer.start_as_current_span("GET /products"):
+            with tracer.start_as_current_span("SELECT") as child:
+                child.set_status(Status(StatusCode.ERROR, "lost connection"))
+            assert exporter.get_finished_spans() == () #held until the root ends
+        with tracer.start_as_current_span("GET /products"):
+            pass
+
+        assert [span.name for span in exporter.get_finished_spans()] == ["SELECT", "GET /products"]
+
+    def test_tail_keeps_slow_trace(self, monkeypatch):
+        import time
+
+        tracer, exporter, processor = self._provider(monkeypatch, ratio=0.0, latency_threshold=0.01)
+        with tracer.start_as_current_span("GET /products"):
+            time.sleep(0.02)
+
+        assert len(exporter.get_finished_spans()) == 1
+
+    def test_tail_buffer_is_bounded(self, monkeypatch):
+        from opentelemetry import trace
+
+        tracer, exporter, processor = self._provider(monkeypatch, ratio=1.0, max_traces=2)
+        for index in range(4):
+            with trace.use_span(tracer.start_span(f"root {index}")):
+                tracer.start_span("child").end() #children end, roots never do
+
+        assert len(processor._traces) == 2
+        assert exporter.get_finished_spans() == ()
+
+
+class TestProductSpanExport:
+
+    def _spans(self, monkeypatch, count=1):
+        monkeypatch.delenv("OTEL_SDK_DISABLED", raising=False)
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+        from opentelemetry.trace import Status, StatusCode
+
+        exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+        tracer = provider.get_tracer("product-service", "1.0.0")
+        for index in range(count):
+            with tracer.start_as_current_span("GET /products", attributes={"http.status_code": 500, "cache.hit": False}):
+                with tracer.start_as_current_span("SELECT") as child:
+                    child.set_status(Status(StatusCode.ERROR, "lost connection"))
+        return exporter.get_finished_spans()
+
+    def test_spans_are_encoded_as_otlp_json(self, monkeypatch):
+        from product_span_export import encode_spans
+
+        child, root = self._spans(monkeypatch)
+        body = encode_spans([child, root])
+
+        scope_spans = body["resourceSpans"][0]["scopeSpans"]
+        assert scope_spans[0]["scope"] == {"name": "product-service", "version": "1.0.0"}
+        encoded_child, encoded_root = scope_spans[0]["spans"]
+        assert encoded_root["traceId"] == format(root.context.trace_id, "032x")
+        assert encoded_child["parentSpanId"] == encoded_root["spanId"]
+        assert "parentSpanId" not in encoded_root
+        assert encoded_root["kind"] == 1 #SPAN_KIND_INTERNAL
+        assert {"key": "http.status_code", "value": {"intValue": "500"}} in encoded_root["attributes"]
+        assert {"key": "cache.hit", "value": {"boolValue": False}} in encoded_root["attributes"]
+        assert encoded_child["status"] == {"code": 2, "message": "lost connection"}
+
+    def test_exporter_posts_gzip_to_the_collector(self, monkeypatch):
+        sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../scripts/loadtest')))
+        from otlp_collector import start_collector
+        from opentelemetry.sdk.trace.export import SpanExportResult
+        from product_span_export import MeasuredSpanExporter, OTLPJSONSpanExporter, spans_exported_total
+
+        server, stats = start_collector()
+        exporter = MeasuredSpanExporter(OTLPJSONSpanExporter(f"http://127.0.0.1:{server.server_address[1]}/v1/traces"), "test")
+        try:
+            assert exporter.export(self._spans(monkeypatch, count=3)) == SpanExportResult.SUCCESS
+        finally:
+            exporter.shutdown()
+            server.shutdown()
+
+        batches, spans, wire_bytes, json_bytes, _ = stats.snapshot()
+        assert (batches, spans) == (1, 6)
+        assert wire_bytes < json_bytes
+        assert spans_exported_total.value(("test", "success")) == 6
+
+    def test_unreachable_collector_counts_dropped_spans(self, monkeypatch):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+        from product_span_export import MeasuredSpanExporter, OTLPJSONSpanExporter, spans_dropped_total
+
+        before = spans_dropped_total.value(("export_failed",))
+        exporter = MeasuredSpanExporter(OTLPJSONSpanExporter("http://127.0.0.1:9/v1/traces", timeout=1), "unreachable")
+
+        assert exporter.export(self._spans(monkeypatch)) == SpanExportResult.FAILURE
+        assert spans_dropped_total.value(("export_failed",)) - before == 2
+
+    def test_full_queue_counts_dropped_spans(self, monkeypatch):
+        from product_span_export import MeasuredBatchSpanProcessor, spans_dropped_total
+
+        exporter = MagicMock()
+        processor = MeasuredBatchSpanProcessor(exporter, max_queue_size=2, max_export_batch_size=2, schedule_delay_millis=60000)
+        processor.done = True #stops the export thread, so the queue only fills
+        with processor.condition:
+            processor.condition.notify_all()
+        processor.worker_thread.join()
+        processor.done = False
+
+        before = spans_dropped_total.value(("queue_full",))
+        for span in self._spans(monkeypatch, count=2):
+            processor.on_end(span)
+
+        assert spans_dropped_total.value(("queue_full",)) - before == 2
+        assert len(processor.queue) == 2
+        processor.shutdown()
+
+
+class TestProductStructuredLogging:
+
+    def _record(self, message, *args, level=20, **extra):
+        import logging
+        record = logging.LogRecord("product", level, __file__, 1, message, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_formatter_writes_valid_json_with_extras(self):
+        import json
+        from product_structured_logging import JSONFormatter
+
+        line = JSONFormatter("product-service").format(self._record('Product "TV" created by %s', 7, product_id=3, price=9.9, log_sample=0.5))
+        entry = json.loads(line)
+
+        assert entry["message"] == 'Product "TV" created by 7'
+        assert entry["service"] == "product-service"
+        assert entry["product_id"] == 3 and entry["price"] == 9.9
+        assert "log_sample" not in entry and "args" not in entry
+
+    def test_trace_ids_come_from_the_calling_thread(self, span_exporter):
+        from product_structured_logging import LogContextFilter
+
+        with span_exporter.tracer.start_as_current_span("request") as span:
+            record = self._record("inside a request")
+            LogContextFilter().filter(record)
+
+        assert record.trace_id == format(span.get_span_context().trace_id, "032x")
+        assert record.span_id == format(span.get_span_context().span_id, "016x")
+
+    def test_interval_suppresses_repeats_and_reports_them(self):
+        from product_structured_logging import LogSamplingFilter
+
+        sampling = LogSamplingFilter()
+        results = [sampling.filter(self._record("Health check executed", log_interval=60)) for _ in range(3)]
+        assert results == [True, False, False]
+
+        sampling._last.clear() #interval elapsed
+        record = self._record("Health check executed", log_interval=60)
+        assert sampling.filter(record)
+        assert record.suppressed == 2
+        assert sampling.filter(self._record("Health check failed", level=30, log_interval=60, log_sample=0.0)) #warnings always pass
+
+    def test_sampling_keeps_the_configured_share(self):
+        from product_structured_logging import LogSamplingFilter
+
+        sampling = LogSamplingFilter()
+        assert not any(sampling.filter(self._record("Products retrieved", log_sample=0.0)) for _ in range(50))
+        assert all(sampling.filter(self._record("Products retrieved", log_sample=1.0)) for _ in range(50))
+
+    def test_async_handler_writes_from_the_listener_and_drops_when_full(self):
+        import io, json, logging
+        from logging.handlers import QueueListener
+        from product_structured_logging import AsyncLogHandler, JSONFormatter, log_records_dropped_total
+
+        stream = io.StringIO()
+        writer = logging.StreamHandler(stream)
+        writer.setFormatter(JSONFormatter("product-service"))
+        handler = AsyncLogHandler(max_size=1)
+        before = log_records_dropped_total.value(("queue_full",))
+
+        handler.handle(self._record("first %s", "line", user_id=1))
+        handler.handle(self._record("second"))
+        assert log_records_dropped_total.value(("queue_full",)) - before == 1
+
+        listener = QueueListener(handler.queue, writer)
+        listener.start()
+        listener.stop()
+        entry = json.loads(stream.getvalue())
+        assert (entry["message"], entry["user_id"]) == ("first line", 1)
+
+    def test_rate_limits_cover_child_loggers(self):
+        from product_structured_logging import LogAggregationFilter
+
+        aggregation = LogAggregationFilter(MagicMock(), {"werkzeug": (1, 60)})
+        first, second = (self._record("GET /products 200") for _ in range(2))
+        first.name = second.name = "werkzeug.serving"
+
+        assert aggregation.filter(first)
+        assert not aggregation.filter(second)
+
+    def test_stop_listener_writes_the_last_summaries(self):
+        import io, json, logging
+        from logging.handlers import QueueListener
+        from product_structured_logging import AsyncLogHandler, JSONFormatter, LogAggregationFilter, stop_listener
+
+        stream = io.StringIO()
+        writer = logging.StreamHandler(stream)
+        writer.setFormatter(JSONFormatter("product-service"))
+        handler = AsyncLogHandler()
+        aggregation = LogAggregationFilter(handler, {"product": (1, 60)})
+        handler.addFilter(aggregation)
+        listener = QueueListener(handler.queue, writer)
+        listener.aggregation = aggregation
+        listener.start()
+        for _ in range(3):
+            handler.handle(self._record("Import failed", level=logging.WARNING))
+        flusher = aggregation._flusher
+
+        stop_listener(listener, timeout=1)
+        assert not flusher.is_alive()
+        messages = [json.loads(line)["message"] for line in stream.getvalue().splitlines()]
+        assert messages == ["Import failed", "2 similar events in the last 60 seconds: Import failed"]
+
+
+class TestProductStartup:
+
+    def test_failed_phase_stops_the_startup(self):
+        from product_startup import StartupGate
+
+        gate = StartupGate()
+        resumed, failures = [], []
+        assert not gate.run([("database", lambda: False), ("resume_imports", lambda: resumed.append(1))], on_failure=failures.append)
+        assert (gate.status(), failures, resumed) == ("failed", ["database"], [])
+        assert not gate.ready.is_set() and "total" not in gate.phases
+
+    def test_table_created_late_is_retried(self):
+        import product_app
+
+        connection = MagicMock()
+        connection.cursor.return_value.__enter__.return_value.fetchone.side_effect = [None, {"table_rows": 0}]
+        with patch.object(product_app, "DB_SETUP_BACKOFF_INITIAL", 0.001), patch('product_app.get_db_connection', return_value=connection):
+            assert product_app.verify_db_setup(deadline=1)
+        assert connection.close.call_count == 2
+
+
+class TestProductAppFactory:
+
+    def test_instrumentations_are_chosen_by_config(self, monkeypatch):
+        import product_app
+
+        enabled = []
+        monkeypatch.setattr(product_app, "setup_tracing", lambda factory_app, instrumentations: enabled.append(instrumentations))
+        monkeypatch.setenv("OTEL_INSTRUMENTATIONS", "flask, pymysql")
+        monkeypatch.delenv("OTEL_SDK_DISABLED")
+
+        factory_app = create_app({"STRUCTURED_LOGGING": False})
+        assert enabled == [("flask", "pymysql")]
+        assert factory_app.config["TRACING_ENABLED"]
+
+        create_app({"STRUCTURED_LOGGING": False, "TRACING_ENABLED": False})
+        assert len(enabled) == 1
+
+    def test_import_worker_runs_in_the_app_context(self):
+        from flask import current_app
+        from product_import import ImportJobManager
+
+        manager = ImportJobManager("/nonexistent", connection_factory=None)
+        manager.context = app.app_context
+        seen = []
+        manager.process = lambda job: seen.append(current_app.name)
+        manager._enqueue(MagicMock())
+        manager._queue.join()
+        assert seen == [app.name]
+
+    def test_every_worker_resumes_imports(self):
+        from product_app import startup_steps
+
+        assert [name for name, _ in startup_steps()] == ["database", "health_monitor", "resume_imports"]
+
+    def test_respawned_worker_resumes_the_jobs_of_the_dead_one(self, tmp_path):
+        from product_import import ImportJobManager
+
+        dead_worker = ImportJobManager(str(tmp_path), MagicMock())
+        with patch.object(dead_worker, "_enqueue"):
+            job = dead_worker.submit(333, io.BytesIO(b"name,price\nfirst,1\n"), "csv")
+        sibling, respawned = ImportJobManager(str(tmp_path), MagicMock()), ImportJobManager(str(tmp_path), MagicMock())
+
+        with patch.object(sibling, "_enqueue") as enqueue:
+            assert sibling.resume_pending() == 0 #the owner is alive, its flock is held
+        enqueue.assert_not_called()
+
+        os.close(dead_worker._claims.pop(job.job_id)) #what the kernel does when the worker dies
+        with patch.object(respawned, "_enqueue") as enqueue:
+            assert respawned.resume_pending() == 1
+        assert enqueue.call_args[0][0].job_id == job.job_id
+        with patch.object(sibling, "_enqueue"):
+            assert sibling.resume_pending() == 0 #taken once
+
+
+class FakeAsyncCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+        self.lastrowid = None
+        self.rowcount = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, statement, args=None):
+        self.connection.statements.append(" ".join(statement.split()))
+        self.rows = next((rows for prefix, rows in self.connection.responses if prefix in statement), [])
+        self.lastrowid, self.rowcount = 42, len(self.rows) or 1
+
+    async def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    async def fetchall(self):
+        return tuple(self.rows)
+
+
+class FakeAsyncConnection:
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.statements = []
+        self.in_transaction = False
+        self.rollbacks = 0
+        self.closed = False
+
+    def cursor(self):
+        return FakeAsyncCursor(self)
+
+    def close(self):
+        self.closed = True
+
+    async def begin(self):
+        self.in_transaction = True
+
+    async def commit(self):
+        self.in_transaction = False
+
+    async def rollback(self):
+        self.in_transaction = False
+        self.rollbacks += 1
+
+    def get_transaction_status(self):
+        return self.in_transaction
+
+
+class FakeAsyncPool:
+
+    def __init__(self, responses):
+        self.connection = FakeAsyncConnection(responses)
+        self.size, self.freesize, self.maxsize = 1, 1, 20
+        self.closed = False
+
+    async def acquire(self):
+        return self.connection
+
+    def release(self, connection):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
+
+
+class TestProductASGI:
+    SECRET = "asgi-test-secret-key-of-32-bytes!"
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        pytest.importorskip("starlette")
+        import jwt, product_asgi
+        from starlette.testclient import TestClient
+        from datetime import datetime
+        from decimal import Decimal
+
+        pool = FakeAsyncPool([
+            ("information_schema", [{"table_rows": 3}]),
+            ("WHERE created_by", [{"id": 1, "name": "mouse", "price": Decimal("19.99"), "quantity": 2, "description": "",
+                                   "created_at": datetime(2024, 1, 1, 12, 0), "created_by": 7}]),
+        ])
+
+        async def create_pool(**options):
+            return pool
+        monkeypatch.setattr(product_asgi.aiomysql, "create_pool", create_pool)
+        asgi_app = product_asgi.create_asgi_app({"STRUCTURED_LOGGING": False, "TRACING_ENABLED": False, "SECRET_KEY": self.SECRET,
+                                                 "MYSQL_PORT": "3306", "MYSQL_DB": "products"})
+        with TestClient(asgi_app) as client:
+            assert asgi_app.state.startup.ready.wait(5)
+            client.pool = pool
+            client.headers["Authorization"] = "Bearer " + jwt.encode({"user_id": 7, "email": "asgi@example.com"}, self.SECRET, algorithm="HS256")
+            yield client
+
+    def test_products_have_the_wsgi_wire_format(self, client):
+        response = client.get("/products")
+
+        assert response.status_code == 200
+        assert response.json() == {"products": [{"created_at": "Mon, 01 Jan 2024 12:00:00 GMT", "created_by": 7, "description": "",
+                                                  "id": 1, "name": "mouse", "price": 19.99, "quantity": 2}]}
+        assert client.pool.connection.statements[-1].endswith("WHERE created_by = %s")
+
+    def test_create_product_is_validated_and_committed(self, client):
+        assert client.post("/products", json={"name": "Mouse"}).json() == {"error": "missing required field: price"}
+
+        response = client.post("/products", json={"name": "Mouse", "price": 10.5, "quantity": 3})
+        assert response.status_code == 201
+        assert response.json()["id"] == 42 and response.json()["product_name"] == "mouse"
+        assert not client.pool.connection.in_transaction
+
+    def test_auth_and_body_errors(self, client):
+        assert client.get("/products", headers={"Authorization": ""}).json() == {"error": "Token is missing!"}
+        assert client.get("/products", headers={"Authorization": "Bearer nope"}).status_code == 401
+        response = client.put("/products", content=b"{not json")
+        assert (response.status_code, response.json()) == (400, {"error": "Invalid JSON body"})
+
+    def test_unfinished_transaction_is_rolled_back(self, client):
+        response = client.put("/products", json={"id": 99, "price": 5})
+
+        assert response.status_code == 404 #the SELECT found nothing, the transaction was left open
+        assert client.pool.connection.rollbacks == 1 and not client.pool.connection.in_transaction
+
+    def test_metrics_and_health_match_the_wsgi_app(self, client):
+        client.get("/products")
+        assert client.get("/health").json() == {"status": "healthy"}
+        assert client.get("/health/detailed").json()["checks"]["database_query"]
+
+        metrics = client.get("/metrics").text
+        assert 'http_requests_total{method="GET",route="/products",status="200"}' in metrics
+        assert 'db_queries_total{statement="SELECT id, name, price, quantity, description, created_at, created_by FROM items WHERE created_by = ?"}' in metrics
+        assert 'db_pool_connections{state="max"}' in metrics
+
+
+class TestProductCircuitBreaker:
+
+    @pytest.fixture
+    def breaker(self):
+        from product_circuit_breaker import db_breaker
+        yield db_breaker
+        db_breaker.record_success()
+
+    def test_open_breaker_fails_fast_with_retry_after(self, breaker):
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+        with patch('product_app.pymysql.connect') as mock_connect, app.test_client() as client:
+            with patch('product_app.jwt.decode', return_value={'user_id': 1, 'email': 'breaker@example.com'}):
+                response = client.post('/products', json={"name": "Breaker", "price": 10}, headers={'Authorization': 'Bearer token'})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(response.get_json()["retry_after"])
+        mock_connect.assert_not_called()
+
+    def test_read_timeout_counts_as_a_failure(self, breaker):
+        import pymysql
+        from product_db_instrumentation import InstrumentedCursor
+
+        cursor = InstrumentedCursor(MagicMock())
+        with patch('pymysql.cursors.DictCursor.execute', side_effect=pymysql.err.OperationalError(2013, "timed out")):
+            with pytest.raises(pymysql.err.OperationalError):
+                cursor.execute("SELECT 1")
+        assert breaker.failures == 1
+
+    def test_asgi_answers_503_while_open(self, monkeypatch, breaker):
+        pytest.importorskip("starlette")
+        import jwt, product_asgi
+        from starlette.testclient import TestClient
+
+        pool = FakeAsyncPool([("information_schema", [{"table_rows": 3}])])
+
+        async def create_pool(**options):
+            return pool
+        monkeypatch.setattr(product_asgi.aiomysql, "create_pool", create_pool)
+        asgi_app = product_asgi.create_asgi_app({"STRUCTURED_LOGGING": False, "TRACING_ENABLED": False, "SECRET_KEY": TestProductASGI.SECRET, "MYSQL_PORT": "3306"})
+        with TestClient(asgi_app) as client:
+            assert asgi_app.state.startup.ready.wait(5)
+            asgi_app.state.health_monitor.snapshot() #a successful health round would close the breaker again
+            asgi_app.state.health_monitor.stop()
+            for _ in range(breaker.failure_threshold):
+                breaker.record_failure()
+            token = jwt.encode({"user_id": 7}, TestProductASGI.SECRET, algorithm="HS256")
+            response = client.get("/products", headers={"Authorization": "Bearer " + token})
+        assert response.status_code == 503 and int(response.headers["Retry-After"]) >= 1
+
+
+class TestProductConcurrencyLimits:
+
+    def test_imports_have_their_own_limit(self):
+        limits = app.extensions["concurrency_limits"]
+        assert limits.classify("POST", "/products/import") == "bulk"
+        assert limits.classify("GET", "/products/import/<job_id>") == "default"
+        assert limits.classify("GET", "/metrics") is None
+
+    def test_asgi_sheds_with_retry_after(self, monkeypatch):
+        pytest.importorskip("starlette")
+        import jwt, product_asgi
+        from starlette.testclient import TestClient
+
+        pool = FakeAsyncPool([("information_schema", [{"table_rows": 3}])])
+
+        async def create_pool(**options):
+            return pool
+        monkeypatch.setattr(product_asgi.aiomysql, "create_pool", create_pool)
+        monkeypatch.setenv("CONCURRENCY_LIMITS", "service=1")
+        asgi_app = product_asgi.create_asgi_app({"STRUCTURED_LOGGING": False, "TRACING_ENABLED": False, "SECRET_KEY": TestProductASGI.SECRET, "MYSQL_PORT": "3306"})
+        limits = asgi_app.state.concurrency_limits
+        with TestClient(asgi_app) as client:
+            assert asgi_app.state.startup.ready.wait(5)
+            limits.service.in_flight = 1 #a request already being served
+            token = jwt.encode({"user_id": 7}, TestProductASGI.SECRET, algorithm="HS256")
+            response = client.get("/products", headers={"Authorization": "Bearer " + token})
+            health = client.get("/health")
+            limits.service.in_flight = 0
+        assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+        assert health.status_code == 200
+        assert limits.classes["default"].in_flight == 0 #the default permit was given back when the service one was refused
+
+
+class TestProductRateLimits:
+
+    @pytest.fixture
+    def limiter(self, monkeypatch):
+        from product_rate_limit import LocalBuckets
+
+        limiter = app.extensions["rate_limiter"]
+        monkeypatch.setattr(limiter, "buckets", LocalBuckets())
+        monkeypatch.setattr(limiter, "policies", {"ip": (100, 10.0), "user": (1, 60.0)})
+        return limiter
+
+    def test_user_limited_after_token_check(self, limiter):
+        import jwt
+
+        tokens = [jwt.encode({"user_id": user_id}, TestProductASGI.SECRET, algorithm="HS256") for user_id in (1, 1, 2)]
+        with patch.dict(app.config, {"SECRET_KEY": TestProductASGI.SECRET}), \
+             patch('product_app.get_db_connection', return_value=None), app.test_client() as client:
+            responses = [client.get('/products', headers={'Authorization': 'Bearer ' + token}) for token in tokens]
+        assert [response.status_code for response in responses] == [500, 429, 500] #user 2 has its own bucket
+        assert responses[1].headers["RateLimit-Policy"] == "1;w=60"
+
+    def test_shared_buckets_across_pods_and_local_fallback(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        import redis
+        from product_rate_limit import LocalBuckets, RateLimiter, SharedBuckets
+
+        server = fakeredis.FakeServer()
+        pods = [RateLimiter({"user": (2, 10.0)}, {}, SharedBuckets(fakeredis.FakeRedis(server=server), LocalBuckets())) for _ in range(2)]
+        assert [pod.check("user", 1).allowed for pod in pods + pods] == [True, True, False, False]
+
+        broken = SharedBuckets(MagicMock(), LocalBuckets())
+        broken._take = MagicMock(side_effect=redis.ConnectionError("down"))
+        assert broken.take("user:1", 5.0, 10.0) == (True, 5.0)
+        assert broken.breaker.failures == 1
+
+
+class TestProductDeadlines:
+
+    def test_view_catching_deadline_exceeded_still_answers_504(self):
+        from product_deadline import current_deadline
+
+        connection = MagicMock()
+        connection.cursor.return_value.__enter__.return_value.execute.side_effect = lambda *args: current_deadline().exceed("database")
+        with patch('product_app.jwt.decode', return_value={'user_id': 1, 'email': 'deadline@example.com'}), \
+             patch('product_app.get_db_connection', return_value=connection), app.test_client() as client:
+            response = client.get('/products', headers={'Authorization': 'Bearer token'})
+        assert response.status_code == 504 #get_products answers 500 for any exception
+
+    def test_caller_deadlines_do_not_shrink_the_concurrency_limit(self):
+        from product_concurrency_limit import overload_signal
+        from product_deadline import current_deadline
+
+        assert overload_signal(504, caller_bound=True) is None and overload_signal(504) is True
+        limits = app.extensions["concurrency_limits"]
+        before = limits.service.limit, limits.classes["default"].limit
+        connection = MagicMock()
+        connection.cursor.return_value.__enter__.return_value.execute.side_effect = lambda *args: current_deadline().exceed("database")
+        with patch.object(app.extensions["rate_limiter"], "policies", {}), \
+             patch('product_app.jwt.decode', return_value={'user_id': 1, 'email': 'deadline@example.com'}), \
+             patch('product_app.get_db_connection', return_value=connection), app.test_client() as client:
+            anonymous = [client.get('/products', headers={'X-Request-Timeout-Ms': '0'}) for _ in range(25)]
+            short = [client.get('/products', headers={'Authorization': 'Bearer token', 'X-Request-Timeout-Ms': '1'}) for _ in range(25)]
+        assert {response.status_code for response in anonymous + short} == {504}
+        assert (limits.service.limit, limits.classes["default"].limit) == before #any client could collapse the limit otherwise
+        assert limits.service.in_flight == 0
+
+    def test_asgi_abandons_statement_at_the_deadline(self, monkeypatch):
+        pytest.importorskip("starlette")
+        import asyncio, jwt, product_asgi
+        from starlette.testclient import TestClient
+
+        pool = FakeAsyncPool([("information_schema", [{"table_rows": 3}])])
+
+        async def create_pool(**options):
+            return pool
+
+        async def slow_execute(cursor, statement, args=None):
+            cursor.connection.statements.append(statement)
+            await asyncio.sleep(5)
+        monkeypatch.setattr(product_asgi.aiomysql, "create_pool", create_pool)
+        asgi_app = product_asgi.create_asgi_app({"STRUCTURED_LOGGING": False, "TRACING_ENABLED": False, "SECRET_KEY": TestProductASGI.SECRET, "MYSQL_PORT": "3306"})
+        with TestClient(asgi_app) as client:
+            assert asgi_app.state.startup.ready.wait(5)
+            asgi_app.state.health_monitor.stop()
+            monkeypatch.setattr(FakeAsyncCursor, "execute", slow_execute)
+            token = jwt.encode({"user_id": 7}, TestProductASGI.SECRET, algorithm="HS256")
+            response = client.get("/products", headers={"Authorization": "Bearer " + token, "X-Request-Timeout-Ms": "100"})
+        assert response.status_code == 504
+        assert pool.connection.statements[-1].startswith("SELECT /*+ MAX_EXECUTION_TIME(")
+        assert pool.connection.closed #its reply would be read by the next statement
+
+
+class TestProductGracefulShutdown:
+
+    def test_readiness_fails_while_draining(self):
+        from product_app import shutdown, startup
+        startup.ready.set()
+        shutdown.begin()
+        try:
+            with app.test_client() as client:
+                readiness = client.get('/health/detailed')
+        finally:
+            shutdown.draining.clear()
+            startup.ready.clear()
+        assert readiness.status_code == 503 and readiness.get_json()["status"] == "draining"
+        assert shutdown.in_flight == 0
+
+    def test_asgi_drains_then_closes_the_pool(self, monkeypatch):
+        pytest.importorskip("starlette")
+        import asyncio, jwt, threading, time, product_asgi
+        from starlette.testclient import TestClient
+
+        pool = FakeAsyncPool([("information_schema", [{"table_rows": 3}])])
+        closed = []
+
+        async def create_pool(**options):
+            return pool
+
+        async def slow_execute(cursor, statement, args=None):
+            cursor.connection.statements.append(statement)
+            await asyncio.sleep(0.3)
+        monkeypatch.setattr(product_asgi.aiomysql, "create_pool", create_pool)
+        asgi_app = product_asgi.create_asgi_app({"STRUCTURED_LOGGING": False, "TRACING_ENABLED": False, "SECRET_KEY": TestProductASGI.SECRET, "MYSQL_PORT": "3306"})
+        shutdown = asgi_app.state.shutdown
+        shutdown.on_shutdown("pool_open", lambda timeout: closed.append(pool.closed))
+        with TestClient(asgi_app) as client:
+            assert asgi_app.state.startup.ready.wait(5)
+            asgi_app.state.health_monitor.stop()
+            monkeypatch.setattr(FakeAsyncCursor, "execute", slow_execute)
+            token = jwt.encode({"user_id": 7}, TestProductASGI.SECRET, algorithm="HS256")
+            request = threading.Thread(target=client.get, args=("/products",), kwargs={"headers": {"Authorization": "Bearer " + token}})
+            request.start()
+            for _ in range(200):
+                if shutdown.in_flight:
+                    break
+                time.sleep(0.01)
+            shutdown.begin()
+            readiness = client.get("/health/detailed")
+            assert shutdown.in_flight == 1 and shutdown.drain(2.0) #the product query finished
+            request.join()
+        assert readiness.status_code == 503 and readiness.json()["status"] == "draining"
+        assert closed == [False] and pool.closed #hooks ran before the pool was closed
+
+
+class TestProductPreload:
+
+    def test_warm_up_validates_a_real_product(self):
+        from product_app import warm_up_app
+        warm_up_app(app) #what the gunicorn master does before forking, fails when the product is rejected
+
+
+class TestMultiprocessMetrics:
+
+    def worker_registry(self, directory, requests, in_flight):
+        from product_metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        registry.counter("requests_total", "Requests").inc(requests)
+        registry.gauge("in_flight", "Requests in flight").inc(in_flight)
+        registry.histogram("latency_seconds", "Latency", buckets=(1.0,)).observe(0.5)
+        registry.function_gauge("limit", "Limit of the worker", lambda: requests)
+        registry.function_gauge("saturation", "Saturation", lambda: requests / 10, multiprocess="max")
+        registry.multiprocess_dir = directory
+        return registry
+
+    def test_scrape_sums_the_workers_of_the_pod(self, tmp_path):
+        from product_metrics import mark_worker_dead, reset_multiprocess_dir
+
+        directory = str(tmp_path)
+        (tmp_path / "4242.json").write_text("{}") #previous run
+        reset_multiprocess_dir(directory)
+        with patch('product_metrics.os.getpid', return_value=1001):
+            self.worker_registry(directory, 3, 1).write_snapshot()
+        scraping = self.worker_registry(directory, 2, 1)
+
+        lines = scraping.render().splitlines()
+        assert "requests_total 5" in lines and "in_flight 2" in lines and "latency_seconds_count 2" in lines
+        assert 'limit{worker="1001"} 3' in lines and f'limit{{worker="{os.getpid()}"}} 2' in lines
+        assert "saturation 0.3" in lines
+
+        mark_worker_dead(directory, 1001)
+        lines = scraping.render().splitlines()
+        assert "requests_total 5" in lines and "latency_seconds_count 2" in lines #counters of the exited worker are kept
+        assert "in_flight 1" in lines and "saturation 0.2" in lines
+        assert not any('worker="1001"' in line for line in lines)
+        assert os.listdir(directory) == ["dead.json"]
+
+    def test_worker_snapshots_stop_with_the_worker(self, tmp_path):
+        import json
+
+        registry = self.worker_registry(str(tmp_path), 0, 0)
+        registry.start_multiprocess(str(tmp_path), interval=0.01)
+        writer = registry._writer
+        registry.metrics[0].inc(4)
+        registry.stop_multiprocess(timeout=1)
+        assert not writer.is_alive()
+        snapshot = json.loads((tmp_path / f"{os.getpid()}.json").read_text())
+        assert snapshot["live"] and snapshot["metrics"]["requests_total"]["values"] == [[[], 4]]
@@ -235,6 +235,69 @@ class TestProductValidator:
             error_msg = str(result.get("error",result)).lower()
             assert expected_result.lower() in error_msg, f"Incorrect error message: {error_msg} for {data} "
 
+class TestProductBatchValidator:
+
+    BATCH_ROWS = [
+        {"name": "Test Product", "price": 29.99, "quantity": 10, "description": "A test product"},
+        {"name": "PRODUCT UPPERCASE", "price": "49.50", "quantity": "5", "description": ""},
+        {"name": "Minimal Product", "price": 0.01},
+        {"price": 29.99},
+        {"name": "Test Product"},
+        {"name": "", "price": 29.99},
+        {"name": "Product<script>", "price": 10},
+        {"name": "Test Product", "price": "abc"},
+        {"name": "Test Product", "price": 10000},
+        {"name": "Test Product", "price": -1},
+        {"name": "Test Product", "price": 1, "quantity": -5},
+        {"name": "Test Product", "price": 1, "quantity": 10000},
+        {"name": "Test Product", "price": 1, "quantity": 2.5},
+        {"name": "Test Product", "price": 1, "quantity": "many"},
+        {"name": "Test Product", "price": 1, "description": 123},
+    ]
+
+    def test_validate_batch_matches_per_item_validation(self):
+        rows = self.BATCH_ROWS
+        error_mask, errors, columns = ProductValidator.validate_batch(
+            [row.get("name") for row in rows],
+            [row.get("price") for row in rows],
+            [row.get("quantity", 0) for row in rows],
+            [row.get("description", "") for row in rows])
+
+        for index, row in enumerate(rows):
+            is_valid, result = ProductValidator.validate_registration_object(row)
+            assert bool(error_mask[index]) == (not is_valid), f"mask differs for row {row}"
+            if is_valid:
+                assert columns["product_name"][index] == result["product_name"]
+                assert columns["price"][index] == result["price"]
+                assert columns["quantity"][index] == result["quantity"]
+                assert columns["description"][index] == result["description"]
+            else:
+                assert errors[index] == result["error"], f"error differs for row {row}"
+
+    def test_validate_batch_without_numpy(self, monkeypatch):
+        import product_validator
+        monkeypatch.setattr(product_validator, "np", None) #plain list fallback
+
+        self.test_validate_batch_matches_per_item_validation()
+
+    def test_validate_batch_column_length_mismatch(self):
+        with pytest.raises(ValueError):
+            ProductValidator.validate_batch(["a", "b"], [1.0])
+
+    def test_validate_batch_numpy_columns(self):
+        np = pytest.importorskip("numpy")
+
+        error_mask, errors, columns = ProductValidator.validate_batch(
+            np.array(["keyboard", "mouse", "monitor"]).tolist(),
+            np.array([10.5, 10000.0, 0.0]),
+            np.array([1, 2, -1]))
+
+        assert error_mask.tolist() == [False, True, True]
+        assert errors[1] == "price does not meet requirements"
+        assert errors[2] == "Invalid quantity: Quantity must be at least 0"
+        assert columns["price"][0] == 10.5
+        assert columns["quantity"][0] == 1
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 
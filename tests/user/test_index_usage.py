@@ -0,0 +1,78 @@
+import pytest, os
+from helpers.index_usage_helpers import IndexUsageHelpers, service_source
+
+#Index usage regression suite - seeds a scratch database on a local MySQL and EXPLAINs every statement
+#user-service issues. Skipped when no MySQL is reachable (INDEX_TEST_MYSQL_* variables, root@127.0.0.1 by default).
+
+SEED_ROWS = int(os.environ.get("INDEX_TEST_ROWS", "50000"))
+MAX_SCAN_ROWS = int(os.environ.get("INDEX_TEST_MAX_SCAN_ROWS", "1000"))
+
+SOURCES = [service_source("user-service", "app.py")]
+SCHEMA = service_source("scripts", "structure", "init.sql")
+
+SAMPLES = {
+    "id": SEED_ROWS // 2,
+    "email": "user1234@example.com",
+    "password": "pbkdf2:sha256:seeded",
+}
+
+SEED_SQL = "INSERT INTO users (email, password) VALUES (%s, %s)"
+
+
+def service_statements():
+    statements = []
+    for source in SOURCES:
+        statements.extend(IndexUsageHelpers.extract_statements(source))
+    return statements
+
+
+@pytest.fixture(scope="module")
+def index_helper():
+    pymysql = pytest.importorskip("pymysql")
+    try:
+        connection = pymysql.connect(host=os.environ.get("INDEX_TEST_MYSQL_HOST", "127.0.0.1"),
+                                     port=int(os.environ.get("INDEX_TEST_MYSQL_PORT", "3306")),
+                                     user=os.environ.get("INDEX_TEST_MYSQL_USER", "root"),
+                                     password=os.environ.get("INDEX_TEST_MYSQL_PASSWORD", ""),
+                                     cursorclass=pymysql.cursors.DictCursor,
+                                     connect_timeout=3)
+    except pymysql.Error as e:
+        pytest.skip(f"MySQL not reachable for the index usage suite: {e}")
+
+    helper = IndexUsageHelpers(connection, "index_usage_auth", MAX_SCAN_ROWS)
+    helper.create_schema(SCHEMA)
+    helper.seed("users", SEED_SQL, [(f"user{index}@example.com", "pbkdf2:sha256:seeded") for index in range(SEED_ROWS)])
+    yield helper
+    helper.drop_schema()
+    connection.close()
+
+
+class TestStatementExtraction:
+    """Runs without MySQL - keeps the statement list in sync with the service code"""
+
+    def test_login_and_profile_statements_are_found(self):
+        statements = service_statements()
+        assert "SELECT * FROM users WHERE email=%s" in statements
+        assert "SELECT id, email FROM users WHERE id=%s" in statements
+        assert "UPDATE users SET password=%s WHERE id=%s" in statements
+
+    def test_every_statement_can_be_bound(self):
+        for statement in service_statements():
+            bound = IndexUsageHelpers.bind_sample_values(statement, SAMPLES)
+            assert "%s" not in bound
+
+    def test_insert_ignore_binds_its_columns(self):
+        bound = IndexUsageHelpers.bind_sample_values("INSERT IGNORE INTO users (email, password) VALUES (%s, %s)", SAMPLES)
+        assert bound == "INSERT IGNORE INTO users (email, password) VALUES ('user1234@example.com', 'pbkdf2:sha256:seeded')"
+
+    def test_metadata_queries_are_not_checked(self):
+        assert not IndexUsageHelpers.needs_index("SELECT 1")
+        assert not IndexUsageHelpers.needs_index("SELECT COUNT(*) as table_exists FROM information_schema.tables WHERE table_schema = DATABASE()")
+        assert IndexUsageHelpers.needs_index("SELECT * FROM users WHERE email=%s")
+
+
+@pytest.mark.parametrize("statement", [statement for statement in service_statements() if IndexUsageHelpers.needs_index(statement)])
+def test_statement_uses_an_index(index_helper, statement):
+    plan = index_helper.explain(IndexUsageHelpers.bind_sample_values(statement, SAMPLES))
+    problems = index_helper.plan_problems(plan)
+    assert not problems, f"{statement}\n" + "\n".join(problems) + f"\nEXPLAIN: {plan}"
@@ -3,10 +3,20 @@ from unittest.mock import Mock, patch, MagicMock
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../user-service')))
 
-from app import app, token_required, get_db_connection, token_blacklist, blacklist_expiry
+from app import create_app, token_required, token_digest, get_db_connection, health_monitor, HEALTH_CHECK_TIMEOUT, startup
+from metrics import registry
 from pymysql import Error
 from validators import Validators
 
+app = create_app()
+
+@pytest.fixture(autouse=True)
+def tokens_not_revoked():
+    #Logouts of one test do not leak into the next one
+    from token_revocation import LocalRevocations
+    with patch.dict(app.extensions, {"token_revocations": LocalRevocations()}):
+        yield
+
 class TestTokenRequiredDecorator:
 
     def test_token_required_missing_token(self):
@@ -102,6 +112,7 @@ class TestGetDbConnection:
 
             # call function
             import pymysql
+            from db_instrumentation import InstrumentedCursor
             conn = get_db_connection()
 
             assert conn == mock_conn
@@ -111,7 +122,9 @@ class TestGetDbConnection:
                 password="test_pass",
                 database="test_db",
                 port=3306,
-                cursorclass=pymysql.cursors.DictCursor
+                cursorclass=InstrumentedCursor,
+                connect_timeout=2, #DB_CONNECT_TIMEOUT and DB_READ_TIMEOUT defaults
+                read_timeout=10
             )
     
     @patch('app.pymysql.connect')
@@ -381,14 +394,11 @@ class TestAppRoutesWithMocks:
     def test_logout_route_success(self, mock_jwt_decode):
         """Test logout route"""
 
-        mock_jwt_decode.return_value = {'user_id': 123, 'email': 'test@example.com','exp':1234567890}
-
-        token_blacklist.clear()
-        blacklist_expiry.clear()
+        mock_jwt_decode.return_value = {'user_id': 123, 'email': 'test@example.com','exp':4102444800}
 
         with app.test_client() as client:
             with app.app_context():
-                with patch('app.jwt.decode', mock_jwt_decode):
+                with patch('app.jwt.decode', mock_jwt_decode), patch('app.get_db_connection') as mock_get_db_connection:
 
                     response = client.post(
                         '/logout',
@@ -400,9 +410,15 @@ class TestAppRoutesWithMocks:
                     assert "Logout successful" in response_data["message"]
                     assert response_data["user_id"] == 123
                     
-                    # Verify token was added to blacklist
-                    assert "valid.jwt.token" in token_blacklist
-                    assert "valid.jwt.token" in blacklist_expiry
+                    # Verify the token is refused until its exp, without a database round trip
+                    revocations = app.extensions["token_revocations"]
+                    assert revocations.revoked(token_digest("valid.jwt.token"))
+                    assert revocations._expires_at[token_digest("valid.jwt.token")] == 4102444800
+                    mock_get_db_connection.assert_not_called()
+
+                    again = client.post('/logout', headers={'Authorization': 'Bearer valid.jwt.token'})
+                    assert again.status_code == 401
+                    assert "Token has been invalidated" in again.get_json()["error"]
     
 
     def test_logout_without_token(self):
@@ -415,11 +431,18 @@ class TestAppRoutesWithMocks:
 
 
 class TestHealthEndpoints:
+
+    @pytest.fixture(autouse=True)
+    def started(self):
+        startup.ready.set() #what the startup thread does once verify_db_setup passed
+        yield
+        startup.ready.clear()
     
     @patch('app.get_db_connection')
     def test_health_check(self, mock_db):
         mock_conn = MagicMock()
         mock_db.return_value = mock_conn
+        health_monitor.run_checks() #what the monitor thread does every HEALTH_CHECK_INTERVAL
         
         with app.test_client() as client:
             response = client.get('/health')
@@ -432,6 +455,7 @@ class TestHealthEndpoints:
         mock_cursor = MagicMock()
         mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
         mock_db.return_value = mock_conn
+        health_monitor.run_checks()
         
         with app.test_client() as client:
             response = client.get('/health/detailed')
@@ -440,16 +464,906 @@ class TestHealthEndpoints:
             assert "checks" in data
             assert data["checks"]["database_connection"] == True
             assert data["checks"]["database_query"] == True
+
+    @patch('app.get_db_connection')
+    def test_probes_answer_from_the_last_check(self, mock_db):
+        mock_db.return_value = None #database down
+        health_monitor.run_checks()
+
+        with app.test_client() as client:
+            for _ in range(5):
+                response = client.get('/health/detailed')
+            assert response.status_code == 503
+            assert response.get_json()["checks"]["database_connection"] == False
+            assert client.get('/health').get_json()["status"] == "unhealthy"
+
+        mock_db.assert_called_once() #probes never open connections
+        assert mock_db.call_args.kwargs["connect_timeout"] == HEALTH_CHECK_TIMEOUT
+
+    @patch('app.get_db_connection')
+    def test_failed_query_is_reported_apart_from_the_connection(self, mock_db):
+        mock_db.return_value.cursor.return_value.__enter__.return_value.execute.side_effect = Error("Lost connection")
+        health_monitor.run_checks()
+
+        with app.test_client() as client:
+            checks = client.get('/health/detailed').get_json()["checks"]
+
+        assert (checks["database_connection"], checks["database_query"]) == (True, False)
+        assert 'health_check_up{check="database"} 0' in registry.render()
     
     def test_metrics_endpoint(self):
         with app.test_client() as client:
+            client.get('/health')
             response = client.get('/metrics')
             assert response.status_code == 200
-            data = response.get_json()
-            assert "service" in data
-            assert data["service"] == "user-service"
-            assert "active_endpoints" in data
+            assert response.mimetype == "text/plain"
+            body = response.get_data(as_text=True)
+            assert "# TYPE http_requests_total counter" in body
+            assert 'http_requests_total{method="GET",route="/health",status="200"}' in body
+            assert 'http_request_duration_seconds_bucket{method="GET",route="/health",le="+Inf"}' in body
+            assert "# TYPE password_hashes_in_progress gauge" in body
+
+
+class TestContentNegotiation:
+
+    @patch('app.get_db_connection')
+    @patch('app.jwt.decode')
+    def test_get_profile_as_cbor(self, mock_jwt_decode, mock_db):
+        cbor2 = pytest.importorskip("cbor2")
+        mock_jwt_decode.return_value = {'user_id': 123, 'email': 'test@example.com'}
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_db.return_value = mock_conn
+        mock_cursor.fetchone.return_value = {'id': 123, 'email': 'test@example.com'}
+
+        with app.test_client() as client:
+            response = client.get('/profile', headers={'Authorization': 'Bearer valid.jwt.token',
+                                                       'Accept': 'application/cbor, application/json;q=0.5'})
+
+        assert response.status_code == 200
+        assert response.mimetype == "application/cbor"
+        assert cbor2.loads(response.data) == {"user_id": 123, "email": "test@example.com"}
+
+    @patch('app.get_db_connection')
+    def test_binary_bodies_reject_unknown_tags_and_large_bodies(self, mock_db):
+        cbor2 = pytest.importorskip("cbor2")
+        from content_negotiation import BINARY_BODY_MAX_BYTES
+
+        with app.test_client() as client:
+            tagged = client.post('/register', data=cbor2.dumps(cbor2.CBORTag(9999, "x")), content_type="application/cbor")
+            large = client.post('/register', data=cbor2.dumps({"email": "a" * BINARY_BODY_MAX_BYTES}), content_type="application/cbor")
+
+        assert tagged.status_code == 400
+        assert large.status_code == 413
+        mock_db.assert_not_called()
+
+
+class TestMetrics:
+
+    def test_counters_are_summed_across_threads(self):
+        import threading
+        from metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        counter = registry.counter("test_total", "test", ("route",))
+        threads = [threading.Thread(target=lambda: [counter.inc(labels=("/a",)) for _ in range(1000)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc(labels=("/a",))
+
+        assert 'test_total{route="/a"} 4001' in registry.render()
+        assert 'test_total{route="/a"} 4001' in registry.render() #finished thread shards are folded in once
+
+    def test_histogram_buckets_are_cumulative(self):
+        from metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        histogram = registry.histogram("latency_seconds", "test", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(value)
+
+        body = registry.render()
+        assert 'latency_seconds_bucket{le="0.1"} 1' in body
+        assert 'latency_seconds_bucket{le="1.0"} 3' in body
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in body
+        assert "latency_seconds_count 4" in body
+        assert "latency_seconds_sum 6.05" in body
+
+    @patch('app.get_db_connection')
+    @patch('app.jwt.decode')
+    def test_server_errors_are_counted(self, mock_jwt_decode, mock_db):
+        from metrics import http_request_errors_total
+        mock_jwt_decode.return_value = {'user_id': 123, 'email': 'test@example.com'}
+        mock_db.return_value = None
+        labels = ("GET", "/profile")
+        before = http_request_errors_total.value(labels)
+
+        with app.test_client() as client:
+            response = client.get('/profile', headers={'Authorization': 'Bearer valid.jwt.token'})
+
+        assert response.status_code == 503
+        assert http_request_errors_total.value(labels) == before + 1
+
+
+class TestDBInstrumentation:
+
+    @patch('pymysql.cursors.Cursor.execute', return_value=1)
+    def test_log_records_carry_request_db_stats(self, mock_execute):
+        import logging
+        from db_instrumentation import InstrumentedCursor, RequestDBStatsFilter
+
+        with app.test_request_context('/login'):
+            InstrumentedCursor(MagicMock()).execute("SELECT id, email, password FROM users WHERE email = %s", ("a@b.com",))
+            record = logging.LogRecord("test", logging.INFO, __file__, 1, "login", None, None)
+            RequestDBStatsFilter().filter(record)
+
+        assert record.db_query_count == 1
+        assert record.db_time_ms >= 0
+
+    def test_failed_statement_is_not_explained(self, caplog):
+        import pymysql
+        import db_instrumentation
+        from db_instrumentation import InstrumentedCursor
+
+        connection = MagicMock()
+        cursor = InstrumentedCursor(connection)
+        cursor._executed = "SELECT * FROM users WHERE id = 1"
+        with patch.object(db_instrumentation, "SLOW_QUERY_MS", 0), caplog.at_level("WARNING"), \
+             patch('pymysql.cursors.Cursor.execute', side_effect=pymysql.err.ProgrammingError(1064, "syntax error")):
+            db_instrumentation._last_explain.clear()
+            with pytest.raises(pymysql.err.ProgrammingError):
+                cursor.execute("SELECT * FROM users WHERE id = %s", (1,))
+
+        connection.cursor.assert_not_called()
+        record = next(record for record in caplog.records if record.message.startswith("Slow query"))
+        assert record.explain is None
+
+    @patch('pymysql.cursors.Cursor.execute', return_value=1)
+    def test_explain_history_is_bounded(self, mock_execute):
+        import db_instrumentation
+        from db_instrumentation import InstrumentedCursor
+
+        cursor = InstrumentedCursor(MagicMock())
+        cursor._executed = "SELECT 1 FROM users"
+        with patch.object(db_instrumentation, "EXPLAIN_HISTORY", 3):
+            db_instrumentation._last_explain.clear()
+            for index in range(5):
+                cursor._explain(f"SELECT * FROM t{index}")
+            assert list(db_instrumentation._last_explain) == ["SELECT * FROM t2", "SELECT * FROM t3", "SELECT * FROM t4"]
+
+
+@pytest.fixture
+def span_exporter(monkeypatch):
+    monkeypatch.delenv("OTEL_SDK_DISABLED", raising=False) #conftest disables the SDK for the app import
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    exporter.tracer = provider.get_tracer(__name__)
+    return exporter
+
+
+class TestRequestTracing:
 
+    def _finish(self, span_exporter, path, method, payload, status, user_id=None):
+        from flask import jsonify, g
+        from opentelemetry import trace
+        from tracing import _enrich_request_span
+
+        with app.test_request_context(path, method=method):
+            with span_exporter.tracer.start_as_current_span("request") as span, trace.use_span(span):
+                if user_id is not None:
+                    g.current_user_id = user_id
+                response = jsonify(payload) #the JSON provider keeps the payload for the hook
+                response.status_code = status
+                _enrich_request_span(response)
+        return span_exporter.get_finished_spans()[-1]
+
+    def test_login_records_user_id(self, span_exporter):
+        span = self._finish(span_exporter, '/login', 'POST', {"token": "t", "user_id": 5, "email": "a@b.com"}, 200)
+
+        assert span.attributes["user.id"] == 5
+        assert span.attributes["app.result"] == "success"
+
+    def test_view_args_and_forbidden_access(self, span_exporter):
+        span = self._finish(span_exporter, '/users/9', 'GET', {"error": "Unauthorized access"}, 403, user_id=1)
+
+        assert span.attributes["user_id"] == 9
+        assert span.attributes["enduser.id"] == "1"
+        assert span.attributes["app.result"] == "client_error"
+        assert span.attributes["error.message"] == "Unauthorized access"
+
+    def test_server_error_sets_span_status(self, span_exporter):
+        from opentelemetry.trace import StatusCode
+
+        span = self._finish(span_exporter, '/profile', 'GET', {"error": "Database connection error"}, 503, user_id=1)
+
+        assert span.status.status_code == StatusCode.ERROR
+        assert span.attributes["error"] is True
+
+
+class TestTraceSampling:
+
+    def test_health_probes_are_dropped_by_default(self, monkeypatch):
+        from opentelemetry.sdk.trace.sampling import Decision
+        from sampling import sampler_from_env
+
+        monkeypatch.delenv("TRACE_SAMPLE_ROUTES", raising=False)
+        sampler = sampler_from_env()
+
+        assert sampler.should_sample(None, 1, "GET /health", attributes={"http.route": "/health"}).decision == Decision.DROP
+        assert sampler.should_sample(None, 1, "POST /login", attributes={"http.route": "/login"}).decision == Decision.RECORD_AND_SAMPLE
+        assert sampler.should_sample(None, 1, "verify_db_setup").decision == Decision.RECORD_AND_SAMPLE
+
+    def test_tail_sampling_is_opt_in(self, monkeypatch):
+        from sampling import TailSamplingSpanProcessor, span_processor_from_env
+
+        processor = MagicMock()
+        monkeypatch.delenv("TRACE_TAIL_SAMPLING", raising=False)
+        assert span_processor_from_env(processor) is processor
+
+        monkeypatch.setenv("TRACE_TAIL_SAMPLING", "true")
+        monkeypatch.setenv("TRACE_TAIL_LATENCY_MS", "250")
+        wrapped = span_processor_from_env(processor)
+        assert isinstance(wrapped, TailSamplingSpanProcessor)
+        assert wrapped.latency_threshold_ns == 250_000_000
+
+
+class TestSpanExport:
+
+    def test_exporter_is_chosen_from_env(self, monkeypatch):
+        from span_export import OTLPJSONSpanExporter, span_exporter_from_env
+
+        monkeypatch.setenv("OTEL_TRACES_EXPORTER", "otlp")
+        monkeypatch.setenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://collector:4318/")
+        monkeypatch.delenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", raising=False)
+        name, exporter = span_exporter_from_env()
+
+        assert name == "otlp"
+        assert isinstance(exporter, OTLPJSONSpanExporter)
+        assert exporter.endpoint == "http://collector:4318/v1/traces"
+        assert exporter.compression == "gzip"
+        exporter.shutdown()
+
+    def test_queue_depth_is_exported(self):
+        from metrics import registry
+
+        assert "span_export_queue_depth" in registry.render()
+
+
+class TestStructuredLogging:
+
+    def test_exception_and_quotes_stay_valid_json(self):
+        import json, logging, sys
+        from structured_logging import AsyncLogHandler, JSONFormatter
+
+        try:
+            raise ValueError('bad "input"')
+        except ValueError:
+            record = logging.LogRecord("user", logging.ERROR, __file__, 1, 'Login failed for "%s"', ("a@b.com",), sys.exc_info())
+        prepared = AsyncLogHandler().prepare(record)
+        entry = json.loads(JSONFormatter("user-service").format(prepared))
+
+        assert entry["message"] == 'Login failed for "a@b.com"'
+        assert 'ValueError: bad "input"' in entry["exception"]
+        assert prepared.exc_info is None #tracebacks are not carried across threads
+
+
+class TestAuthLogAggregation:
+
+    def _record(self, message, name="auth", level=30):
+        import logging
+        return logging.LogRecord(name, level, __file__, 1, message, None, None)
+
+    def test_rate_limits_are_parsed(self):
+        from structured_logging import parse_rate_limits
+
+        assert parse_rate_limits("auth=5/10, werkzeug=20/1,bogus") == {"auth": (5, 10.0), "werkzeug": (20, 1.0)}
+
+    def test_flood_is_folded_into_one_summary(self):
+        from structured_logging import LogAggregationFilter, log_events_suppressed_total
+
+        handler = MagicMock()
+        aggregation = LogAggregationFilter(handler, {"auth": (2, 10)})
+        before = log_events_suppressed_total.value(("auth.login", "Login failed - invalid credentials"))
+
+        results = [aggregation.filter(self._record("Login failed - invalid credentials", name="auth.login")) for _ in range(5)]
+        assert results == [True, True, False, False, False]
+        assert aggregation.filter(self._record("Access attempt with blacklisted token")) #other keys keep their own budget
+        assert aggregation.filter(self._record("Health check executed", name="root")) #loggers without a limit pass
+        handler.handle.assert_not_called()
+
+        aggregation.flush(now=float("inf")) #window over and nothing new came
+        summary = handler.handle.call_args[0][0]
+        assert summary.getMessage() == "3 similar events in the last 10 seconds: Login failed - invalid credentials"
+        assert (summary.suppressed, summary.levelname, summary.name) == (3, "WARNING", "auth.login")
+        assert log_events_suppressed_total.value(("auth.login", "Login failed - invalid credentials")) - before == 3
+
+    def test_summary_is_written_when_the_next_window_starts(self):
+        from structured_logging import LogAggregationFilter
+
+        handler = MagicMock()
+        aggregation = LogAggregationFilter(handler, {"auth": (1, 10)})
+        aggregation.filter(self._record("Logout attempt with invalid token"))
+        aggregation.filter(self._record("Logout attempt with invalid token"))
+        next(iter(aggregation._windows.values())).started -= 10
+
+        assert aggregation.filter(self._record("Logout attempt with invalid token"))
+        assert handler.handle.call_args[0][0].suppressed == 1
+
+    def test_flusher_stops_with_the_process(self):
+        from structured_logging import LogAggregationFilter
+
+        handler = MagicMock()
+        aggregation = LogAggregationFilter(handler, {"auth": (1, 60)})
+        for _ in range(3):
+            aggregation.filter(self._record("Login failed - invalid credentials"))
+        flusher = aggregation._flusher
+        assert flusher.is_alive() #started by the first suppressed record
+
+        aggregation.stop(timeout=1)
+        assert not flusher.is_alive()
+        assert handler.handle.call_args[0][0].suppressed == 2 #the open window is written, not lost
+        aggregation.filter(self._record("Login failed - invalid credentials"))
+        aggregation.filter(self._record("Login failed - invalid credentials"))
+        assert aggregation._flusher is flusher #not started again once stopped
+
+        aggregation._after_fork() #a forked worker gets its own flusher on demand
+        aggregation.filter(self._record("Login failed - invalid credentials"))
+        assert aggregation._flusher is not flusher and aggregation._flusher.is_alive()
+        aggregation.stop(timeout=1)
+
+    @patch('app.get_db_connection')
+    def test_credential_stuffing_is_rate_limited(self, mock_db):
+        import logging
+        from structured_logging import LogAggregationFilter
+
+        mock_conn = MagicMock()
+        mock_conn.cursor.return_value.__enter__.return_value.fetchone.return_value = None
+        mock_db.return_value = mock_conn
+
+        records = []
+        collector = logging.Handler()
+        collector.emit = records.append
+        collector.addFilter(LogAggregationFilter(collector, {"auth": (3, 60)}))
+        root = logging.getLogger()
+        level = root.level
+        root.addHandler(collector) #like the queue handler of setup_structured_logging
+        root.setLevel(logging.INFO)
+        try:
+            with app.test_client() as client:
+                for index in range(20):
+                    response = client.post('/login', json={"email": f"victim{index}@example.com", "password": "Guess123@"})
+                    assert response.status_code == 401
+        finally:
+            root.removeHandler(collector)
+            root.setLevel(level)
+
+        failures = [record for record in records if record.getMessage() == "Login failed - invalid credentials"]
+        attempts = [record for record in records if record.getMessage() == "Login attempt"]
+        assert len(failures) == 3
+        assert len(attempts) == 20 #the audit trail keeps every attempt
+
+
+class TestStartup:
+
+    def _connection(self, table_rows):
+        connection = MagicMock()
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = None if table_rows is None else {"table_rows": table_rows}
+        return connection
+
+    def test_readiness_is_held_until_the_database_checks_pass(self):
+        import app as app_module
+        from startup import StartupGate
+
+        gate = StartupGate()
+        #Down, then up while MySQL still runs the init scripts, then ready
+        connections = [None, self._connection(None), self._connection(42)]
+        with patch.object(app_module, "startup", gate), patch.object(app_module, "DB_SETUP_BACKOFF_INITIAL", 0.001), \
+                patch('app.get_db_connection', side_effect=connections) as mock_db, app.test_client() as client:
+            response = client.get('/health/detailed')
+            assert (response.status_code, response.get_json()["status"]) == (503, "starting")
+
+            assert gate.run([("database", app_module.verify_db_setup)])
+            mock_db.side_effect = None
+            health_monitor.run_checks()
+            assert client.get('/health/detailed').status_code == 200
+
+        assert mock_db.call_count == 4 #3 attempts and the health check
+        assert mock_db.call_args_list[2].kwargs["connect_timeout"] == HEALTH_CHECK_TIMEOUT
+        query = connections[2].cursor.return_value.__enter__.return_value.execute.call_args.args[0]
+        assert "information_schema.tables" in query and "COUNT(*)" not in query #metadata only, no table scan
+        assert set(gate.phases) == {"database", "total"}
+        assert 'startup_phase_duration_seconds{phase="database"}' in registry.render()
+
+    def test_deadline_stops_the_retries(self):
+        import time
+        from startup import retry_with_backoff
+
+        sleeps = []
+        def always_down(attempt):
+            raise ConnectionError("MySQL unreachable")
+        def sleep(delay):
+            sleeps.append(delay)
+            time.sleep(delay)
+
+        started = time.monotonic()
+        assert retry_with_backoff(always_down, 0.05, initial=0.01, maximum=0.02, sleep=sleep) == 0
+        assert time.monotonic() - started < 0.5
+        assert sleeps and all(0 <= delay <= 0.02 for delay in sleeps)
+
+    def test_backoff_grows_to_the_maximum_with_jitter(self):
+        from startup import backoff_delays
+
+        delays = backoff_delays(0.1, 2.0)
+        ceilings = [0.1, 0.2, 0.4, 0.8, 1.6, 2.0, 2.0]
+        assert all(0 <= next(delays) <= ceiling for ceiling in ceilings)
+
+
+class TestAppFactory:
+
+    def test_import_has_no_instrumentation_side_effects(self):
+        import subprocess
+        service_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../user-service'))
+        script = ("import sys, logging, app; "
+                  "print(any(name.startswith('opentelemetry.instrumentation') or name == 'opentelemetry.sdk.trace' for name in sys.modules), "
+                  "len(logging.getLogger().handlers))")
+        result = subprocess.run([sys.executable, "-c", script], cwd=service_dir, capture_output=True, text=True, check=True)
+        assert result.stdout.split() == ["False", "0"] #no SDK, no instrumentor and no log handler until create_app
+
+    def test_config_overrides_the_environment(self):
+        factory_app = create_app({"MYSQL_HOST": "db.internal", "MYSQL_PORT": "3306", "STRUCTURED_LOGGING": False, "TRACING_ENABLED": False})
+
+        assert factory_app.config["MYSQL_HOST"] == "db.internal"
+        assert {"/login", "/profile", "/health/detailed"} <= {rule.rule for rule in factory_app.url_map.iter_rules()}
+        with factory_app.app_context(), patch('app.pymysql.connect') as mock_connect:
+            get_db_connection()
+        assert mock_connect.call_args.kwargs["host"] == "db.internal" #read from current_app, not from import time
+
+
+class TestPreload:
+
+    def test_warm_up_runs_on_the_app(self):
+        from app import warm_up_app
+        warm_up_app(app) #what the gunicorn master does before forking
+
+    def test_memory_usage_of_this_process(self):
+        from preload import memory_usage
+
+        usage = memory_usage()
+        assert 0 < usage["uss"] <= usage["pss"] <= usage["rss"]
+        assert memory_usage(pid=2 ** 22 + 1) == {} #no such process
+        assert 'process_memory_bytes{kind="uss"}' in registry.render()
+
+    def test_freeze_moves_the_heap_to_the_permanent_generation(self):
+        import gc
+        from preload import disable_gc, enable_gc, freeze
+
+        disable_gc()
+        try:
+            freeze()
+            assert gc.get_freeze_count() > 0 and not gc.isenabled()
+        finally:
+            gc.unfreeze()
+            enable_gc()
+
+
+@pytest.fixture
+def breaker():
+    from circuit_breaker import db_breaker
+    yield db_breaker
+    db_breaker.record_success() #closed again for the other tests
+
+
+class TestCircuitBreaker:
+
+    def test_opens_half_opens_and_closes(self):
+        from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+        now = [0.0]
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        assert breaker.allow() and breaker.state == "closed"
+        breaker.record_failure()
+        assert breaker.state == "open" and not breaker.allow()
+        now[0] = 7.5
+        with pytest.raises(CircuitOpenError) as error:
+            breaker.check()
+        assert error.value.retry_after == 3
+
+        now[0] = 10
+        assert breaker.state == "half_open"
+        assert breaker.allow() and not breaker.allow() #one trial call at a time
+        breaker.record_failure()
+        assert breaker.state == "open" and breaker.retry_after() == 10
+
+        now[0] = 20
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.status() == {"state": "closed", "consecutive_failures": 0}
+
+    def test_only_unreachable_server_errors_are_outages(self):
+        from circuit_breaker import is_outage
+        import pymysql
+
+        assert is_outage(pymysql.err.OperationalError(2013, "Lost connection to MySQL server during query (timed out)"))
+        assert not is_outage(pymysql.err.OperationalError(1213, "Deadlock found"))
+
+    @patch('app.pymysql.connect')
+    def test_open_breaker_fails_fast_with_retry_after(self, mock_connect, breaker):
+        mock_connect.side_effect = Error("Can't connect")
+        with app.app_context():
+            for _ in range(breaker.failure_threshold):
+                assert get_db_connection() is None
+        assert breaker.state == "open"
+
+        with app.test_client() as client:
+            response = client.post('/register', json={"email": "breaker@example.com", "password": "Breaker@123"})
+        assert response.status_code == 503
+        assert int(response.headers["Retry-After"]) >= 1
+        assert mock_connect.call_count == breaker.failure_threshold #no connect attempt while open
+
+    @patch('app.get_db_connection')
+    def test_breaker_state_in_health_and_metrics(self, mock_db, breaker):
+        mock_db.side_effect = None
+        startup.ready.set()
+        try:
+            breaker.record_failure()
+            health_monitor.run_checks()
+            with app.test_client() as client:
+                detailed = client.get('/health/detailed').get_json()
+                metrics = client.get('/metrics').get_data(as_text=True)
+        finally:
+            startup.ready.clear()
+        assert detailed["circuit_breaker"] == {"state": "closed", "consecutive_failures": 1}
+        assert 'circuit_breaker_state{breaker="mysql",state="closed"} 1' in metrics
+
+
+class TestConcurrencyLimits:
+
+    def test_aimd_backs_off_once_per_window_and_grows_while_used(self):
+        from concurrency_limit import AIMDLimiter
+
+        now = [0.0]
+        limiter = AIMDLimiter("test", maximum=10, latency_target=1.0, minimum=2, backoff=0.5, clock=lambda: now[0])
+        for _ in range(4):
+            assert limiter.try_acquire()
+        limiter.release(2.0)
+        limiter.release(2.0) #same window, one signal
+        assert limiter.limit == 5
+        limiter.release(0.1) #2 in flight out of 5, nothing learned
+        assert limiter.limit == 5
+
+        for _ in range(4):
+            assert limiter.try_acquire()
+        assert not limiter.try_acquire() and limiter.in_flight == 5
+        limiter.release(0.1)
+        assert limiter.limit == 5.2
+        now[0] = 1.0
+        limiter.release(0.1, overloaded=True)
+        assert limiter.limit == 2.6
+        limiter.release(0.1, overloaded=True)
+        assert limiter.limit == 2.6 and limiter.in_flight == 2
+
+    def test_routes_classified_and_probes_bypass(self):
+        from concurrency_limit import ConcurrencyLimits
+        from app import ROUTE_CLASSES
+
+        limits = ConcurrencyLimits(ROUTE_CLASSES, {"service": 3, "default": 3, "auth": 1}, {"service": 1, "default": 1, "auth": 1})
+        assert limits.classify("POST", "/login") == "auth" and limits.classify("GET", "/profile") == "default"
+        assert limits.acquire(limits.classify("GET", "/health")) == []
+        permits = limits.acquire("auth")
+        assert permits and limits.acquire("auth") is None
+        assert limits.service.in_flight == 1 #the refused request gave back nothing
+        limits.release(permits, 0.01)
+        assert limits.service.in_flight == 0
+
+    def test_full_auth_class_sheds_login_with_retry_after(self):
+        limits = app.extensions["concurrency_limits"]
+        auth = limits.classes["auth"]
+        auth.in_flight = int(auth.limit)
+        startup.ready.set()
+        try:
+            with app.test_client() as client:
+                response = client.post('/login', json={"email": "shed@example.com", "password": "Shed@1234"})
+                health = client.get('/health')
+        finally:
+            auth.in_flight = 0
+            startup.ready.clear()
+        assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+        assert health.status_code == 200
+
+    @patch('app.get_db_connection', return_value=None)
+    def test_database_outage_is_not_an_overload_signal(self, mock_db):
+        from concurrency_limit import overload_signal
+
+        assert overload_signal(504) and overload_signal(500, TimeoutError("read timed out"))
+        assert overload_signal(503) is None and overload_signal(500) is False
+        assert overload_signal(504, caller_bound=True) is None #X-Request-Timeout-Ms: 1 is the caller's choice, not overload
+        limits = app.extensions["concurrency_limits"]
+        before = limits.service.limit, limits.classes["auth"].limit
+        with patch.object(app.extensions["rate_limiter"], "policies", {}), app.test_client() as client: #earlier tests used up the auth bucket
+            responses = [client.post('/login', json={"email": "down@example.com", "password": "Down@1234"}) for _ in range(5)]
+        assert {response.status_code for response in responses} == {503}
+        assert (limits.service.limit, limits.classes["auth"].limit) == before
+        assert limits.service.in_flight == 0
+
+
+class TestRateLimits:
+
+    def test_bucket_refills_and_full_buckets_are_evicted(self):
+        from rate_limit import LocalBuckets
+
+        now = [0.0]
+        buckets = LocalBuckets(evict_interval=60, clock=lambda: now[0])
+        assert [buckets.take("ip:a", 1.0, 3.0)[0] for _ in range(4)] == [True, True, True, False]
+        assert buckets.take("ip:b", 1.0, 3.0)[0] #other clients have their own bucket
+        now[0] = 1.0
+        assert buckets.take("ip:a", 1.0, 3.0) == (True, 3.0)
+        assert len(buckets) == 2
+        now[0] = 61.0
+        buckets.take("ip:c", 1.0, 3.0)
+        assert len(buckets) == 1
+
+    def test_decision_headers(self):
+        from rate_limit import LocalBuckets, RateLimiter
+
+        limiter = RateLimiter({"user": (2, 10.0)}, {}, LocalBuckets())
+        first = limiter.check("user", 7)
+        assert first.headers() == {"RateLimit-Limit": "2", "RateLimit-Remaining": "1", "RateLimit-Reset": "5", "RateLimit-Policy": "2;w=10"}
+        limiter.check("user", 7)
+        refused = limiter.check("user", 7)
+        assert not refused.allowed and refused.headers()["Retry-After"] == "5"
+        assert limiter.check("ip", "1.2.3.4") is None #no such policy
+
+    def test_client_ip_ignores_what_the_client_forwarded(self):
+        from rate_limit import client_ip
+
+        assert client_ip("6.6.6.6, 10.0.0.1", "10.0.0.2", trusted_proxies=1) == "10.0.0.1"
+        assert client_ip("6.6.6.6, 10.0.0.1", "10.0.0.2") == "10.0.0.2"
+        assert client_ip(None, "10.0.0.2", trusted_proxies=1) == "10.0.0.2"
+
+    def test_login_limited_per_ip_with_429(self, monkeypatch):
+        from rate_limit import LocalBuckets
+
+        limiter = app.extensions["rate_limiter"]
+        monkeypatch.setattr(limiter, "buckets", LocalBuckets())
+        monkeypatch.setattr(limiter, "policies", {"ip": (100, 10.0), "auth": (1, 60.0)})
+        startup.ready.set()
+        try:
+            with app.test_client() as client:
+                first = client.post('/login', json={})
+                second = client.post('/login', json={})
+                health = client.get('/health')
+        finally:
+            startup.ready.clear()
+        assert first.status_code == 400 and first.headers["RateLimit-Remaining"] == "0"
+        assert second.status_code == 429 and second.headers["Retry-After"] == "60"
+        assert second.get_json()["retry_after"] == 60
+        assert health.status_code == 200 and "RateLimit-Limit" not in health.headers
+
+
+class TestDeadlines:
+
+    def test_budget_and_execution_time_hint(self):
+        from deadline import request_budget, with_execution_time_hint
+
+        assert request_budget(10.0) == 10.0
+        assert request_budget(10.0, "2500", queue_wait=0.5) == 2.0
+        assert request_budget(1.0, "60000") == 1.0 #the caller cannot extend the route's budget
+        assert with_execution_time_hint("SELECT id FROM users", 1.5) == "SELECT /*+ MAX_EXECUTION_TIME(1500) */ id FROM users"
+        assert with_execution_time_hint("UPDATE users SET email = %s", 1.5) == "UPDATE users SET email = %s"
+
+    def test_statement_bounded_by_the_deadline(self, breaker):
+        import pymysql
+        from db_instrumentation import InstrumentedCursor
+        from deadline import Deadline, DeadlineExceeded, set_deadline
+
+        connection = MagicMock(_read_timeout=10)
+        cursor = InstrumentedCursor(connection)
+        deadline = Deadline(2.0)
+        set_deadline(deadline)
+        try:
+            with patch('pymysql.cursors.DictCursor.execute', side_effect=pymysql.err.OperationalError(3024, "maximum statement execution time exceeded")) as execute:
+                with pytest.raises(DeadlineExceeded):
+                    cursor.execute("SELECT id FROM users WHERE id = %s", (1,))
+        finally:
+            set_deadline(None)
+        assert execute.call_args[0][0].startswith("SELECT /*+ MAX_EXECUTION_TIME(")
+        assert connection._read_timeout == 10 #restored once the statement is over
+        assert deadline.exceeded == "database" and breaker.failures == 0 #our budget, not a MySQL outage
+
+    @patch('app.get_db_connection')
+    def test_request_that_waited_out_its_budget_gets_504(self, mock_db):
+        import time
+        startup.ready.set()
+        try:
+            with app.test_client() as client:
+                response = client.post('/register', json={"email": "late@example.com", "password": "Late@1234"},
+                                       headers={"X-Request-Timeout-Ms": "500", "X-Request-Start": f"t={time.time() - 1:.3f}"})
+                health = client.get('/health', headers={"X-Request-Start": f"t={time.time() - 60:.3f}"})
+                metrics = client.get('/metrics').get_data(as_text=True)
+        finally:
+            startup.ready.clear()
+        assert response.status_code == 504 and response.get_json() == {"error": "Request deadline exceeded"}
+        mock_db.assert_not_called()
+        assert health.status_code == 200 #probes have no deadline
+        assert 'deadline_exceeded_total{route="/register",stage="queue"}' in metrics
+
+
+class TestGracefulShutdown:
+
+    def test_drain_waits_for_requests_then_runs_hooks(self):
+        import threading
+        from shutdown import GracefulShutdown
+
+        shutdown = GracefulShutdown(readiness_delay=0, drain_timeout=2.0)
+        calls = []
+        shutdown.on_shutdown("logs", lambda timeout: calls.append("logs"))
+        shutdown.on_shutdown("spans", lambda timeout: calls.append(("spans", timeout)))
+        shutdown.on_shutdown("health_monitor", Mock(side_effect=RuntimeError("already stopped")))
+        shutdown.request_started()
+        threading.Timer(0.1, shutdown.request_finished).start()
+
+        drained_in = shutdown.finish()
+        assert 0.1 <= drained_in < 2.0 and shutdown.in_flight == 0
+        assert calls == [("spans", 3.0), "logs"] #last registered first, a failing hook does not stop the others
+        assert shutdown.finish() == drained_in and len(calls) == 2
+
+    def test_sigterm_fails_readiness_then_stops_and_finishes(self):
+        import signal, time
+        from shutdown import GracefulShutdown
+
+        shutdown = GracefulShutdown(readiness_delay=0.1, drain_timeout=0.1)
+        stop = Mock()
+        original = signal.getsignal(signal.SIGTERM)
+        try:
+            assert shutdown.handle_sigterm(stop)
+            os.kill(os.getpid(), signal.SIGTERM)
+            assert shutdown.draining.is_set() and not stop.called #still accepting while the endpoints are removed
+            shutdown.request_started() #outlives the drain
+            time.sleep(0.4)
+        finally:
+            signal.signal(signal.SIGTERM, original)
+        stop.assert_called_once()
+        assert shutdown.drain_seconds is not None and 0.2 <= shutdown.drain_seconds < 0.4
+
+    def test_readiness_fails_while_draining(self):
+        from app import shutdown
+        startup.ready.set()
+        shutdown.begin()
+        try:
+            with app.test_client() as client:
+                readiness = client.get('/health/detailed')
+                liveness = client.get('/health')
+                metrics = client.get('/metrics').get_data(as_text=True)
+        finally:
+            shutdown.draining.clear()
+            startup.ready.clear()
+        assert readiness.status_code == 503 and readiness.get_json()["status"] == "draining"
+        assert liveness.status_code == 200
+        assert shutdown.in_flight == 0 and shutdown.served_while_draining >= 3
+        assert "shutdown_draining_seconds" in metrics
+
+
+class TestTokenRevocation:
+
+    @patch('app.jwt.decode', return_value={'user_id': 123, 'email': 'test@example.com', 'exp': 4102444800})
+    def test_logged_out_token_is_refused_without_the_database(self, mock_jwt_decode):
+        with patch('app.get_db_connection', return_value=None) as mock_get_db_connection, app.test_client() as client:
+            assert client.post('/logout', headers={'Authorization': 'Bearer revoked.jwt.token'}).status_code == 200
+            response = client.get('/profile', headers={'Authorization': 'Bearer revoked.jwt.token'})
+
+        assert response.status_code == 401
+        assert "Token has been invalidated" in response.get_json()["error"]
+        mock_get_db_connection.assert_not_called()
+
+    @patch('app.jwt.decode', return_value={'user_id': 123, 'email': 'test@example.com', 'exp': 4102444800})
+    def test_rate_limited_user_is_refused_before_the_revocation_lookup(self, mock_jwt_decode):
+        revocations = MagicMock()
+        with patch.dict(app.extensions, {"token_revocations": revocations}), \
+             patch('app.limit_user', return_value=("limited", 429)), app.test_client() as client:
+            response = client.get('/profile', headers={'Authorization': 'Bearer valid.jwt.token'})
+
+        assert response.status_code == 429
+        revocations.revoked.assert_not_called()
+
+    def test_local_revocations_end_with_the_token(self):
+        from token_revocation import LocalRevocations
+
+        now = [1000.0]
+        revocations = LocalRevocations(evict_interval=60.0, clock=lambda: now[0])
+        revocations.revoke("a", 1030.0)
+        revocations.revoke("b")
+        assert revocations.revoked("a") and revocations.revoked("b") and not revocations.revoked("c")
+        now[0] = 1031.0
+        assert not revocations.revoked("a") #expired tokens already fail jwt.decode
+        now[0] = 1061.0
+        revocations.revoked("b")
+        assert len(revocations) == 1
+
+    def test_shared_revocations_across_pods_and_local_fallback(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        import redis, time
+        from token_revocation import LocalRevocations, SharedRevocations
+
+        server = fakeredis.FakeServer()
+        now = [0.0]
+        pods = [SharedRevocations(fakeredis.FakeRedis(server=server), LocalRevocations(), cache_ttl=1.0, clock=lambda: now[0]) for _ in range(2)]
+        assert not pods[1].revoked("digest")
+        pods[0].revoke("digest", time.time() + 60)
+        assert pods[0].revoked("digest")
+        assert not pods[1].revoked("digest") #cached answer, for at most cache_ttl
+        now[0] = 1.0
+        assert pods[1].revoked("digest", time.time() + 60)
+        assert pods[1].fallback.revoked("digest") #kept locally, no more Redis calls for it
+        assert 55 <= fakeredis.FakeRedis(server=server).ttl("revoked:digest") <= 60
+
+        client = MagicMock()
+        client.exists.side_effect = client.set.side_effect = redis.ConnectionError("down")
+        broken = SharedRevocations(client, LocalRevocations())
+        broken.revoke("mine", time.time() + 60)
+        assert broken.revoked("mine") and not broken.revoked("other") #no 503 while Redis is down
+        assert broken.breaker.failures == 2
+
+    def test_token_digest_does_not_store_the_token(self):
+        digest = token_digest("header.payload.signature")
+        assert len(digest) == 64 and "payload" not in digest
+
+class TestMultiprocessMetrics:
+
+    def worker_registry(self, directory, requests, in_flight):
+        from metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        registry.counter("requests_total", "Requests").inc(requests)
+        registry.gauge("in_flight", "Requests in flight").inc(in_flight)
+        registry.histogram("latency_seconds", "Latency", buckets=(1.0,)).observe(0.5)
+        registry.function_gauge("limit", "Limit of the worker", lambda: requests)
+        registry.function_gauge("saturation", "Saturation", lambda: requests / 10, multiprocess="max")
+        registry.multiprocess_dir = directory
+        return registry
+
+    def test_scrape_sums_the_workers_of_the_pod(self, tmp_path):
+        from metrics import mark_worker_dead, reset_multiprocess_dir
+
+        directory = str(tmp_path)
+        (tmp_path / "4242.json").write_text("{}") #previous run
+        reset_multiprocess_dir(directory)
+        with patch('metrics.os.getpid', return_value=1001):
+            self.worker_registry(directory, 3, 1).write_snapshot()
+        scraping = self.worker_registry(directory, 2, 1)
+
+        lines = scraping.render().splitlines()
+        assert "requests_total 5" in lines and "in_flight 2" in lines and "latency_seconds_count 2" in lines
+        assert 'limit{worker="1001"} 3' in lines and f'limit{{worker="{os.getpid()}"}} 2' in lines
+        assert "saturation 0.3" in lines
+
+        mark_worker_dead(directory, 1001)
+        lines = scraping.render().splitlines()
+        assert "requests_total 5" in lines and "latency_seconds_count 2" in lines #counters of the exited worker are kept
+        assert "in_flight 1" in lines and "saturation 0.2" in lines
+        assert not any('worker="1001"' in line for line in lines)
+        assert os.listdir(directory) == ["dead.json"]
+
+    def test_worker_snapshots_stop_with_the_worker(self, tmp_path):
+        import json
+
+        registry = self.worker_registry(str(tmp_path), 0, 0)
+        registry.start_multiprocess(str(tmp_path), interval=0.01)
+        writer = registry._writer
+        registry.metrics[0].inc(4)
+        registry.stop_multiprocess(timeout=1)
+        assert not writer.is_alive()
+        snapshot = json.loads((tmp_path / f"{os.getpid()}.json").read_text())
+        assert snapshot["live"] and snapshot["metrics"]["requests_total"]["values"] == [[[], 4]]
 
 if __name__ == "__main__":
     # to run tests in this file directly
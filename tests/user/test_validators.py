@@ -77,6 +77,20 @@ class TestValidators:
             error_found = any(expected_error in error_messages for expected_error in expected_errors)
             assert error_found, f"Expected errors {expected_errors} not found in {errors}"
 
+    def test_validate_password_error_messages_unchanged(self):
+        is_valid, errors = Validators.validate_password("aaaa")
+
+        assert is_valid == False
+        assert errors == [
+            "password must be at least 8 characters long",
+            "password must contain at least one uppercase letter",
+            "password must contain at least one number",
+            "password must contain at least one special character: @#/-_&!",
+        ]
+
+    def test_sanitize_input_non_ascii(self):
+        assert Validators.sanitize_input(" Café <b>ñ</b> ") == "Café bñb"
+
     def test_sanitize_input(self):
         test_cases = [
             # (input, expected_output)
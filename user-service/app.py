@@ -1,48 +1,68 @@
 import jwt,datetime,os,pymysql,logging, time;
 from datetime import datetime, timedelta, timezone
 from functools import wraps
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, current_app, request, jsonify, g
 from werkzeug.security import check_password_hash, generate_password_hash
 from pymysql import Error
-from dotenv import dotenv_values
-from pathlib import Path
+from env_files import load_env_files
+load_env_files() #first: the modules below and the constants of this one read the environment at import
 from validators import Validators
+from content_negotiation import NegotiatingJSONProvider, NegotiatingRequest
+from compression import setup_compression
+from metrics import registry, setup_metrics, record_db_connect, PROMETHEUS_CONTENT_TYPE
+from db_instrumentation import InstrumentedCursor, RequestDBStatsFilter, setup_db_instrumentation
+from tracing import setup_request_tracing, traced
+from health import HealthMonitor
+from startup import StartupGate, retry_with_backoff
+from circuit_breaker import CircuitOpenError, db_breaker
+from concurrency_limit import ConcurrencyLimits, setup_concurrency_limits
+from rate_limit import RateLimiter, limit_user, setup_rate_limits
+from token_revocation import revocations_from_env, token_digest
+from deadline import deadline_timeout, raise_if_exhausted, setup_deadlines
+from shutdown import GracefulShutdown, flush_spans, setup_shutdown
+from preload import warm_up
+from structured_logging import setup_structured_logging, stop_listener, HOT_PATH_LOG_SAMPLE
 from opentelemetry import trace
-from opentelemetry.exporter.jaeger.thrift import JaegerExporter
-from opentelemetry.sdk.resources import SERVICE_NAME, Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.instrumentation.flask import FlaskInstrumentor
-from opentelemetry.instrumentation.requests import RequestsInstrumentor
-from opentelemetry.instrumentation.pymysql import PyMySQLInstrumentor
-from opentelemetry.instrumentation.logging import LoggingInstrumentor
 from opentelemetry.trace import Status, StatusCode
 
+#OpenTelemetry instrumentors create_app can enable (OTEL_INSTRUMENTATIONS)
+INSTRUMENTATIONS = ("flask", "requests", "pymysql", "logging")
+
+
+def setup_tracing(app, instrumentations=INSTRUMENTATIONS):
+    #SDK, exporters and instrumentors are imported here and not at module level -
+    #together they are most of the import time of a worker (pkg_resources, requests)
+    from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from sampling import sampler_from_env, span_processor_from_env
+    from span_export import batch_processor_from_env
 
-def setup_tracing():
     resource = Resource.create({
         SERVICE_NAME: "user-service",
         "deployment.environment": os.environ.get('FLASK_ENV', 'development'),
         "service.version": "1.0.0"
                                 })
     
-    provider = TracerProvider(resource=resource)
+    provider = TracerProvider(resource=resource, sampler=sampler_from_env()) #per route head sampling, TRACE_SAMPLE_*
     
-    jaeger_exporter = JaegerExporter(
-        agent_host_name=os.environ.get('JAEGER_AGENT_HOST', 'jaeger.monitoring.svc.cluster.local'),
-        agent_port=int(os.environ.get('JAEGER_AGENT_PORT', '6831')),
-    )
-    span_processor = BatchSpanProcessor(jaeger_exporter)
+    #OTLP/HTTP or Jaeger exporter (OTEL_TRACES_EXPORTER) behind a bounded batch queue (OTEL_BSP_*)
+    span_processor = span_processor_from_env(batch_processor_from_env()) #tail sampling of slow/failed traces, TRACE_TAIL_*
     provider.add_span_processor(span_processor)
 
     trace.set_tracer_provider(provider)
     
-    FlaskInstrumentor().instrument_app(app)
-    RequestsInstrumentor().instrument()
-    PyMySQLInstrumentor().instrument()
-    LoggingInstrumentor().instrument()
-    
-    return trace.get_tracer(__name__)
+    if "flask" in instrumentations:
+        from opentelemetry.instrumentation.flask import FlaskInstrumentor
+        FlaskInstrumentor().instrument_app(app)
+    if "requests" in instrumentations:
+        from opentelemetry.instrumentation.requests import RequestsInstrumentor
+        RequestsInstrumentor().instrument()
+    if "pymysql" in instrumentations:
+        from opentelemetry.instrumentation.pymysql import PyMySQLInstrumentor
+        PyMySQLInstrumentor().instrument()
+    if "logging" in instrumentations:
+        from opentelemetry.instrumentation.logging import LoggingInstrumentor
+        LoggingInstrumentor().instrument()
 
 def get_port():
     port = os.environ.get('FLASK_RUN_PORT','3001')
@@ -54,62 +74,129 @@ def get_debug_mode():
     return env in ['development','staging']
 
 
-def load_env_files():
-    current_dir = Path(__file__).parent
-
-    env_test_path = current_dir.parent / '.env.test'
-    if env_test_path.exists():
-        env_vars= dotenv_values(str(env_test_path))
-        for key, values in env_vars.items():
-            os.environ[key] = values
-        return
-    
-    root_env_path = current_dir.parent / '.env'
-    if root_env_path.exists():
-        env_vars = dotenv_values(str(root_env_path))
-        for key, values in env_vars.items():
-            os.environ[key] = values
-        return
-
-load_env_files()
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
-tracer = setup_tracing()
-token_blacklist = set()
-blacklist_expiry = {}
-
-#config
-app.config["MYSQL_HOST"] = os.environ.get("MYSQL_HOST") or os.environ.get("USER_MYSQL_HOST")
-app.config["MYSQL_USER"] = os.environ.get("MYSQL_USER") or os.environ.get("USER_MYSQL_USER")
-app.config["MYSQL_PASSWORD"] = os.environ.get("MYSQL_PASSWORD") or os.environ.get("USER_MYSQL_PASSWORD")
-app.config["MYSQL_DB"] = os.environ.get("MYSQL_DATABASE") or os.environ.get("USER_MYSQL_DB")
-app.config["MYSQL_PORT"] = os.environ.get("MYSQL_PORT") or os.environ.get("USER_MYSQL_PORT")
-
-#logging setup
-def setup_structured_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='{"timestamp": "%(asctime)s", "level": "%(levelname)s", "service": "user-service", "message": "%(message)s"}',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-setup_structured_logging()
-
-def get_db_connection():
+def load_config():
+    """Settings of create_app from the environment, .env.test or .env were loaded at import"""
+
+    return {
+        "SECRET_KEY": os.environ.get('SECRET_KEY'),
+        "MYSQL_HOST": os.environ.get("MYSQL_HOST") or os.environ.get("USER_MYSQL_HOST"),
+        "MYSQL_USER": os.environ.get("MYSQL_USER") or os.environ.get("USER_MYSQL_USER"),
+        "MYSQL_PASSWORD": os.environ.get("MYSQL_PASSWORD") or os.environ.get("USER_MYSQL_PASSWORD"),
+        "MYSQL_DB": os.environ.get("MYSQL_DATABASE") or os.environ.get("USER_MYSQL_DB"),
+        "MYSQL_PORT": os.environ.get("MYSQL_PORT") or os.environ.get("USER_MYSQL_PORT"),
+        #No SDK, exporter or instrumentor is even imported when tracing is off
+        "TRACING_ENABLED": os.environ.get("OTEL_SDK_DISABLED", "false").lower() != "true",
+        "INSTRUMENTATIONS": tuple(name.strip() for name in os.environ.get("OTEL_INSTRUMENTATIONS", ",".join(INSTRUMENTATIONS)).split(",") if name.strip()),
+        "STRUCTURED_LOGGING": True,
+    }
+
+
+#Route classes of the concurrency limiters: probes and scrapes bypass them, password hashing gets
+#its own tight limit so a login flood cannot take every thread of a worker (GUNICORN_THREADS)
+ROUTE_CLASSES = {"/health": None, "/health/detailed": None, "/metrics": None, "POST /login": "auth", "POST /register": "auth"}
+CONCURRENCY_LIMITS = {"service": 4, "default": 4, "auth": 2}
+CONCURRENCY_LATENCY_TARGETS = {"service": 1.0, "default": 1.0, "auth": 2.0}
+#Token buckets, (burst, window seconds): per client IP, per user and per IP on the auth routes
+RATE_LIMITS = {"ip": (300, 10.0), "user": (100, 10.0), "auth": (30, 60.0)}
+#Time budget per route class in seconds, X-Request-Timeout-Ms only shortens it - logins and registrations hash a password
+REQUEST_BUDGETS = {"default": 10.0, "auth": 5.0}
+
+
+def create_app(config=None):
+    """Builds the user service - importing this module only loads .env, everything else happens here.
+
+    `config` overrides the settings load_config reads from the environment.
+    """
+
+    app = Flask(__name__)
+    app.config.update(load_config())
+    app.config.update(config or {})
+
+    app.request_class = NegotiatingRequest #request bodies in JSON, MessagePack or CBOR
+    app.json = NegotiatingJSONProvider(app) #orjson backed JSON, or MessagePack/CBOR when the Accept header asks for it
+    setup_compression(app) #gzip/br/zstd negotiated from Accept-Encoding, above COMPRESSION_MIN_SIZE
+    setup_metrics(app) #RED metrics per route, exported on /metrics
+    setup_shutdown(app, shutdown) #requests in flight, drained on SIGTERM
+    setup_rate_limits(app, RateLimiter.from_env(ROUTE_CLASSES, RATE_LIMITS)) #429 + RateLimit headers, before a concurrency permit is taken
+    app.extensions["token_revocations"] = revocations_from_env() #tokens logged out, in Redis with RATE_LIMIT_REDIS_URL
+    setup_deadlines(app, ROUTE_CLASSES, REQUEST_BUDGETS) #per request deadline, bounds connects and statements, 504 once exhausted - before a permit is taken
+    setup_concurrency_limits(app, ConcurrencyLimits.from_env(ROUTE_CLASSES, CONCURRENCY_LIMITS, CONCURRENCY_LATENCY_TARGETS)) #AIMD limits on in-flight requests, 503 when shed
+    setup_db_instrumentation(app) #per request query count and DB time on the request span
+    setup_request_tracing(app) #user, result and error attributes on the FlaskInstrumentor request span
+    if app.config["STRUCTURED_LOGGING"]:
+        listener = setup_structured_logging("user-service", filters=[RequestDBStatsFilter()]) #JSON lines with extras and trace ids, written by a background thread
+        shutdown.on_shutdown("logs", lambda timeout: stop_listener(listener, timeout))
+    if app.config["TRACING_ENABLED"]:
+        setup_tracing(app, app.config["INSTRUMENTATIONS"])
+        shutdown.on_shutdown("spans", flush_spans)
+    app.register_blueprint(bp)
+
+    #The health monitor and startup threads open connections outside of requests
+    health_monitor.context = startup.context = app.app_context
+    shutdown.on_shutdown("health_monitor", lambda timeout: health_monitor.stop())
+    return app
+
+
+bp = Blueprint("user", __name__)
+tracer = trace.get_tracer(__name__) #proxy until setup_tracing installs the provider
+auth_logger = logging.getLogger("auth") #login and token failures only, rate limited with summaries during floods (LOG_RATE_LIMITS)
+
+#Short timeouts: with MySQL down a request fails after DB_CONNECT_TIMEOUT, and at once when the breaker is open
+DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", "2"))
+DB_READ_TIMEOUT = int(os.environ.get("DB_READ_TIMEOUT", "10"))
+
+def get_db_connection(check_breaker=True, **options):
+    if check_breaker:
+        db_breaker.check() #CircuitOpenError, answered with 503 and Retry-After by database_unavailable
+    options.setdefault("connect_timeout", deadline_timeout(DB_CONNECT_TIMEOUT)) #DeadlineExceeded, answered with 504, when the request is out of time
+    options.setdefault("read_timeout", deadline_timeout(DB_READ_TIMEOUT))
+    started = time.perf_counter()
     try:
         connection = pymysql.connect(
-            host=app.config["MYSQL_HOST"],
-            user=app.config["MYSQL_USER"],
-            password=app.config["MYSQL_PASSWORD"],
-            database=app.config["MYSQL_DB"],
-            port=int(app.config["MYSQL_PORT"]),
-            cursorclass=pymysql.cursors.DictCursor
+            host=current_app.config["MYSQL_HOST"],
+            user=current_app.config["MYSQL_USER"],
+            password=current_app.config["MYSQL_PASSWORD"],
+            database=current_app.config["MYSQL_DB"],
+            port=int(current_app.config["MYSQL_PORT"]),
+            cursorclass=InstrumentedCursor, #DictCursor timing every statement
+            **options
         )
+        record_db_connect(started, True)
+        db_breaker.record_success()
         return connection
     except Error as e:
+        record_db_connect(started, False)
+        raise_if_exhausted()
+        db_breaker.record_failure()
         logging.error(f"Error connecting to MySQL Platform: {e}")
         return None
 
+
+#Password hashing is the most CPU heavy work in this service, in progress hashes show when requests queue behind it
+password_hashes_in_progress = registry.gauge("password_hashes_in_progress", "Password hash or verify operations running", ("operation",))
+password_hash_duration_seconds = registry.histogram("password_hash_duration_seconds", "Time spent hashing or verifying passwords", ("operation",),
+                                                    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+
+def hash_password(password):
+    labels = ("hash",)
+    password_hashes_in_progress.inc(labels=labels)
+    started = time.perf_counter()
+    try:
+        return generate_password_hash(password)
+    finally:
+        password_hash_duration_seconds.observe(time.perf_counter() - started, labels=labels)
+        password_hashes_in_progress.dec(labels=labels)
+
+def verify_password(password_hash, password):
+    labels = ("verify",)
+    password_hashes_in_progress.inc(labels=labels)
+    started = time.perf_counter()
+    try:
+        return check_password_hash(password_hash, password)
+    finally:
+        password_hash_duration_seconds.observe(time.perf_counter() - started, labels=labels)
+        password_hashes_in_progress.dec(labels=labels)
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -121,614 +208,484 @@ def token_required(f):
             if token.startswith("Bearer "):
                 token = token[7:]
 
-                data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+                data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
                 current_user_id = data['user_id']
         except jwt.ExpiredSignatureError:
             return jsonify({"error": "Token has expired!"}), 401
         except jwt.InvalidTokenError:
             return jsonify({"error": "Invalid token!"}), 401
         
-
-        return f(current_user_id, *args, **kwargs)
-    return decorated
-
-@app.before_request
-def check_blacklisted_token():
-    
-    cleanup_expired_tokens()
-
-    # Public routes that do not require token validation
-    public_routes = ['/login', '/register', '/health', '/health/detailed', '/metrics']
-    
-    if request.path in public_routes:
-        return
-    
-    # Protected routes - check for blacklisted token
-    auth_header = request.headers.get('Authorization')
-    
-    if auth_header and auth_header.startswith('Bearer '):
-        token = auth_header.split(' ')[1]
-        
-        if token in token_blacklist:
-            logging.warning("Access attempt with blacklisted token", 
-                          extra={"endpoint": request.path, "method": request.method})
+        g.current_user_id = current_user_id #picked up by the request span
+        limited = limit_user(current_user_id)
+        if limited:
+            return limited
+        if token_revoked(token, data.get("exp")):
+            auth_logger.warning("Access attempt with blacklisted token", 
+                             extra={"endpoint": request.path, "method": request.method})
             return jsonify({
                 "error": "Token has been invalidated. Please login again."
             }), 401
-    
+        return f(current_user_id, *args, **kwargs)
+    return decorated
 
-# Function to clean up expired tokens from the blacklist
-def cleanup_expired_tokens():
-    
-    current_time = time.time()
-    tokens_to_remove = []
-    
-    for token, exp_time in blacklist_expiry.items():
-        if exp_time < current_time:
-            tokens_to_remove.append(token)
-    
-    for token in tokens_to_remove:
-        token_blacklist.discard(token)
-        blacklist_expiry.pop(token, None)
-    
-    if tokens_to_remove:
-        logging.info(f"Cleaned up {len(tokens_to_remove)} expired tokens from blacklist")
+#Logged out tokens are refused until their exp, an expired token already fails jwt.decode.
+#Per process, or shared by every worker and pod through Redis (see token_revocation.py)
+def token_revoked(token, expires_at=None):
+    return current_app.extensions["token_revocations"].revoked(token_digest(token), expires_at)
 
-@app.route("/register", methods=["POST"])
-def register():
-    with tracer.start_as_current_span("register_user") as span:
-        data = request.get_json()
+def revoke_token(token, expires_at=None):
+    current_app.extensions["token_revocations"].revoke(token_digest(token), expires_at)
 
-        span.set_attribute("http.method", "POST")
-        span.set_attribute("http.route", "/register")
+@bp.route("/register", methods=["POST"])
+@traced(response_fields={"user.id": "user_id"})
+def register():
+    data = request.get_json()
 
     #Concealing password values from logs
-        log_data = {key:value for key, value in data.items()} if data else {} #Creating copy from data to not erase original 
-        if "password" in log_data:
-            log_data["password"] = "*" * 6
-        logging.info("Registration attempt", extra={"data": log_data})
+    log_data = {key:value for key, value in data.items()} if data else {} #Creating copy from data to not erase original 
+    if "password" in log_data:
+        log_data["password"] = "*" * 6
+    logging.info("Registration attempt", extra={"data": log_data})
 
     #Input data validation
-        is_valid, validation_response = Validators.validate_registration_data(data)
-        if not is_valid:
-            logging.warning(f"Registration failed: {validation_response}")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", validation_response.get("error", "Invalid data"))
-            return jsonify(validation_response), 400 
+    is_valid, validation_response = Validators.validate_registration_data(data)
+    if not is_valid:
+        logging.warning(f"Registration failed: {validation_response}")
+        return jsonify(validation_response), 400 
     
-        email = validation_response["email"]
-        password = validation_response["password"]
-
-        span.set_attribute("user.email", email)
-
-        connection = get_db_connection()
-        if not connection:
-            logging.error("Database connection error during registration")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "Database connection error")
-            span.set_status(Status(StatusCode.ERROR, "Database connection error"))
-            return jsonify({"error": "Database connection error"}), 503 #503 = Service Unavailable(database down or unreachable)
+    email = validation_response["email"]
+    password = validation_response["password"]
+
+    connection = get_db_connection()
+    if not connection:
+        logging.error("Database connection error during registration")
+        return jsonify({"error": "Database connection error"}), 503 #503 = Service Unavailable(database down or unreachable)
     
-        try:
-            with connection.cursor() as cursor:
-                with tracer.start_as_current_span("check_existing_user") as check_span:
-                    cursor.execute("SELECT * FROM users WHERE email=%s",(email,))
-                    existing_user = cursor.fetchone()
-                    check_span.set_attribute("user.exists", existing_user is not None)
-
-                    if existing_user:
-                        logging.warning("Registration failed - user already exists", extra={"email": email})
-                        span.set_attribute("error", True)
-                        span.set_attribute("error.message", "User already exists")
-                        return jsonify({"error": "User already exists"}), 409 #409 = Conflict(user already exists)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT * FROM users WHERE email=%s",(email,))
+            existing_user = cursor.fetchone()
+
+            if existing_user:
+                logging.warning("Registration failed - user already exists", extra={"email": email})
+                return jsonify({"error": "User already exists"}), 409 #409 = Conflict(user already exists)
                 
-                with tracer.start_as_current_span("create_user") as create_span:
-                    hashed_password = generate_password_hash(password)
-                    cursor.execute("INSERT INTO users (email, password) VALUES (%s, %s)",(email, hashed_password))
-                    user_id = cursor.lastrowid
-                    connection.commit()
-                    create_span.set_attribute("user.id", user_id)
+            hashed_password = hash_password(password)
+            cursor.execute("INSERT INTO users (email, password) VALUES (%s, %s)",(email, hashed_password))
+            user_id = cursor.lastrowid
+            connection.commit()
 
-                logging.info("User registered successfully", extra={"email": email, "user_id": user_id})
-                span.set_attribute("user.id", user_id)
+            logging.info("User registered successfully", extra={"email": email, "user_id": user_id})
 
-                return jsonify({
-                    "message": "User registered successfully",
-                    "user_id": user_id,
-                    "email": email
-                }), 201 #201 = Created(resource successfully created)
+            return jsonify({
+                "message": "User registered successfully",
+                "user_id": user_id,
+                "email": email
+            }), 201 #201 = Created(resource successfully created)
+
+    except Exception as e:
+        logging.error(f"Registration error", extra={"email": email, "error": str(e)})
+        return jsonify({"error": f"Registration error: {str(e)}"}), 500 
+    finally:
+        connection.close()
+
+@bp.route("/login", methods=["POST"])
+@traced(response_fields={"user.id": "user_id"})
+def login():
+    auth = request.authorization
+    data = {}
 
-        except Exception as e:
-            logging.error(f"Registration error", extra={"email": email, "error": str(e)})
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", str(e))
-            span.set_status(Status(StatusCode.ERROR, str(e)))
-            return jsonify({"error": f"Registration error: {str(e)}"}), 500 
-        finally:
-            connection.close()
+    #check db for username and password
+    #determining the authentication method
+    if auth and auth.username and auth.password:
+        user_email = auth.username
+        password = auth.password
+        auth_method = "basic"
 
-@app.route("/login", methods=["POST"])
-def login():
-    with tracer.start_as_current_span("login_user") as span:
-        span.set_attribute("http.method", "POST")
-        span.set_attribute("http.route", "/login")
-
-        auth = request.authorization
-        data = {}
-
-        #check db for username and password
-        #determining the authentication method
-        if auth and auth.username and auth.password:
-            user_email = auth.username
-            password = auth.password
-            auth_method = "basic"
-
-        elif request.is_json:
-            try:
-                data = request.get_json()
-                if data.get("email") and data.get("password"):
-                    user_email = data.get("email")
-                    password = data.get("password","")
-                    auth_method = "json"
-                else:
-                    logging.warning("No valid authentication method provided")
-                    span.set_attribute("error", True)
-                    span.set_attribute("error.message", "No valid authentication method provided")
-                    return jsonify({
-                        "error": "No valid authentication method provided", 
-                        "supported_auth_methods": ["basic_auth","json"]}), 400 #400 = Bad Request(no valid authentication method)
-            except Exception as e:
-                logging.error(f"Error parsing JSON data during login", extra={"error": str(e)})
-                span.set_attribute("error", True)
-                span.set_attribute("error.message", f"Error parsing JSON data: {str(e)}")
+    elif request.is_json:
+        try:
+            data = request.get_json()
+            if data.get("email") and data.get("password"):
+                user_email = data.get("email")
+                password = data.get("password","")
+                auth_method = "json"
+            else:
+                auth_logger.warning("No valid authentication method provided")
                 return jsonify({
-                    "error": "Invalid JSON data", 
-                    "supported_auth_methods": ["basic_auth","json"]}), 400 #400 = Bad Request(invalid JSON data)
-        else:
-            logging.warning("No valid authentication method provided")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "No valid authentication method provided")
+                    "error": "No valid authentication method provided", 
+                    "supported_auth_methods": ["basic_auth","json"]}), 400 #400 = Bad Request(no valid authentication method)
+        except Exception as e:
+            logging.error(f"Error parsing JSON data during login", extra={"error": str(e)})
             return jsonify({
-                "error": "No valid authentication method provided", 
-                "supported_auth_methods": ["basic_auth","json"]}), 400 #400 = Bad Request(no valid authentication method)
+                "error": "Invalid JSON data", 
+                "supported_auth_methods": ["basic_auth","json"]}), 400 #400 = Bad Request(invalid JSON data)
+    else:
+        auth_logger.warning("No valid authentication method provided")
+        return jsonify({
+            "error": "No valid authentication method provided", 
+            "supported_auth_methods": ["basic_auth","json"]}), 400 #400 = Bad Request(no valid authentication method)
 
-        logging.info("Login attempt", extra={"email": user_email, "auth_method": auth_method})
-        span.set_attribute("user.email", user_email)
-        span.set_attribute("user.auth_method", auth_method)
+    logging.info("Login attempt", extra={"email": user_email, "auth_method": auth_method}) #audit line, never rate limited like the failures
     
-        if 'user_email' in locals():
-            user_email = Validators.sanitize_input(user_email)
+    if 'user_email' in locals():
+        user_email = Validators.sanitize_input(user_email)
 
-        if not user_email or not password:
-            logging.warning("Login failed - missing credentials")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "missing credentials")
-            return jsonify({
-                "error": "Missing credentials", 
-                "supported_auth_methods": ["basic_auth","json"]}), 401 #401 = Unauthorized(missing or invalid credentials)
+    if not user_email or not password:
+        auth_logger.warning("Login failed - missing credentials")
+        return jsonify({
+            "error": "Missing credentials", 
+            "supported_auth_methods": ["basic_auth","json"]}), 401 #401 = Unauthorized(missing or invalid credentials)
     
     #logic for authentication
-        connection = get_db_connection()
-        if not connection:
-            logging.error("Database connection error during login")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "Database connection error")
-            span.set_status(Status(StatusCode.ERROR, "Database connection error"))
-            return jsonify({"error": "Database connection error"}), 503 #503 = Service Unavailable(database down or unreachable)
+    connection = get_db_connection()
+    if not connection:
+        logging.error("Database connection error during login")
+        return jsonify({"error": "Database connection error"}), 503 #503 = Service Unavailable(database down or unreachable)
     
-        try:
-            with connection.cursor() as cursor:
-                with tracer.start_as_current_span("query_user") as query_span:
-                    cursor.execute("SELECT * FROM users WHERE email=%s",(user_email,))
-                    user=cursor.fetchone()
-                    query_span.set_attribute("user.found", user is not None)
-
-                if user and check_password_hash(user['password'], password):
-                    with tracer.start_as_current_span("generate_token") as token_span: 
-                        token = jwt.encode({
-                            "user_id": user['id'],
-                            "email": user['email'],
-                            "exp": datetime.now(timezone.utc) + timedelta(hours=1)
-                        }, app.config['SECRET_KEY'], algorithm="HS256")
-                        token_span.set_attribute("token.generated", True)
-                        token_span.set_attribute("user.id", user['id'])
-
-                    logging.info("User logged in successfully", extra={"email": user_email, "user_id": user['id']})
-                    span.set_attribute("user.id", user['id'])
-
-                    return jsonify({
-                        "token": token,
-                        "user_id": user['id'],
-                        "email": user['email']
-                        })
-                else:
-                    logging.warning("Login failed - invalid credentials", extra={"email": user_email})
-                    span.set_attribute("error", True)
-                    span.set_attribute("error.message", "invalid credentials")
-                    return jsonify({"error": "Invalid credentials"}), 401
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT * FROM users WHERE email=%s",(user_email,))
+            user=cursor.fetchone()
+
+            if user and verify_password(user['password'], password):
+                token = jwt.encode({
+                    "user_id": user['id'],
+                    "email": user['email'],
+                    "exp": datetime.now(timezone.utc) + timedelta(hours=1)
+                }, current_app.config['SECRET_KEY'], algorithm="HS256")
+
+                logging.info("User logged in successfully", extra={"email": user_email, "user_id": user['id']})
+
+                return jsonify({
+                    "token": token,
+                    "user_id": user['id'],
+                    "email": user['email']
+                    })
+            else:
+                auth_logger.warning("Login failed - invalid credentials", extra={"email": user_email})
+                return jsonify({"error": "Invalid credentials"}), 401
         
-        except Exception as e:
-            logging.error(f"Authentication error", extra={"email": user_email, "error": str(e)})
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", str(e))
-            span.set_status(Status(StatusCode.ERROR, str(e)))
-            return jsonify({"error": f"Authentication error: {str(e)}"}), 500
-        finally:
-            connection.close()
+    except Exception as e:
+        logging.error(f"Authentication error", extra={"email": user_email, "error": str(e)})
+        return jsonify({"error": f"Authentication error: {str(e)}"}), 500
+    finally:
+        connection.close()
 
-@app.route("/profile", methods=["GET"])
+@bp.route("/profile", methods=["GET"])
 @token_required
 def get_profile(current_user_id):
-    with tracer.start_as_current_span("get_profile") as span:
-        span.set_attribute("http.method", "GET")
-        span.set_attribute("http.route", "/profile")
-
-        connection = get_db_connection()
-        if not connection:
-            logging.error("Database connection error during profile retrieval")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message","Database connection error")
-            span.set_status(Status(StatusCode.ERROR, "Database connection error"))
-            return jsonify({"error": "Database connection error"}), 503 #503 = Service Unavailable(database down or unreachable)
+    connection = get_db_connection()
+    if not connection:
+        logging.error("Database connection error during profile retrieval")
+        return jsonify({"error": "Database connection error"}), 503 #503 = Service Unavailable(database down or unreachable)
     
-        try:
-            with connection.cursor() as cursor:
-                with tracer.start_as_current_span("query_user_profile") as query_span:
-                    cursor.execute("SELECT id, email FROM users WHERE id=%s",(current_user_id,))
-                    user = cursor.fetchone()
-                    query_span.set_attribute("user.found", user is not None)
-
-                if not user:
-                    logging.warning("Profile retrieval failed - user not found", extra={"user_id": current_user_id})
-                    span.set_attribute("error", True)
-                    span.set_attribute("error.message", "user not found")            
-                    return jsonify({"error": "User not found"}), 404 #404 = Not Found(user does not exist)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id, email FROM users WHERE id=%s",(current_user_id,))
+            user = cursor.fetchone()
+
+            if not user:
+                logging.warning("Profile retrieval failed - user not found", extra={"user_id": current_user_id})
+                return jsonify({"error": "User not found"}), 404 #404 = Not Found(user does not exist)
                 
-                logging.info("Profile retrieved successfully", extra={"user_id": current_user_id})
-                span.set_attribute("user.id", user['id'])
+            logging.info("Profile retrieved successfully", extra={"user_id": current_user_id, "log_sample": HOT_PATH_LOG_SAMPLE})
 
-                return jsonify({
-                    "user_id": user['id'],
-                    "email": user['email']
-                })
+            return jsonify({
+                "user_id": user['id'],
+                "email": user['email']
+            })
 
-        except Exception as e:
-            logging.error(f"Profile retrieval error", extra={"user_id": current_user_id, "error": str(e)})
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", str(e))
-            span.set_status(Status(StatusCode.ERROR, str(e)))
-            return jsonify({"error": f"Profile retrieval error:{str(e)}"}), 500
-        finally:
-            connection.close()
+    except Exception as e:
+        logging.error(f"Profile retrieval error", extra={"user_id": current_user_id, "error": str(e)})
+        return jsonify({"error": f"Profile retrieval error:{str(e)}"}), 500
+    finally:
+        connection.close()
 
-@app.route("/profile", methods=["PUT"])
+@bp.route("/profile", methods=["PUT"])
 @token_required
 def update_profile(current_user_id):
-    with tracer.start_as_current_span("update_profile") as span:
-        data = request.get_json()
-        
-        span.set_attribute("http.method", "PUT")
-        span.set_attribute("http.route", "/profile")
-
-        if not data:
-            logging.warning("Profile update failed - no data provided", extra={"user_id": current_user_id})
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "No data provided")
-            return jsonify({"error": "No data provided"}), 400
-
-        email = data.get("email")
-        password = data.get("password")
-
-        if email:
-            is_valid_email, email_result = Validators.validate_email(email)
-            if not is_valid_email:
-                logging.warning("Profile update failed - invalid email", extra={"user_id": current_user_id, "email": email})
-                span.set_attribute("error", True)
-                span.set_attribute("error.message",f"invalid email: {email_result}")
-                return jsonify({"error": f"Invalid email: {email_result}"}), 400
-            email = Validators.sanitize_input(email).lower() 
-    
-        if password:
-            is_valid_password, password_result = Validators.validate_password(password)
-            if not is_valid_password:
-                logging.warning("Profile update failed - invalid password", extra={"user_id": current_user_id})
-                span.set_attribute("error", True)
-                span.set_attribute("error.message",f"invalid password: {password_result}")
-                return jsonify({"error": f"Invalid password: {password_result}, minimun lenght {Validators.MIN_PASSWORD_LENGTH}, maximum lenght {Validators.MAX_PASSWORD_LENGTH}"}), 400
-
-        if not email and not password:
-            logging.warning("Profile update failed - no valid fields to update", extra={"user_id": current_user_id})
-            span.set_attribute("error", True)
-            span.set_attribute("error.message","no valid fields to update")
-            return jsonify({"error": "No valid fields to update"}), 400
-
-        connection = get_db_connection()
-
-        if not connection:
-            logging.error("Database connection error during profile update")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "Database connection error")
-            span.set_status(Status(StatusCode.ERROR, "Database connection error"))
-            return jsonify({"error": "Database connection error"}), 503 #503 = Service Unavailable(database down or unreachable)
+    data = request.get_json()
+
+    if not data:
+        logging.warning("Profile update failed - no data provided", extra={"user_id": current_user_id})
+        return jsonify({"error": "No data provided"}), 400
+
+    email = data.get("email")
+    password = data.get("password")
+
+    if email:
+        is_valid_email, email_result = Validators.validate_email(email)
+        if not is_valid_email:
+            logging.warning("Profile update failed - invalid email", extra={"user_id": current_user_id, "email": email})
+            return jsonify({"error": f"Invalid email: {email_result}"}), 400
+        email = Validators.sanitize_input(email).lower() 
     
-        try:
-            with connection.cursor() as cursor:
-                with tracer.start_as_current_span("update_user_profile") as update_span:
-                    if email:
-                        cursor.execute("UPDATE users SET email=%s WHERE id=%s",(email, current_user_id))
-                    if password:
-                        hashed_password = generate_password_hash(password)
-                        cursor.execute("UPDATE users SET password=%s WHERE id=%s",(hashed_password, current_user_id))
-            
-                    connection.commit()
-                    logging.info("Profile updated successfully", extra={"user_id": current_user_id})
-                    update_span.set_attribute("profile.updated", True)
-                    return jsonify({"message": "Profile updated successfully"}), 200
+    if password:
+        is_valid_password, password_result = Validators.validate_password(password)
+        if not is_valid_password:
+            logging.warning("Profile update failed - invalid password", extra={"user_id": current_user_id})
+            return jsonify({"error": f"Invalid password: {password_result}, minimun lenght {Validators.MIN_PASSWORD_LENGTH}, maximum lenght {Validators.MAX_PASSWORD_LENGTH}"}), 400
 
-        except Exception as e:
-            logging.error(f"Profile update error", extra={"user_id": current_user_id, "error": str(e)})
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", str(e))
-            span.set_status(Status(StatusCode.ERROR, str(e)))
-            return jsonify({"error": f"Profile update error: {str(e)}"}), 500
-        finally:
-            connection.close()
+    if not email and not password:
+        logging.warning("Profile update failed - no valid fields to update", extra={"user_id": current_user_id})
+        return jsonify({"error": "No valid fields to update"}), 400
 
-@app.route("/users/<int:user_id>", methods=["GET"])
+    connection = get_db_connection()
+
+    if not connection:
+        logging.error("Database connection error during profile update")
+        return jsonify({"error": "Database connection error"}), 503 #503 = Service Unavailable(database down or unreachable)
+    
+    try:
+        with connection.cursor() as cursor:
+            if email:
+                cursor.execute("UPDATE users SET email=%s WHERE id=%s",(email, current_user_id))
+            if password:
+                hashed_password = hash_password(password)
+                cursor.execute("UPDATE users SET password=%s WHERE id=%s",(hashed_password, current_user_id))
+            
+            connection.commit()
+            logging.info("Profile updated successfully", extra={"user_id": current_user_id})
+            return jsonify({"message": "Profile updated successfully"}), 200
+
+    except Exception as e:
+        logging.error(f"Profile update error", extra={"user_id": current_user_id, "error": str(e)})
+        return jsonify({"error": f"Profile update error: {str(e)}"}), 500
+    finally:
+        connection.close()
+
+@bp.route("/users/<int:user_id>", methods=["GET"])
+@traced(view_args=("user_id",))
 @token_required
 def get_user_by_id(current_user_id, user_id):
-    with tracer.start_as_current_span("get_user_by_id") as span:
-        span.set_attribute("http.method", "GET")
-        span.set_attribute("http.route", "/users/<id>")
+    if current_user_id != user_id:
+        auth_logger.warning("Unauthorized access attempt to user data", extra={"requested_user_id": user_id, "current_user_id": current_user_id})
+        return jsonify({"error": "Unauthorized access"}), 403 #403 = Forbidden(trying to access resources they do not own)
+
+    connection = get_db_connection()
+    if not connection:
+        logging.error("Database connection error during user retrieval by ID")
+        return jsonify({"error": "Database connection error"}), 503 #503 = Service Unavailable(database down or unreachable)
     
-        if current_user_id != user_id:
-            logging.warning("Unauthorized access attempt to user data", extra={"requested_user_id": user_id, "current_user_id": current_user_id})
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "Unauthorized access")
-            return jsonify({"error": "Unauthorized access"}), 403 #403 = Forbidden(trying to access resources they do not own)
-
-        connection = get_db_connection()
-        if not connection:
-            logging.error("Database connection error during user retrieval by ID")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message","Database connection error")
-            span.set_status(Status(StatusCode.ERROR, "Database connection error"))
-            return jsonify({"error": "Database connection error"}), 503 #503 = Service Unavailable(database down or unreachable)
-    
-        try:
-            with connection.cursor() as cursor:
-                with tracer.start_as_current_span("query_user_by_id") as query_profile_id_span:
-                    cursor.execute("SELECT id, email FROM users WHERE id=%s",(user_id,))
-                    user = cursor.fetchone()
-                    query_profile_id_span.set_attribute("user.found", user is not None)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id, email FROM users WHERE id=%s",(user_id,))
+            user = cursor.fetchone()
                 
-            if not user:
-                logging.warning("User retrieval by ID failed - user not found", extra={"requested_user_id": user_id, "current_user_id": current_user_id})
-                span.set_attribute("error", True)
-                span.set_attribute("error.message", "user not found")
-                return jsonify({"error": "User not found"}), 404 #404 = Not Found(user does not exist)
+        if not user:
+            logging.warning("User retrieval by ID failed - user not found", extra={"requested_user_id": user_id, "current_user_id": current_user_id})
+            return jsonify({"error": "User not found"}), 404 #404 = Not Found(user does not exist)
         
-            logging.info("User retrieved by ID successfully", extra={"requested_user_id": user_id, "current_user_id": current_user_id})
-            return jsonify({
-                "user_id": user['id'],
-                "email": user['email']
-            })
+        logging.info("User retrieved by ID successfully", extra={"requested_user_id": user_id, "current_user_id": current_user_id})
+        return jsonify({
+            "user_id": user['id'],
+            "email": user['email']
+        })
 
-        except Exception as e:
-            logging.error(f"User retrieval by ID error", extra={"requested_user_id": user_id, "current_user_id": current_user_id, "error": str(e)})
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", str(e))
-            span.set_status(Status(StatusCode.ERROR, str(e)))
-            return jsonify({"error": f"User retrieval error:{str(e)}"}), 500
-        finally:
-            connection.close()
+    except Exception as e:
+        logging.error(f"User retrieval by ID error", extra={"requested_user_id": user_id, "current_user_id": current_user_id, "error": str(e)})
+        return jsonify({"error": f"User retrieval error:{str(e)}"}), 500
+    finally:
+        connection.close()
 
-@app.route("/logout", methods=["POST"])
+@bp.route("/logout", methods=["POST"])
+@traced(response_fields={"user.id": "user_id"})
 def logout():
-    with tracer.start_as_current_span("logout_user") as span:
-        span.set_attribute("http.method", "POST")
-        span.set_attribute("http.route", "/logout")
-        #Getting authorization header
-        auth_header = request.headers.get('Authorization')
+    #Getting authorization header
+    auth_header = request.headers.get('Authorization')
     
-        #validating toke presence
-        if not auth_header:
-            logging.warning("Logout attempt without authorization header")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "missing authorization header")
-            return jsonify({"error": "Authorization header is missing"}), 401 #401 = Unauthorized
-
-        if not auth_header.startswith("Bearer "):
-            logging.warning("Logout attempt with invalid authorization format")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "invalid authorization format")
-            return jsonify({"error": "Bearer token required"}), 401 #401 = Unauthorized
+    #validating toke presence
+    if not auth_header:
+        auth_logger.warning("Logout attempt without authorization header")
+        return jsonify({"error": "Authorization header is missing"}), 401 #401 = Unauthorized
+
+    if not auth_header.startswith("Bearer "):
+        auth_logger.warning("Logout attempt with invalid authorization format")
+        return jsonify({"error": "Bearer token required"}), 401 #401 = Unauthorized
     
-        #Extracting token
-        token = auth_header.split(" ")[1]
+    #Extracting token
+    token = auth_header.split(" ")[1]
 
-        try:
-        #Decoding token to get expiration time
-            decoded_token = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+    try:
+    #Decoding token to get expiration time
+        decoded_token = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
         
-            user_id = decoded_token.get("user_id")
-            email = decoded_token.get("email")
-            exp = decoded_token.get("exp")
-
-            token_blacklist.add(token)
-
-            if exp:
-                blacklist_expiry[token] = exp 
-
-            logging.info("User logged out successfully", extra={"user_id": user_id, 
-                                                                "email": email
-                                                                })
-            return jsonify({"message": "Logout successful",
-                            "user_id": user_id,
-                            "timestamp": datetime.now(timezone.utc).isoformat()
-                            }), 200
-        except jwt.ExpiredSignatureError:
-            logging.warning("Logout attempt with expired token")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "logout attempt with expired token")
-            return jsonify({"error": "Token has already expired"}), 401 #401 = Unauthorized
-        except jwt.InvalidTokenError:
-            logging.warning("Logout attempt with invalid token")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", "logout attempt with invalid token")
-            return jsonify({"error": "Invalid token"}), 401 #401 = Unauthorized
+        user_id = decoded_token.get("user_id")
+        email = decoded_token.get("email")
+        exp = decoded_token.get("exp")
+
+        if token_revoked(token, exp):
+            auth_logger.warning("Logout attempt with blacklisted token")
+            return jsonify({"error": "Token has been invalidated. Please login again."}), 401 #401 = Unauthorized
+        revoke_token(token, exp)
+
+        logging.info("User logged out successfully", extra={"user_id": user_id, 
+                                                            "email": email
+                                                            })
+        return jsonify({"message": "Logout successful",
+                        "user_id": user_id,
+                        "timestamp": datetime.now(timezone.utc).isoformat()
+                        }), 200
+    except jwt.ExpiredSignatureError:
+        auth_logger.warning("Logout attempt with expired token")
+        return jsonify({"error": "Token has already expired"}), 401 #401 = Unauthorized
+    except jwt.InvalidTokenError:
+        auth_logger.warning("Logout attempt with invalid token")
+        return jsonify({"error": "Invalid token"}), 401 #401 = Unauthorized
 
 
 #Health check endpoint
-@app.route("/health", methods=["GET"])
+#Dependencies are checked on a background thread, probes answer from the last result
+HEALTH_CHECK_TIMEOUT = int(os.environ.get("HEALTH_CHECK_TIMEOUT", "2"))
+
+def check_database():
+    #Bypasses the breaker and reports to it: when MySQL is back this closes it without waiting for a request to try
+    connection = get_db_connection(check_breaker=False, connect_timeout=HEALTH_CHECK_TIMEOUT, read_timeout=HEALTH_CHECK_TIMEOUT)
+    if not connection:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        return True
+    finally:
+        connection.close()
+
+health_monitor = HealthMonitor({"database": check_database}, interval=float(os.environ.get("HEALTH_CHECK_INTERVAL", "5")))
+startup = StartupGate() #verify_db_setup runs on it in the background, see __main__
+shutdown = GracefulShutdown.from_env() #SIGTERM handler installed by gunicorn.conf.py
+
+@bp.route("/health", methods=["GET"])
 def health_check():
-    with tracer.start_as_current_span("health_check") as span:
-        span.set_attribute("http.method", "GET")
-        span.set_attribute("http.route", "/health")
+    if not startup.ready.is_set():
+        return jsonify({"status": startup.status()}) #alive while the database checks retry, the process exits if they run out of time
+    snapshot = health_monitor.snapshot()
+    return jsonify({"status": "healthy" if snapshot.healthy() else "unhealthy"})
 
-        try:
-            connection = get_db_connection()
-            healthy = connection is not None
-            if connection:
-                connection.close()
-            span.set_attribute("healthy", healthy)
-            return jsonify({"status": "healthy" if healthy else "unhealthy"})
-        except:
-            span.set_attribute("healthy", False)
-            span.set_attribute("error", True)
-            span.set_status(Status(StatusCode.ERROR, "Health check failed"))
-            return jsonify({"status": "unhealthy"}), 503
-
-@app.route("/health/detailed",methods=["GET"])
+@bp.route("/health/detailed",methods=["GET"])
+@traced(response_fields={"health.status": "status"})
 def health_detailed():
-    with tracer.start_as_current_span("detailed_health_check") as span:
-        checks = {
-            "database_connection": False,
-            "database_query":False,
-            "service_responsive":True
-        }
-
-        try:
-            connection = get_db_connection()
-            if connection:
-                checks["database_connection"] = True
-                span.set_attribute("database.connected", True)
-                
-                with connection.cursor() as cursor:
-                    cursor.execute("SELECT 1")
-                    cursor.fetchone()
-                    checks["database_query"] = True
-                    span.set_attribute("database.query", True)
-                connection.close()
-        
-        except Exception as e:
-            logging.error(f"Health check error: {str(e)}")
-            span.set_attribute("error", True)
-            span.set_attribute("error.message", str(e))
-            span.set_status(Status(StatusCode.ERROR, f"Health check detailed failed: {str(e)}"))
-
-        all_healthy = all(checks.values())
-        status = "healthy" if all_healthy else "unhealthy"
-        span.set_attribute("health.status", status)
+    if not startup.ready.is_set():
+        #Readiness - no traffic until the database checks of the startup passed
+        return jsonify({"status": startup.status(),
+                        "service": "user-service",
+                        "timestamp": datetime.now(timezone.utc).isoformat(),
+                        "startup_phases": dict(startup.phases)
+                        }), 503
+    if shutdown.draining.is_set():
+        #SIGTERM - out of the endpoints before the server stops accepting, liveness stays up while it drains
+        return jsonify({"status": "draining",
+                        "service": "user-service",
+                        "timestamp": datetime.now(timezone.utc).isoformat(),
+                        "draining_seconds": round(shutdown.draining_for(), 3)
+                        }), 503
+    snapshot = health_monitor.snapshot()
+    database = snapshot.checks["database"]
+    checks = {
+        #get_db_connection returns None when it cannot connect, an error means the connection worked and the query failed
+        "database_connection": database["ok"] or database["error"] is not None,
+        "database_query": database["ok"],
+        "service_responsive": True
+    }
+    status = "healthy" if snapshot.healthy() else "unhealthy"
+
+    return jsonify({"status": status,
+                    "service": "user-service", 
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "checks": checks,
+                    "checked_at": snapshot.timestamp,
+                    "check_age_seconds": round(snapshot.age(), 3),
+                    "check_duration_ms": database["duration_ms"],
+                    "circuit_breaker": db_breaker.status()
+                    }), 200 if snapshot.healthy() else 503
+
+@bp.app_errorhandler(CircuitOpenError)
+def database_unavailable(error):
+    #Breaker open - fail at once instead of every request holding a thread for the connect timeout
+    return jsonify({"error": "Database temporarily unavailable",
+                    "retry_after": error.retry_after
+                    }), 503, {"Retry-After": str(error.retry_after)}
+
+@bp.route("/metrics",methods=["GET"])
+def metrics():
+        #Prometheus text format - request counts, errors and latency per route, DB connections and password hashing
+        return registry.render(), 200, {"Content-Type": PROMETHEUS_CONTENT_TYPE}
 
-        logging.info(f"Health check executed - Status: {status}", extra={"checks": checks})
 
-        return jsonify({"status": status,
-                        "service": "user-service", 
-                        "timestamp": datetime.now(timezone.utc).isoformat(),
-                        "checks": checks
-                            
-                        }), 200 if all_healthy else 503
+#Startup: the server listens right away, readiness stays "starting" until the database checks pass
+DB_SETUP_DEADLINE = float(os.environ.get("DB_SETUP_DEADLINE", "70")) #the old 14 attempts x 5s
+DB_SETUP_BACKOFF_INITIAL = float(os.environ.get("DB_SETUP_BACKOFF_INITIAL", "0.1"))
+DB_SETUP_BACKOFF_MAX = float(os.environ.get("DB_SETUP_BACKOFF_MAX", "5"))
 
-@app.route("/metrics",methods=["GET"])
-def metrics():
-        return jsonify({
-            "service": "user-service",
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "active_endpoints": ["/register", "/login", "/profile", "/users/<id>", "/health", "/metrics"]
-        })
+def verify_db_attempt(attempt):
+    with tracer.start_as_current_span(f"db_setup_attempt_{attempt}") as attempt_span:
+        attempt_span.set_attribute("attempt.number", attempt)
+        #A stalled handshake must not eat the whole deadline
+        connection = get_db_connection(check_breaker=False, connect_timeout=HEALTH_CHECK_TIMEOUT, read_timeout=HEALTH_CHECK_TIMEOUT)
+        try:
+            if not connection:
+                attempt_span.set_attribute("db.connection_error", True)
+                raise Exception("Connection returned None")
 
+            attempt_span.set_attribute("db.connected", True)
+            with tracer.start_as_current_span("verify_users_table_existence") as table_span:
+                #Metadata only - table_rows is the InnoDB estimate, a COUNT(*) would scan the whole table
+                with connection.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT table_rows AS table_rows
+                        FROM information_schema.tables
+                        WHERE table_schema = DATABASE()
+                        AND table_name = 'users'
+                    """)
+                    result = cursor.fetchone()
+                table_span.set_attribute("db.table_results", result is not None)
+                if result is None:
+                    #The init scripts of the database create it, it shows up once MySQL is done with them
+                    raise Exception("table 'users' does not exist yet")
+                table_span.set_attribute("db.users_estimated_rows", result["table_rows"] or 0)
+                logging.info(f"table 'users' exists with about {result['table_rows'] or 0} records")
+        except Exception as e:
+            attempt_span.set_attribute("error", True)
+            attempt_span.set_status(Status(StatusCode.ERROR, str(e)))
+            raise
+        finally:
+            if connection:
+                try:
+                    connection.close()
+                except Exception as close_err:
+                    logging.warning(f"Failed to close connection: {close_err}")
 
-def verify_db_setup():
+def verify_db_setup(deadline=None):
+    deadline = DB_SETUP_DEADLINE if deadline is None else deadline
     with tracer.start_as_current_span("verify_db_setup") as span:
-        max_retries = 15
-        retry_delay = 5  #seconds
-        span.set_attribute("db_setup.max_retries", max_retries)
-
-        for attempt in range(1,max_retries):
-            with tracer.start_as_current_span(f"db_setup_attempt_{attempt}") as attempt_span:
-                attempt_span.set_attribute("attempt.number", attempt)
-                connection = None
-
-                try: #Verify basic connectivity
-                    connection = get_db_connection()
-                    if not connection:
-                        print(f"Database connection returned none, attempt: {attempt}")
-                        attempt_span.set_attribute("db.connection_error", True)
-                        attempt_span.set_status(Status(StatusCode.ERROR, "Database connection returned None"))
-                        raise Exception("Connection returned None")
-            
-                    with connection.cursor() as cursor:
-                        cursor.execute("SELECT 1")
-                        result = cursor.fetchone()
-                        if not result:
-                            raise Exception("Simple query SELECT 1 failed")
-                    
-                    print(f"Database connection established on attempt: {attempt}")
-                    attempt_span.set_attribute("db.connected", True)
-                    
-                    with tracer.start_as_current_span("verify_users_table_existence") as table_span:
-                        try: #Verify if 'users' table exists
-                            with connection.cursor() as cursor:
-                                cursor.execute("""
-                                    SELECT COUNT(*) as table_exists
-                                    FROM information_schema.tables
-                                    WHERE table_schema = DATABASE()
-                                    AND table_name = 'users'
-                                """)
-                                result = cursor.fetchone()
-                                exists = result['table_exists'] > 0
-                                table_span.set_attribute("db.table_results", exists)
-
-                                if exists:
-                                    cursor.execute("SELECT COUNT(*) AS count FROM  users")
-                                    user_result = cursor.fetchone()
-                                    user_count = user_result['count']
-                                    table_span.set_attribute("db.users_count", user_count)
-                                    print(f"table 'users' exists with {user_count} records")
-                                else:
-                                    print("table 'users' still not exists")
-                        
-                        except Exception as e:
-                            table_span.set_attribute("error", True)
-                            table_span.set_status(Status(StatusCode.ERROR, f"Table verification failed: {str(e)}"))
-                            print(f"Table verification failed: {e}")
-
-                    span.set_attribute("db_setup.table_verification", True)
-                    span.set_attribute("db_setup.attempts", attempt)
-                    return True
-            
-                except Exception as e:
-                    attempt_span.set_attribute("error", True)
-                    attempt_span.set_status(Status(StatusCode.ERROR, str(e)))
-                    print(f"Attempt {attempt} failed: {e}")
-                    
-                    if attempt < max_retries:
-                        time.sleep(retry_delay)
-                    else:
-                        span.set_attribute("db_setup.max_retries_reached", True)
-                        span.set_status(Status(StatusCode.ERROR, "Max retries reached"))
-                        return False
-
-                finally:
-                    if connection:
-                        try:
-                            connection.close()
-                        except Exception as close_err:
-                            print(f"Failed to close connection: {close_err}")
-    return False
+        span.set_attribute("db_setup.deadline_seconds", deadline)
+        attempts = retry_with_backoff(verify_db_attempt, deadline, DB_SETUP_BACKOFF_INITIAL, DB_SETUP_BACKOFF_MAX, phase="database")
+        if not attempts:
+            span.set_attribute("db_setup.deadline_reached", True)
+            span.set_status(Status(StatusCode.ERROR, "Deadline reached"))
+            return False
+        span.set_attribute("db_setup.table_verification", True)
+        span.set_attribute("db_setup.attempts", attempts)
+        return True
+
+def startup_failed(phase):
+    print("Failed to start User Service due to database setup issues.")
+    os._exit(1) #let the orchestrator restart the pod
+
+def startup_steps():
+    #Run in every process that serves requests: __main__, or each gunicorn worker after the fork
+    return [
+        ("database", verify_db_setup),
+        ("health_monitor", health_monitor.start),
+    ]
+
+def warm_up_app(app):
+    """Preload mode (gunicorn.conf.py) - runs once in the master before the workers fork"""
+
+    warm_up(app, validate=lambda: Validators.validate_registration_data({"email": "warm-up@example.com", "password": "Warm-up-1234"}))
 
 if __name__ == "__main__":
+    app = create_app()
     port = get_port()
     debug_mode = get_debug_mode()
     environment = os.environ.get('FLASK_ENV','development')
@@ -749,8 +706,6 @@ if __name__ == "__main__":
     print("  GET  /metrics      - Service metrics")
     print("=" * 50)
 
-    if verify_db_setup():
-        host = os.getenv('FLASK_HOST', '0.0.0.0')
-        app.run(host=host, port=port, debug=debug_mode)  # nosec 
-    else:
-        print("Failed to start User Service due to database setup issues.")
\ No newline at end of file
+    startup.start(startup_steps(), on_failure=startup_failed)
+    host = os.getenv('FLASK_HOST', '0.0.0.0')
+    app.run(host=host, port=port, debug=debug_mode)  # nosec 
@@ -0,0 +1,128 @@
+import math, os, threading, time
+from metrics import registry
+
+STATES = ("closed", "open", "half_open")
+
+circuit_breaker_transitions_total = registry.counter("circuit_breaker_transitions_total", "State changes of the circuit breakers, by new state", ("breaker", "state"))
+circuit_breaker_rejections_total = registry.counter("circuit_breaker_rejections_total", "Calls failed fast because the breaker was open", ("breaker",))
+
+_breakers = []
+registry.function_gauge("circuit_breaker_state", "1 for the current state of each circuit breaker",
+                        lambda: {(breaker.name, state): int(breaker.state == state) for breaker in _breakers for state in STATES},
+                        ("breaker", "state"))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency the breaker considers down"""
+
+    def __init__(self, breaker):
+        super().__init__(f"{breaker.name} circuit open, retry in {breaker.retry_after()}s")
+        self.breaker = breaker
+        self.retry_after = breaker.retry_after()
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures, open -> half_open after `reset_timeout`.
+
+    While open every call fails at once instead of waiting out a connect timeout.
+    Half open lets `half_open_max_calls` trial calls through: a success closes the
+    breaker, a failure opens it for another `reset_timeout`.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=10.0, half_open_max_calls=1, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._state = "closed"
+        self._trials = 0
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+        _breakers.append(self)
+
+    @staticmethod
+    def from_env(name, prefix="DB_BREAKER"):
+        return CircuitBreaker(name,
+                              failure_threshold=int(os.environ.get(f"{prefix}_FAILURES", "5")),
+                              reset_timeout=float(os.environ.get(f"{prefix}_RESET_TIMEOUT", "10")),
+                              half_open_max_calls=int(os.environ.get(f"{prefix}_HALF_OPEN_CALLS", "1")))
+
+    @property
+    def state(self):
+        if self._state == "open" and self.clock() - self.opened_at >= self.reset_timeout:
+            with self._lock:
+                if self._state == "open": #another thread may have moved it already
+                    self._transition("half_open")
+        return self._state
+
+    def _transition(self, state):
+        #caller holds the lock
+        self._state = state
+        self._trials = 0
+        if state == "open":
+            self.opened_at = self.clock()
+        elif state == "closed":
+            self.failures = 0
+        circuit_breaker_transitions_total.inc(labels=(self.name, state))
+
+    def allow(self):
+        """True when a call may go through - counts as one trial call while half open"""
+
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open":
+            with self._lock:
+                if self._trials >= self.half_open_max_calls and self.clock() - self._trial_started >= self.reset_timeout:
+                    self._trials = 0 #trial calls that never reported back do not hold the breaker forever
+                if self._state == "half_open" and self._trials < self.half_open_max_calls:
+                    self._trials += 1
+                    self._trial_started = self.clock()
+                    return True
+        circuit_breaker_rejections_total.inc(labels=(self.name,))
+        return False
+
+    def check(self):
+        if not self.allow():
+            raise CircuitOpenError(self)
+
+    def record_success(self):
+        if self._state == "closed" and not self.failures: #the common case takes no lock
+            return
+        with self._lock:
+            self.failures = 0
+            if self._state != "closed":
+                self._transition("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._state == "half_open" or (self._state == "closed" and self.failures >= self.failure_threshold):
+                self._transition("open")
+
+    def retry_after(self):
+        """Whole seconds until the breaker lets a trial call through, for the Retry-After header"""
+
+        if self._state != "open":
+            return 1
+        return max(1, math.ceil(self.reset_timeout - (self.clock() - self.opened_at)))
+
+    def status(self):
+        state = self.state
+        status = {"state": state, "consecutive_failures": self.failures}
+        if state == "open":
+            status["retry_after_seconds"] = self.retry_after()
+        return status
+
+
+def is_outage(error):
+    """pymysql errors that mean the server is unreachable - client side codes 2000-2999 (can't connect, lost connection, timeouts)"""
+
+    code = error.args[0] if error.args and isinstance(error.args[0], int) else 0
+    return 2000 <= code < 3000
+
+
+db_breaker = CircuitBreaker.from_env("mysql") #around every MySQL connection of this process
@@ -0,0 +1,155 @@
+import os, time, zlib
+from flask import request
+from metrics import registry
+
+#brotli and zstandard are optional, gzip (zlib) is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "application/x-ndjson", "application/msgpack", "application/x-msgpack",
+                          "application/vnd.msgpack", "application/cbor", "text/")
+
+
+#Totals per encoding, exported on /metrics
+compression_responses_total = registry.counter("compression_responses_total", "Responses compressed", ("encoding",))
+compression_bytes_in_total = registry.counter("compression_bytes_in_total", "Response bytes before compression", ("encoding",))
+compression_bytes_out_total = registry.counter("compression_bytes_out_total", "Response bytes after compression", ("encoding",))
+compression_cpu_seconds_total = registry.counter("compression_cpu_seconds_total", "CPU seconds spent compressing", ("encoding",))
+
+
+def record_compression(encoding, bytes_in, bytes_out, cpu_seconds):
+    labels = (encoding,)
+    compression_responses_total.inc(labels=labels)
+    compression_bytes_in_total.inc(bytes_in, labels=labels)
+    compression_bytes_out_total.inc(bytes_out, labels=labels)
+    compression_cpu_seconds_total.inc(cpu_seconds, labels=labels)
+
+
+class Compressor:
+    """Response compression negotiated from Accept-Encoding (zstd, br, gzip)"""
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=4, zstd_level=3):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.zstd_level = zstd_level
+        self.encodings = []
+        if zstandard is not None:
+            self.encodings.append("zstd")
+        if brotli is not None:
+            self.encodings.append("br")
+        self.encodings.append("gzip") #server preference order, used when the client weights are equal
+
+    @staticmethod
+    def from_env():
+        return Compressor(min_size=int(os.environ.get("COMPRESSION_MIN_SIZE", "1024")),
+                          gzip_level=int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6")),
+                          brotli_quality=int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4")),
+                          zstd_level=int(os.environ.get("COMPRESSION_ZSTD_LEVEL", "3")))
+
+    def choose_encoding(self, accept_encoding):
+        if not accept_encoding:
+            return None
+        best = None
+        best_quality = 0
+        for encoding in self.encodings:
+            quality = accept_encoding.quality(encoding)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def compress(self, encoding, data):
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.zstd_level).compress(data)
+        if encoding == "br":
+            return brotli.compress(data, quality=self.brotli_quality)
+        return zlib.compress(data, self.gzip_level, wbits=31) #wbits 31 = gzip container
+
+    def stream_compressor(self, encoding):
+        """Returns (compress_chunk, finish) for incremental compression of streamed bodies"""
+
+        if encoding == "zstd":
+            compressobj = zstandard.ZstdCompressor(level=self.zstd_level).compressobj()
+            return (lambda chunk: compressobj.compress(chunk) + compressobj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+                    compressobj.flush)
+        if encoding == "br":
+            compressobj = brotli.Compressor(quality=self.brotli_quality)
+            return (lambda chunk: compressobj.process(chunk) + compressobj.flush(),
+                    compressobj.finish)
+        compressobj = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return (lambda chunk: compressobj.compress(chunk) + compressobj.flush(zlib.Z_SYNC_FLUSH),
+                compressobj.flush)
+
+    def should_compress(self, response):
+        if request.method == "HEAD" or response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.direct_passthrough or "Content-Encoding" in response.headers:
+            return False
+        mimetype = response.mimetype or ""
+        return any(mimetype.startswith(compressible) for compressible in COMPRESSIBLE_MIMETYPES)
+
+    def _compress_stream(self, encoding, chunks):
+        compress_chunk, finish = self.stream_compressor(encoding)
+        bytes_in = bytes_out = 0
+        cpu_seconds = 0.0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            started = time.thread_time()
+            compressed = compress_chunk(chunk)
+            cpu_seconds += time.thread_time() - started
+            bytes_in += len(chunk)
+            bytes_out += len(compressed)
+            if compressed:
+                yield compressed #each chunk is flushed so the client receives data as it is produced
+        started = time.thread_time()
+        tail = finish()
+        cpu_seconds += time.thread_time() - started
+        bytes_out += len(tail)
+        record_compression(encoding, bytes_in, bytes_out, cpu_seconds)
+        if tail:
+            yield tail
+
+    def __call__(self, response):
+        """after_request hook"""
+
+        if not self.should_compress(response):
+            return response
+
+        encoding = self.choose_encoding(request.accept_encodings)
+        response.vary.add("Accept-Encoding")
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._compress_stream(encoding, response.response)
+            response.headers.pop("Content-Length", None)
+            response.headers["Content-Encoding"] = encoding
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size: #small bodies cost more CPU than the bytes they would save
+            return response
+
+        started = time.thread_time()
+        compressed = self.compress(encoding, data)
+        record_compression(encoding, len(data), len(compressed), time.thread_time() - started)
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+
+def setup_compression(app, compressor=None):
+    if os.environ.get("COMPRESSION_ENABLED", "true").lower() == "false":
+        return None
+    compressor = compressor or Compressor.from_env()
+    app.after_request(compressor)
+    return compressor
@@ -0,0 +1,182 @@
+import os, threading, time
+from flask import g, jsonify, request
+from metrics import registry, parse_request_start
+
+concurrency_limit_rejected_total = registry.counter("concurrency_limit_rejected_total", "Requests shed by the adaptive concurrency limiters", ("limiter",))
+
+_limiters = []
+registry.function_gauge("concurrency_limit", "Current adaptive limit on in-flight requests",
+                        lambda: {(limiter.name,): round(limiter.limit, 2) for limiter in _limiters}, ("limiter",))
+registry.function_gauge("concurrency_limit_in_flight", "Requests holding a permit of each limiter",
+                        lambda: {(limiter.name,): limiter.in_flight for limiter in _limiters}, ("limiter",))
+
+SHED_RETRY_AFTER = 1 #seconds, overload clears faster than a breaker opens
+
+
+def parse_limits(value):
+    """"service=64,default=32,auth=2" -> {"service": 64.0, "default": 32.0, "auth": 2.0}"""
+
+    limits = {}
+    for item in (value or "").split(","):
+        if "=" not in item:
+            continue
+        name, number = item.rsplit("=", 1)
+        limits[name.strip()] = float(number)
+    return limits
+
+
+def route_class(route_classes, method, rule):
+    """Class of a route in ROUTE_CLASSES - "METHOD /rule" first, then "/rule", else "default". None: probes and scrapes"""
+
+    return route_classes.get(f"{method} {rule}", route_classes.get(rule, "default"))
+
+
+class AIMDLimiter:
+    """Adaptive limit on in-flight requests, additive increase / multiplicative decrease like TCP.
+
+    Each finished request reports its latency (queue wait included when the proxy
+    sends X-Request-Start). Under `latency_target` the limit grows by 1/limit, about
+    one per limit's worth of requests, and only while it is actually used. Over the
+    target, or on a 503/504, it is multiplied by `backoff`, at most once per
+    `latency_target` so a burst of slow requests counts as one signal.
+    """
+
+    def __init__(self, name, maximum, latency_target, minimum=1, backoff=0.9, clock=time.monotonic):
+        self.name = name
+        self.maximum = maximum
+        self.minimum = minimum
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.clock = clock
+        self.limit = float(maximum) #a fresh worker does not shed, the first slow requests bring it down
+        self.in_flight = 0
+        self._last_decrease = float("-inf")
+        self._lock = threading.Lock()
+        _limiters.append(self)
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                concurrency_limit_rejected_total.inc(labels=(self.name,))
+                return False
+            self.in_flight += 1
+            return True
+
+    def cancel(self):
+        #Permit given back without a latency sample, another limiter refused the request
+        with self._lock:
+            self.in_flight -= 1
+
+    def release(self, latency, overloaded=False):
+        with self._lock:
+            in_use = self.in_flight
+            self.in_flight -= 1
+            if overloaded or latency > self.latency_target:
+                now = self.clock()
+                if now - self._last_decrease >= self.latency_target:
+                    self._last_decrease = now
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+            elif in_use * 2 >= self.limit: #an idle worker keeps its limit, it has not learned anything
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class ConcurrencyLimits:
+    """A service wide limiter plus one per route class - a request needs a permit from both.
+
+    `route_classes` maps "METHOD /rule" or "/rule" to a class name, None bypasses
+    the limiters (probes and scrapes must answer under load). Other routes are "default".
+    """
+
+    def __init__(self, route_classes, limits, latency_targets):
+        self.route_classes = route_classes
+        self.service = AIMDLimiter("service", limits["service"], latency_targets["service"])
+        names = {name for name in route_classes.values() if name} | {"default"}
+        self.classes = {name: AIMDLimiter(name, limits[name], latency_targets[name]) for name in sorted(names)}
+
+    @staticmethod
+    def from_env(route_classes, limits, latency_targets):
+        #CONCURRENCY_LIMITS / CONCURRENCY_LATENCY_TARGETS override the defaults of the service, one entry per limiter
+        limits = dict(limits, **parse_limits(os.environ.get("CONCURRENCY_LIMITS")))
+        latency_targets = dict(latency_targets, **parse_limits(os.environ.get("CONCURRENCY_LATENCY_TARGETS")))
+        return ConcurrencyLimits(route_classes, limits, latency_targets)
+
+    def classify(self, method, rule):
+        return route_class(self.route_classes, method, rule)
+
+    def acquire(self, route_class):
+        """Permits to hand back to release(), [] for bypassed routes, None when the request is shed"""
+
+        if route_class is None:
+            return []
+        limiter = self.classes[route_class]
+        if not limiter.try_acquire():
+            return None
+        if not self.service.try_acquire():
+            limiter.cancel()
+            return None
+        return [limiter, self.service]
+
+    def release(self, permits, latency, overloaded=False):
+        for limiter in permits:
+            limiter.release(latency, overloaded)
+
+    def cancel(self, permits):
+        #Permits given back without a latency sample
+        for limiter in permits:
+            limiter.cancel()
+
+
+def overload_signal(status, error=None, caller_bound=False):
+    """True for the app's own timeouts (504, TimeoutError), False for a normal sample, None for no sample.
+
+    Behind a route every 503 means MySQL is unavailable (open breaker, failed
+    connect). That says nothing about how many requests the worker can take -
+    shrinking the limit would shed healthy traffic long after the database is back.
+    Neither does a timeout of a deadline the caller's header shortened (`caller_bound`):
+    X-Request-Timeout-Ms: 1 must not let any client collapse the limit.
+    """
+
+    timed_out = status == 504 or isinstance(error, TimeoutError)
+    if status == 503 or (timed_out and caller_bound):
+        return None
+    return timed_out
+
+
+def shed_response():
+    return jsonify({"error": "Service overloaded, retry later",
+                    "retry_after": SHED_RETRY_AFTER
+                    }), 503, {"Retry-After": str(SHED_RETRY_AFTER)}
+
+
+def setup_concurrency_limits(app, limits):
+    """before_request takes the permits or sheds with 503, teardown gives them back with the latency"""
+
+    app.extensions["concurrency_limits"] = limits
+
+    def acquire():
+        if request.url_rule is None: #404s and 405s cost nothing
+            return None
+        permits = limits.acquire(limits.classify(request.method, request.url_rule.rule))
+        if permits is None:
+            return shed_response()
+        g.concurrency_permits = permits
+        g.concurrency_started = time.perf_counter() - (parse_request_start(request.headers.get("X-Request-Start")) or 0.0)
+        return None
+
+    def record_status(response):
+        g.concurrency_status = response.status_code
+        return response
+
+    def release(error=None):
+        permits = g.pop("concurrency_permits", None)
+        if permits:
+            deadline = g.get("deadline") #setup_deadlines runs first, the start of a request sets it
+            overloaded = overload_signal(g.pop("concurrency_status", 500), error, deadline is not None and deadline.caller_bound)
+            if overloaded is None:
+                limits.cancel(permits)
+            else:
+                limits.release(permits, time.perf_counter() - g.pop("concurrency_started"), overloaded)
+
+    app.before_request(acquire)
+    app.after_request(record_status)
+    app.teardown_request(release)
@@ -0,0 +1,26 @@
+import os
+from dotenv import dotenv_values
+from pathlib import Path
+
+
+def load_env_files():
+    """.env.test, or else .env, of the repository root into os.environ.
+
+    Runs before the service modules are imported: metrics, logging, shutdown and
+    the app module read some of their settings at import time.
+    """
+
+    root_dir = Path(__file__).parent.parent
+
+    env_test_path = root_dir / '.env.test'
+    if env_test_path.exists():
+        env_vars= dotenv_values(str(env_test_path))
+        for key, values in env_vars.items():
+            os.environ[key] = values
+        return
+    
+    root_env_path = root_dir / '.env'
+    if root_env_path.exists():
+        env_vars = dotenv_values(str(root_env_path))
+        for key, values in env_vars.items():
+            os.environ[key] = values
@@ -0,0 +1,481 @@
+import bisect, json, os, threading, time
+from flask import g, request
+
+#Latency buckets in seconds, the same ones Prometheus client libraries use by default
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Shards:
+    """Per-thread value maps - each request thread writes only its own dict, so updates need no lock.
+
+    Reads sum every shard. Shards of finished threads are folded into a base map
+    during collection so the threaded dev server does not grow the list forever.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock() #only taken when a thread writes for the first time and on collection
+        self._shards = []
+        self._base = {}
+
+    def shard(self):
+        values = getattr(self._local, "values", None)
+        if values is None:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+        return values
+
+    def collect(self, merge):
+        with self._lock:
+            alive = []
+            for thread, values in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, values))
+                else:
+                    for key, value in list(values.items()):
+                        self._base[key] = merge(self._base.get(key), value)
+            self._shards = alive
+
+            totals = {}
+            for values in [self._base] + [values for _, values in alive]:
+                for key, value in list(values.items()):
+                    totals[key] = merge(totals.get(key), value)
+            return totals
+
+
+def _add(total, value):
+    return value if total is None else total + value
+
+
+def _add_histogram(total, value):
+    if total is None:
+        return list(value)
+    return [a + b for a, b in zip(total, value)]
+
+
+class Counter:
+
+    metric_type = "counter"
+    multiprocess = "sum" #see MetricsRegistry.start_multiprocess - the counts of exited workers are kept
+    merge = staticmethod(_add)
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._shards = _Shards()
+
+    def inc(self, amount=1, labels=()):
+        values = self._shards.shard()
+        values[labels] = values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._shards.collect(_add).get(labels, 0)
+
+    def values(self):
+        return self._shards.collect(_add)
+
+    def samples(self, values=None):
+        values = self.values() if values is None else values
+        return [(self.name, tuple(zip(self.labelnames, labels)), value) for labels, value in sorted(values.items())]
+
+
+class Gauge(Counter):
+    """Up/down gauge (in-flight requests) - every thread keeps its own delta and reads sum them"""
+
+    metric_type = "gauge"
+    multiprocess = "live_sum"
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+
+class FunctionGauge:
+    """Gauge whose value is read from a callback at scrape time, for state owned by other objects.
+
+    With several workers each one is exported with a `worker` label, or only the
+    highest value of them with multiprocess="max".
+    """
+
+    metric_type = "gauge"
+    merge = staticmethod(_add)
+
+    def __init__(self, name, help_text, function, labelnames=(), multiprocess="worker"):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self.multiprocess = multiprocess
+
+    def values(self):
+        value = self.function()
+        return value if isinstance(value, dict) else {(): value} #{labels tuple: value}
+
+    def samples(self, values=None):
+        labelnames = self.labelnames
+        if values is None:
+            values = self.values()
+        elif self.multiprocess == "worker":
+            labelnames += ("worker",)
+        return [(self.name, tuple(zip(labelnames, labels)), sample) for labels, sample in sorted(values.items())]
+
+
+class FunctionCounter(FunctionGauge):
+    """Counter read from a callback at scrape time - the value has to only go up (CPU seconds), rate() works on it"""
+
+    metric_type = "counter"
+
+    def __init__(self, name, help_text, function, labelnames=()):
+        super().__init__(name, help_text, function, labelnames, multiprocess="sum")
+
+
+class Histogram:
+
+    metric_type = "histogram"
+    multiprocess = "sum"
+    merge = staticmethod(_add_histogram)
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._shards = _Shards()
+
+    def observe(self, value, labels=()):
+        values = self._shards.shard()
+        counts = values.get(labels)
+        if counts is None:
+            counts = values[labels] = [0] * (len(self.buckets) + 2) #one slot per bucket, +Inf and the sum
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def values(self):
+        return self._shards.collect(_add_histogram)
+
+    def samples(self, values=None):
+        values = self.values() if values is None else values
+        samples = []
+        for labels, counts in sorted(values.items()):
+            labels = tuple(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts[:-1]):
+                cumulative += count
+                samples.append((self.name + "_bucket", labels + (("le", _format_value(bound)),), cumulative))
+            samples.append((self.name + "_count", labels, cumulative))
+            samples.append((self.name + "_sum", labels, counts[-1]))
+        return samples
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """Metrics of this process, or of every gunicorn worker of the pod once start_multiprocess ran.
+
+    In multiprocess mode each worker writes its values to `<directory>/<pid>.json`
+    every `interval` seconds and a scrape, answered by any worker, merges the
+    files: counters and histograms are summed over every worker, the ones that
+    exited included (the master folds them into dead.json), gauges over the
+    live workers, function gauges get a `worker` label or the highest value.
+    The other workers are up to `interval` seconds behind.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.multiprocess_dir = None
+        self._writer = None
+        self._stop_writer = threading.Event()
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def function_gauge(self, name, help_text, function, labelnames=(), multiprocess="worker"):
+        return self._register(FunctionGauge(name, help_text, function, labelnames, multiprocess))
+
+    def function_counter(self, name, help_text, function, labelnames=()):
+        return self._register(FunctionCounter(name, help_text, function, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def snapshot(self):
+        #JSON has no tuples, labels are written as lists
+        return {metric.name: {"mode": metric.multiprocess, "values": [[list(labels), value] for labels, value in metric.values().items()]}
+                for metric in self.metrics}
+
+    def write_snapshot(self):
+        path = os.path.join(self.multiprocess_dir, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as snapshot:
+            json.dump({"live": True, "metrics": self.snapshot()}, snapshot)
+        os.replace(path + ".tmp", path) #a scrape never reads half a file
+
+    def start_multiprocess(self, directory, interval=1.0):
+        """In the worker, after the fork - the writer thread of the master does not survive it"""
+
+        self.multiprocess_dir = directory
+        self._stop_writer.clear()
+        self.write_snapshot()
+
+        def write():
+            while not self._stop_writer.wait(interval):
+                self.write_snapshot()
+
+        self._writer = threading.Thread(target=write, name="metrics-writer", daemon=True)
+        self._writer.start()
+
+    def stop_multiprocess(self, timeout=None):
+        #Last snapshot once the requests are drained, the master keeps its counters after the exit
+        if self._writer is None:
+            return
+        self._stop_writer.set()
+        self._writer.join(timeout)
+        self._writer = None
+        self.write_snapshot()
+
+    def _worker_values(self):
+        """{metric name: {labels: value}} merged over the workers, this one read live"""
+
+        own = str(os.getpid())
+        snapshots = {}
+        #dead.json last: a worker folded into it meanwhile is then skipped and not counted twice, see mark_worker_dead
+        for file_name in sorted(os.listdir(self.multiprocess_dir), key=lambda file_name: file_name == "dead.json"):
+            worker = file_name[:-len(".json")]
+            if not file_name.endswith(".json") or worker == own:
+                continue
+            try:
+                with open(os.path.join(self.multiprocess_dir, file_name)) as snapshot:
+                    snapshots[worker] = json.load(snapshot)
+            except (OSError, ValueError): #exited and folded meanwhile
+                continue
+        folded = set(snapshots.get("dead", {}).get("workers", ()))
+
+        workers = [(own, True, {metric.name: metric.values() for metric in self.metrics})]
+        for worker, data in snapshots.items():
+            if worker not in folded:
+                workers.append((worker, data["live"], {name: {tuple(labels): value for labels, value in metric["values"]}
+                                                       for name, metric in data["metrics"].items()}))
+
+        merged = {}
+        for metric in self.metrics:
+            values = merged[metric.name] = {}
+            for worker, live, snapshot in workers:
+                if metric.name not in snapshot or (not live and metric.multiprocess != "sum"):
+                    continue
+                for labels, value in snapshot[metric.name].items():
+                    if metric.multiprocess == "worker":
+                        values[labels + (worker,)] = value
+                    elif metric.multiprocess == "max":
+                        values[labels] = max(values.get(labels, value), value)
+                    else:
+                        values[labels] = metric.merge(values.get(labels), value)
+        return merged
+
+    def render(self):
+        """Prometheus text exposition format"""
+
+        merged = self._worker_values() if self.multiprocess_dir else {}
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for name, labels, value in metric.samples(merged.get(metric.name)):
+                label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels)
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if label_text else f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def reset_multiprocess_dir(directory):
+    """In the master before the first fork: snapshots of a previous run would be summed with the new ones"""
+
+    os.makedirs(directory, exist_ok=True)
+    for file_name in os.listdir(directory):
+        if file_name.endswith((".json", ".tmp")):
+            os.remove(os.path.join(directory, file_name))
+
+
+def mark_worker_dead(directory, pid):
+    """In the master once a worker exited: its counters and histograms go to dead.json, its gauges are dropped"""
+
+    path = os.path.join(directory, f"{pid}.json")
+    dead_path = os.path.join(directory, "dead.json")
+    try:
+        with open(path) as snapshot:
+            metrics = json.load(snapshot)["metrics"]
+    except (OSError, ValueError): #died before its first snapshot
+        return
+    dead = {"live": False, "workers": [], "metrics": {}}
+    if os.path.exists(dead_path):
+        with open(dead_path) as snapshot:
+            dead = json.load(snapshot)
+    for name, metric in metrics.items():
+        if metric["mode"] != "sum":
+            continue
+        values = {tuple(labels): value for labels, value in dead["metrics"].get(name, {}).get("values", [])}
+        for labels, value in metric["values"]:
+            values[tuple(labels)] = (_add_histogram if isinstance(value, list) else _add)(values.get(tuple(labels)), value)
+        dead["metrics"][name] = {"mode": "sum", "values": [[list(labels), value] for labels, value in values.items()]}
+    dead["workers"].append(str(pid))
+    with open(dead_path + ".tmp", "w") as snapshot:
+        json.dump(dead, snapshot)
+    os.replace(dead_path + ".tmp", dead_path) #the worker is listed as folded before its own file goes
+    os.remove(path)
+
+
+registry = MetricsRegistry()
+
+#RED metrics per route
+http_requests_total = registry.counter("http_requests_total", "HTTP requests handled", ("method", "route", "status"))
+http_request_errors_total = registry.counter("http_request_errors_total", "HTTP requests answered with a 5xx status", ("method", "route"))
+http_request_duration_seconds = registry.histogram("http_request_duration_seconds", "HTTP request latency in seconds", ("method", "route"))
+http_requests_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests currently being served", ("route",))
+
+#Database connections - there is no pool, every request opens its own connection
+db_connections_opened_total = registry.counter("db_connections_opened_total", "MySQL connections opened")
+db_connection_errors_total = registry.counter("db_connection_errors_total", "MySQL connection attempts that failed")
+db_connect_duration_seconds = registry.histogram("db_connect_duration_seconds", "Time spent opening a MySQL connection")
+
+
+class DecayingAverage:
+    """Exponentially weighted average that fades towards 0 when no new observations arrive"""
+
+    def __init__(self, alpha=0.2, half_life=10.0):
+        self.alpha = alpha
+        self.half_life = half_life
+        self.average = 0.0
+        self.updated = time.monotonic()
+
+    def observe(self, value):
+        #plain float updates, a lost update under a race only nudges the average
+        self.average += self.alpha * (value - self.average)
+        self.updated = time.monotonic()
+
+    def value(self):
+        idle = time.monotonic() - self.updated
+        return self.average * 0.5 ** (idle / self.half_life)
+
+
+class SaturationSignal:
+    """How close this worker is to its limit, 1.0 means saturated.
+
+    The highest of in-flight requests over capacity, queue wait over its target
+    and DB connect wait over its target. Requests pile up on the DB and on password
+    hashing well before CPU peaks, so this moves earlier than CPU utilization.
+    """
+
+    def __init__(self, capacity=4, queue_wait_target=0.05, db_wait_target=0.05):
+        self.capacity = capacity
+        self.queue_wait_target = queue_wait_target
+        self.db_wait_target = db_wait_target
+        self.queue_wait = DecayingAverage()
+        self.db_wait = DecayingAverage()
+
+    @staticmethod
+    def from_env():
+        return SaturationSignal(capacity=int(os.environ.get("SATURATION_CAPACITY", "4")),
+                                queue_wait_target=float(os.environ.get("SATURATION_QUEUE_WAIT_TARGET", "0.05")),
+                                db_wait_target=float(os.environ.get("SATURATION_DB_WAIT_TARGET", "0.05")))
+
+    def components(self):
+        in_flight = sum(value for labels, value in http_requests_in_flight._shards.collect(_add).items()
+                        if labels != ("/metrics",)) #the scrape itself does not count
+        return {
+            ("in_flight",): in_flight / self.capacity,
+            ("queue_wait",): self.queue_wait.value() / self.queue_wait_target,
+            ("db_wait",): self.db_wait.value() / self.db_wait_target,
+        }
+
+    def value(self):
+        return max(self.components().values())
+
+
+def parse_request_start(header, now=None):
+    """Seconds the request waited in front of the app, from the proxy X-Request-Start header (t=<epoch>)"""
+
+    if not header:
+        return None
+    try:
+        started = float(header.strip().lstrip("t="))
+    except ValueError:
+        return None
+    while started > 1e11: #nginx sends seconds with milliseconds, other proxies send ms or us
+        started /= 1000
+    return max((now or time.time()) - started, 0.0)
+
+
+saturation = SaturationSignal.from_env()
+registry.function_counter("process_cpu_seconds_total", "CPU seconds used by this process", time.process_time)
+http_request_queue_wait_seconds = registry.histogram("http_request_queue_wait_seconds", "Time between the proxy accepting the request and the app starting it")
+#The most saturated worker stands for the pod, the HPA reads one series per pod
+registry.function_gauge("service_saturation", "Highest saturation component, 1.0 means the replica is at capacity", saturation.value, multiprocess="max")
+registry.function_gauge("service_saturation_component", "Saturation per signal", saturation.components, ("signal",), multiprocess="max")
+
+
+def _route_label():
+    return request.url_rule.rule if request.url_rule is not None else "unmatched" #route template keeps the label set small
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_route = _route_label()
+    http_requests_in_flight.inc(labels=(g.metrics_route,))
+
+    queue_wait = parse_request_start(request.headers.get("X-Request-Start"))
+    if queue_wait is not None:
+        http_request_queue_wait_seconds.observe(queue_wait)
+        saturation.queue_wait.observe(queue_wait)
+
+
+def _after_request(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(error=None):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return
+    route = g.pop("metrics_route")
+    status = g.pop("metrics_status", 500) #no response recorded means the view raised
+    method = request.method
+
+    http_requests_in_flight.dec(labels=(route,))
+    http_requests_total.inc(labels=(method, route, str(status)))
+    http_request_duration_seconds.observe(time.perf_counter() - started, labels=(method, route))
+    if status >= 500:
+        http_request_errors_total.inc(labels=(method, route))
+
+
+def setup_metrics(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+def record_db_connect(started, success):
+    elapsed = time.perf_counter() - started
+    db_connect_duration_seconds.observe(elapsed)
+    saturation.db_wait.observe(elapsed)
+    if success:
+        db_connections_opened_total.inc()
+    else:
+        db_connection_errors_total.inc()
@@ -0,0 +1,65 @@
+import gc, logging
+import jwt
+from metrics import registry
+
+#/proc/<pid>/smaps_rollup fields, in kB
+_SMAPS_FIELDS = {"Rss": "rss", "Pss": "pss", "Private_Clean": "uss", "Private_Dirty": "uss"}
+
+
+def memory_usage(pid="self"):
+    """RSS, PSS and USS of a process in bytes (Linux only, empty elsewhere).
+
+    USS is what the process alone holds - what freeing one worker gives back.
+    PSS adds its share of the pages it shares with the master and the other workers.
+    """
+
+    usage = {"rss": 0, "pss": 0, "uss": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as smaps:
+            for line in smaps:
+                name, _, value = line.partition(":")
+                if name in _SMAPS_FIELDS:
+                    usage[_SMAPS_FIELDS[name]] += int(value.split()[0]) * 1024
+    except OSError:
+        return {}
+    return usage
+
+
+registry.function_gauge("process_memory_bytes", "Memory of this worker process, uss is unique to it, pss adds its share of copy-on-write pages",
+                        lambda: {(kind,): value for kind, value in memory_usage().items()}, ("kind",))
+
+
+def warm_up(app, validate=None):
+    """Does once in the master what every worker would otherwise do on its first requests.
+
+    Pages touched here are shared copy-on-write by all workers instead of being
+    built again in each of them: URL map, JSON provider, JWT and validators.
+    """
+
+    with app.test_request_context("/health"):
+        app.json.dumps({"warm": True})
+    key = app.config["SECRET_KEY"] or "warm-up-key-of-at-least-32-bytes" #only the code paths matter, not the key
+    jwt.decode(jwt.encode({"warm": True}, key, algorithm="HS256"), key, algorithms=["HS256"])
+    if validate is not None:
+        validate()
+
+
+def disable_gc():
+    #Collections in the master would leave freed holes in pages the workers are about to share
+    gc.disable()
+
+
+def freeze():
+    """Right before fork: moves every object alive in the master to the permanent generation.
+
+    The workers' collector then never writes to their headers, so the pages stay shared.
+    """
+
+    gc.collect()
+    gc.freeze()
+    logging.info("Preloaded heap frozen", extra={"frozen_objects": gc.get_freeze_count(), **memory_usage()})
+
+
+def enable_gc():
+    gc.enable()
+
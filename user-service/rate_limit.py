@@ -0,0 +1,240 @@
+import logging, math, os, threading, time
+from flask import current_app, g, jsonify, request
+from metrics import registry
+from circuit_breaker import CircuitBreaker
+from concurrency_limit import route_class
+from structured_logging import parse_rate_limits
+
+try:
+    import redis
+except ImportError: #only needed for limits shared between pods (RATE_LIMIT_REDIS_URL)
+    redis = None
+
+rate_limit_rejected_total = registry.counter("rate_limit_rejected_total", "Requests answered 429 by the rate limiter, by policy", ("policy",))
+rate_limit_backend_errors_total = registry.counter("rate_limit_backend_errors_total", "Shared rate limit backend calls that failed, the local buckets answered instead")
+
+_buckets = []
+registry.function_gauge("rate_limit_tracked_clients", "Clients with a bucket that is not full yet, in this process",
+                        lambda: sum(len(buckets) for buckets in _buckets))
+
+
+class LocalBuckets:
+    """Token buckets of this process, one float per client.
+
+    A bucket is stored as the time it will be full again (GCRA's theoretical
+    arrival time): taking a token pushes it by window/burst, and a request that
+    would push it more than `window` ahead of now finds the bucket empty. Full
+    buckets hold nothing worth keeping - every `evict_interval` seconds they are
+    dropped, so a scan of a million IPs does not stay in memory.
+    """
+
+    def __init__(self, evict_interval=60.0, clock=time.monotonic):
+        self.evict_interval = evict_interval
+        self.clock = clock
+        self._full_at = {}
+        self._next_eviction = clock() + evict_interval
+        self._lock = threading.Lock()
+        _buckets.append(self)
+
+    def __len__(self):
+        return len(self._full_at)
+
+    def take(self, key, interval, window):
+        """(allowed, seconds until the bucket is full again)"""
+
+        now = self.clock()
+        with self._lock:
+            if now >= self._next_eviction:
+                self._full_at = {key: full_at for key, full_at in self._full_at.items() if full_at > now}
+                self._next_eviction = now + self.evict_interval
+            full_at = max(self._full_at.get(key, now), now)
+            if full_at + interval - now > window + 1e-9:
+                return False, full_at - now
+            self._full_at[key] = full_at + interval
+            return True, full_at + interval - now
+
+
+#Same algorithm in one round trip, on the Redis clock so that every pod agrees on "now".
+#The key expires when the bucket is full again, Redis does the eviction.
+_TAKE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local interval, window = tonumber(ARGV[1]), tonumber(ARGV[2])
+local full_at = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+if full_at + interval - now > window + 1e-9 then
+    return {0, tostring(full_at - now)}
+end
+redis.call('SET', KEYS[1], tostring(full_at + interval), 'PX', math.ceil((full_at + interval - now) * 1000))
+return {1, tostring(full_at + interval - now)}
+"""
+
+
+class SharedBuckets:
+    """Token buckets in Redis, shared by every pod - the limits hold for the service, not per replica.
+
+    When Redis does not answer the local buckets take over (the limits are then
+    per pod again) and a circuit breaker keeps requests from waiting on it.
+    """
+
+    def __init__(self, client, fallback, prefix="ratelimit:"):
+        self.client = client
+        self.fallback = fallback
+        self.prefix = prefix
+        self.breaker = CircuitBreaker("rate_limit_redis", failure_threshold=3, reset_timeout=5.0)
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    def __len__(self):
+        return 0 #counted by Redis, not by this process
+
+    def take(self, key, interval, window):
+        if self.breaker.allow():
+            try:
+                allowed, full_in = self._take(keys=[self.prefix + key], args=[interval, window])
+                self.breaker.record_success()
+                return bool(allowed), float(full_in)
+            except redis.RedisError as e:
+                self.breaker.record_failure()
+                rate_limit_backend_errors_total.inc()
+                logging.getLogger("rate_limit").warning("Rate limit backend unavailable, using local buckets", extra={"error": str(e)})
+        return self.fallback.take(key, interval, window)
+
+
+class Decision:
+    __slots__ = ("policy", "allowed", "limit", "window", "remaining", "reset", "retry_after")
+
+    def __init__(self, policy, allowed, limit, window, remaining, reset, retry_after):
+        self.policy = policy
+        self.allowed = allowed
+        self.limit = limit
+        self.window = window
+        self.remaining = remaining
+        self.reset = reset
+        self.retry_after = retry_after
+
+    def headers(self):
+        #RateLimit header fields of the IETF httpapi draft, for the policy closest to its limit
+        headers = {"RateLimit-Limit": str(self.limit),
+                   "RateLimit-Remaining": str(self.remaining),
+                   "RateLimit-Reset": str(math.ceil(self.reset)),
+                   "RateLimit-Policy": f"{self.limit};w={self.window:g}"}
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+def client_ip(forwarded_for, remote_addr, trusted_proxies=0):
+    """Address of the client as seen by the outermost trusted proxy.
+
+    X-Forwarded-For entries left of the ones appended by our own proxies are
+    whatever the client sent, so they are never used as the key.
+    """
+
+    if trusted_proxies and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        if hops:
+            return hops[-min(trusted_proxies, len(hops))]
+    return remote_addr
+
+
+class RateLimiter:
+    """Token bucket policies: "ip" for every request, "user" once the JWT is verified, and one
+    per route class (see ROUTE_CLASSES) keyed by IP, for routes such as /login. Routes the
+    route classes bypass (probes, scrapes) are never limited.
+
+    `policies` maps a policy name to (burst, window): up to `burst` requests at once,
+    refilled at burst/window per second.
+    """
+
+    def __init__(self, policies, route_classes, buckets, trusted_proxies=0):
+        self.policies = policies
+        self.route_classes = route_classes
+        self.buckets = buckets
+        self.trusted_proxies = trusted_proxies
+
+    @staticmethod
+    def from_env(route_classes, policies):
+        #RATE_LIMITS="ip=300/10,user=100/10,auth=30/60" overrides the defaults of the service, per policy
+        policies = dict(policies, **parse_rate_limits(os.environ.get("RATE_LIMITS")))
+        buckets = LocalBuckets(float(os.environ.get("RATE_LIMIT_EVICT_INTERVAL", "60")))
+        url = os.environ.get("RATE_LIMIT_REDIS_URL")
+        if url:
+            if redis is None:
+                raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the redis package is not installed")
+            timeout = float(os.environ.get("RATE_LIMIT_REDIS_TIMEOUT", "0.05"))
+            buckets = SharedBuckets(redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout), fallback=buckets)
+        return RateLimiter(policies, route_classes, buckets, int(os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", "0")))
+
+    def route_class(self, method, rule):
+        return route_class(self.route_classes, method, rule)
+
+    def check(self, policy, key):
+        """Takes a token from the bucket of `key` under `policy` - None when there is no such policy"""
+
+        if policy not in self.policies:
+            return None
+        burst, window = self.policies[policy]
+        interval = window / burst
+        allowed, full_in = self.buckets.take(f"{policy}:{key}", interval, window)
+        if not allowed:
+            rate_limit_rejected_total.inc(labels=(policy,))
+            return Decision(policy, False, burst, window, 0, full_in, max(1, math.ceil(full_in + interval - window)))
+        return Decision(policy, True, burst, window, int((window - full_in) / interval + 1e-9), full_in, 0)
+
+    def check_client(self, method, rule, forwarded_for, remote_addr):
+        """Decisions of the per IP policies for a request, [] for routes that are never limited"""
+
+        route_class = self.route_class(method, rule)
+        if route_class is None:
+            return []
+        ip = client_ip(forwarded_for, remote_addr, self.trusted_proxies)
+        decisions = [self.check("ip", ip)]
+        if route_class != "default":
+            decisions.append(self.check(route_class, ip))
+        return [decision for decision in decisions if decision]
+
+
+def most_limiting(decisions):
+    #The refused decision if there is one, otherwise the policy with the fewest requests left
+    return min(decisions, key=lambda decision: (decision.allowed, decision.remaining), default=None)
+
+
+def limited_response(decision):
+    return jsonify({"error": "Rate limit exceeded",
+                    "retry_after": decision.retry_after
+                    }), 429, decision.headers()
+
+
+def limit_user(user_id):
+    """Called by token_required once the token is verified - the 429 response, or None"""
+
+    limiter = current_app.extensions.get("rate_limiter")
+    decision = limiter.check("user", user_id) if limiter else None
+    if decision is None:
+        return None
+    g.rate_limits = g.get("rate_limits", []) + [decision]
+    return None if decision.allowed else limited_response(decision)
+
+
+def setup_rate_limits(app, limiter):
+    """Per IP policies before the request, per user ones in token_required, RateLimit headers on every response"""
+
+    app.extensions["rate_limiter"] = limiter
+
+    def check_client():
+        if request.url_rule is None:
+            return None
+        g.rate_limits = limiter.check_client(request.method, request.url_rule.rule,
+                                             request.headers.get("X-Forwarded-For"), request.remote_addr)
+        refused = most_limiting(g.rate_limits)
+        if refused is not None and not refused.allowed:
+            return limited_response(refused)
+        return None
+
+    def add_headers(response):
+        decision = most_limiting(g.get("rate_limits", ()))
+        if decision is not None:
+            response.headers.update(decision.headers())
+        return response
+
+    app.before_request(check_client)
+    app.after_request(add_headers)
@@ -0,0 +1,320 @@
+import atexit, logging, os, queue, random, threading, time
+from logging.handlers import QueueHandler, QueueListener
+from opentelemetry import trace
+from metrics import registry
+
+#orjson is already used by the JSON provider, json is the fallback
+try:
+    import orjson
+
+    def _dumps(value):
+        return orjson.dumps(value, default=str).decode("utf-8")
+except ImportError:
+    import json
+
+    def _dumps(value):
+        return json.dumps(value, default=str, separators=(",", ":"))
+
+HOT_PATH_LOG_SAMPLE = float(os.environ.get("LOG_HOT_PATH_SAMPLE", "0.1")) #share of per request success lines kept
+
+log_records_dropped_total = registry.counter("log_records_dropped_total", "Log records not written, by reason", ("reason",))
+log_events_suppressed_total = registry.counter("log_events_suppressed_total", "Records folded into a summary by the per logger rate limits", ("logger", "message"))
+log_summaries_total = registry.counter("log_summaries_total", "\"N similar events\" summaries written", ("logger",))
+
+#Attributes every LogRecord has - anything else on a record came from extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_CONTROL_ATTRIBUTES = {"log_sample", "log_interval", "log_key", "log_summary"}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line with the extra fields, trace ids and exception of the record"""
+
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+        self._second = None
+        self._prefix = ""
+
+    def _timestamp(self, created):
+        #The date part changes once a second, only the milliseconds are formatted per record
+        second = int(created)
+        if second != self._second:
+            self._second = second
+            self._prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        return f"{self._prefix}.{int((created - second) * 1000):03d}+00:00"
+
+    def format(self, record):
+        entry = {
+            "timestamp": self._timestamp(record.created),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key not in _CONTROL_ATTRIBUTES and not key.startswith("otel"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        elif record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return _dumps(entry)
+
+
+class LogContextFilter(logging.Filter):
+    """Adds the trace and span id of the calling thread - must run before the record is queued"""
+
+    def filter(self, record):
+        span_context = trace.get_current_span().get_span_context()
+        if span_context.is_valid:
+            record.trace_id = format(span_context.trace_id, "032x")
+            record.span_id = format(span_context.span_id, "016x")
+        return True
+
+
+class LogSamplingFilter(logging.Filter):
+    """Sampling and rate limiting for hot paths, opted into per call:
+
+        logging.info("Products retrieved", extra={"log_sample": 0.1})       #1 in 10
+        logging.info("Health check executed", extra={"log_interval": 60})  #at most one a minute
+
+    Rate limits are kept per message. The next record that passes carries the
+    number it stood for in "suppressed". Warnings and errors are never dropped.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._last = {}
+        self._suppressed = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        sample = getattr(record, "log_sample", None)
+        if sample is not None and random.random() >= sample: # nosec - sampling, not security
+            log_records_dropped_total.inc(labels=("sampled",))
+            return False
+
+        interval = getattr(record, "log_interval", None)
+        if interval is None:
+            return True
+        key = record.msg
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last.get(key, -interval) < interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                log_records_dropped_total.inc(labels=("rate_limited",))
+                return False
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+def parse_rate_limits(value):
+    """"auth=5/10,werkzeug=20/1" -> {"auth": (5, 10.0), "werkzeug": (20, 1.0)} - records per key per window in seconds"""
+
+    limits = {}
+    for item in (value or "").split(","):
+        if "=" not in item or "/" not in item:
+            continue
+        name, limit = item.split("=", 1)
+        burst, window = limit.split("/", 1)
+        limits[name.strip()] = (int(burst), float(window))
+    return limits
+
+
+class _Window:
+    __slots__ = ("started", "passed", "suppressed", "record")
+
+    def __init__(self, started, record):
+        self.started = started
+        self.passed = 1
+        self.suppressed = 0
+        self.record = record
+
+
+class LogAggregationFilter(logging.Filter):
+    """Per logger rate limits, warnings included - for floods such as auth failures.
+
+    Each key (logger, level and message, or extra={"log_key": ...}) may write
+    `burst` records per window. The rest are counted, and once the window is
+    over one record "N similar events in the last T seconds: <message>" is
+    written in their place. A background thread, started by the first
+    suppressed record of each process, writes the summaries of keys that went
+    quiet until stop().
+    """
+
+    def __init__(self, handler, limits):
+        super().__init__()
+        self.handler = handler
+        self.limits = limits
+        self._windows = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._stopped = threading.Event()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        #Threads do not survive fork - the flusher of a preloading master is restarted on demand
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._stopped = threading.Event()
+
+    def _limit_name(self, name):
+        #"auth" also covers "auth.login"
+        while name:
+            if name in self.limits:
+                return name
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record):
+        if getattr(record, "log_summary", False):
+            return True
+        limit_name = self._limit_name(record.name)
+        if limit_name is None:
+            return True
+        burst, window = self.limits[limit_name]
+
+        key = (record.name, record.levelno, getattr(record, "log_key", record.msg))
+        now = time.monotonic()
+        summary = None
+        with self._lock:
+            current = self._windows.get(key)
+            if current is None or now - current.started >= window:
+                if current is not None and current.suppressed:
+                    summary = self._summary(current, window)
+                self._windows[key] = _Window(now, record)
+                allowed = True
+            elif current.passed < burst:
+                current.passed += 1
+                allowed = True
+            else:
+                current.suppressed += 1
+                current.record = record #the summary carries the fields of the latest event
+                allowed = False
+                self._start_flusher()
+
+        if summary is not None:
+            self.handler.handle(summary)
+        if not allowed:
+            log_events_suppressed_total.inc(labels=(record.name, str(key[2])))
+        return allowed
+
+    def _summary(self, current, window):
+        record = current.record
+        summary = logging.LogRecord(record.name, record.levelno, record.pathname, record.lineno,
+                                    f"{current.suppressed} similar events in the last {window:g} seconds: {record.getMessage()}", None, None)
+        summary.log_summary = True
+        summary.suppressed = current.suppressed
+        summary.window_seconds = window
+        log_summaries_total.inc(labels=(record.name,))
+        return summary
+
+    def _start_flusher(self):
+        #Called with the lock held
+        if self._flusher is None and not self._stopped.is_set():
+            self._flusher = threading.Thread(target=self._flush_loop, name="LogAggregationFlusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stopped.wait(min(window for _, window in self.limits.values())):
+            self.flush()
+
+    def stop(self, timeout=None):
+        """Ends the flusher and writes the summaries of every window still open - before the writer stops"""
+
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout)
+        self.flush(now=float("inf"))
+
+    def flush(self, now=None):
+        """Writes the summaries of windows that ended without a new record to trigger them"""
+
+        now = time.monotonic() if now is None else now
+        summaries = []
+        with self._lock:
+            for key, current in list(self._windows.items()):
+                window = self.limits[self._limit_name(key[0])][1]
+                if now - current.started < window:
+                    continue
+                del self._windows[key]
+                if current.suppressed:
+                    summaries.append(self._summary(current, window))
+        for summary in summaries:
+            self.handler.handle(summary)
+
+
+class AsyncLogHandler(QueueHandler):
+    """Queues records for a background writer - the request thread only formats the message.
+
+    SimpleQueue puts without taking a lock. It has no maxsize, so the bound is
+    checked here: past max_size records are dropped and counted instead of blocking.
+    """
+
+    def __init__(self, log_queue=None, max_size=10000):
+        super().__init__(queue.SimpleQueue() if log_queue is None else log_queue)
+        self.max_size = max_size
+
+    def prepare(self, record):
+        #Message and traceback are rendered here, arguments may change once the caller moves on.
+        #The record is updated in place, other handlers get the same rendered message.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.max_size:
+            log_records_dropped_total.inc(labels=("queue_full",))
+            return
+        self.queue.put_nowait(record)
+
+
+def stop_listener(listener, timeout=None):
+    """Writes what is still queued and ends the writer thread - at exit, or earlier from the graceful shutdown"""
+
+    aggregation = getattr(listener, "aggregation", None)
+    if aggregation is not None:
+        aggregation.stop(timeout) #its last summaries go through the queue
+    if listener._thread is not None: #QueueListener.stop fails when called twice
+        listener.stop()
+
+
+def setup_structured_logging(service, filters=(), rate_limits=None):
+    """Root logger -> filters and queue on the calling thread -> JSON lines on stderr from a writer thread"""
+
+    writer = logging.StreamHandler()
+    writer.setFormatter(JSONFormatter(service))
+
+    handler = AsyncLogHandler(max_size=int(os.environ.get("LOG_QUEUE_SIZE", "10000")))
+    handler.addFilter(LogSamplingFilter()) #first, so dropped records cost nothing more
+    aggregation = LogAggregationFilter(handler, parse_rate_limits(os.environ.get("LOG_RATE_LIMITS", "")) if rate_limits is None else rate_limits)
+    handler.addFilter(aggregation)
+    handler.addFilter(LogContextFilter())
+    for log_filter in filters:
+        handler.addFilter(log_filter)
+
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(), handlers=[handler], force=True)
+
+    listener = QueueListener(handler.queue, writer, respect_handler_level=True)
+    listener.aggregation = aggregation #stopped by stop_listener before the writer
+    listener.start()
+    atexit.register(stop_listener, listener) #flushes what is still queued
+
+    def after_fork():
+        #Workers forked from a preloading master get their own queue and writer thread. The copy
+        #of the master's queue holds its records, which its own writer thread writes, and the lock
+        #state of the master's writer blocked in get(): the worker's writer would never wake up,
+        #and joining it at exit would hang the worker until the master kills it.
+        handler.queue = listener.queue = queue.SimpleQueue()
+        listener.start()
+    os.register_at_fork(after_in_child=after_fork)
+    return listener
@@ -0,0 +1,129 @@
+import hashlib, logging, math, os, threading, time
+from metrics import registry
+from circuit_breaker import CircuitBreaker
+
+try:
+    import redis
+except ImportError: #only needed for revocations shared between pods (RATE_LIMIT_REDIS_URL)
+    redis = None
+
+token_revocation_backend_errors_total = registry.counter("token_revocation_backend_errors_total", "Shared revocation backend calls that failed, the tokens revoked by this process answered instead")
+
+_revocations = []
+registry.function_gauge("revoked_tokens_tracked", "Logged out tokens remembered by this process until their exp",
+                        lambda: sum(len(revocations) for revocations in _revocations))
+
+
+def token_digest(token):
+    #The sha256 is stored, never the token itself
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class LocalRevocations:
+    """Logged out tokens of this process, digest -> exp.
+
+    An expired token already fails jwt.decode, so past its exp a token no longer
+    counts and every `evict_interval` seconds the expired ones are dropped.
+    Tokens without an exp are kept.
+    """
+
+    def __init__(self, evict_interval=60.0, clock=time.time):
+        self.evict_interval = evict_interval
+        self.clock = clock
+        self._expires_at = {}
+        self._next_eviction = clock() + evict_interval
+        self._lock = threading.Lock()
+        _revocations.append(self)
+
+    def __len__(self):
+        return len(self._expires_at)
+
+    def revoke(self, digest, expires_at=None):
+        with self._lock:
+            self._expires_at[digest] = expires_at
+
+    def revoked(self, digest, expires_at=None):
+        now = self.clock()
+        if now >= self._next_eviction:
+            with self._lock:
+                self._expires_at = {key: exp for key, exp in self._expires_at.items() if exp is None or exp > now}
+                self._next_eviction = now + self.evict_interval
+        exp = self._expires_at.get(digest, 0)
+        return exp is None or exp > now
+
+
+class SharedRevocations:
+    """Logged out tokens in Redis, one key per token that expires with it - refused by every worker and pod.
+
+    Answers are cached for `cache_ttl` seconds, so a token revoked elsewhere may
+    still pass for that long and a busy user costs one Redis call per `cache_ttl`.
+    Tokens found revoked are kept by the local revocations until their exp. When
+    Redis does not answer only the tokens revoked by this process are refused and
+    a circuit breaker keeps requests from waiting on it.
+    """
+
+    def __init__(self, client, fallback, cache_ttl=1.0, prefix="revoked:", clock=time.monotonic):
+        self.client = client
+        self.fallback = fallback
+        self.cache_ttl = cache_ttl
+        self.prefix = prefix
+        self.clock = clock
+        self.breaker = CircuitBreaker("token_revocation_redis", failure_threshold=3, reset_timeout=5.0)
+        self._cache = {}
+        self._cache_expires = clock() + cache_ttl
+
+    def __len__(self):
+        return 0 #counted by Redis, not by this process
+
+    def _backend_error(self, e):
+        self.breaker.record_failure()
+        token_revocation_backend_errors_total.inc()
+        logging.getLogger("auth").warning("Token revocation backend unavailable, using the tokens revoked by this process", extra={"error": str(e)})
+
+    def revoke(self, digest, expires_at=None):
+        self.fallback.revoke(digest, expires_at)
+        if self.breaker.allow():
+            try:
+                #the key lives as long as the token, expired tokens already fail jwt.decode
+                ttl = max(math.ceil(expires_at - time.time()), 1) if expires_at else None
+                self.client.set(self.prefix + digest, 1, ex=ttl)
+                self.breaker.record_success()
+            except redis.RedisError as e:
+                self._backend_error(e)
+
+    def revoked(self, digest, expires_at=None):
+        if self.fallback.revoked(digest):
+            return True
+        now = self.clock()
+        if now >= self._cache_expires:
+            self._cache = {} #whole generations are dropped, the cache never outgrows the tokens seen in cache_ttl
+            self._cache_expires = now + self.cache_ttl
+        cached = self._cache.get(digest)
+        if cached is not None:
+            return cached
+        if not self.breaker.allow():
+            return False
+        try:
+            revoked = bool(self.client.exists(self.prefix + digest))
+            self.breaker.record_success()
+        except redis.RedisError as e:
+            self._backend_error(e)
+            return False
+        if revoked:
+            self.fallback.revoke(digest, expires_at)
+        self._cache[digest] = revoked
+        return revoked
+
+
+def revocations_from_env():
+    """Per process revocations, in Redis when RATE_LIMIT_REDIS_URL is set - the same Redis as the rate limit buckets"""
+
+    revocations = LocalRevocations(float(os.environ.get("TOKEN_REVOCATION_EVICT_INTERVAL", "60")))
+    url = os.environ.get("RATE_LIMIT_REDIS_URL")
+    if url:
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the redis package is not installed")
+        timeout = float(os.environ.get("RATE_LIMIT_REDIS_TIMEOUT", "0.05"))
+        revocations = SharedRevocations(redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout), fallback=revocations,
+                                        cache_ttl=float(os.environ.get("TOKEN_REVOCATION_CACHE_TTL", "1")))
+    return revocations
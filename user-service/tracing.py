@@ -0,0 +1,99 @@
+from flask import g, request
+from opentelemetry import trace
+from opentelemetry.trace import Status, StatusCode
+
+#Per route span enrichment, keyed by the view function name (the endpoint without its blueprint)
+ROUTE_SPECS = {}
+
+
+class RouteTraceSpec:
+    """Which request/response fields of a route are copied onto the request span.
+
+    Values are a key of the JSON body or a callable that receives the body.
+    """
+
+    def __init__(self, request_fields=None, response_fields=None, view_args=()):
+        self.request_fields = request_fields or {}
+        self.response_fields = response_fields or {}
+        self.view_args = view_args
+
+    def apply(self, span, payload, body=None, view_args=None):
+        for name in self.view_args:
+            _set(span, name, (view_args or {}).get(name))
+
+        if self.request_fields and isinstance(body, dict):
+            for attribute, field in self.request_fields.items():
+                _set(span, attribute, _extract(body, field))
+
+        if self.response_fields and isinstance(payload, dict):
+            for attribute, field in self.response_fields.items():
+                _set(span, attribute, _extract(payload, field))
+
+
+def traced(request_fields=None, response_fields=None, view_args=()):
+    """Declares the span attributes of a route - goes below @app.route"""
+
+    def decorator(f):
+        ROUTE_SPECS[f.__name__] = RouteTraceSpec(request_fields, response_fields, view_args)
+        return f
+    return decorator
+
+
+def _extract(body, field):
+    if callable(field):
+        return field(body)
+    return body.get(field)
+
+
+def _set(span, attribute, value):
+    if value is None:
+        return
+    if not isinstance(value, (str, bool, int, float)): #span attributes only take primitives
+        value = str(value)
+    span.set_attribute(attribute, value)
+
+
+def _error_message(payload):
+    if isinstance(payload, dict):
+        return payload.get("error") or payload.get("Error")
+    return None
+
+
+def enrich_span(span, status, payload, user_id=None, spec=None, body=None, view_args=None):
+    """Adds user, result and error of a finished request to its server span - shared by the Flask and ASGI apps"""
+
+    if user_id is not None:
+        span.set_attribute("enduser.id", str(user_id))
+
+    if status < 400:
+        span.set_attribute("app.result", "success")
+    else:
+        message = _error_message(payload)
+        span.set_attribute("app.result", "client_error" if status < 500 else "server_error")
+        span.set_attribute("error", True)
+        if message:
+            span.set_attribute("error.message", str(message))
+        if status >= 500:
+            span.set_status(Status(StatusCode.ERROR, str(message) if message else None))
+
+    if spec is not None:
+        spec.apply(span, payload, body, view_args)
+
+
+def _enrich_request_span(response):
+    """after_request hook - enriches the server span FlaskInstrumentor opened"""
+
+    span = trace.get_current_span()
+    if not span.is_recording(): #unsampled or tracing disabled, nothing to pay for
+        return response
+
+    spec = ROUTE_SPECS.get((request.endpoint or "").rpartition(".")[2])
+    body = None
+    if spec is not None and spec.request_fields:
+        body = request.get_json(silent=True) #cached by Flask when the route already parsed it
+    enrich_span(span, response.status_code, g.get("response_payload"), g.get("current_user_id"), spec, body, request.view_args)
+    return response
+
+
+def setup_request_tracing(app):
+    app.after_request(_enrich_request_span)
@@ -5,10 +5,17 @@ class Validators:
 
     # Regex simple email validation
     EMAIL_REGEX = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    EMAIL_PATTERN = re.compile(EMAIL_REGEX) # compiled once at import instead of looked up on every call
 
     # Password configuration
     MIN_PASSWORD_LENGTH = 8
     MAX_PASSWORD_LENGTH = 20
+    SPECIAL_CHARACTERS = "@#/-_&!"
+    SPECIAL_CHARACTERS_SET = frozenset(SPECIAL_CHARACTERS)
+
+    # Translation table that deletes every dangerous character in a single pass
+    SANITIZE_TABLE = str.maketrans('', '', '<>"\';/\\=')
+    DANGEROUS_BYTES = b'<>"\';/\\='
 
     @staticmethod
     def validate_email(email):
@@ -18,7 +25,7 @@ class Validators:
         email_to_validate = email.strip() #removing leading and trailing spaces 
         
         # Validating email format with regex
-        if not re.match(Validators.EMAIL_REGEX, email_to_validate):
+        if not Validators.EMAIL_PATTERN.match(email_to_validate):
             return False, "Invalid email format"
     
         # Verifying email length
@@ -33,24 +40,36 @@ class Validators:
             return False, ["Password must be a valid string"]
         
         errors = []
-        special_characters = "@#/-_&!"
+        special_characters = Validators.SPECIAL_CHARACTERS
 
         if len(password) < Validators.MIN_PASSWORD_LENGTH:
             errors.append(f"password must be at least {Validators.MIN_PASSWORD_LENGTH} characters long")
 
         if len(password) > Validators.MAX_PASSWORD_LENGTH:
             errors.append(f"password must be at most {Validators.MAX_PASSWORD_LENGTH} characters long")
-        
-        if not any(char.isupper() for char in password):
+
+        # Single scan of the password collecting every character class at once
+        has_upper = has_lower = has_digit = has_special = False
+        for char in password:
+            if char.isupper():
+                has_upper = True
+            elif char.islower():
+                has_lower = True
+            elif char.isdigit():
+                has_digit = True
+            elif char in Validators.SPECIAL_CHARACTERS_SET:
+                has_special = True
+
+        if not has_upper:
             errors.append("password must contain at least one uppercase letter")
 
-        if not any(char.islower() for char in password):
+        if not has_lower:
             errors.append("password must contain at least one lowercase letter")
         
-        if not any(char.isdigit() for char in password):
+        if not has_digit:
             errors.append("password must contain at least one number")
         
-        if not any(char in special_characters for char in password):
+        if not has_special:
             errors.append(f"password must contain at least one special character: {special_characters}")
         
         return len(errors) == 0, errors # len(errors) == 0 returns True if no errors were found
@@ -62,11 +81,9 @@ class Validators:
         if not isinstance(text, str): # Condition to guarantee that only string types goes throguh sanitization
             return text
         
-        dangerous_characters = ['<', '>', '"', "'", ';', '/', '\\','='] 
-        for char in dangerous_characters:
-            text = text.replace(char, '')
-        
-        return text.strip()
+        if text.isascii(): # bytes.translate deletes in C without a per character dict lookup
+            return text.encode('ascii').translate(None, Validators.DANGEROUS_BYTES).decode('ascii').strip()
+        return text.translate(Validators.SANITIZE_TABLE).strip()
     
     @staticmethod
     def validate_registration_data(data):
@@ -91,7 +108,7 @@ class Validators:
                 "requirements": {
                     "min_length": Validators.MIN_PASSWORD_LENGTH,
                     "max_length": Validators.MAX_PASSWORD_LENGTH,
-                    "special characters": "@#/-_&!",
+                    "special characters": Validators.SPECIAL_CHARACTERS,
                     "errors": password_result
                 }
             }